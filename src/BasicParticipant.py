@@ -16,7 +16,9 @@ from EMDAT_core.Participant import *
 from EMDAT_core.Recording import *
 from EMDAT_core.AOI import AOI
 from EMDAT_core.Scene import Scene
+from EMDAT_core.feature_selection import FeatureSelection
 from EMDAT_core.utils import *
+from EMDAT_core import instrumentation
 
 from EMDAT_eyetracker.TobiiV2Recording import TobiiV2Recording
 from EMDAT_eyetracker.TobiiV3Recording import TobiiV3Recording
@@ -30,7 +32,7 @@ class BasicParticipant(Participant):
     def __init__(self, pid, eventfile, datafile, fixfile, saccfile, segfile,
                  log_time_offset=None, aoifile=None, prune_length=None,
                  require_valid_segs=True, auto_partition_low_quality_segments=False,
-                 rpsdata=None, export_pupilinfo=True):
+                 rpsdata=None, export_pupilinfo=True, feature_selection=None):
         """Inits BasicParticipant class
         Args:
             pid: Participant id
@@ -70,6 +72,9 @@ class BasicParticipant(Participant):
 
             rpsdata: rest pupil sizes for all scenes if available
 
+            feature_selection: If not None, a FeatureSelection: only the features it needs are computed, and
+                only the data these features depend on is read (see EMDAT_core/feature_selection.py)
+
         Yields:
             a BasicParticipant object
         """
@@ -79,6 +84,7 @@ class BasicParticipant(Participant):
                              log_time_offset, aoifile, prune_length, require_valid_segs,
                              auto_partition_low_quality_segments, rpsdata)
 
+        instrumentation.begin_participant(pid)
         print("Participant \""+str(pid)+"\"...")
 
         # print files used
@@ -95,31 +101,37 @@ class BasicParticipant(Participant):
 
         self.features = {}
 
+        if params.VERBOSE != "QUIET":
+            print("Creating partition...")
+
+        # In Participant.py: Get the scenes and segments specified in the segfile
+        scenelist, self.numofsegments = partition(segfile)
+
+        if self.numofsegments == 0:
+            raise Exception("No segments found.")
+
+        # In Recording.py: only read the rows of the input files around the segments
+        read_filter = ReadFilter.from_scenes(scenelist) if params.READ_SEGMENTS_ONLY else None
+
         """
         Type of eye tracker that generated the raw data. Must be specified in params.py,
         so appropriate parser is selected
         """
         if params.EYETRACKERTYPE == "TobiiV2":
             rec = TobiiV2Recording(datafile, fixfile, event_file=eventfile,
-                                   media_offset=params.MEDIA_OFFSET)
+                                   media_offset=params.MEDIA_OFFSET, read_filter=read_filter,
+                                   feature_selection=feature_selection)
         elif params.EYETRACKERTYPE == "TobiiV3":
             rec = TobiiV3Recording(datafile, fixfile, saccade_file=saccfile,
-                                   event_file=eventfile, media_offset=params.MEDIA_OFFSET)
+                                   event_file=eventfile, media_offset=params.MEDIA_OFFSET, read_filter=read_filter,
+                                   feature_selection=feature_selection)
         elif params.EYETRACKERTYPE == "SMI":
             rec = SMIRecording(datafile, fixfile, saccade_file=saccfile, event_file=eventfile,
-                               media_offset=params.MEDIA_OFFSET)
+                               media_offset=params.MEDIA_OFFSET, read_filter=read_filter,
+                               feature_selection=feature_selection)
         else:
             raise Exception("Unknown eye tracker type.")
 
-        if params.VERBOSE != "QUIET":
-            print("Creating partition...")
-
-        # In Participant.py: Get the scenes and segments specified in the segfile
-        scenelist, self.numofsegments = partition(segfile)
-
-        if self.numofsegments == 0:
-            raise Exception("No segments found.")
-
         # In Recording.py: Read the list of AOIs for this experiment from aoifile
         if aoifile is not None:
             aois = read_aois(aoifile)
@@ -136,7 +148,8 @@ class BasicParticipant(Participant):
                                                      prune_length=prune_length,
                                                      require_valid_segs=require_valid_segs,
                                                      auto_partition_low_quality_segments=auto_partition_low_quality_segments,
-                                                     rpsdata=rpsdata, export_pupilinfo=export_pupilinfo)
+                                                     rpsdata=rpsdata, export_pupilinfo=export_pupilinfo,
+                                                     feature_selection=feature_selection)
         # Sort segments by their starting timestamp
         all_segs = sorted(self.segments, key=lambda x: x.start)
 
@@ -144,13 +157,15 @@ class BasicParticipant(Participant):
         self.whole_scene = Scene(str(pid)+'_allsc', [], rec.all_data, rec.fix_data,
                                  saccade_data=rec.sac_data, event_data=rec.event_data,
                                  Segments=all_segs, aoilist=aois, prune_length=prune_length,
-                                 require_valid=require_valid_segs, export_pupilinfo=export_pupilinfo)
+                                 require_valid=require_valid_segs, export_pupilinfo=export_pupilinfo,
+                                 feature_selection=feature_selection)
         self.scenes.insert(0, self.whole_scene)
 
         #Clean memory
         for sc in self.scenes:
             sc.clean_memory()
         rec.clean_memory()
+        instrumentation.end_participant()
 
         if (params.VERBOSE != "QUIET"):
             print("Done!")
@@ -159,7 +174,7 @@ class BasicParticipant(Participant):
 
 def read_participants_Basic(datadir, user_list, pids, prune_length=None, aoifile=None,
                             log_time_offsets=None, require_valid_segs=True,
-                            auto_partition_low_quality_segments=False, rpsfile=None):
+                            auto_partition_low_quality_segments=False, rpsfile=None, feature_selection=None):
     """Generates list of Participant objects. Relevant information is read from input files
 
     Args:
@@ -194,10 +209,30 @@ def read_participants_Basic(datadir, user_list, pids, prune_length=None, aoifile
         rpsfile: If not None, a string containing the name of the '.tsv' file
             with rest pupil sizes for all scenes and for each user.
 
+        feature_selection: If not None, a FeatureSelection of the features to compute (by default all of them)
+
     Returns:
         a list Participant objects
     """
-    participants = []
+    return list(iter_participants_Basic(datadir, user_list, pids, prune_length=prune_length, aoifile=aoifile,
+                                        log_time_offsets=log_time_offsets, require_valid_segs=require_valid_segs,
+                                        auto_partition_low_quality_segments=auto_partition_low_quality_segments,
+                                        rpsfile=rpsfile, feature_selection=feature_selection))
+
+
+def iter_participants_Basic(datadir, user_list, pids, prune_length=None, aoifile=None,
+                            log_time_offsets=None, require_valid_segs=True,
+                            auto_partition_low_quality_segments=False, rpsfile=None, feature_selection=None):
+    """Generates the Participant objects one at a time. Relevant information is read from input files
+
+    Unlike read_participants_Basic, a Participant can be released by the caller before the next one is
+    read, so that only one Participant has to be kept in memory at a time.
+
+    Args: as in read_participants_Basic
+
+    Yields:
+        a Participant object for each user recording whose files are found, in the order of user_list
+    """
     if log_time_offsets == None:    #setting the default offset which is 1 sec
         log_time_offsets = [1]*len(pids)
 
@@ -233,13 +268,48 @@ def read_participants_Basic(datadir, user_list, pids, prune_length=None, aoifile
             segfile = "{dir}/SMI_Sample_{rec}.seg".format(dir=datadir, rec=rec)
 
         if os.path.exists(allfile):
-            p = BasicParticipant(rec, evefile, allfile, fixfile, sacfile, segfile, log_time_offset=offset,
-                                 aoifile=aoifile, prune_length=prune_length, require_valid_segs=require_valid_segs,
-                                 auto_partition_low_quality_segments=auto_partition_low_quality_segments, 
-                                 rpsdata=currpsdata,export_pupilinfo=True)
-            participants.append(p)
+            yield BasicParticipant(rec, evefile, allfile, fixfile, sacfile, segfile, log_time_offset=offset,
+                                   aoifile=aoifile, prune_length=prune_length, require_valid_segs=require_valid_segs,
+                                   auto_partition_low_quality_segments=auto_partition_low_quality_segments,
+                                   rpsdata=currpsdata,export_pupilinfo=True, feature_selection=feature_selection)
         else:
             log_to_file("Error reading participant files for: "+str(pid)+" FILE NOT FOUND\n")
             
             warn("Error reading participant files for: "+str(pid))
-    return participants
+
+
+def write_participants_features_Basic(outfile, datadir, user_list, pids, prune_length=None, aoifile=None,
+                                      log_time_offsets=None, require_valid_segs=True,
+                                      auto_partition_low_quality_segments=False, rpsfile=None,
+                                      featurelist=None, aoifeaturelist=None, aoifeaturelabels=None, id_prefix=True):
+    """Computes the features of a list of participants and writes them to a tsv-format file, one participant at a time
+
+    Writes the same file as write_features_tsv(read_participants_Basic(...), outfile, ...), but each
+    Participant is released as soon as its feature rows are written, so that the peak memory is
+    that of the largest participant rather than that of all of them. Only the features written to
+    the file are computed (see EMDAT_core/feature_selection.py).
+
+    Args:
+        outfile: a string containing the name of the output file
+
+        datadir, user_list, pids, prune_length, aoifile, log_time_offsets, require_valid_segs,
+        auto_partition_low_quality_segments, rpsfile: as in read_participants_Basic
+
+        featurelist, aoifeaturelist, aoifeaturelabels, id_prefix: as in write_features_tsv
+
+    Returns:
+        the number of participants whose files were found
+    """
+    writer = FeatureTsvWriter(outfile, featurelist=featurelist, aoifeaturelist=aoifeaturelist,
+                              aoifeaturelabels=aoifeaturelabels, id_prefix=id_prefix)
+    feature_selection = FeatureSelection(featurelist, aoifeaturelist, aoifeaturelabels)
+    numparticipants = 0
+    for p in iter_participants_Basic(datadir, user_list, pids, prune_length=prune_length, aoifile=aoifile,
+                                     log_time_offsets=log_time_offsets, require_valid_segs=require_valid_segs,
+                                     auto_partition_low_quality_segments=auto_partition_low_quality_segments,
+                                     rpsfile=rpsfile, feature_selection=feature_selection):
+        writer.add(p)
+        numparticipants += 1
+        del p  # release the participant before the next one is read
+    writer.close()
+    return numparticipants
@@ -8,8 +8,8 @@ Authors: Sebastien Lalle (creator), Samad Kardan.
 Institution: The University of British Columbia.
 """
 
-from math import ceil, floor
-from multiprocessing import Process, Queue
+from __future__ import print_function
+from multiprocessing import Pool
 import os.path
 
 params = __import__('params')
@@ -18,204 +18,180 @@ from EMDAT_core.Participant import *
 from EMDAT_core.Recording import *
 from EMDAT_core.AOI import AOI
 from EMDAT_core.Scene import Scene
+from EMDAT_core.feature_selection import FeatureSelection
 from EMDAT_core.utils import *
+from EMDAT_core import instrumentation
 
-from EMDAT_eyetracker.TobiiV2Recording import TobiiV2Recording
-from EMDAT_eyetracker.TobiiV3Recording import TobiiV3Recording
-from EMDAT_eyetracker.SMIRecording import SMIRecording
+from BasicParticipant import BasicParticipant
 
 
-class BasicParticipant(Participant):
-    """
-    This is a sample child class based on the Participant class that implements all the
-    placeholder methods in the Participant class for a basic project
-    """
-    def __init__(self, pid, eventfile, datafile, fixfile, saccfile, segfile, log_time_offset = None, aoifile = None, prune_length= None,
-                 require_valid_segs = True, auto_partition_low_quality_segments = False, rpsdata = None, export_pupilinfo = False):
-        """Inits BasicParticipant class
-        Args:
-            pid: Participant id
-
-            eventfile: a string containing the name of the "Event-Data.tsv" file for this participant
-
-            datafile: a string containing the name of the "All-Data.tsv" file for this participant
-
-            fixfile: a string containing the name of the "Fixation-Data.tsv" file for this participant
-
-            segfile: a string containing the name of the '.seg' file for this participant
-
-            log_time_offset: If not None, an integer indicating the time offset between the
-                external log file and eye tracking logs
-
-            aoifile: If not None, a string containing the name of the '.aoi' file
-                with definitions of the "AOI"s.
-
-            prune_length: If not None, an integer that specifies the time
-                interval (in ms) from the beginning of each Segment in which
-                samples are considered in calculations.  This can be used if,
-                for example, you only wish to consider data in the first
-                1000 ms of each Segment. In this case (prune_length = 1000),
-                all data beyond the first 1000ms of the start of the "Segment"s
-                will be disregarded.
-
-            auto_partition_low_quality_segments: a boolean indicating whether EMDAT should
-                split the "Segment"s which have low sample quality, into two new
-                sub "Segment"s discarding the largest gap of invalid samples.
-
-            rpsdata: rest pupil sizes for all scenes if available
+def participant_files(datadir, rec):
+    """Returns the names of the input files of a user recording for the current eye tracker type
 
-        Yields:
-            a BasicParticipant object
-        """
-
-
-        Participant.__init__(self, pid, eventfile, datafile, fixfile, saccfile, segfile, log_time_offset, aoifile, prune_length,
-                 require_valid_segs, auto_partition_low_quality_segments, rpsdata)   #calling the Participant's constructor
-
-        print "Participant \""+str(pid)+"\"..."
-        if params.VERBOSE != "QUIET":
-            print "Reading input files:"
-            print "--Scenes/Segments file: "+segfile
-            print "--Eye tracking samples file: "+datafile
-            print "--Fixations file: "+fixfile
-            print "--Saccades file: "+saccfile if saccfile is not None else "--No saccades file"
-            print "--Events file: "+eventfile if eventfile is not None else "--No events file"
-            print "--AOIs file: "+aoifile if aoifile is not None else "--No AOIs file"
-            print
-
-        self.features={}
-        if params.EYETRACKERTYPE == "TobiiV2":
-            rec = TobiiRecording(datafile, fixfile, event_file=eventfile, media_offset=params.MEDIA_OFFSET)
-        elif params.EYETRACKERTYPE == "TobiiV3":
-            rec = TobiiV3Recording(datafile, fixfile, saccade_file=saccfile, event_file=eventfile, media_offset=params.MEDIA_OFFSET)
-        elif params.EYETRACKERTYPE == "SMI":
-            rec = SMIRecording(datafile, fixfile, saccade_file=saccfile, event_file=eventfile, media_offset=params.MEDIA_OFFSET)
-        else:
-            raise Exception("Unknown eye tracker type.")
-
-        if params.VERBOSE != "QUIET":
-            print "Creating partition..."
+    Args:
+        datadir: directory with user data
 
-        scenelist,self.numofsegments = partition(segfile)
-        if self.numofsegments == 0:
-            raise Exception("No segments found.")
+        rec: the user recording (as in user_list)
 
-        if aoifile is not None:
-            aois = read_aois(aoifile)
-        else:
-            aois = None
+    Returns:
+        a tuple (allfile, fixfile, sacfile, evefile, segfile). sacfile is None if the eye tracker
+        does not export saccades
+    """
+    if params.EYETRACKERTYPE == "TobiiV2":
+        allfile = datadir+'/P'+str(rec)+'-All-Data.tsv'
+        fixfile = datadir+'/P'+str(rec)+'-Fixation-Data.tsv'
+        evefile = datadir+'/P'+str(rec)+'-Event-Data.tsv'
+        sacfile = None
+        segfile = datadir+'/P'+str(rec)+'.seg'
+    elif params.EYETRACKERTYPE == "TobiiV3":
+        allfile = "{dir}/P{rec}_Data_Export.tsv".format(dir=datadir, rec=rec)
+        fixfile = "{dir}/P{rec}_Data_Export.tsv".format(dir=datadir, rec=rec)
+        sacfile = "{dir}/P{rec}_Data_Export.tsv".format(dir=datadir, rec=rec)
+        evefile = "{dir}/P{rec}_Data_Export.tsv".format(dir=datadir, rec=rec)
+        segfile = "{dir}/TobiiV3_sample_{rec}.seg".format(dir=datadir, rec=rec)
+    elif params.EYETRACKERTYPE == "SMI":
+        allfile = "{dir}/SMI_Sample_{rec}_Samples.txt".format(dir=datadir, rec=rec)
+        fixfile = "{dir}/SMI_Sample_{rec}_Events.txt".format(dir=datadir, rec=rec)
+        sacfile = "{dir}/SMI_Sample_{rec}_Events.txt".format(dir=datadir, rec=rec)
+        evefile = "{dir}/SMI_Sample_{rec}_Events.txt".format(dir=datadir, rec=rec)
+        segfile = "{dir}/SMI_Sample_{rec}.seg".format(dir=datadir, rec=rec)
+    else:
+        raise Exception("Unknown eye tracker type.")
+    return allfile, fixfile, sacfile, evefile, segfile
 
-        self.features['numofsegments'] = self.numofsegments
+def participant_tasks(datadir, user_list, pids, log_time_offsets=None, rpsfile=None, options=None):
+    """Returns one task per user recording for the workers of run_participant_pool
 
-        if params.VERBOSE != "QUIET":
-            print "Generating features..."
+    Args:
+        datadir, user_list, pids, log_time_offsets, rpsfile: as in read_participants_pool
 
-        self.segments, self.scenes = rec.process_rec(scenelist = scenelist,aoilist = aois,prune_length = prune_length, require_valid_segs = require_valid_segs,
-                                                     auto_partition_low_quality_segments = auto_partition_low_quality_segments, rpsdata = rpsdata, export_pupilinfo=export_pupilinfo)
+        options: a dictionary with the keyword arguments of the BasicParticipant constructor
+            (without log_time_offset and rpsdata, which are set for each participant)
 
-        all_segs = sorted(self.segments, key=lambda x: x.start)
-        self.whole_scene = Scene(str(pid)+'_allsc',[],rec.all_data,rec.fix_data, saccade_data = rec.sac_data, event_data = rec.event_data, Segments = all_segs, aoilist = aois,prune_length = prune_length, require_valid = require_valid_segs, export_pupilinfo=export_pupilinfo )
-        self.scenes.insert(0,self.whole_scene)
+    Returns:
+        a list of tuples (index, rec, pid, offset, datadir, options) where index is the position
+        of the recording in user_list
+    """
+    if log_time_offsets is None:
+        log_time_offsets = [0]*len(pids)
+    rpsdata = read_rest_pupil_sizes(rpsfile)
+    tasks = []
+    for index, (rec, pid, offset) in enumerate(zip(user_list, pids, log_time_offsets)):
+        task_options = dict(options or {})
+        task_options['rpsdata'] = rpsdata[pid] if rpsdata is not None else None
+        tasks.append((index, rec, pid, offset, datadir, task_options))
+    return tasks
 
-        #Clean memory
-        for sc in self.scenes:
-            sc.clean_memory()
-        rec.clean_memory()
+def build_participant(rec, pid, offset, datadir, options):
+    """Builds the BasicParticipant of one user recording
 
-        if params.VERBOSE != "QUIET":
-            print "Done!"
+    Args:
+        rec, pid, offset, datadir, options: as in the tasks returned by participant_tasks
 
+    Returns:
+        a BasicParticipant, or None if the files of this participant could not be found
+    """
+    allfile, fixfile, sacfile, evefile, segfile = participant_files(datadir, rec)
+    if not os.path.exists(allfile):
+        print("Error reading participant files for: "+str(pid))
+        return None
+    return BasicParticipant(rec, evefile, allfile, fixfile, sacfile, segfile, log_time_offset = offset, **options)
 
-def read_participants_Basic(q, datadir, user_list, pids, prune_length = None, aoifile = None, log_time_offsets=None,
-                          require_valid_segs = True, auto_partition_low_quality_segments = False, rpsfile = None, export_pupilinfo = False):
-    """Generates list of Participant objects. Relevant information is read from input files
+def read_participant(task):
+    """Builds one BasicParticipant and returns it (worker of read_participants_pool)
 
     Args:
-        q: Queue to which all processes must add return values.
+        task: a tuple (index, rec, pid, offset, datadir, options) as returned by participant_tasks
 
-        datadir: directory with user data (including "All-Data.tsv", "Fixation-Data.tsv", "Event-Data.tsv" files)
-        for all participants
+    Returns:
+        a tuple (index, participant, report) where participant is None if the files of this
+        participant could not be found, and report is the instrumentation report of the participant
+        (None if instrumentation is disabled)
+    """
+    index, rec, pid, offset, datadir, options = task
+    p = build_participant(rec, pid, offset, datadir, options)
+    if p is None:
+        return index, None, None
+    return index, p, instrumentation.participant_report(rec)
 
-        user_list: list of user recordings (files extracted for one participant from Tobii studio)
+def extract_participant_features(task):
+    """Builds one BasicParticipant and returns its feature rows (worker of read_participants_features_pool)
 
-        pids: User ID that is used in the external logs (can be different from above but there should be a 1-1 mapping)
+    The Participant object itself never leaves the worker process: only the exported feature
+    names and values are sent back to the parent.
 
-        prune_length: If not None, an integer that specifies the time
-            interval (in ms) from the beginning of each Segment in which
-            samples are considered in calculations.  This can be used if,
-            for example, you only wish to consider data in the first
-            1000 ms of each Segment. In this case (prune_length = 1000),
-            all data beyond the first 1000ms of the start of the "Segment"s
-            will be disregarded.
+    Args:
+        task: a tuple (index, rec, pid, offset, datadir, options, featurelists, aoifeaturelist, id_prefix,
+            require_valid) where the first items are as returned by participant_tasks and featurelists
+            is a list of feature lists to export
 
-        aoifile: If not None, a string containing the name of the '.aoi' file
-            with definitions of the "AOI"s.
+    Returns:
+        a tuple (index, exports, report) where exports is a list with one (featnames, rows) tuple per
+        feature list, or None if the files of this participant could not be found, and report is the
+        instrumentation report of the participant (None if instrumentation is disabled)
+    """
+    (index, rec, pid, offset, datadir, options, featurelists, aoifeaturelist, id_prefix,
+     require_valid) = task
+    p = build_participant(rec, pid, offset, datadir, options)
+    if p is None:
+        return index, None, None
+    exports = []
+    for featurelist in featurelists:
+        exports.append(p.export_features(featurelist, aoifeaturelist = aoifeaturelist,
+                                         id_prefix = id_prefix, require_valid = require_valid))
+    return index, exports, instrumentation.participant_report(rec)
+
+def run_participant_pool(worker, tasks, nbprocesses, user_list):
+    """Runs one task per participant with a pool of worker processes
+
+    Tasks are handed out one at a time, largest samples file first, so that a long recording
+    does not hold back the other participants. The results are put back in the order of
+    user_list whatever the order in which workers finish.
 
-        log_time_offset: If not None, an integer indicating the time offset between the
-            external log file and eye tracking logs
+    Args:
+        worker: a function taking a task and returning a tuple (index, result, report)
 
-        require_valid_segs: a boolean determining whether invalid "Segment"s
-            will be ignored when calculating the features or not. default = True
+        tasks: a list of tasks whose first items are as returned by participant_tasks
 
-        auto_partition_low_quality_segments: a boolean indicating whether EMDAT should
-            split the "Segment"s which have low sample quality, into two new
-            sub "Segment"s discarding the largest gap of invalid samples.
+        nbprocesses: number of worker processes (number of CPU cores is a good option).
 
-        rpsfile: If not None, a string containing the name of the '.tsv' file
-            with rest pupil sizes for all scenes and for each user.
+        user_list: list of user recordings
 
     Returns:
-        a list Participant objects (in queue)
+        a list with the result of each task, in the order of user_list
     """
-    participants = []
-    if log_time_offsets == None:    #setting the default offset which is 1 sec
-        log_time_offsets = [0]*len(pids)
-
-    # read rest pupil sizes (rpsvalues) from rpsfile
-    rpsdata = read_rest_pupil_sizes(rpsfile)
-
-    for rec,pid,offset in zip(user_list,pids,log_time_offsets):
-        #extract pupil sizes for the current user. Set to None if not available
-        if rpsdata != None:
-            currpsdata = rpsdata[pid]
-        else:
-            currpsdata = None
-
-        if params.EYETRACKERTYPE == "TobiiV2":
-            allfile = datadir+'/P'+str(rec)+'-All-Data.tsv'
-            fixfile = datadir+'/P'+str(rec)+'-Fixation-Data.tsv'
-            evefile = datadir+'/P'+str(rec)+'-Event-Data.tsv'
-            sacfile = None
-            segfile = datadir+'/P'+str(rec)+'.seg'
-        elif params.EYETRACKERTYPE == "TobiiV3":
-            allfile = "{dir}/P{rec}_Data_Export.tsv".format(dir=datadir, rec=rec)
-            fixfile = "{dir}/P{rec}_Data_Export.tsv".format(dir=datadir, rec=rec)
-            sacfile = "{dir}/P{rec}_Data_Export.tsv".format(dir=datadir, rec=rec)
-            evefile = "{dir}/P{rec}_Data_Export.tsv".format(dir=datadir, rec=rec)
-            segfile = "{dir}/TobiiV3_sample_{rec}.seg".format(dir=datadir, rec=rec)
-        elif params.EYETRACKERTYPE == "SMI":
-            allfile = "{dir}/SMI_Sample_{rec}_Samples.txt".format(dir=datadir, rec=rec)
-            fixfile = "{dir}/SMI_Sample_{rec}_Events.txt".format(dir=datadir, rec=rec)
-            sacfile = "{dir}/SMI_Sample_{rec}_Events.txt".format(dir=datadir, rec=rec)
-            evefile = "{dir}/SMI_Sample_{rec}_Events.txt".format(dir=datadir, rec=rec)
-            segfile = "{dir}/SMI_Sample_{rec}.seg".format(dir=datadir, rec=rec)
-
-        if os.path.exists(allfile):
-            p = BasicParticipant(rec, evefile, allfile, fixfile, sacfile, segfile, log_time_offset = offset,
-                                aoifile=aoifile, prune_length = prune_length, require_valid_segs = require_valid_segs,
-                                auto_partition_low_quality_segments = auto_partition_low_quality_segments, rpsdata = currpsdata)
-            participants.append(p)
-        else:
-            print "Error reading participant files for: "+pid
-    q.put(participants)
-    return
-
-def read_participants_Basic_multiprocessing(nbprocesses, datadir, user_list, pids, prune_length = None, aoifile = None, log_time_offsets = None,
-                          require_valid_segs = True, auto_partition_low_quality_segments = False, rpsfile = None, export_pupilinfo = False):
-    """Generates list of Participant objects in parallel computing. Relevant information is read from input files
+    def input_size(task):
+        allfile = participant_files(task[4], task[1])[0]
+        return os.path.getsize(allfile) if os.path.exists(allfile) else 0
+    sizes = dict((task[0], input_size(task)) for task in tasks)
+    tasks = sorted(tasks, key=lambda task: (-sizes[task[0]], task[0]))
+
+    nbprocesses = max(1, min(nbprocesses, len(tasks)))
+    results = [None]*len(tasks)
+    pool = Pool(nbprocesses)
+    try:
+        for index, result, report in pool.imap_unordered(worker, tasks, 1):
+            results[index] = result
+            instrumentation.add_participant_report(user_list[index], report)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return results
+
+def read_participants_pool(nbprocesses, datadir, user_list, pids, prune_length = None, aoifile = None, log_time_offsets = None,
+                           require_valid_segs = True, auto_partition_low_quality_segments = False, rpsfile = None,
+                           export_pupilinfo = False, feature_selection = None):
+    """Generates list of Participant objects with a pool of worker processes. Relevant information is read from input files
+
+    The Participant objects are built in the workers and sent back to the parent, which is only
+    needed when the Participant objects themselves are used (e.g. by the functions of
+    ValidityProcessing): read_participants_features_pool only sends back the feature rows.
 
     Args:
-        nbprocesses: number of processes to run in parallel (number of CPU cores is a good option).
+        nbprocesses: number of worker processes (number of CPU cores is a good option).
 
         datadir: directory with user data (including "All-Data.tsv", "Fixation-Data.tsv", "Event-Data.tsv" files)
         for all participants
@@ -248,77 +224,89 @@ def read_participants_Basic_multiprocessing(nbprocesses, datadir, user_list, pid
         rpsfile: If not None, a string containing the name of the '.tsv' file
             with rest pupil sizes for all scenes and for each user.
 
-    Returns:
-        a list Participant objects
-    """
+        export_pupilinfo: a boolean determining whether the pupil sizes of the "Scene"s are kept for export
 
-    q = Queue()
-    listprocess = []
-    participants = []
+        feature_selection: If not None, a FeatureSelection of the features to compute (by default all of them)
 
-    if nbprocesses < 1:
-        nbprocesses = 1
-    if nbprocesses > len(user_list):
-        nbprocesses = len(user_list)
-
-    for i in range(0, nbprocesses): #create a sublist of participants for each process
-        user_listsplit = chunks(user_list, nbprocesses)
-        pidssplit = chunks(pids, nbprocesses)
-        log_time_offsets_list = chunks(log_time_offsets, nbprocesses) if log_time_offsets is not None else None
+    Returns:
+        a list Participant objects, in the order of user_list. Participants whose files are missing are left out
+    """
+    options = {'aoifile': aoifile, 'prune_length': prune_length, 'require_valid_segs': require_valid_segs,
+               'auto_partition_low_quality_segments': auto_partition_low_quality_segments,
+               'export_pupilinfo': export_pupilinfo, 'feature_selection': feature_selection}
+    tasks = participant_tasks(datadir, user_list, pids, log_time_offsets, rpsfile, options)
+    participants = run_participant_pool(read_participant, tasks, nbprocesses, user_list)
+    return [p for p in participants if p is not None]
+
+def read_participants_features_pool(nbprocesses, datadir, user_list, pids, featurelists, aoifeaturelist = None, id_prefix = False,
+                                    require_valid = True, prune_length = None, aoifile = None, log_time_offsets = None,
+                                    require_valid_segs = True, auto_partition_low_quality_segments = False, rpsfile = None, export_pupilinfo = False):
+    """Computes the features of a list of participants with a pool of worker processes
+
+    Each participant is a separate task (see run_participant_pool). Workers return feature rows
+    instead of Participant objects, and only compute the features of featurelists and aoifeaturelist
+    (see EMDAT_core/feature_selection.py).
 
-    print user_listsplit
-    try:
-        for i in range(0, nbprocesses):
-            if log_time_offsets is None:
-			    p = Process(target=read_participants_Basic, args=(q, datadir, user_listsplit[i], pidssplit[i], prune_length, aoifile, log_time_offsets,
-                          require_valid_segs, auto_partition_low_quality_segments, rpsfile, export_pupilinfo))
-            else:
-			    p = Process(target=read_participants_Basic, args=(q, datadir, user_listsplit[i], pidssplit[i], prune_length, aoifile, log_time_offsets_list[i],
-                          require_valid_segs, auto_partition_low_quality_segments, rpsfile, export_pupilinfo))
+    Args:
+        nbprocesses: number of worker processes (number of CPU cores is a good option).
 
-            listprocess.append(p)
-            p.start() # start the process
+        datadir, user_list, pids, prune_length, aoifile, log_time_offsets, require_valid_segs,
+        auto_partition_low_quality_segments, rpsfile, export_pupilinfo: as in read_participants_pool
 
-        for i in range(0, nbprocesses):
-            participants = participants + q.get(True) # wait for the results of all processes
+        featurelists: a list of feature lists, e.g. [params.featurelist, params.aoisequencefeat].
+            The features of each list are exported separately, as Participant.export_features does
 
-        for pr in listprocess:
-            pr.terminate()
-            pr.join() #kill the process
+        aoifeaturelist: if not None, a list of features to be returned for each of the "AOI"s.
 
-    except  Exception as e:
-        exc_type, exc_obj, exc_tb = sys.exc_info()
-        print "Exception", sys.exc_info()
-        print "Line ", exc_tb.tb_lineno
+        id_prefix: a boolean determining if the participant id should also be exported
 
-    return participants
+        require_valid: a boolean determining if invalid "Scene"s are dropped from the export
 
-def chunks(l, n):
-    """Split a list in balanced sub-lists. If equal sublits are not possible, remaining elements are distribute evenly among sublists.
+    Returns:
+        a list with one (featnames, rows) tuple per feature list, in the format of
+        Participant.export_features_all. Participants whose files are missing have no rows
+    """
+    if any(featurelist is None for featurelist in featurelists):
+        selected = None
+    else:
+        selected = [name for featurelist in featurelists for name in featurelist]
+    options = {'aoifile': aoifile, 'prune_length': prune_length, 'require_valid_segs': require_valid_segs,
+               'auto_partition_low_quality_segments': auto_partition_low_quality_segments,
+               'export_pupilinfo': export_pupilinfo,
+               'feature_selection': FeatureSelection(selected, aoifeaturelist)}
+    tasks = [task + (featurelists, aoifeaturelist, id_prefix, require_valid)
+             for task in participant_tasks(datadir, user_list, pids, log_time_offsets, rpsfile, options)]
+    results = run_participant_pool(extract_participant_features, tasks, nbprocesses, user_list)
+
+    exported = []
+    for i in range(len(featurelists)):
+        featnames = None
+        rows = []
+        for exports in results:
+            if exports is None:
+                continue
+            fnames, data = exports[i]
+            if featnames is None or (data and not rows):
+                featnames = fnames
+            rows += data
+        exported.append((featnames, rows))
+    return exported
+
+@instrumentation.timed("export")
+def write_feature_rows_tsv(featnames, rows, outfile):
+    """Writes feature rows, as returned by read_participants_features_pool, to a tsv-format file
 
     Args:
-        l: the list to split.
+        featnames: a list of feature names
 
-        n: the number of sublists to generate.
+        rows: a list of lists of feature values
 
-    Returns:
-        a list of n sublists
+        outfile: a string containing the name of the output file
     """
-    if n < 1:
-        n = 1
-    if len(l) < n:
-        n = len(l)
-
-    nsize = len(l)/n #number of elements in the sublists
-    if len(l)%n == 0:
-        return [l[i:i + nsize] for i in range(0, len(l), nsize)]
-    else:
-        l2 = [l[i:i + nsize] for i in range(0, len(l[0:nsize*n]), nsize)]
-        i=0
-        for j in l[nsize*n:len(l)]: #distribute remaining elements
-            l2[i].append(j)
-            i = (i+1) % n
-        return l2
+    with open(outfile, 'w') as f:
+        f.write('\t'.join(featnames) + '\n')
+        for row in rows:
+            f.write('\t'.join([str(value) for value in row]) + '\n')
 
 def partition_Basic(segfile):
     """Generates the scenelist based on a .seg file
@@ -333,7 +321,7 @@ def partition_Basic(segfile):
     """
     scenelist = read_segs(segfile)
     segcount = 0
-    for l in scenelist.itervalues():
+    for l in scenelist.values():
         segcount += len(l)
     return scenelist, segcount
 
@@ -352,43 +340,7 @@ def read_events(evfile):
     with open(evfile, 'r') as f:
         lines = f.readlines()
 
-    return map(Event, lines[(params.EVENTSHEADERLINES+params.NUMBEROFEXTRAHEADERLINES):])
-
-def read_rest_pupil_sizes(rpsfile):
-    """
-    Returns a dictionary of rest pupil sizes for all scenes if rpsfile is provided. None otherwise
-    The input file has the following format:
-        pid\t<scene name 1>\t<scene name 2>....\n
-        <pid 1>\t<rest pupil size 1>\t<rest pupil size 2>
-
-    Args:
-        rpsfile: a string containing the name of the '.tsv' file
-            with rest pupil sizes for all partiicpants and all scenes.
-
-    Returns:
-        a dictionary of rest pupil sizes. None otherwise
-
-    """
-    if rpsfile != None:
-        with open(rpsfile, 'r') as f:
-            lines = f.readlines()
-        rpsdic = {}
-        import re
-        scenelist = re.findall('\w+', lines[0])
-        for line in lines[1:]:
-            linelist = re.findall('\w+', line)
-            pid = cast_int(linelist[0])
-            if pid == None: #if casting didn't work
-                pid = linelist[0]
-            rpsdic[pid] = {}
-            for scene, rpsvalue in zip(scenelist[1:], linelist[1:]):
-                rpsdic[pid][scene] = cast_int(rpsvalue)
-
-        return rpsdic
-    else:
-        return None
-
-
+    return list(map(Event, lines[(params.EVENTSHEADERLINES+params.NUMBEROFEXTRAHEADERLINES):]))
 
 def plot_pupil_dilation_all(participants, outdir, scene):
     """
@@ -16,7 +16,13 @@ Institution: The University of British Columbia.
 """
 
 from EMDAT_core.utils import *
+from EMDAT_core.data_structures import SampleTable, IntervalIndex
+from EMDAT_core import instrumentation
+from EMDAT_core import vectorized
+from EMDAT_core.feature_selection import ALL_FEATURES
 from warnings import warn
+import numpy as np
+import numbers
 
 
 class AOI():
@@ -43,8 +49,16 @@ class AOI():
         self.polyin = polyin
         self.polyout = polyout
         self.timeseq = timeseq
+        self.activity_index = None
 #            self.partial = True
 
+    def index_activity(self):
+        """Builds the IntervalIndex of the time intervals of all the shapes of the AOI, so that is_active and
+        is_active_partition do not scan timeseq (see read_aoilines). It must be built again if timeseq changes.
+        """
+        self.always_active = any(seq == [] for seq in self.timeseq)  # one shape at least is global
+        self.activity_index = IntervalIndex([intr for seq in self.timeseq for intr in seq])
+
     def set_coordinates(self, polyin, polyout=[]):
         """Sets the coordiantes of the AOI
 
@@ -71,6 +85,16 @@ class AOI():
         if start == -1:
             return False
 
+        index = getattr(self, 'activity_index', None)
+        if index is not None:
+            if self.always_active:
+                return True
+            if index.max_end_starting_before(start) > start or index.max_end_starting_before(end, inclusive=False) >= end:
+                return True
+            if index.min_end_starting_after(start) < end:
+                warn("Incorrect definition of Dynamic AOI and Segments, AOI info not calculated for AOI:"+self.aid)
+            return False
+
         if self.timeseq == [[]]:
             return True #global AOI
 
@@ -105,6 +129,18 @@ class AOI():
         if params.DEBUG or params.VERBOSE == "VERBOSE":
             print("in:",self.aid)
 
+        index = getattr(self, 'activity_index', None)
+        if index is not None:
+            if self.always_active or index.max_end_starting_before(start) >= end:
+                return True, [] #global, or active during the whole interval
+            ovelap_part = []
+            for i in index.overlapping(start, end):
+                intr = index.intervals[i]
+                if params.DEBUG or params.VERBOSE == "VERBOSE":
+                    print("partial:",start,end,":",intr[0],intr[1])
+                ovelap_part.append( (max(start,intr[0]), min(end,intr[1])) )
+            return len(ovelap_part) > 0, merge_overlaps(ovelap_part)
+
         if self.timeseq == [[]]:
             return True, [] #global AOI
 
@@ -125,25 +161,225 @@ class AOI():
                         ovelap_part.append( (ovstart,ovend) )
                         is_active = True
 
-        # optimization of ovelap_part (no intervals intersecting each others)
-        ovelap_part_opt = []
-        for nseq in ovelap_part:
-            intersection = False
-            for oseq in ovelap_part_opt:
-                if (oseq[0] < nseq[1] and oseq[1] > nseq[0]) or (oseq[0] < nseq[1] and oseq[1] > nseq[0]): #intersection in the intervals: merging them
-                    intersection = True
-                    oseq[0] = min(oseq[0], nseq[0])
-                    oseq[1] = max(oseq[1], nseq[1])
-            if not intersection: #new interval
-                ovelap_part_opt.append([nseq[0],nseq[1]])
-        return is_active, ovelap_part_opt #partially or not active
+        return is_active, merge_overlaps(ovelap_part) #partially or not active
+
+
+def merge_overlaps(ovelap_part):
+    """Merges the overlapping parts of a time interval in which an AOI is active (see AOI.is_active_partition)
+
+    Each part is merged into all the merged parts it intersects, in the given order, or starts a new merged part.
+
+    Args:
+        ovelap_part: a list of (start, end) sub-intervals, in the order of the shapes and intervals of the AOI
+
+    Returns:
+        a list of [start, end] sub-intervals
+    """
+    ovelap_part_opt = []
+    for nseq in ovelap_part:
+        intersection = False
+        for oseq in ovelap_part_opt:
+            if (oseq[0] < nseq[1] and oseq[1] > nseq[0]) or (oseq[0] < nseq[1] and oseq[1] > nseq[0]): #intersection in the intervals: merging them
+                intersection = True
+                oseq[0] = min(oseq[0], nseq[0])
+                oseq[1] = max(oseq[1], nseq[1])
+        if not intersection: #new interval
+            ovelap_part_opt.append([nseq[0],nseq[1]])
+    return ovelap_part_opt
+
+
+class AOIClassifier(object):
+    """Labels gaze samples and "Fixation"s with the "AOI"s that contain them, in one batch
+
+    Instead of testing every point against the polygons of an AOI each time AOI features are
+    calculated, the points of a whole recording are classified once against all the "AOI"s (with
+    utils.points_inside_polygon). A point is inside the j-th AOI of the list if it is inside one of
+    its polyin polygons but outside the corresponding polyout polygon, as in _datapoint_inside_aoi.
+    Only the geometry is labelled: whether an AOI is active at the time of a point is still checked
+    by the callers.
+
+    The samples are labelled with an AOI-membership bitmask (bit j set if the sample is inside the
+    j-th AOI), stored in the SampleTable (aoi_mask attribute, along with the classifier in
+    aoi_classifier). The "Fixation"s are labelled with a membership table (one row per Fixation,
+    one column per AOI) kept by the classifier.
+
+    Attributes:
+        aois: the list of "AOI"s, in the order of their bits
+        dtype: the dtype of the sample masks: uint64, or object (Python integers) for more than 64 AOIs
+        fixation_table: a boolean array with the AOI membership of each labelled Fixation
+        fixation_rows: a dictionary with the row of each labelled Fixation in fixation_table
+    """
+
+    def __init__(self, aois):
+        """Inits AOIClassifier class
+
+        Args:
+            aois: a list of "AOI"s
+
+        Yields:
+            an AOIClassifier object
+        """
+        self.aois = list(aois)
+        self.bits = dict((aoi.aid, j) for j, aoi in enumerate(self.aois))
+        self.dtype = np.uint64 if len(self.aois) <= 64 else object
+        self.fixation_table = np.zeros((0, len(self.aois)), dtype=bool)
+        self.fixation_rows = {}
+
+    def get_bit(self, aoi):
+        """Returns the bit of an AOI in the masks, or None if the AOI was not classified by this classifier"""
+        j = self.bits.get(aoi.aid)
+        if j is None or self.aois[j] is not aoi:
+            return None
+        return j
+
+    def membership(self, x, y):
+        """Returns the AOI membership of a batch of points
+
+        Args:
+            x: a NumPy array with the x coordinates of the points
+            y: a NumPy array with the y coordinates of the points
+
+        Returns:
+            a boolean array with one row per point and one column per AOI
+        """
+        table = np.zeros((len(x), len(self.aois)), dtype=bool)
+        for j, aoi in enumerate(self.aois):
+            table[:, j] = _points_inside_aoi(x, y, aoi)
+        return table
+
+    def classify(self, x, y):
+        """Returns the AOI-membership bitmasks of a batch of points
+
+        Args:
+            x: a NumPy array with the x coordinates of the points
+            y: a NumPy array with the y coordinates of the points
+
+        Returns:
+            a NumPy array with the mask of each point
+        """
+        table = self.membership(x, y)
+        if self.dtype is object:
+            masks = np.zeros(len(x), dtype=object)
+            for j in range(len(self.aois)):
+                masks[table[:, j]] |= 1 << j
+            return masks
+        bits = np.uint64(1) << np.arange(len(self.aois), dtype=np.uint64)
+        return (table * bits).sum(axis=1, dtype=np.uint64)
+
+    @instrumentation.timed("aoi_labels")
+    def label(self, all_data, fixation_data):
+        """Classifies the samples and the "Fixation"s of a recording and stores their labels
+
+        Args:
+            all_data: a SampleTable (a list of "Datapoint"s is left unlabelled)
+            fixation_data: a list of "Fixation"s
+        """
+        if isinstance(all_data, SampleTable):
+            all_data.aoi_mask = self.classify(all_data.gazepointx, all_data.gazepointy)
+            all_data.aoi_classifier = self
+
+        self.fixation_table = np.zeros((len(fixation_data), len(self.aois)), dtype=bool)
+        self.fixation_rows = {}
+        # Points with integer and with float coordinates are classified separately, to keep
+        # the arithmetic of point_inside_polygon for each of them
+        groups = {}
+        for row, fix in enumerate(fixation_data):
+            self.fixation_rows[fix] = row
+            x, y = fix.mappedfixationpointx, fix.mappedfixationpointy
+            if x is not None and y is not None:
+                groups.setdefault(_is_integer(x) and _is_integer(y), []).append(row)
+        for integer, rows in groups.items():
+            dtype = np.int64 if integer else np.float64
+            x = np.array([fixation_data[row].mappedfixationpointx for row in rows], dtype=dtype)
+            y = np.array([fixation_data[row].mappedfixationpointy for row in rows], dtype=dtype)
+            self.fixation_table[rows] = self.membership(x, y)
+
+    def samples_inside(self, masks, aoi):
+        """Returns a boolean array, True for the masks that include a given AOI
+
+        Args:
+            masks: an array of masks returned by classify
+            aoi: an AOI of this classifier
+        """
+        j = self.get_bit(aoi)
+        if self.dtype is object:
+            return np.array([(mask >> j) & 1 == 1 for mask in masks], dtype=bool)
+        return (masks & (np.uint64(1) << np.uint64(j))) != 0
+
+    def fixation_membership(self, fixation_data, aois):
+        """Returns the membership of a sequence of labelled "Fixation"s in a list of "AOI"s
+
+        Args:
+            fixation_data: a list of "Fixation"s labelled by this classifier
+            aois: a list of "AOI"s of this classifier
+
+        Returns:
+            a FixationMembership, or None if some of the "Fixation"s or "AOI"s were not labelled
+        """
+        columns = [self.get_bit(aoi) for aoi in aois]
+        rows = [self.fixation_rows.get(fix) for fix in fixation_data]
+        if None in columns or None in rows:
+            return None
+        table = self.fixation_table[np.array(rows, dtype=np.intp)][:, np.array(columns, dtype=np.intp)]
+        return FixationMembership(table, aois)
+
+
+class FixationMembership(object):
+    """The AOI membership of a sequence of "Fixation"s (e.g. the "Fixation"s of a Segment)
+
+    Attributes:
+        table: a boolean array with one row per Fixation and one column per AOI
+        aois: the list of "AOI"s of the columns
+    """
+
+    def __init__(self, table, aois):
+        """Inits FixationMembership class
+
+        Args:
+            table: a boolean array with one row per Fixation and one column per AOI
+            aois: the list of "AOI"s of the columns
+
+        Yields:
+            a FixationMembership object
+        """
+        self.table = table
+        self.aois = aois
+        self._transitions = None
+
+    def __len__(self):
+        return len(self.table)
+
+    def take(self, rows):
+        """Returns the FixationMembership of the "Fixation"s at the given rows, in order"""
+        return FixationMembership(self.table[rows], self.aois)
+
+    def get_column(self, aoi):
+        """Returns the column of an AOI in the table, or None if the AOI is not one of the columns"""
+        for j, column_aoi in enumerate(self.aois):
+            if column_aoi is aoi:
+                return j
+        return None
+
+    def get_transitions(self):
+        """Returns the matrix of transitions between "AOI"s
+
+        Returns:
+            an integer array where the value at [i, j] is the number of "Fixation"s inside the i-th
+            AOI that follow a Fixation inside the j-th AOI
+        """
+        if self._transitions is None:
+            table = self.table.astype(np.int64)
+            self._transitions = np.dot(table[1:].T, table[:-1])
+        return self._transitions
 
 
 class AOI_Stat():
     """Methods of AOI_Stat calculate and store all features related to the given AOI object
     """
 
-    def __init__(self,aoi, seg_all_data, seg_fixation_data, starttime, endtime, sum_discarded, active_aois, seg_event_data=None, rest_pupil_size = 0, export_pupilinfo = False):
+    @instrumentation.timed("aoi_stats")
+    def __init__(self,aoi, seg_all_data, seg_fixation_data, starttime, endtime, sum_discarded, active_aois, seg_event_data=None, rest_pupil_size = 0, export_pupilinfo = False, fixation_membership = None,
+                 feature_selection = None):
         """Inits AOI_Stat class
 
         Args:
@@ -153,6 +389,9 @@ class AOI_Stat():
             starttime:
             endtime:
             active_aois:list of the AOI objects that will be used for calculating the transitions between this AOI and other AOIs
+            fixation_membership: if not None, the FixationMembership of seg_fixation_data (see AOIClassifier)
+            feature_selection: if not None, a FeatureSelection: the pupil, distance, event and transition features
+                are only computed if it needs them, and keep their default values otherwise
 
         Yields:
             an AOI_Stat object
@@ -222,7 +461,12 @@ class AOI_Stat():
 
         if not(self.isActive):
             return
-        all_data = []
+        # the AOIClassifier that labelled the samples of this segment, if any
+        classifier = getattr(seg_all_data, 'aoi_classifier', None)
+        if classifier is not None and classifier.get_bit(self.aoi) is None:
+            classifier = None
+        sample_ranges = []
+        fixation_rows = []
         fixation_data = []
         event_data = []
 
@@ -232,9 +476,10 @@ class AOI_Stat():
             for intr in partition:
                 if starttime <= intr[1] and endtime >= intr[0]:
                     _,st,en = get_chunk(seg_all_data, 0, intr[0], intr[1])
-                    all_data += seg_all_data[st:en]
+                    sample_ranges.append((st, en))
                     _,st,en = get_chunk(seg_fixation_data, 0, intr[0],intr[1])
                     fixation_data += seg_fixation_data[st:en]
+                    fixation_rows += range(st, en)
                     if seg_event_data != None:
                         _,st,en = get_chunk(seg_event_data, 0, intr[0],intr[1])
                         event_data += seg_event_data[st:en]
@@ -242,48 +487,106 @@ class AOI_Stat():
                 print("len(seg_all_data)",seg_all_data)
                 print("len(seg_fixation_data)",seg_fixation_data)
                 print("len(fixation_data)",fixation_data)
+            if fixation_membership is not None:
+                fixation_membership = fixation_membership.take(np.array(fixation_rows, dtype=np.intp))
         else:  #global AOI (always active)
-            all_data = seg_all_data
+            sample_ranges = None
             fixation_data = seg_fixation_data
             if seg_event_data != None:
                 event_data = seg_event_data
 
-        ## Remove datapoints with invalid gaze coordinates
-        datapoints = filter(lambda datapoint: datapoint.gazepointx != -1 and datapoint.gazepointy != -1, all_data)
-        # Only keep samples inside AOI
-        datapoints = filter(lambda datapoint: _datapoint_inside_aoi(datapoint, self.aoi.polyin, self.aoi.polyout), datapoints)
+        if isinstance(seg_all_data, SampleTable):
+            datapoints = self.select_datapoints(seg_all_data, sample_ranges, classifier)
+        else:
+            if sample_ranges is None:
+                all_data = seg_all_data
+            else:
+                all_data = []
+                for st, en in sample_ranges:
+                    all_data += seg_all_data[st:en]
+            ## Remove datapoints with invalid gaze coordinates
+            datapoints = list(filter(lambda datapoint: datapoint.gazepointx != -1 and datapoint.gazepointy != -1, all_data))
+            # Only keep samples inside AOI
+            datapoints = list(filter(lambda datapoint: _datapoint_inside_aoi(datapoint, self.aoi.polyin, self.aoi.polyout), datapoints))
+
+        if feature_selection is None:
+            feature_selection = ALL_FEATURES
+
+        if feature_selection.needs_aoi('pupil'):
+            self.generate_pupil_features(datapoints, rest_pupil_size, export_pupilinfo)
 
-        self.generate_pupil_features(datapoints, rest_pupil_size, export_pupilinfo)
+        if feature_selection.needs_aoi('distance'):
+            self.generate_distance_features(datapoints)
 
-        self.generate_distance_features(datapoints)
+        if fixation_membership is not None and fixation_membership.get_column(self.aoi) is None:
+            fixation_membership = None
+        fixation_indices = self.generate_fixation_features(datapoints, fixation_data, sum_discarded, fixation_membership)
 
-        fixation_indices = self.generate_fixation_features(datapoints, fixation_data, sum_discarded)
+        if feature_selection.needs_aoi('event'):
+            self.generate_event_features(seg_event_data, event_data, sum_discarded)
 
-        self.generate_event_features(seg_event_data, event_data, sum_discarded)
+        if feature_selection.needs_aoi('transition'):
+            self.generate_transition_features(active_aois, fixation_data, fixation_indices, fixation_membership)
 
-        self.generate_transition_features(active_aois, fixation_data, fixation_indices)
 
+    def select_datapoints(self, seg_all_data, sample_ranges, classifier=None):
+        """Returns the samples of a SampleTable with valid gaze coordinates inside the AOI
+
+        The AOI-membership masks of the samples are used if they have been labelled by an
+        AOIClassifier, otherwise the samples are classified here.
+
+        Args:
+            seg_all_data: the SampleTable of the segment
+            sample_ranges: a list of (start, end) index ranges of the samples to consider, or None for all samples
+            classifier: the AOIClassifier that labelled seg_all_data, or None
+
+        Returns:
+            a SampleTable with the selected samples, in order
+        """
+        if classifier is not None:
+            inside = classifier.samples_inside(seg_all_data.aoi_mask, self.aoi)
+        else:
+            inside = _points_inside_aoi(seg_all_data.gazepointx, seg_all_data.gazepointy, self.aoi)
+        ## Remove datapoints with invalid gaze coordinates
+        inside &= (seg_all_data.gazepointx != -1) & (seg_all_data.gazepointy != -1)
+
+        if sample_ranges is None:
+            indices = np.flatnonzero(inside)
+        else:
+            indices = np.concatenate([np.arange(st, en) for st, en in sample_ranges] + [np.arange(0)])
+            indices = indices[inside[indices]]
+        return seg_all_data.take(indices)
 
     def generate_pupil_features(self, datapoints, rest_pupil_size, export_pupilinfo):
+        if isinstance(datapoints, SampleTable):
+            features, adjvalidpupilsizes, valid_pupil_velocity, pupilinfo = vectorized.pupil_features(
+                datapoints, rest_pupil_size, params.PUPIL_ADJUSTMENT, export_pupilinfo)
+            self.numpupilsizes = len(adjvalidpupilsizes)
+            self.numpupilvelocity = len(valid_pupil_velocity)
+            self.features.update(features)
+            if pupilinfo is not None:
+                self.pupilinfo_for_export = pupilinfo
+            return
+
         #get all datapoints where pupil size is available
-        valid_pupil_data = filter(lambda x: x.pupilsize > 0, datapoints)
-        valid_pupil_velocity = filter(lambda x: x.pupilvelocity != -1, datapoints)
+        valid_pupil_data = list(filter(lambda x: x.pupilsize > 0, datapoints))
+        valid_pupil_velocity = list(filter(lambda x: x.pupilvelocity != -1, datapoints))
         #number of valid pupil sizes
         self.numpupilsizes = len(valid_pupil_data)
         self.numpupilvelocity = len(valid_pupil_velocity)
 
         if self.numpupilsizes > 0: #check if the current segment has pupil data available
             if params.PUPIL_ADJUSTMENT == "rpscenter":
-                adjvalidpupilsizes = map(lambda x: x.pupilsize - rest_pupil_size, valid_pupil_data)
+                adjvalidpupilsizes = list(map(lambda x: x.pupilsize - rest_pupil_size, valid_pupil_data))
             elif params.PUPIL_ADJUSTMENT == "PCPS":
-                adjvalidpupilsizes = map(lambda x: (x.pupilsize - rest_pupil_size) / (1.0 * rest_pupil_size), valid_pupil_data)
+                adjvalidpupilsizes = list(map(lambda x: (x.pupilsize - rest_pupil_size) / (1.0 * rest_pupil_size), valid_pupil_data))
             else:
-                adjvalidpupilsizes = map(lambda x: x.pupilsize, valid_pupil_data)#valid_pupil_data
+                adjvalidpupilsizes = list(map(lambda x: x.pupilsize, valid_pupil_data))#valid_pupil_data
 
-            valid_pupil_velocity = map(lambda x: x.pupilvelocity, valid_pupil_velocity)#valid_pupil_data
+            valid_pupil_velocity = list(map(lambda x: x.pupilvelocity, valid_pupil_velocity))#valid_pupil_data
 
             if export_pupilinfo:
-                self.pupilinfo_for_export = map(lambda x: [x.timestamp, x.pupilsize, rest_pupil_size], valid_pupil_data)
+                self.pupilinfo_for_export = list(map(lambda x: [x.timestamp, x.pupilsize, rest_pupil_size], valid_pupil_data))
 
             self.features['meanpupilsize'] = mean(adjvalidpupilsizes)
             self.features['stddevpupilsize'] = stddev(adjvalidpupilsizes)
@@ -300,17 +603,23 @@ class AOI_Stat():
 
 
     def generate_distance_features(self, datapoints):
+        if isinstance(datapoints, SampleTable):
+            features, distances_from_screen = vectorized.distance_features(datapoints)
+            self.numdistancedata = len(distances_from_screen)
+            self.features.update(features)
+            return
+
         # check if pupil sizes are available for all missing points
         invalid_distance_data = filter(lambda x: x.distance <= 0 and x.gazepointx >= 0, datapoints)
 #        if len(invalid_distance_data) > 0:
 #            warn("Distance from screen is unavailable for a valid data sample. Number of missing points: " + str(len(invalid_distance_data)))
 
         #get all datapoints where distance is available
-        valid_distance_data = filter(lambda x: x.distance > 0, datapoints)
+        valid_distance_data = list(filter(lambda x: x.distance > 0, datapoints))
         #number of valid pupil sizes
         self.numdistancedata = len(valid_distance_data)
         if self.numdistancedata > 0: #check if the current segment has pupil data available
-            distances_from_screen = map(lambda x: x.distance, valid_distance_data)
+            distances_from_screen = list(map(lambda x: x.distance, valid_distance_data))
             self.features['meandistance'] = mean(distances_from_screen)
             self.features['stddevdistance'] = stddev(distances_from_screen)
             self.features['maxdistance'] = max(distances_from_screen)
@@ -319,11 +628,14 @@ class AOI_Stat():
             self.features['enddistance'] = distances_from_screen[-1]
 
 
-    def generate_fixation_features(self, datapoints, fixation_data, sum_discarded):
+    def generate_fixation_features(self, datapoints, fixation_data, sum_discarded, fixation_membership=None):
 
         fixation_indices = []
-        fixation_indices = filter(lambda i: _fixation_inside_aoi(fixation_data[i], self.aoi.polyin, self.aoi.polyout), range(len(fixation_data)))
-        fixations = map(lambda i: fixation_data[i], fixation_indices)
+        if fixation_membership is not None:
+            fixation_indices = np.flatnonzero(fixation_membership.table[:, fixation_membership.get_column(self.aoi)]).tolist()
+        else:
+            fixation_indices = list(filter(lambda i: _fixation_inside_aoi(fixation_data[i], self.aoi.polyin, self.aoi.polyout), range(len(fixation_data))))
+        fixations = list(map(lambda i: fixation_data[i], fixation_indices))
         numfixations = len(fixations)
         self.features['numfixations'] = numfixations
         self.features['longestfixation'] = -1
@@ -336,8 +648,8 @@ class AOI_Stat():
         self.features['proportiontime'] = float(totaltimespent)/(self.length - sum_discarded)
         if numfixations > 0:
             self.features['longestfixation'] = max(map(lambda x: x.fixationduration, fixations))
-            self.features['meanfixationduration'] = mean(map(lambda x: float(x.fixationduration), fixations))
-            self.features['stddevfixationduration'] = stddev(map(lambda x: float(x.fixationduration), fixations))
+            self.features['meanfixationduration'] = mean(list(map(lambda x: float(x.fixationduration), fixations)))
+            self.features['stddevfixationduration'] = stddev(list(map(lambda x: float(x.fixationduration), fixations)))
             self.features['timetofirstfixation'] = fixations[0].timestamp - self.starttime
             self.features['timetolastfixation'] = fixations[-1].timestamp - self.starttime
             self.features['proportionnum'] = float(numfixations)/len(fixation_data)
@@ -348,7 +660,7 @@ class AOI_Stat():
     def generate_event_features(self, seg_event_data, event_data, sum_discarded):
 
         if seg_event_data != None:
-            events = filter(lambda event: _event_inside_aoi(event,self.aoi.polyin, self.aoi.polyout), event_data)
+            events = list(filter(lambda event: _event_inside_aoi(event,self.aoi.polyin, self.aoi.polyout), event_data))
             leftc, rightc, doublec, _ = generate_event_lists(events)
         if seg_event_data != None:
             self.features['numevents'] = len(events)
@@ -366,24 +678,35 @@ class AOI_Stat():
             self.features['timetolastdoubleclic'] = doublec[-1].timestamp - self.starttime if len(doublec) > 0 else -1
 
 
-    def generate_transition_features(self, active_aois, fixation_data, fixation_indices):
+    def generate_transition_features(self, active_aois, fixation_data, fixation_indices, fixation_membership=None):
         #calculating the transitions to and from this AOI and other active AOIs at the moment
         for aoi in active_aois:
             aid = aoi.aid
             self.features['numtransfrom_%s'%(aid)] = 0
 
         sumtransfrom = 0
-        for i in fixation_indices:
-            if i > 0:
-                for aoi in active_aois:
-                    aid = aoi.aid
-                    polyin = aoi.polyin
-                    polyout = aoi.polyout
-                    key = 'numtransfrom_%s'%(aid)
-
-                    if _fixation_inside_aoi(fixation_data[i-1], polyin, polyout):
-                        self.features[key] += 1
-                        sumtransfrom += 1
+        columns = None
+        if fixation_membership is not None:
+            columns = [fixation_membership.get_column(aoi) for aoi in active_aois]
+        if columns is not None and None not in columns:
+            #row of the transition matrix for the fixations inside this AOI
+            transitions = fixation_membership.get_transitions()[fixation_membership.get_column(self.aoi)]
+            for aoi, j in zip(active_aois, columns):
+                key = 'numtransfrom_%s'%(aoi.aid)
+                self.features[key] += int(transitions[j])
+                sumtransfrom += int(transitions[j])
+        else:
+            for i in fixation_indices:
+                if i > 0:
+                    for aoi in active_aois:
+                        aid = aoi.aid
+                        polyin = aoi.polyin
+                        polyout = aoi.polyout
+                        key = 'numtransfrom_%s'%(aid)
+
+                        if _fixation_inside_aoi(fixation_data[i-1], polyin, polyout):
+                            self.features[key] += 1
+                            sumtransfrom += 1
         for aoi in active_aois:
             aid = aoi.aid
 
@@ -412,7 +735,7 @@ class AOI_Stat():
         if featurelist == []:
             return [], []
         elif not featurelist:   #all features
-            featnames = self.features.keys()
+            featnames = list(self.features.keys())
         else:                   #a list was given
             featnames = []
             for name in featurelist:
@@ -427,7 +750,7 @@ class AOI_Stat():
 
         featnames.sort()
 
-        featvals = map(lambda x: self.features[x], featnames)
+        featvals = list(map(lambda x: self.features[x], featnames))
 #        print featnames
 
         return featnames, featvals
@@ -438,7 +761,7 @@ class AOI_Stat():
 
         print("AOI ID:",self.aoi.aid)
         fn,fv = self.get_features()
-        for i in xrange(len(fn)):
+        for i in range(len(fn)):
             print(fn[i],':',fv[i])
         print
 
@@ -514,3 +837,27 @@ def _event_inside_aoi(event, polyin, polyout):
                 break
             i += 1
     return inside
+
+
+def _points_inside_aoi(x, y, aoi):
+    """Vectorized version of _datapoint_inside_aoi: returns a boolean array, True for the points
+    inside one of the polyin polygons of the AOI but outside the corresponding polyout polygon
+
+    Args:
+        x: a NumPy array with the x coordinates of the points
+        y: a NumPy array with the y coordinates of the points
+        aoi: an AOI object
+    """
+    inside = np.zeros(len(x), dtype=bool)
+    i = 0
+    for polyin_i in aoi.polyin:
+        inside_in = points_inside_polygon(x, y, polyin_i)
+        if inside_in.any():
+            inside |= inside_in & ~points_inside_polygon(x, y, aoi.polyout[i])
+        i += 1
+    return inside
+
+
+def _is_integer(value):
+    """Returns True if a coordinate is an integer (int or long)"""
+    return isinstance(value, numbers.Integral)
@@ -0,0 +1,483 @@
+"""
+UBC Eye Movement Data Analysis Toolkit (EMDAT), Version 3
+
+OnlineSegment class: computes the general features of a Segment (validity, blinks, pupil, distance
+from the screen, fixations and path, saccades and events) from live gaze streams.
+
+Samples, fixations, saccades and events are given one at a time or in small batches as they are
+produced by the eye tracker. Each one updates running accumulators in constant time, and the
+features of the current interval (the data received since the last call to get_features) and of
+the whole session so far can be read at any time, also in constant time: the cost of a feature
+update does not grow with the length of the session.
+
+Institution: The University of British Columbia.
+"""
+
+import math
+import params
+from EMDAT_core import geometry
+from EMDAT_core.accumulators import StatAccumulator
+
+
+class OnlineSegment(object):
+    """
+    An incremental version of the general features of Segment for live gaze data.
+
+    The cumulative features are computed as Segment computes them over all the data received so far.
+    Interval features are computed over the data received since the last call to get_features, with
+    the following conventions for the values that involve consecutive records: a path distance or
+    angle, a blink or the time between two blinks belongs to the interval in which its last record
+    (fixation or sample) is received. Invalid gaps are split between the intervals they overlap.
+
+    Attributes:
+        segid: a string containing the id of the OnlineSegment
+        rest_pupil_size: rest pupil size used to adjust pupil size (see params.PUPIL_ADJUSTMENT)
+        start: the timestamp of the first sample (None before the first sample)
+        last_timestamp: the timestamp of the last sample (None before the first sample)
+    """
+
+    def __init__(self, segid, rest_pupil_size=0):
+        """Inits an empty OnlineSegment
+
+        Args:
+            segid: a string containing the id of the OnlineSegment
+
+            rest_pupil_size: rest pupil size for this segment, used to adjust pupil size.
+
+        Yields:
+            an OnlineSegment object
+        """
+        self.segid = segid
+        self.rest_pupil_size = rest_pupil_size
+        self.start = None
+        self.last_timestamp = None
+        self.cumulative = _OnlineState(None)
+        self.interval = _OnlineState(None)
+
+        self.invalid_gap_start = None   # start of the current group of invalid samples, if any
+        self.blink_gap_start = None     # start of the current group of invalid (for blinks) samples, if any
+        self.last_blink_end = None      # end of the last blink
+        self.fixation_points = []       # the coordinates of the last two "Fixation"s
+        self.pending_left_click = None  # the last left click, if it can still be the first click of a double click
+
+    def add_sample(self, datapoint):
+        """Adds a gaze sample
+
+        Args:
+            datapoint: a Datapoint, more recent than all the samples added so far
+        """
+        timestamp = datapoint.timestamp
+        if self.start is None:
+            self.start = timestamp
+            self.cumulative.start_time = timestamp
+            self.interval.start_time = timestamp
+        self.last_timestamp = timestamp
+        states = (self.cumulative, self.interval)
+
+        if datapoint.stimuliname != '':
+            for state in states:
+                state.numsamples += 1
+
+        # groups of invalid samples (see Segment.calc_largest_validity_gap)
+        if not datapoint.is_valid:
+            if self.invalid_gap_start is None:
+                self.invalid_gap_start = timestamp
+        elif self.invalid_gap_start is not None:
+            self._close_invalid_gap(timestamp)
+
+        # blinks (see Segment.calc_blink_features)
+        if not datapoint.is_valid_blink:
+            if self.blink_gap_start is None:
+                self.blink_gap_start = timestamp
+        elif self.blink_gap_start is not None:
+            blink = self._blink(self.blink_gap_start, timestamp)
+            if blink is not None:
+                for state in states:
+                    state.add_blink(*blink)
+                self.last_blink_end = timestamp
+            self.blink_gap_start = None
+
+        # pupil and distance from the screen (see Segment.calc_pupil_features and Segment.calc_distance_features)
+        pupilsize = datapoint.pupilsize
+        if pupilsize is not None and pupilsize > 0:
+            adjusted = self.adjust_pupil_size(pupilsize)
+            for state in states:
+                state.accumulators['pupilsize'].add(adjusted)
+        pupilvelocity = datapoint.pupilvelocity
+        if pupilvelocity is not None and pupilvelocity != -1:
+            for state in states:
+                state.accumulators['pupilvelocity'].add(pupilvelocity)
+        distance = datapoint.distance
+        if distance is not None and distance > 0:
+            for state in states:
+                state.accumulators['distance'].add(distance)
+
+    def add_samples(self, datapoints):
+        """Adds a batch of gaze samples (a list of "Datapoint"s or a SampleTable), in chronological order"""
+        for datapoint in datapoints:
+            self.add_sample(datapoint)
+
+    def add_fixation(self, fixation):
+        """Adds a Fixation, once it has ended
+
+        Args:
+            fixation: a Fixation, more recent than all the "Fixation"s added so far
+        """
+        states = (self.cumulative, self.interval)
+        for state in states:
+            state.accumulators['fixationduration'].add(fixation.fixationduration)
+
+        # path distances and angles (see Segment.calc_distances, calc_abs_angles and calc_rel_angles)
+        point = (fixation.mappedfixationpointx, fixation.mappedfixationpointy)
+        if self.fixation_points:
+            last = self.fixation_points[-1]
+            distance = math.sqrt((point[0] - last[0])**2 + (point[1] - last[1])**2)
+            (_, theta) = geometry.vector_difference(last, point)
+            for state in states:
+                state.accumulators['pathdistance'].add(distance)
+                state.accumulators['abspathangles'].add(abs(theta))
+            if len(self.fixation_points) == 2:
+                rel_angle = relative_angle(self.fixation_points[0], last, point)
+                for state in states:
+                    state.accumulators['relpathangles'].add(rel_angle)
+        self.fixation_points = self.fixation_points[-1:] + [point]
+
+    def add_fixations(self, fixations):
+        """Adds a batch of "Fixation"s, in chronological order"""
+        for fixation in fixations:
+            self.add_fixation(fixation)
+
+    def add_saccade(self, saccade):
+        """Adds a Saccade
+
+        Args:
+            saccade: a Saccade
+        """
+        for state in (self.cumulative, self.interval):
+            state.accumulators['saccadedistance'].add(float(saccade.saccadedistance))
+            state.accumulators['saccadeduration'].add(float(saccade.saccadeduration))
+            state.accumulators['saccadespeed'].add(float(saccade.saccadespeed))
+
+    def add_saccades(self, saccades):
+        """Adds a batch of "Saccade"s, in chronological order"""
+        for saccade in saccades:
+            self.add_saccade(saccade)
+
+    def add_event(self, event):
+        """Adds an Event (see utils.generate_event_lists for the detection of double clicks)
+
+        Args:
+            event: an Event, more recent than all the "Event"s added so far
+        """
+        states = (self.cumulative, self.interval)
+        if event.event == "KeyPress":
+            for state in states:
+                state.add_event('keyp', event.timestamp)
+        elif event.event == "LeftMouseClick":
+            previous = self.pending_left_click
+            if previous is not None and (event.timestamp - previous.timestamp) <= 700 and \
+                    (event.data1 - previous.data1) <= 10 and (event.data2 - previous.data2) <= 10:
+                # the previous left click was the first click of this double click
+                for state in states:
+                    state.remove_last_left_click(previous.timestamp)
+                    state.add_event('doublec', event.timestamp)
+                self.pending_left_click = None
+            else:
+                for state in states:
+                    state.add_event('leftc', event.timestamp)
+                self.pending_left_click = event
+        elif event.event == "RightMouseClick":
+            for state in states:
+                state.add_event('rightc', event.timestamp)
+
+    def add_events(self, events):
+        """Adds a batch of "Event"s, in chronological order"""
+        for event in events:
+            self.add_event(event)
+
+    def adjust_pupil_size(self, pupilsize):
+        """Returns a pupil size adjusted with the rest pupil size of this segment (see params.PUPIL_ADJUSTMENT)"""
+        return adjust_pupil_size(pupilsize, self.rest_pupil_size)
+
+    def get_features(self, new_interval=True):
+        """Returns the features of the current interval and the cumulative features
+
+        Args:
+            new_interval: if True, a new interval is started after this call
+
+        Returns:
+            two dictionaries (feature name: value): the features of the data received since the
+            previous interval was started, and the features of all the data received so far
+        """
+        interval = self._features(self.interval)
+        cumulative = self._features(self.cumulative)
+        if new_interval:
+            self.interval = _OnlineState(self.last_timestamp)
+        return interval, cumulative
+
+    def _close_invalid_gap(self, end):
+        """Adds the current group of invalid samples, which ends at the given timestamp"""
+        if end - self.invalid_gap_start > params.MAX_SEG_TIMEGAP:
+            for state in (self.cumulative, self.interval):
+                state.length_invalid += end - max(self.invalid_gap_start, state.start_time)
+        self.invalid_gap_start = None
+
+    def _blink(self, start, end):
+        """Returns the (duration, time since the previous blink) of an invalid group of samples, or
+        None if it is not a blink. The time since the previous blink is None for the first blink."""
+        duration = end - start
+        if params.EYETRACKERTYPE != "SMI":
+            lower_bound, upper_bound = params.blink_threshold
+            if duration > upper_bound or duration < lower_bound:
+                return None
+        interval = start - self.last_blink_end if self.last_blink_end is not None else None
+        return duration, interval
+
+    def _features(self, state):
+        """Returns the features of an _OnlineState, including the groups of invalid samples that are still open"""
+        if self.last_timestamp is None or state.start_time is None:
+            length = 0
+        else:
+            length = self.last_timestamp - state.start_time
+        numfixations = state.accumulators['fixationduration'].count
+
+        # groups of invalid samples still open end at the last sample, as in Segment
+        length_invalid = state.length_invalid
+        if self.invalid_gap_start is not None and self.last_timestamp - self.invalid_gap_start > params.MAX_SEG_TIMEGAP:
+            length_invalid += self.last_timestamp - max(self.invalid_gap_start, state.start_time)
+        if numfixations == 0:
+            length_invalid = 0  # see Segment.calc_largest_validity_gap
+        blinkduration = state.accumulators['blinkduration']
+        blinktimedistance = state.accumulators['blinktimedistance']
+        if self.blink_gap_start is not None:
+            blink = self._blink(self.blink_gap_start, self.last_timestamp)
+            if blink is not None:
+                blinkduration = StatAccumulator.combine([blinkduration, _single(blink[0])])
+                if blink[1] is not None:
+                    blinktimedistance = StatAccumulator.combine([blinktimedistance, _single(blink[1])])
+
+        accumulators = dict(state.accumulators)
+        accumulators['blinkduration'] = blinkduration
+        accumulators['blinktimedistance'] = blinktimedistance
+        return general_features(length, length_invalid, state.numsamples, accumulators,
+                                state.event_counts, state.first_events)
+
+
+class _OnlineState(object):
+    """The running statistics of an OnlineSegment over a span of time (an interval or the whole session)
+
+    Attributes:
+        start_time: the timestamp at which the span starts (None before the first sample)
+        numsamples: the number of samples with a stimuli name
+        length_invalid: the time (in ms) covered by the closed groups of invalid samples longer than params.MAX_SEG_TIMEGAP
+        accumulators: a dictionary with a StatAccumulator per signal, as in Segment
+        event_counts: the number of events of each kind ('leftc', 'rightc', 'doublec' and 'keyp')
+        first_events: the timestamp of the first event of each kind (None if there is none)
+    """
+
+    SIGNALS = ('blinkduration', 'blinktimedistance', 'pupilsize', 'pupilvelocity', 'distance', 'fixationduration',
+               'pathdistance', 'abspathangles', 'relpathangles', 'saccadedistance', 'saccadeduration', 'saccadespeed')
+
+    def __init__(self, start_time):
+        self.start_time = start_time
+        self.numsamples = 0
+        self.length_invalid = 0
+        self.accumulators = dict((signal, StatAccumulator()) for signal in self.SIGNALS)
+        self.event_counts = {'leftc': 0, 'rightc': 0, 'doublec': 0, 'keyp': 0}
+        self.first_events = {'leftc': None, 'rightc': None, 'doublec': None, 'keyp': None}
+
+    def add_blink(self, duration, interval):
+        """Adds a blink and the time since the previous blink (None for the first blink)"""
+        self.accumulators['blinkduration'].add(duration)
+        if interval is not None:
+            self.accumulators['blinktimedistance'].add(interval)
+
+    def add_event(self, kind, timestamp):
+        """Adds an event of the given kind"""
+        self.event_counts[kind] += 1
+        if self.first_events[kind] is None:
+            self.first_events[kind] = timestamp
+
+    def remove_last_left_click(self, timestamp):
+        """Removes the last left click (at the given timestamp), which turned out to start a double click.
+        Nothing is done if this click was received before the start of this span."""
+        if (self.start_time is not None and timestamp < self.start_time) or self.event_counts['leftc'] == 0:
+            return
+        self.event_counts['leftc'] -= 1
+        if self.event_counts['leftc'] == 0:
+            self.first_events['leftc'] = None
+
+
+def adjust_pupil_size(pupilsize, rest_pupil_size):
+    """Returns a pupil size adjusted with a rest pupil size as in Segment.calc_pupil_features (see params.PUPIL_ADJUSTMENT)"""
+    if params.PUPIL_ADJUSTMENT == "rpscenter":
+        return pupilsize - rest_pupil_size
+    elif params.PUPIL_ADJUSTMENT == "PCPS":
+        return (pupilsize - rest_pupil_size) / (1.0 * rest_pupil_size)
+    return pupilsize
+
+
+def general_features(length, length_invalid, numsamples, accumulators, event_counts, first_events):
+    """Returns the general features of a Segment (see OnlineSegment) from the statistics of its data
+
+    Args:
+        length: the time (in ms) between the first and the last sample
+        length_invalid: the time (in ms) covered by the groups of invalid samples longer than params.MAX_SEG_TIMEGAP
+        numsamples: the number of samples with a stimuli name
+        accumulators: a dictionary with a StatAccumulator per signal (see _OnlineState.SIGNALS)
+        event_counts: the number of events of each kind ('leftc', 'rightc', 'doublec' and 'keyp')
+        first_events: the timestamp of the first event of each kind (None if there is none)
+
+    Returns:
+        a dictionary (feature name: value)
+    """
+    features = {}
+    numfixations = accumulators['fixationduration'].count
+    blinkduration = accumulators['blinkduration']
+    blinktimedistance = accumulators['blinktimedistance']
+    valid_length = length - length_invalid
+    def rate(value):
+        return float(value) / valid_length if valid_length > 0 else -1
+
+    features['completion_time'] = length
+    features['length'] = length
+    features['length_invalid'] = length_invalid
+    features['numsamples'] = numsamples
+    features['numfixations'] = numfixations
+
+    features['blinknum'] = blinkduration.count
+    features['blinkdurationtotal'] = blinkduration.sum if blinkduration.count > 0 else 0
+    features['blinkdurationmean'] = _mean(blinkduration) if blinkduration.count > 0 else 0
+    features['blinkdurationstd'] = blinkduration.stddev() if blinkduration.count > 0 else 0
+    features['blinkdurationmin'] = _value_or(blinkduration.min, -1)
+    features['blinkdurationmax'] = _value_or(blinkduration.max, -1)
+    features['blinkrate'] = rate(blinkduration.count) if blinkduration.count > 0 else -1
+    features['blinktimedistancemean'] = _mean(blinktimedistance) if blinktimedistance.count > 0 else -1
+    features['blinktimedistancestd'] = blinktimedistance.stddev() if blinktimedistance.count > 0 else -1
+    features['blinktimedistancemin'] = _value_or(blinktimedistance.min, -1)
+    features['blinktimedistancemax'] = _value_or(blinktimedistance.max, -1)
+
+    _add_stats(features, accumulators['pupilsize'],
+               ('meanpupilsize', 'stddevpupilsize', 'maxpupilsize', 'minpupilsize', 'startpupilsize', 'endpupilsize'))
+    if accumulators['pupilsize'].count > 0:
+        _add_stats(features, accumulators['pupilvelocity'],
+                   ('meanpupilvelocity', 'stddevpupilvelocity', 'maxpupilvelocity', 'minpupilvelocity'))
+    else:
+        _add_stats(features, StatAccumulator(),
+                   ('meanpupilvelocity', 'stddevpupilvelocity', 'maxpupilvelocity', 'minpupilvelocity'))
+    _add_stats(features, accumulators['distance'],
+               ('meandistance', 'stddevdistance', 'maxdistance', 'mindistance', 'startdistance', 'enddistance'))
+
+    fixationduration = accumulators['fixationduration']
+    if numfixations > 0:
+        features['meanfixationduration'] = _mean(fixationduration)
+        features['stddevfixationduration'] = fixationduration.stddev()
+        features['sumfixationduration'] = fixationduration.sum
+        features['fixationrate'] = rate(numfixations)
+    else:
+        features['meanfixationduration'] = -1
+        features['stddevfixationduration'] = -1
+        features['sumfixationduration'] = -1
+        features['fixationrate'] = -1
+    pathdistance = accumulators['pathdistance']
+    abspathangles = accumulators['abspathangles']
+    relpathangles = accumulators['relpathangles']
+    if pathdistance.count > 0:
+        features['meanpathdistance'] = _mean(pathdistance)
+        features['sumpathdistance'] = pathdistance.sum
+        features['stddevpathdistance'] = pathdistance.stddev()
+        features['eyemovementvelocity'] = rate(pathdistance.sum)
+        features['sumabspathangles'] = abspathangles.sum
+        features['abspathanglesrate'] = rate(abspathangles.sum)
+        features['meanabspathangles'] = _mean(abspathangles)
+        features['stddevabspathangles'] = abspathangles.stddev()
+        features['sumrelpathangles'] = relpathangles.sum
+        features['relpathanglesrate'] = rate(relpathangles.sum)
+        features['meanrelpathangles'] = _mean(relpathangles)
+        features['stddevrelpathangles'] = relpathangles.stddev()
+    else:
+        for name in ('meanpathdistance', 'sumpathdistance', 'stddevpathdistance', 'eyemovementvelocity',
+                     'sumabspathangles', 'abspathanglesrate', 'meanabspathangles', 'stddevabspathangles',
+                     'sumrelpathangles', 'relpathanglesrate', 'meanrelpathangles', 'stddevrelpathangles'):
+            features[name] = -1
+
+    saccadedistance = accumulators['saccadedistance']
+    saccadeduration = accumulators['saccadeduration']
+    saccadespeed = accumulators['saccadespeed']
+    features['numsaccades'] = saccadedistance.count
+    if saccadedistance.count > 0:
+        features['sumsaccadedistance'] = saccadedistance.sum
+        features['meansaccadedistance'] = _mean(saccadedistance)
+        features['stddevsaccadedistance'] = saccadedistance.stddev()
+        features['longestsaccadedistance'] = saccadedistance.max
+        features['sumsaccadeduration'] = saccadeduration.sum
+        features['meansaccadeduration'] = _mean(saccadeduration)
+        features['stddevsaccadeduration'] = saccadeduration.stddev()
+        features['longestsaccadeduration'] = saccadeduration.max
+        features['meansaccadespeed'] = _mean(saccadespeed)
+        features['stddevsaccadespeed'] = saccadespeed.stddev()
+        features['maxsaccadespeed'] = saccadespeed.max
+        features['minsaccadespeed'] = saccadespeed.min
+        if saccadeduration.sum != 0:
+            features['fixationsaccadetimeratio'] = float(features['sumfixationduration']) / saccadeduration.sum
+        else:
+            features['fixationsaccadetimeratio'] = -1
+    else:
+        for name in ('sumsaccadedistance', 'meansaccadedistance', 'stddevsaccadedistance', 'longestsaccadedistance',
+                     'sumsaccadeduration', 'meansaccadeduration', 'stddevsaccadeduration', 'longestsaccadeduration',
+                     'meansaccadespeed', 'stddevsaccadespeed', 'maxsaccadespeed', 'minsaccadespeed',
+                     'fixationsaccadetimeratio'):
+            features[name] = -1
+
+    features['numevents'] = sum(event_counts.values())
+    for kind, name in (('leftc', 'leftclic'), ('rightc', 'rightclic'), ('doublec', 'doubleclic'), ('keyp', 'keypressed')):
+        features['num' + name] = event_counts[kind]
+        features[name + 'rate'] = rate(event_counts[kind])
+        features['timetofirst' + name] = _value_or(first_events[kind], -1)
+    return features
+
+
+def relative_angle(previous, point, following):
+    """Returns the angle (in radians) at point between the saccades from previous and to following
+    (see Segment.calc_rel_angles)"""
+    (lastx, lasty), (x, y), (nextx, nexty) = previous, point, following
+    v1 = (lastx - x, lasty - y)
+    v2 = (nextx - x, nexty - y)
+    if v1 == (0.0, 0.0) or v2 == (0.0, 0.0):
+        return 0.0
+    v1_dot = math.sqrt(geometry.simpledotproduct(v1, v1))
+    v2_dot = math.sqrt(geometry.simpledotproduct(v2, v2))
+    normv1 = ((lastx - x) / v1_dot, (lasty - y) / v1_dot)
+    normv2 = ((nextx - x) / v2_dot, (nexty - y) / v2_dot)
+    dotproduct = geometry.simpledotproduct(normv1, normv2)
+    return math.acos(min(1.0, max(-1.0, dotproduct)))
+
+
+def _single(value):
+    """Returns a StatAccumulator holding one value"""
+    acc = StatAccumulator()
+    acc.add(value)
+    return acc
+
+
+def _mean(acc):
+    """Returns the mean of the values of a StatAccumulator computed as utils.mean (sum / count, 0 if there is no value)"""
+    if acc.count == 0:
+        return 0
+    return acc.sum / float(acc.count)
+
+
+def _value_or(value, default):
+    """Returns value, or default if value is None"""
+    return default if value is None else value
+
+
+def _add_stats(features, acc, names):
+    """Sets the mean, stddev, max, min (and start and end, if in names) features of a signal, or -1 if it has no value"""
+    if acc.count == 0:
+        for name in names:
+            features[name] = -1
+        return
+    values = [_mean(acc), acc.stddev(), acc.max, acc.min, acc.first, acc.last]
+    for name, value in zip(names, values):
+        features[name] = value
@@ -9,10 +9,12 @@ Generic class to handle eye tracking and events data for one Participant in the
 Institution: The University of British Columbia.
 """
 
-import string
+import shutil
+import tempfile
 import params
 import EMDAT_core
 from EMDAT_core.data_structures import *
+from EMDAT_core import instrumentation
 from EMDAT_core.Scene import Scene
 from EMDAT_core.Recording import *
 from EMDAT_core.utils import log_to_file
@@ -96,7 +98,7 @@ class Participant():
         Returns:
             a list of "Segment ids" of invalid Segments in this particiapnt's eye gaze data
         """
-        return map(lambda y: y.segid, filter(lambda x: not x.is_valid, self.segments))
+        return list(map(lambda y: y.segid, filter(lambda x: not x.is_valid, self.segments)))
 
     def valid_segments(self):
         """Returns a list of valid segments in this particiapnt's eye gaze data
@@ -104,7 +106,7 @@ class Participant():
         Returns:
             a list of "Segment ids" of invalid Segments in this particiapnt's eye gaze data
         """
-        return map(lambda y: y.segid, filter(lambda x: x.is_valid, self.segments))
+        return list(map(lambda y: y.segid, filter(lambda x: x.is_valid, self.segments)))
 
 
     def export_features(self, featurelist=None, aoifeaturelist=None, aoifeaturelabels = None,
@@ -185,9 +187,9 @@ class Participant():
         featnames, data  = self.export_features(featurelist, aoifeaturelist = aoifeaturelist,
                                                 id_prefix = id_prefix, require_valid = require_valid)
 
-        ret = string.join(featnames, '\t') + '\n'
+        ret = '\t'.join(featnames) + '\n'
         for t in data:
-            ret += (string.join(map(str, t), '\t') + '\n')
+            ret += ('\t'.join(map(str, t)) + '\n')
         return ret
 
     def print_(self):
@@ -331,6 +333,7 @@ def export_features_all(participants, featurelist = None, aoifeaturelist = None,
     return featnames, data
 
 
+@instrumentation.timed("export")
 def write_features_tsv(participants, outfile, featurelist = None, aoifeaturelist =  None,
                        aoifeaturelabels=None, id_prefix = True):
     """Returns feature names and their values for a list of "Participant"s in a tsv-format file
@@ -364,11 +367,82 @@ def write_features_tsv(participants, outfile, featurelist = None, aoifeaturelist
     [part_orig.add(p.pid) for p in participants]
     part_remaining = set()
     with open(outfile, 'w') as f:
-        f.write(string.join(fnames, '\t') + '\n')
+        f.write('\t'.join(fnames) + '\n')
         for l in fvals:
-            f.write(string.join(map(str, l), '\t') + '\n')
+            f.write('\t'.join(map(str, l)) + '\n')
             part_remaining.add(l[0])
     
+    _log_removed_participants(part_orig, part_remaining)
+
+
+class FeatureTsvWriter(object):
+    """
+    Writes the features of "Participant"s to a tsv-format file one Participant at a time
+
+    The file is the same as the one write_features_tsv writes for the same list of "Participant"s,
+    but the "Participant"s do not have to be kept in memory until all of them are read: the rows of
+    a Participant are written as soon as it is added, after which it can be released. As in
+    export_features_all, the header is made of the feature names of the last Participant, so the
+    rows are kept in a temporary file and copied after the header when the writer is closed.
+    """
+
+    def __init__(self, outfile, featurelist = None, aoifeaturelist = None, aoifeaturelabels = None,
+                 id_prefix = True):
+        """Inits FeatureTsvWriter class
+
+        Args:
+            outfile: a string containing the name of the output file (written by close())
+
+            featurelist, aoifeaturelist, aoifeaturelabels, id_prefix: as in write_features_tsv
+        """
+        self.outfile = outfile
+        self.featurelist = featurelist
+        self.aoifeaturelist = aoifeaturelist
+        self.aoifeaturelabels = aoifeaturelabels
+        self.id_prefix = id_prefix
+        self.featnames = None
+        self.part_orig = set()
+        self.part_remaining = set()
+        self.rows = tempfile.TemporaryFile(mode = 'w+')
+
+    @instrumentation.timed("export")
+    def add(self, participant):
+        """Writes the feature rows of a Participant
+
+        Args:
+            participant: a Participant
+        """
+        fnames, fvals = participant.export_features(featurelist = self.featurelist,
+                                                    aoifeaturelist = self.aoifeaturelist,
+                                                    aoifeaturelabels = self.aoifeaturelabels,
+                                                    id_prefix = self.id_prefix)
+        self.featnames = fnames
+        self.part_orig.add(participant.pid)
+        for l in fvals:
+            self.rows.write('\t'.join(map(str, l)) + '\n')
+            self.part_remaining.add(l[0])
+
+    @instrumentation.timed("export")
+    def close(self):
+        """Writes the output file and logs the "Participant"s that had no rows"""
+        if self.featnames is None:
+            raise NameError('No participants were passed to the function')
+        with open(self.outfile, 'w') as f:
+            f.write('\t'.join(self.featnames) + '\n')
+            self.rows.seek(0)
+            shutil.copyfileobj(self.rows, f)
+        self.rows.close()
+        _log_removed_participants(self.part_orig, self.part_remaining)
+
+
+def _log_removed_participants(part_orig, part_remaining):
+    """Logs the "Participant"s that have no feature rows, as written by write_features_tsv
+
+    Args:
+        part_orig: the set of the ids of all the "Participant"s
+
+        part_remaining: the set of the ids found in the feature rows
+    """
     part_lost = part_orig.symmetric_difference(part_remaining)
     for p in part_lost:
         log_to_file("Participant "+p+" removed as it had not enough valid samples for any of the tasks!\n")
@@ -413,7 +487,7 @@ def read_events(evfile):
     with open(evfile, 'r') as f:
         lines = f.readlines()
 
-    return map(Event, lines[(params.EVENTSHEADERLINES+params.NUMBEROFEXTRAHEADERLINES):])
+    return list(map(Event, lines[(params.EVENTSHEADERLINES+params.NUMBEROFEXTRAHEADERLINES):]))
 
 
 def plot_pupil_dilation_all(participants, outdir, scene):
@@ -10,55 +10,180 @@ Institution: The University of British Columbia.
 """
 
 from abc import ABCMeta, abstractmethod
+import os
+import numpy as np
 from EMDAT_core.data_structures import *
 from EMDAT_core.Scene import *
 from EMDAT_core.AOI import *
 from EMDAT_core.utils import *
+from EMDAT_core import recording_cache
+from EMDAT_core.segment_cache import SegmentCache
+from EMDAT_core.SlidingWindow import scene_windows
+from EMDAT_core import instrumentation
+import params
 
 
 class Recording:
     __metaclass__ = ABCMeta
 
-    def __init__(self, all_file, fixation_file, saccade_file=None, event_file=None, media_offset=(0, 0)):
+    READER_VERSION = 1  # to be increased whenever a change in the reader changes the data it returns
+    READER_PARAMS = ()  # names of the parameters in params that the reader depends on
+    TIMESTAMPS_PER_MS = 1  # the number of units of the timestamps of the exported files in a millisecond
+
+    @instrumentation.timed("parse")
+    def __init__(self, all_file, fixation_file, saccade_file=None, event_file=None, media_offset=(0, 0),
+                 read_filter=None, feature_selection=None):
         """
         :param all_file: path to file that contains all gaze points
         :param fixation_file :path to file that contains all gaze points
         :param event_file :path to file that contains all events
         :param media_offset: the coordinates of the top left corner of the window showing the interface under study.
         (0,0) if the interface was in full screen (default value).
+        :param read_filter: If not None, a ReadFilter with the stimulus and the time ranges of the rows to read
+        (the readers that do not support a filter read all the rows).
+        :param feature_selection: If not None, a FeatureSelection: the saccade and event files are not read,
+        and the pupil and distance columns of the samples are not read (and set to -1), if no feature it needs
+        depends on them (see EMDAT_core/feature_selection.py).
         """
         self.media_offset = media_offset
+        self.read_filter = read_filter
+        self.feature_selection = feature_selection
+        if not self.reads_data('saccades'):
+            saccade_file = None
+        if not self.reads_data('events'):
+            event_file = None
+
+        self.all_data, self.fix_data, self.sac_data, self.event_data = \
+            self.read_data_cached(all_file, fixation_file, saccade_file, event_file)
+        if getattr(params, 'SEGMENT_CACHE_DIR', None) is not None:
+            self.segment_data_key = recording_cache.recording_digest(
+                self.cache_key_data(), (all_file, fixation_file, saccade_file, event_file))
+        else:
+            self.segment_data_key = None
+        # index the timestamps of each stream once, for the interval queries of get_chunk
+        if isinstance(self.all_data, list):
+            self.all_data = RecordList(self.all_data)
+        self.fix_data = RecordList(self.fix_data)
+        if self.sac_data is not None:
+            self.sac_data = RecordList(self.sac_data)
+        if self.event_data is not None:
+            self.event_data = RecordList(self.event_data)
 
-        self.all_data = self.read_all_data(all_file)
         if len(self.all_data) == 0:
             raise Exception("The file '" + all_file + "' has no samples!")
 
-        self.fix_data = self.read_fixation_data(fixation_file)
         if len(self.fix_data) == 0:
             raise Exception("The file '" + fixation_file + "' has no fixations!")
 
         if saccade_file is not None:
-            self.sac_data = self.read_saccade_data(saccade_file)
             if len(self.sac_data) == 0:
                 raise Exception("The file '" + saccade_file + "' has no saccades!")
 
-        else:
-            self.sac_data = None
-
         if event_file is not None:
-            self.event_data = self.read_event_data(event_file)
             if len(self.event_data) == 0:
                 raise Exception("The file '" + event_file + "' has no events!")
+
+    def read_data(self, all_file, fixation_file, saccade_file=None, event_file=None):
+        """ Read all the data streams of the recording.
+        By default each stream is read from its own file. Readers whose export format holds several
+        streams in the same file can override this method to read them in a single pass.
+
+        :param all_file: path to file that contains all gaze points
+        :param fixation_file :path to file that contains all fixations points
+        :param saccade_file :path to file that contains all saccades (or None)
+        :param event_file :path to file that contains all events (or None)
+        :return: the list of Datapoints, the list of Fixations, the list of Saccades (or None)
+        and the list of Events (or None)
+        """
+        all_data = self.read_all_data(all_file)
+        fix_data = self.read_fixation_data(fixation_file)
+
+        if saccade_file is not None:
+            sac_data = self.read_saccade_data(saccade_file)
         else:
-            self.event_data = None
+            sac_data = None
+
+        if event_file is not None:
+            event_data = self.read_event_data(event_file)
+        else:
+            event_data = None
+
+        return all_data, fix_data, sac_data, event_data
+
+    def read_data_cached(self, all_file, fixation_file, saccade_file=None, event_file=None):
+        """ Read all the data streams of the recording through the cache of parsed recordings.
+        If params.RECORDING_CACHE_DIR is not None, the streams are loaded from the cache file of
+        these input files if there is one, and otherwise read with read_data and saved to the cache.
+
+        :param all_file: path to file that contains all gaze points
+        :param fixation_file :path to file that contains all fixations points
+        :param saccade_file :path to file that contains all saccades (or None)
+        :param event_file :path to file that contains all events (or None)
+        :return: the same values as read_data
+        """
+        cache_dir = getattr(params, 'RECORDING_CACHE_DIR', None)
+        if cache_dir is None:
+            return self.read_data(all_file, fixation_file, saccade_file, event_file)
+
+        path = recording_cache.cache_path(cache_dir, self, all_file, fixation_file, saccade_file, event_file)
+        if os.path.exists(path):
+            try:
+                return recording_cache.load_recording(path)
+            except Exception as e:
+                warn("Cannot read the cached recording '" + path + "' (" + str(e) + "), reading the input files.")
+
+        data = self.read_data(all_file, fixation_file, saccade_file, event_file)
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            recording_cache.save_recording(path, *data)
+        except Exception as e:
+            warn("Cannot write the cached recording '" + path + "': " + str(e))
+        return data
+
+    def cache_key_data(self):
+        """ Returns the reader-specific part of the key of the cached recordings: the reader class
+        and version, the media offset and the values of the parameters the reader depends on.
+        Readers with other settings (e.g. a class attribute used to filter rows) extend this list.
+
+        :return: a list of values with a stable repr()
+        """
+        key = [self.__class__.__module__ + '.' + self.__class__.__name__, self.READER_VERSION,
+               tuple(self.media_offset)]
+        key.extend((name, getattr(params, name, None)) for name in self.READER_PARAMS)
+        if getattr(self, 'read_filter', None) is not None:
+            key.append(('read_filter', self.read_filter.key()))
+        skipped = [data for data in ('pupil', 'distance') if not self.reads_data(data)]
+        if skipped:
+            key.append(('skipped_data', tuple(skipped)))
+        return key
+
+    def segment_cache(self):
+        """ Returns the SegmentCache of the "Segment"s of this recording if params.SEGMENT_CACHE_DIR is not None,
+        and None otherwise.
+        """
+        cache_dir = getattr(params, 'SEGMENT_CACHE_DIR', None)
+        if cache_dir is None or getattr(self, 'segment_data_key', None) is None:
+            return None
+        return SegmentCache(cache_dir, self.segment_data_key)
+
+    def reads_data(self, data):
+        """ Returns True if a kind of data is read from the exported files, i.e. if there is no feature
+        selection or if one of the features it needs depends on the data.
+
+        :param data: 'pupil' or 'distance' (columns of the samples), 'saccades' or 'events' (streams)
+        :return: a boolean
+        """
+        selection = getattr(self, 'feature_selection', None)
+        return selection is None or selection.needs_data(data)
 
     @abstractmethod
     def read_all_data(self, all_file):
         """ Read the data file that contains all gaze points.
 
         :param all_file: path to file that contains all gaze points
-        :return: a list of Datapoints
-        :rtype: list[Datapoint]
+        :return: the Datapoints (a SampleTable or a list of Datapoints)
+        :rtype: SampleTable
         """
         pass
 
@@ -94,7 +219,8 @@ class Recording:
 
     def process_rec(self, segfile=None, scenelist=None, aoifile=None,
                     aoilist=None, prune_length=None, require_valid_segs=True,
-                    auto_partition_low_quality_segments=False, rpsdata=None, export_pupilinfo=False):
+                    auto_partition_low_quality_segments=False, rpsdata=None, export_pupilinfo=False,
+                    window_length=None, window_stride=None, window_alignment="scene", feature_selection=None):
         """Processes the data for one recording (i.e, one complete experiment session)
 
         Args:
@@ -130,10 +256,29 @@ class Recording:
                 the "Segment". default = False
 
             rpsdata: a dictionary with rest pupil sizes: (scene name is a key, rest pupil size is a value)
+
+            window_length: If not None, an integer that turns on the windowing mode: instead of
+                the "Segment"s of the segfile or scenelist, the general features are computed for
+                windows of window_length ms sliding over the time span of each Scene
+                (see SlidingWindow.sliding_windows). AOIs, prune_length and the validity of
+                "Segment"s are not used in this mode.
+            window_stride: the time (in ms) between the starts of two consecutive windows.
+                default = window_length (windows that do not overlap)
+            window_alignment: "scene" if the windows of a Scene start at the start of the Scene, or
+                "recording" if the windows of all "Scene"s are aligned on multiples of window_stride
+                after the first sample of the Recording. default = "scene"
+            feature_selection: If not None, a FeatureSelection: the calculators of the groups of features
+                it does not need are skipped for all the "Segment"s and "Scene"s. By default the
+                feature selection of the Recording, if any.
+
+            *Note: if params.SEGMENT_CACHE_DIR is not None, the "Segment"s computed in earlier runs (for the
+            same data, time range, AOIs and parameters) are loaded from the cache instead of being computed
+            again (see EMDAT_core/segment_cache.py)
         Returns:
-            a list of Scene objects for this Recording
             a list of Segment objects for this recording. This is an aggregated list
             of the "Segment"s of all "Scene"s in the Recording
+            a list of Scene objects for this Recording
+            *Note: in the windowing mode, a list of "Window"s of all "Scene"s and an empty list of "Scene"s
         """
 
         if segfile is not None:
@@ -143,6 +288,21 @@ class Recording:
         elif scenelist is None:
             print("Error in scene file.")
 
+        if window_length is not None:
+            windows = []
+            for scid, sc in scenelist.items():
+                if params.VERBOSE != "QUIET":
+                    print("Preparing windows of scene:" + str(scid))
+                scrpsdata = rpsdata.get(scid, 0) if rpsdata is not None else 0
+                try:
+                    windows.extend(scene_windows(scid, sc, self, window_length, window_stride, window_alignment,
+                                                 rest_pupil_size=scrpsdata))
+                except Exception as e:
+                    warn(str(e))
+                    if params.DEBUG:
+                        raise
+            return windows, []
+
         if aoifile is not None:
             aoilist = read_aois(aoifile)
             if params.VERBOSE != "QUIET":
@@ -151,6 +311,14 @@ class Recording:
             aoilist = []
             print("Warning: No AOIs defined!")
 
+        if feature_selection is None:
+            feature_selection = self.feature_selection
+
+        if aoilist and (feature_selection is None or feature_selection.needs('aoi') or feature_selection.needs('aoisequence')):
+            # classify all samples and fixations against the AOIs once for all segments
+            AOIClassifier(aoilist).label(self.all_data, self.fix_data)
+
+        segment_cache = self.segment_cache()
         scenes = []
         for scid, sc in scenelist.items():
             if params.VERBOSE != "QUIET":
@@ -176,7 +344,8 @@ class Recording:
                                   prune_length=prune_length,
                                   require_valid=require_valid_segs,
                                   auto_partition=auto_partition_low_quality_segments, rest_pupil_size=scrpsdata,
-                                  export_pupilinfo=export_pupilinfo)
+                                  export_pupilinfo=export_pupilinfo, feature_selection=feature_selection,
+                                  segment_cache=segment_cache)
             except Exception as e:
                 warn(str(e))
                 new_scene = None
@@ -186,6 +355,8 @@ class Recording:
                     pass
             if new_scene:
                 scenes.append(new_scene)
+        if segment_cache is not None and params.VERBOSE != "QUIET":
+            print("Segments loaded from the cache: %d, computed: %d" % (segment_cache.hits, segment_cache.misses))
         segs = []
         for sc in scenes:
             segs.extend(sc.segments)
@@ -198,6 +369,98 @@ class Recording:
         self.sac_data = []
         self.event_data = []
 
+class ReadFilter(object):
+    """
+    The rows of the exported files that a reader keeps, so that the rows of other stimuli and the rows
+    far from every "Segment" (e.g. calibration or breaks between tasks) are rejected while reading, after
+    only the stimulus and timestamp columns of the row are read.
+
+    The time ranges are widened by a margin, so that the context used by the readers and the "Segment"s
+    around the start and end of each range (the fixations partly inside a "Segment", the fixation before a
+    saccade) is kept. The features of the "Segment"s are the same as without the filter as long as no such
+    context is further than the margin from the range. The gaze sample before the first sample of each range
+    is kept whatever its distance, as the previous sample of the first sample of a "Segment" for the pupil
+    velocity (e.g. when the rows before a "Segment" belong to another stimulus). The first gaze sample is always
+    kept, as the start of the recording (see SlidingWindow.window_origin).
+
+    Attributes:
+        stimulus: None, or the stimulus (media) name of the rows to keep, for the readers whose exports have one
+        time_ranges: None, or a sorted list of the (start, end) time ranges of the rows to keep, in the
+            time unit of the recording (as in the '.seg' files)
+        margin: the time (in ms) by which the time ranges are widened on each side
+    """
+
+    def __init__(self, stimulus=None, time_ranges=None, margin=0):
+        """Inits ReadFilter class
+
+        Args:
+            stimulus: None, or the stimulus name of the rows to keep
+            time_ranges: None, or a list of (start, end) time ranges, in any order and possibly overlapping
+            margin: the time (in ms) by which the time ranges are widened on each side
+        """
+        self.stimulus = stimulus
+        self.time_ranges = sorted(time_ranges) if time_ranges is not None else None
+        self.margin = margin
+
+    @classmethod
+    def from_scenes(cls, scenelist, stimulus=None, margin=None):
+        """Returns the ReadFilter keeping the rows of the union of the "Segment"s of some scenes
+
+        Args:
+            scenelist: a dict with scid as the key and lists of (segid, start, end) as values, as returned by read_segs
+            stimulus: None, or the stimulus name of the rows to keep
+            margin: the margin of the time ranges (in ms), by default params.READ_FILTER_MARGIN
+        """
+        if margin is None:
+            margin = params.READ_FILTER_MARGIN
+        time_ranges = [(start, end) for segments in scenelist.values() for _, start, end in segments]
+        return cls(stimulus, time_ranges, margin)
+
+    def key(self):
+        """Returns the settings of the filter, as a value with a stable repr() (see Recording.cache_key_data)"""
+        return (self.stimulus, self.margin, tuple(self.time_ranges) if self.time_ranges is not None else None)
+
+    def time_mask(self, timestamps, samples, timestamps_per_ms=1, keep_first=True):
+        """Returns a boolean array, True for the rows to keep according to their timestamps
+
+        Args:
+            timestamps: an int64 array of the timestamps of the rows, with SampleTable.INT_MISSING for the
+                missing ones (kept)
+            samples: a boolean array, True for the rows that are gaze samples (in time order): the sample before
+                the first sample of each time range is always kept
+            timestamps_per_ms: the number of units of the timestamps in a millisecond
+            keep_first: a boolean determining if the first gaze sample is always kept (False when the rows
+                follow other rows of the recording, see EMDAT_eyetracker/columns.py)
+
+        Returns:
+            a boolean array
+        """
+        if self.time_ranges is None:
+            return np.ones(len(timestamps), dtype=bool)
+        margin = self.margin * timestamps_per_ms
+        starts = []
+        ends = []
+        for start, end in self.time_ranges:
+            if starts and start - margin <= ends[-1]:  # overlaps the previous range
+                ends[-1] = max(ends[-1], end + margin)
+            else:
+                starts.append(start - margin)
+                ends.append(end + margin)
+        # inside a range if more ranges start before the timestamp than end before it (ends are inclusive)
+        mask = np.searchsorted(starts, timestamps, side='right') > np.searchsorted(ends, timestamps, side='left')
+        missing = timestamps == SampleTable.INT_MISSING
+        mask |= missing
+        sample_rows = np.flatnonzero(samples)
+        if keep_first:
+            mask[sample_rows[:1]] = True
+        # the sample before the first sample of each range, whatever its distance
+        sample_rows = sample_rows[~missing[sample_rows]]
+        first = np.searchsorted(timestamps[sample_rows], starts, side='left')
+        previous = first[(first > 0) & (first < len(sample_rows))] - 1
+        mask[sample_rows[previous]] = True
+        return mask
+
+
 def read_segs(segfile):
     """Returns a dict with scid as the key and segments as value from a '.seg' file.
 
@@ -262,7 +525,7 @@ def read_aoilines(aoilines):
         aoilines: List of lines from a '.aoi' file
 
     Returns:
-        list of AOIs
+        list of AOIs, with the index of their activity intervals (see AOI.index_activity)
     """
     aoilist = []
     polyin = []
@@ -330,6 +593,9 @@ def read_aoilines(aoilines):
             aoi = AOI(last_aid, [polyin], [[]], [[]])
             aoilist.append(aoi)
 
+    # index the activity intervals of each AOI once, for the activity queries of all the segments and fixations
+    for aoi in aoilist:
+        aoi.index_activity()
     return aoilist
 
 
@@ -409,6 +675,65 @@ def get_distance(distanceleft, distanceright):
     return (distanceleft + distanceright) / 2.0
 
 
+def get_pupil_sizes(pupilleft, pupilright):
+    """Array version of get_pupil_size, for all the samples of a recording at once
+
+    Args:
+        pupilleft, pupilright: float arrays of pupil sizes, with NaN where the value is missing (None)
+
+    Returns:
+        a float array of pupil sizes (-1 where both values are missing)
+    """
+    left_missing = np.isnan(pupilleft)
+    right_missing = np.isnan(pupilright)
+    sizes = np.where(left_missing, pupilright, np.where(right_missing, pupilleft, (pupilleft + pupilright) / 2.0))
+    sizes[left_missing & right_missing] = -1
+    return sizes
+
+
+def get_pupil_velocities(pupilleft, pupilright, timestamps):
+    """Array version of get_pupil_velocity, for consecutive samples of a recording
+
+    The velocity of each sample is computed against the previous sample, and that of the first sample
+    against a previous sample of pupil sizes and timestamp -1, as the readers do.
+
+    Args:
+        pupilleft, pupilright: float arrays of pupil sizes, with NaN where the value is missing (None)
+        timestamps: an int array of the timestamps of the samples
+
+    Returns:
+        a float array of pupil velocities (-1 where no eye has two consecutive values)
+    """
+    last_pupilleft = np.concatenate(([-1.0], pupilleft[:-1]))
+    last_pupilright = np.concatenate(([-1.0], pupilright[:-1]))
+    time = timestamps - np.concatenate(([-1], timestamps[:-1]))
+    left = ~np.isnan(pupilleft) & ~np.isnan(last_pupilleft)
+    right = ~np.isnan(pupilright) & ~np.isnan(last_pupilright)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        both = np.abs((pupilleft + pupilright) / 2 - (last_pupilleft + last_pupilright) / 2) / time
+        left_only = np.abs(pupilleft - last_pupilleft) / time
+        right_only = np.abs(pupilright - last_pupilright) / time
+    return np.where(left & right, both, np.where(left, left_only, np.where(right, right_only, -1.0)))
+
+
+def get_distances(distanceleft, distanceright):
+    """Array version of get_distance (see get_pupil_sizes)"""
+    return get_pupil_sizes(distanceleft, distanceright)
+
+
+def get_missing_values(length):
+    """Returns the values of a column of the samples that is not read (see Recording.reads_data):
+    -1 for all the samples, as for the samples without a value
+
+    Args:
+        length: the number of samples
+
+    Returns:
+        a float array
+    """
+    return np.full(length, -1.0)
+
+
 def get_saccade_distance(saccade_gaze_points):
     distance = 0.0
     try:
@@ -10,9 +10,12 @@ Institution: The University of British Columbia.
 """
 
 import math, EMDAT_core.geometry
+import operator, re
 from EMDAT_core.utils import *
 from EMDAT_core.Segment import *
-from copy import deepcopy
+from EMDAT_core.accumulators import merge_accumulators
+from EMDAT_core.feature_selection import ALL_FEATURES
+from EMDAT_core import instrumentation
 
 
 class Scene(Segment):
@@ -52,14 +55,16 @@ class Scene(Segment):
         fixation_data: A list of "Fixation"s for this Scene
         fixation_start = fixation_data[0].timestamp
         fixation_end = fixation_data[-1].timestamp
-        aoi_data: A list of AOI_Stat objects for relevants "AOI"s for this Scene
+        aoi_data: A dict of SceneAOIStat objects (with the AOI ids as keys) for relevants "AOI"s for this Scene
         has_aois: A boolean indicating if this Scene has AOI features calculated for it
 
     """
 
 
+    @instrumentation.timed("scene_merge")
     def __init__(self, scid, seglist, all_data, fixation_data, saccade_data = None, event_data = None, Segments = None, aoilist = None,
-                  prune_length= None, require_valid = True, auto_partition = False, rest_pupil_size = 0, export_pupilinfo = False):
+                  prune_length= None, require_valid = True, auto_partition = False, rest_pupil_size = 0, export_pupilinfo = False,
+                  feature_selection = None, segment_cache = None):
         """
         Args:
             scid: A string containing the id of the Scene.
@@ -98,9 +103,53 @@ class Scene(Segment):
 
             rest_pupil_size: rest pupil size for the current scene
 
+            feature_selection: If not None, a FeatureSelection: the groups of features it does not need are
+                neither computed for the "Segment"s nor merged (see EMDAT_core/feature_selection.py). By default
+                that of the given "Segment"s, or all the features.
+
+            segment_cache: If not None, a SegmentCache: the "Segment"s found in it (with the same time range,
+                AOIs and parameters) are loaded instead of being computed, and the new ones are saved to it
+                (see EMDAT_core/segment_cache.py).
+
         Yields:
             a Scene object
         """
+        if feature_selection is None:
+            feature_selection = Segments[0].feature_selection if Segments else ALL_FEATURES
+        self.feature_selection = feature_selection
+
+        if segment_cache is not None:
+            cache_settings = segment_cache.settings_key(aoilist, prune_length, rest_pupil_size, export_pupilinfo,
+                                                        feature_selection, saccade_data is not None,
+                                                        event_data is not None)
+
+        ########################################
+        def new_segment(segid, start, end, all_data_in_seg, fixation_data_in_seg, saccade_data_in_seg, event_data_in_seg):
+            """ A helper method creating the Segment of the data between start and end, or loading it from
+            segment_cache if it has been computed before (the Segment is saved to segment_cache otherwise)
+
+            Args:
+                segid: the id of the Segment
+
+                start, end: the time range used to select the data of the Segment
+
+                all_data_in_seg, fixation_data_in_seg, saccade_data_in_seg, event_data_in_seg: the data of the Segment
+
+            Returns:
+                a Segment
+            """
+            if segment_cache is not None:
+                seg = segment_cache.load(cache_settings, start, end, segid, aoilist, feature_selection)
+                if seg is not None:
+                    return seg
+            seg = Segment(segid, all_data_in_seg, fixation_data_in_seg, saccade_data=saccade_data_in_seg,
+                          event_data=event_data_in_seg, aois=aoilist, prune_length=prune_length,
+                          rest_pupil_size = rest_pupil_size, export_pupilinfo = export_pupilinfo,
+                          feature_selection = feature_selection)
+            if segment_cache is not None:
+                segment_cache.save(cache_settings, start, end, seg)
+            return seg
+        ######################################## end new_segment()
 
         ########################################
         def partition_segment(new_seg, seg_start, seg_end, rest_pupil_size, export_pupilinfo):
@@ -166,11 +215,12 @@ class Scene(Segment):
                 else:
                     event_data_in_part = None
 
+                part_time_start = sub_seg_time_start
                 sub_seg_time_start = timebounds[1] #beginning of the next sub_seg is end of this gap
                 if fix_end - fix_start>0:
                     try:
-                        new_sub_seg = Segment(segid+"_"+str(sub_segid), all_data[all_start:all_end], fixation_data[fix_start:fix_end], saccade_data=saccade_data_in_part,
-                                      event_data=event_data_in_part, aois=aoilist, prune_length=prune_length, rest_pupil_size = rest_pupil_size, export_pupilinfo = export_pupilinfo)
+                        new_sub_seg = new_segment(segid+"_"+str(sub_segid), part_time_start, sub_seg_time_end, all_data[all_start:all_end],
+                                                  fixation_data[fix_start:fix_end], saccade_data_in_part, event_data_in_part)
                     except  Exception as e:
                         warn(str(e))
                         if params.DEBUG:
@@ -204,8 +254,8 @@ class Scene(Segment):
                 event_data_in_part = None
             if fix_end - fix_start>0: #add the last sub_seg
                 try:
-                    new_sub_seg = Segment(segid+"_"+str(sub_segid), all_data[all_start:all_end], fixation_data[fix_start:fix_end], saccade_data_in_part,
-                                      event_data=event_data_in_part, aois=aoilist, prune_length=prune_length, rest_pupil_size = rest_pupil_size, export_pupilinfo = export_pupilinfo)
+                    new_sub_seg = new_segment(segid+"_"+str(sub_segid), sub_seg_time_start, sub_seg_time_end, all_data[all_start:all_end],
+                                              fixation_data[fix_start:fix_end], saccade_data_in_part, event_data_in_part)
                 except Exception as e:
                     warn(str(e))
                     if params.DEBUG:
@@ -258,8 +308,8 @@ class Scene(Segment):
 
                 if fix_end - fix_start>0:
                     try:
-                        new_seg = Segment(segid, all_data[all_start:all_end], fixation_data[fix_start:fix_end], saccade_data = saccade_data_in_seg,
-							        event_data=event_data_in_seg, aois=aoilist, prune_length=prune_length, rest_pupil_size = rest_pupil_size, export_pupilinfo = export_pupilinfo)
+                        new_seg = new_segment(segid, start, end, all_data[all_start:all_end], fixation_data[fix_start:fix_end],
+                                              saccade_data_in_seg, event_data_in_seg)
                     except  Exception as e:
                         warn(str(e))
                         if params.DEBUG:
@@ -304,7 +354,7 @@ class Scene(Segment):
         self.require_valid_Segments = require_valid
         if require_valid:   #filter out the invalid Segments
 
-            segments = filter(lambda x:x.is_valid,self.segments)
+            segments = list(filter(lambda x:x.is_valid,self.segments))
         else:
             segments = self.segments
         if len(segments)==0:
@@ -334,6 +384,7 @@ class Scene(Segment):
         self.endseg = endseg
         self.scid = scid
         self.features = {}
+        self.accumulators = merge_accumulators(sorted(segments, key=lambda seg: seg.start))
         self.largest_data_gap = maxfeat(self.segments,'largest_data_gap')   #self.segments is used to calculate validity of the scenes instead of segments which is only valid segments
         self.proportion_valid = weightedmeanfeat(self.segments,'numsamples','proportion_valid') #self.segments is used to calculate validity of the scenes instead of segments which is only valid segments
         self.proportion_valid_fix = weightedmeanfeat(self.segments,'numsamples','proportion_valid_fix') #self.segments is used to calculate validity of the scenes instead of segments which is only valid segments
@@ -363,26 +414,36 @@ class Scene(Segment):
                 else:
                     warn('Error in fixation count for scene: '+self.scid)
 
-        self.merge_fixation_features(segments)
+        if feature_selection.needs('path'):
+            self.merge_fixation_features(segments)
 
-        self.merge_path_angle_features(segments)
+            self.merge_path_angle_features(segments)
+        else:
+            self.features['numfixations'] = self.numfixations
 
-        self.merge_blink_features(segments)
+        if feature_selection.needs('blink'):
+            self.merge_blink_features(segments)
 
-        self.merge_pupil_features(export_pupilinfo, segments)
+        self.pupilinfo_for_export = []
+        if feature_selection.needs('pupil'):
+            self.merge_pupil_features(export_pupilinfo, segments)
 
-        self.merge_distance_data(segments)
+        if feature_selection.needs('distance'):
+            self.merge_distance_data(segments)
 
-        self.merge_saccade_data(saccade_data, segments)
+        if feature_selection.needs('saccade'):
+            self.merge_saccade_data(saccade_data, segments)
 
-        self.merge_event_data(event_data, segments)
+        if feature_selection.needs('event'):
+            self.merge_event_data(event_data, segments)
 
         self.has_aois = False
 
-        if aoilist:
+        if aoilist and feature_selection.needs('aoi'):
             self.set_aois(segments, aoilist)
 
-        self.features['aoisequence'] = self.merge_aoisequences(segments)
+        if feature_selection.needs('aoisequence'):
+            self.features['aoisequence'] = self.merge_aoisequences(segments)
 
     def getid(self):
         """Returns the scid for this Scene
@@ -407,26 +468,11 @@ class Scene(Segment):
             for aid in seg.aoi_data.keys():
                     if aid in self.aoi_data:
                         if seg.aoi_data[aid].isActive:
-                            self.aoi_data[aid] = merge_aoistats(self.aoi_data[aid],seg.aoi_data[aid], self.features['length'], self.numfixations, self.start)
+                            self.aoi_data[aid].add(seg.aoi_data[aid], self.features['length'], self.numfixations, self.start)
                     else:
-                        self.aoi_data[aid] = deepcopy(seg.aoi_data[aid])
-                        if seg.aoi_data[aid].isActive:
-                            self.aoi_data[aid].features['timetofirstfixation'] += self.aoi_data[aid].starttime - self.start
-                            self.aoi_data[aid].features['timetolastfixation'] += self.aoi_data[aid].starttime - self.start
-
-                            if self.firstseg.aoi_data[aid].features['timetofirstleftclic'] != -1:
-                                self.aoi_data[aid].features['timetofirstleftclic'] += self.aoi_data[aid].starttime - self.start
-                            if self.firstseg.aoi_data[aid].features['timetofirstrightclic'] != -1:
-                                self.aoi_data[aid].features['timetofirstrightclic'] += self.aoi_data[aid].starttime - self.start
-                            if self.firstseg.aoi_data[aid].features['timetofirstdoubleclic'] != -1:
-                                self.aoi_data[aid].features['timetofirstdoubleclic'] += self.aoi_data[aid].starttime - self.start
-
-                            if self.firstseg.aoi_data[aid].features['timetolastleftclic'] != -1:
-                                self.aoi_data[aid].features['timetolastleftclic'] += self.aoi_data[aid].starttime - self.start
-                            if self.firstseg.aoi_data[aid].features['timetolastrightclic'] != -1:
-                                self.aoi_data[aid].features['timetolastrightclic'] += self.aoi_data[aid].starttime - self.start
-                            if self.firstseg.aoi_data[aid].features['timetolastdoubleclic'] != -1:
-                                self.aoi_data[aid].features['timetolastdoubleclic'] += self.aoi_data[aid].starttime - self.start
+                        self.aoi_data[aid] = SceneAOIStat(seg.aoi_data[aid], self.start, self.firstseg.aoi_data[aid])
+        for aid in self.aoi_data.keys():
+            self.aoi_data[aid].set_transition_features()
         #Merge stdev
         #For each seg, compute: T = [(numfix-1) * Variance + numfix * power( meanfixduration_in_seg - meanfixduration_in_scene, 2)]
         #At the Scene level: [ SQRT( SUM(T_seg1...Tsegn) / (numfix-1) ]
@@ -470,8 +516,8 @@ class Scene(Segment):
         self.features['fixationrate'] = float(self.numfixations) / (self.length - self.length_invalid)
 
         if self.numfixations > 0:
-            self.features['meanfixationduration'] = weightedmeanfeat(segments,'numfixations',"features['meanfixationduration']")
-            self.features['stddevfixationduration'] = aggregatestddevfeat(segments, 'numfixations', "features['stddevfixationduration']", "features['meanfixationduration']", self.features['meanfixationduration'])
+            self.features['meanfixationduration'] = accumulatedmean(self.accumulators['fixationduration'])
+            self.features['stddevfixationduration'] = accumulatedstddev(self.accumulators['fixationduration'])
             self.features['sumfixationduration'] = sumfeat(segments, "features['sumfixationduration']")
             self.features['fixationrate'] = float(self.numfixations)/(self.length - self.length_invalid)
         else:
@@ -500,18 +546,18 @@ class Scene(Segment):
         self.numrelangles = sumfeat(segments, "numrelangles")
 
         if self.numfixations > 1:
-            self.features['meanpathdistance'] = weightedmeanfeat(segments,'numfixdistances',"features['meanpathdistance']")
+            self.features['meanpathdistance'] = accumulatedmean(self.accumulators['pathdistance'])
             self.features['sumpathdistance'] = sumfeat(segments, "features['sumpathdistance']")
-            self.features['stddevpathdistance'] = aggregatestddevfeat(segments, 'numfixdistances', "features['stddevpathdistance']", "features['meanpathdistance']", self.features['meanpathdistance'])
+            self.features['stddevpathdistance'] = accumulatedstddev(self.accumulators['pathdistance'])
             self.features['eyemovementvelocity'] = self.features['sumpathdistance']/(self.length - self.length_invalid)
             self.features['sumabspathangles'] = sumfeat(segments, "features['sumabspathangles']")
-            self.features['meanabspathangles'] = weightedmeanfeat(segments,'numabsangles',"features['meanabspathangles']")
+            self.features['meanabspathangles'] = accumulatedmean(self.accumulators['abspathangles'])
             self.features['abspathanglesrate'] = self.features['sumabspathangles']/(self.length - self.length_invalid)
-            self.features['stddevabspathangles'] = aggregatestddevfeat(segments, 'numabsangles', "features['stddevabspathangles']", "features['meanabspathangles']", self.features['meanabspathangles'])
+            self.features['stddevabspathangles'] = accumulatedstddev(self.accumulators['abspathangles'])
             self.features['sumrelpathangles'] = sumfeat(segments, "features['sumrelpathangles']")
-            self.features['meanrelpathangles'] = weightedmeanfeat(segments,'numrelangles',"features['meanrelpathangles']")
+            self.features['meanrelpathangles'] = accumulatedmean(self.accumulators['relpathangles'])
             self.features['relpathanglesrate'] = self.features['sumrelpathangles']/(self.length - self.length_invalid)
-            self.features['stddevrelpathangles'] = aggregatestddevfeat(segments, 'numrelangles', "features['stddevrelpathangles']", "features['meanrelpathangles']", self.features['meanrelpathangles'])
+            self.features['stddevrelpathangles'] = accumulatedstddev(self.accumulators['relpathangles'])
         else:
             self.features['meanpathdistance'] = -1
             self.features['sumpathdistance'] = -1
@@ -546,9 +592,8 @@ class Scene(Segment):
         self.features['blinknum'] = sumfeat(segments, "features['blinknum']")
         if self.features['blinknum'] > 0:
             self.features['blinkdurationtotal']     = sumfeat(segments, "features['blinkdurationtotal']")
-            self.features['blinkdurationmean']      = weightedmeanfeat(segments, "features['blinknum']", "features['blinkdurationmean']")
-            self.features['blinkdurationstd']       = aggregatestddevfeat(segments, "features['blinknum']", "features['blinkdurationstd']",
-                                                      "features['blinkdurationmean']", self.features['blinkdurationmean'])
+            self.features['blinkdurationmean']      = accumulatedmean(self.accumulators['blinkduration'])
+            self.features['blinkdurationstd']       = accumulatedstddev(self.accumulators['blinkduration'])
             self.features['blinkdurationmin']       = minfeat(segments, "features['blinkdurationmin']", -1)
             self.features['blinkdurationmax']       = maxfeat(segments, "features['blinkdurationmax']")
             self.features['blinkrate']              = float(self.features['blinknum']) / (self.length - self.length_invalid)
@@ -592,8 +637,8 @@ class Scene(Segment):
         if self.numpupilsizes > 0: # check if scene has any pupil data
             if export_pupilinfo:
                 self.pupilinfo_for_export = mergevalues(segments, 'pupilinfo_for_export')
-            self.features['meanpupilsize'] = weightedmeanfeat(segments, 'numpupilsizes', "features['meanpupilsize']")
-            self.features['stddevpupilsize'] = aggregatestddevfeat(segments, 'numpupilsizes', "features['stddevpupilsize']", "features['meanpupilsize']", self.features['meanpupilsize']) #stddev(self.adjvalidpupilsizes)
+            self.features['meanpupilsize'] = accumulatedmean(self.accumulators['pupilsize'])
+            self.features['stddevpupilsize'] = accumulatedstddev(self.accumulators['pupilsize']) #stddev(self.adjvalidpupilsizes)
             self.features['maxpupilsize'] = maxfeat(segments, "features['maxpupilsize']")
             self.features['minpupilsize'] = minfeat(segments, "features['minpupilsize']", -1)
             self.features['startpupilsize'] = self.firstseg.features['startpupilsize']
@@ -633,8 +678,8 @@ class Scene(Segment):
         """
         self.numdistancedata = sumfeat(segments,'numdistancedata') #Distance
         if self.numdistancedata > 0: # check if scene has any pupil data
-            self.features['meandistance'] = weightedmeanfeat(segments, 'numdistancedata', "features['meandistance']")
-            self.features['stddevdistance'] = aggregatestddevfeat(segments, 'numdistancedata', "features['stddevdistance']", "features['meandistance']", self.features['meandistance'])
+            self.features['meandistance'] = accumulatedmean(self.accumulators['distance'])
+            self.features['stddevdistance'] = accumulatedstddev(self.accumulators['distance'])
             self.features['maxdistance'] = maxfeat(segments, "features['maxdistance']")
             self.features['mindistance'] = minfeat(segments, "features['mindistance']", -1)
             self.features['startdistance'] = self.firstseg.features['startdistance']
@@ -774,6 +819,110 @@ class Scene(Segment):
         #self.adjvalidpupilsizes = []
         #self.distances_from_screen = []
 
+class SceneAOIStat(AOI_Stat):
+    """The statistics of an AOI over the "Segment"s of a Scene
+
+    A SceneAOIStat starts from the AOI_Stat of the AOI in one Segment and folds in the AOI_Stat of the AOI
+    in the other "Segment"s (see Scene.set_aois), with the same arithmetic as merge_aoistats. The AOI_Stat
+    objects of the "Segment"s are only read: the features are copied from the first one (they are numbers),
+    and the transition counts of all the "AOI"s are summed in an array whose proportions are computed once,
+    when all the "Segment"s have been added (see set_transition_features).
+
+    Attributes:
+        aoi: the AOI
+        features: A dict with feature names as its keys and feature values as its values, as in AOI_Stat
+        starttime, endtime, length: the time span of the AOI_Stat the statistics were started from
+        transition_aids: the ids of the "AOI"s of the transition features ('numtransfrom_<aid>')
+        transitions: an array of the number of transitions from each AOI of transition_aids to this AOI
+        total_trans_from: the total number of transitions to this AOI
+    """
+
+    def __init__(self, aoi_stat, sc_start, firstseg_aoi_stat):
+        """Inits SceneAOIStat class
+
+        Args:
+            aoi_stat: the AOI_Stat of the AOI in the first Segment of the Scene that has it
+
+            sc_start: start time (timestamp) of the scene
+
+            firstseg_aoi_stat: the AOI_Stat of the AOI in the Segment of the Scene that starts first
+
+        Yields:
+            a SceneAOIStat object
+        """
+        self.aoi = aoi_stat.aoi
+        self.isActive = aoi_stat.isActive
+        self.starttime = aoi_stat.starttime
+        self.endtime = aoi_stat.endtime
+        self.length = aoi_stat.length
+        self.features = dict(aoi_stat.features)
+        self.numpupilsizes = aoi_stat.numpupilsizes
+        self.numpupilvelocity = aoi_stat.numpupilvelocity
+        self.numevents = aoi_stat.numevents
+        self.numdistancedata = aoi_stat.numdistancedata
+        self.variance = aoi_stat.variance
+        self.total_trans_from = aoi_stat.total_trans_from
+
+        self.transition_aids = []
+        self._transition_index = {}
+        for feat in aoi_stat.features:
+            if feat.startswith('numtransfrom_'):
+                self._transition_index[feat[len('numtransfrom_'):]] = len(self.transition_aids)
+                self.transition_aids.append(feat[len('numtransfrom_'):])
+        self.transitions = np.array([aoi_stat.features['numtransfrom_' + aid] for aid in self.transition_aids],
+                                    dtype=np.int64)
+
+        if self.isActive:
+            offset = self.starttime - sc_start
+            self.features['timetofirstfixation'] += offset
+            self.features['timetolastfixation'] += offset
+            for feat in ('timetofirstleftclic', 'timetofirstrightclic', 'timetofirstdoubleclic',
+                         'timetolastleftclic', 'timetolastrightclic', 'timetolastdoubleclic'):
+                if firstseg_aoi_stat.features[feat] != -1:
+                    self.features[feat] += offset
+
+    def add(self, aoi_stat, total_time, total_numfixations, sc_start):
+        """Folds the AOI_Stat of the AOI in another Segment of the Scene into these statistics
+
+        Args:
+            aoi_stat: an active AOI_Stat of the AOI
+
+            total_time: duration of the scene
+
+            total_numfixations: number of fixations in the scene
+
+            sc_start: start time (timestamp) of the scene
+        """
+        merge_aoi_fixations(self, aoi_stat, total_time, total_numfixations, sc_start)
+        merge_aoi_events(self, aoi_stat, total_time, sc_start)
+
+        self.total_trans_from += aoi_stat.total_trans_from
+        counts = np.zeros(len(self.transition_aids), dtype=np.int64)
+        for feat, value in aoi_stat.features.items():
+            if feat.startswith('numtransfrom_'):
+                aid = feat[len('numtransfrom_'):]
+                if aid not in self._transition_index:
+                    self._transition_index[aid] = len(self.transition_aids)
+                    self.transition_aids.append(aid)
+                    counts = np.append(counts, 0)
+                    self.transitions = np.append(self.transitions, 0)
+                counts[self._transition_index[aid]] = value
+        self.transitions += counts
+
+        merge_aoi_distance(self, aoi_stat)
+        merge_aoi_pupil(self, aoi_stat)
+
+    def set_transition_features(self):
+        """Sets the transition features ('numtransfrom_<aid>' and 'proptransfrom_<aid>') from the transition counts"""
+        if self.total_trans_from > 0:
+            proportions = (self.transitions / float(self.total_trans_from)).tolist()
+        else:
+            proportions = [0] * len(self.transition_aids)
+        for aid, count, proportion in zip(self.transition_aids, self.transitions.tolist(), proportions):
+            self.features['numtransfrom_%s' % (aid)] = count
+            self.features['proptransfrom_%s' % (aid)] = proportion
+
+
 def merge_aoistats(main_AOI_Stat,new_AOI_Stat,total_time,total_numfixations,sc_start=0):
         """a helper method that updates the AOI_Stat object of this Scene with a new AOI_Stat object
 
@@ -794,7 +943,7 @@ def merge_aoistats(main_AOI_Stat,new_AOI_Stat,total_time,total_numfixations,sc_s
         maois = main_AOI_Stat
         merge_aoi_fixations(maois, new_AOI_Stat, total_time, total_numfixations, sc_start)
         #calculating the transitions to and from this AOI and other active AOIs at the moment
-        new_AOI_Stat_transition_aois = filter(lambda x: x.startswith('numtransfrom_'), new_AOI_Stat.features.keys())
+        new_AOI_Stat_transition_aois = list(filter(lambda x: x.startswith('numtransfrom_'), new_AOI_Stat.features.keys()))
         if params.DEBUG or params.VERBOSE == "VERBOSE":
             print("Segment's transition_aois", new_AOI_Stat_transition_aois)
 
@@ -811,7 +960,7 @@ def merge_aoistats(main_AOI_Stat,new_AOI_Stat,total_time,total_numfixations,sc_s
         merge_aoi_distance(maois, new_AOI_Stat)
         merge_aoi_pupil(maois, new_AOI_Stat)
         # updating the proportion tansition features based on new transitions to and from this AOI
-        maois_transition_aois = filter(lambda x: x.startswith('numtransfrom_'),maois.features.keys()) #all the transition features for this AOI should be aupdated even if they are not active for this segment
+        maois_transition_aois = list(filter(lambda x: x.startswith('numtransfrom_'),maois.features.keys())) #all the transition features for this AOI should be aupdated even if they are not active for this segment
         for feat in maois_transition_aois:
             aid = feat[len('numtransfrom_'):]
             if maois.total_trans_from > 0:
@@ -857,9 +1006,9 @@ def merge_aoi_fixations(maois, new_AOI_Stat, total_time, total_numfixations, sc_
             maois.features['fixationrate'] = -1
 
         if new_AOI_Stat.features['timetofirstfixation'] != -1:
-            maois.features['timetofirstfixation'] = min(maois.features['timetofirstfixation'], deepcopy(new_AOI_Stat.features['timetofirstfixation']) + new_AOI_Stat.starttime - sc_start)
+            maois.features['timetofirstfixation'] = min(maois.features['timetofirstfixation'], new_AOI_Stat.features['timetofirstfixation'] + new_AOI_Stat.starttime - sc_start)
         if new_AOI_Stat.features['timetolastfixation'] != -1:
-            maois.features['timetolastfixation'] = max(maois.features['timetolastfixation'], deepcopy(new_AOI_Stat.features['timetolastfixation']) + new_AOI_Stat.starttime - sc_start)
+            maois.features['timetolastfixation'] = max(maois.features['timetolastfixation'], new_AOI_Stat.features['timetolastfixation'] + new_AOI_Stat.starttime - sc_start)
 
 
 def merge_aoi_distance(maois, new_AOI_Stat):
@@ -958,20 +1107,51 @@ def merge_aoi_events(maois, new_AOI_Stat, total_time, sc_start):
         maois.features['doubleclicrate'] = float(maois.features['numdoubleclic'])/total_time
 
         if new_AOI_Stat.features['timetofirstleftclic'] != -1:
-            maois.features['timetofirstleftclic'] = min(maois.features['timetofirstleftclic'], deepcopy(new_AOI_Stat.features['timetofirstleftclic']) + new_AOI_Stat.starttime - sc_start)
+            maois.features['timetofirstleftclic'] = min(maois.features['timetofirstleftclic'], new_AOI_Stat.features['timetofirstleftclic'] + new_AOI_Stat.starttime - sc_start)
         if new_AOI_Stat.features['timetofirstrightclic'] != -1:
-            maois.features['timetofirstrightclic'] = min(maois.features['timetofirstrightclic'], deepcopy(new_AOI_Stat.features['timetofirstrightclic']) + new_AOI_Stat.starttime - sc_start)
+            maois.features['timetofirstrightclic'] = min(maois.features['timetofirstrightclic'], new_AOI_Stat.features['timetofirstrightclic'] + new_AOI_Stat.starttime - sc_start)
         if new_AOI_Stat.features['timetofirstdoubleclic'] != -1:
-            maois.features['timetofirstdoubleclic'] = min(maois.features['timetofirstdoubleclic'], deepcopy(new_AOI_Stat.features['timetofirstdoubleclic']) + new_AOI_Stat.starttime - sc_start)
+            maois.features['timetofirstdoubleclic'] = min(maois.features['timetofirstdoubleclic'], new_AOI_Stat.features['timetofirstdoubleclic'] + new_AOI_Stat.starttime - sc_start)
 
         if new_AOI_Stat.features['timetolastleftclic'] != -1:
-            maois.features['timetolastleftclic'] = max(maois.features['timetolastleftclic'], deepcopy(new_AOI_Stat.features['timetolastleftclic']) + new_AOI_Stat.starttime - sc_start)
+            maois.features['timetolastleftclic'] = max(maois.features['timetolastleftclic'], new_AOI_Stat.features['timetolastleftclic'] + new_AOI_Stat.starttime - sc_start)
         if new_AOI_Stat.features['timetolastrightclic'] != -1:
-            maois.features['timetolastrightclic'] = max(maois.features['timetolastrightclic'], deepcopy(new_AOI_Stat.features['timetolastrightclic']) + new_AOI_Stat.starttime - sc_start)
+            maois.features['timetolastrightclic'] = max(maois.features['timetolastrightclic'], new_AOI_Stat.features['timetolastrightclic'] + new_AOI_Stat.starttime - sc_start)
         if new_AOI_Stat.features['timetolastdoubleclic'] != -1:
-            maois.features['timetolastdoubleclic'] = max(maois.features['timetolastdoubleclic'], deepcopy(new_AOI_Stat.features['timetolastdoubleclic']) + new_AOI_Stat.starttime - sc_start)
+            maois.features['timetolastdoubleclic'] = max(maois.features['timetolastdoubleclic'], new_AOI_Stat.features['timetolastdoubleclic'] + new_AOI_Stat.starttime - sc_start)
 
 
+_FEATURE_PATTERN = re.compile(r"^(\w+)(?:\[(['\"])(\w+)\2\])?$")
+_feature_accessors = {}
+
+def feature_accessor(feat):
+    """a helper method that returns a function reading a target feature from an object
+
+    The feature expression is parsed once and the accessor is memoized, so that the aggregation
+    helpers below do not evaluate the expression for every object.
+
+    Args:
+        feat: a string containing the name of the target feature, either an attribute (e.g. 'numfixations')
+            or an item of an attribute (e.g. "features['length']"). Any other expression is evaluated as 'obj.'+feat
+
+    Returns:
+        a function that takes an object and returns the value of the target feature
+    """
+    accessor = _feature_accessors.get(feat)
+    if accessor is None:
+        match = _FEATURE_PATTERN.match(feat)
+        if match is None:
+            code = compile('obj.' + feat, '<feature>', 'eval')
+            accessor = lambda obj: eval(code, globals(), {'obj': obj})
+        elif match.group(3) is None:
+            accessor = operator.attrgetter(match.group(1))
+        else:
+            attrgetter = operator.attrgetter(match.group(1))
+            key = match.group(3)
+            accessor = lambda obj: attrgetter(obj)[key]
+        _feature_accessors[feat] = accessor
+    return accessor
+
 def weightedmeanfeat(obj_list, totalfeat,ratefeat):
     """a helper method that calculates the weighted average of a target feature over a list of Segments
 
@@ -987,10 +1167,12 @@ def weightedmeanfeat(obj_list, totalfeat,ratefeat):
     """
     num_valid = float(0)
     num = 0
+    get_total = feature_accessor(totalfeat)
+    get_rate = feature_accessor(ratefeat)
 
     for obj in obj_list:
-        t = eval('obj.'+totalfeat)
-        num_valid += t * eval('obj.'+ratefeat)
+        t = get_total(obj)
+        num_valid += t * get_rate(obj)
         num += t
     if num != 0:
         return num_valid / num
@@ -1011,13 +1193,16 @@ def aggregatestddevfeat(obj_list, totalfeat, sdfeat, meanfeat, meanscene):
     """
     num = float(0)
     den = float(0)
+    get_total = feature_accessor(totalfeat)
+    get_sd = feature_accessor(sdfeat)
+    get_mean = feature_accessor(meanfeat)
 
     for obj in obj_list:
-        t = eval('obj.'+totalfeat)
+        t = get_total(obj)
         if t > 0:
-            sd = eval('obj.'+sdfeat)
+            sd = get_sd(obj)
             if math.isnan(sd): sd = 0
-            meanobj = eval('obj.'+meanfeat)
+            meanobj = get_mean(obj)
 
             num += (t-1) * sd**2 + t * (meanobj-meanscene)**2
             den += t
@@ -1026,6 +1211,36 @@ def aggregatestddevfeat(obj_list, totalfeat, sdfeat, meanfeat, meanscene):
         return math.sqrt(float(num)/(den-1))
     return 0
 
+def accumulatedmean(accumulator):
+    """a helper method that returns the mean of the values merged in a StatAccumulator
+
+    Gives the same value as weightedmeanfeat over the "Segment"s whose accumulators were merged.
+
+    Args:
+        accumulator: a StatAccumulator (e.g. one of the merged accumulators of a Scene)
+
+    Returns:
+        the mean of the values, or 0 if there is no value
+    """
+    if accumulator.count == 0:
+        return 0
+    return accumulator.mean
+
+def accumulatedstddev(accumulator):
+    """a helper method that returns the standard deviation of the values merged in a StatAccumulator
+
+    Gives the same value as aggregatestddevfeat over the "Segment"s whose accumulators were merged.
+
+    Args:
+        accumulator: a StatAccumulator (e.g. one of the merged accumulators of a Scene)
+
+    Returns:
+        the standard deviation of the values, or 0 if there are less than two values
+    """
+    if accumulator.count > 1:
+        return accumulator.stddev()
+    return 0
+
 def sumfeat(obj_list, feat):
     """a helper method that calculates the sum of a target feature over a list of objects
 
@@ -1039,8 +1254,9 @@ def sumfeat(obj_list, feat):
         the sum of the target feature over the given list of objects
     """
     sum = 0
+    get_feat = feature_accessor(feat)
     for obj in obj_list:
-        sum += eval('obj.'+feat)
+        sum += get_feat(obj)
     return sum
 
 def minfeat(obj_list, feat, nonevalue = None):
@@ -1058,8 +1274,9 @@ def minfeat(obj_list, feat, nonevalue = None):
         the min of the target feature over the given list of objects
     """
     min = float('+infinity')
+    get_feat = feature_accessor(feat)
     for obj in obj_list:
-        val = eval('obj.'+feat)
+        val = get_feat(obj)
         if min > val and val != nonevalue:
             min = val
     return min
@@ -1077,8 +1294,9 @@ def maxfeat(obj_list, feat):
         the max of the target feature over the given list of objects
     """
     max = float('-infinity')
+    get_feat = feature_accessor(feat)
     for obj in obj_list:
-        val = eval('obj.'+feat)
+        val = get_feat(obj)
         if max < val:
             max = val
     return max
@@ -1096,6 +1314,7 @@ def mergevalues(obj_list, field):
         a list formed by merging corresponding lists from collection of subjects
     """
     mergedlist = []
+    get_field = feature_accessor(field)
     for obj in obj_list:
-        mergedlist.extend(eval('obj.'+ field))
+        mergedlist.extend(get_field(obj))
     return mergedlist
@@ -11,6 +11,12 @@ Institution: The University of British Columbia.
 
 import params
 from EMDAT_core import geometry
+from EMDAT_core import vectorized
+import numpy as np
+from EMDAT_core.data_structures import SampleTable
+from EMDAT_core import instrumentation
+from EMDAT_core.accumulators import StatAccumulator
+from EMDAT_core.feature_selection import ALL_FEATURES
 from EMDAT_core.AOI import *
 from warnings import warn
 from math import isnan
@@ -52,8 +58,13 @@ class Segment():
         fixation_end: timestamp of the last entry from list of "Fixation"s for this Segment
         aoi_data: A list of AOI_Stat objects for relevant "AOI"s for this Segment
         has_aois: A boolean indicating if this Segment has AOI features calculated for it
+        accumulators: a dictionary with a StatAccumulator for each signal of this Segment (e.g. 'pupilsize',
+            'fixationduration'), used to merge statistics over groups of "Segment"s
+        feature_selection: the FeatureSelection of the groups of features computed for this Segment
     """
-    def __init__(self, segid, all_data, fixation_data, saccade_data = None, event_data = None, aois = None, prune_length = None, rest_pupil_size = 0, export_pupilinfo = False):
+    @instrumentation.timed("segment_build")
+    def __init__(self, segid, all_data, fixation_data, saccade_data = None, event_data = None, aois = None, prune_length = None, rest_pupil_size = 0, export_pupilinfo = False,
+                 feature_selection = None):
         """
         Args:
             segid: A string containing the id of the Segment.
@@ -66,6 +77,9 @@ class Segment():
 
             event_data: a list of "Event"s which make up this Segment (None if no events).
 
+            The data streams are usually slices of the streams of a Recording: SampleTable slices and
+            "RecordingView"s, which share the data of the Recording instead of copying it.
+
             aois: a list of "AOI"s relevant to this Segment.
 
             prune_length: If not None, an integer that specifies the time interval (in ms) from the beginning of each segment in which
@@ -77,28 +91,37 @@ class Segment():
 
             export_pupilinfo: True to export raw pupil data in EMDAT output (False by default).
 
+            feature_selection: If not None, a FeatureSelection: the calculators of the groups of features
+                it does not need are skipped (see EMDAT_core/feature_selection.py). By default all the
+                features are computed.
+
         Yields:
             a Segment object
         """
         self.segid = segid
+        if feature_selection is None:
+            feature_selection = ALL_FEATURES
+        self.feature_selection = feature_selection
         #self.all_data = all_data
         #self.fixation_data = fixation_data
         #self.saccade_data = saccade_data
         #self.event_data = event_data
         self.features = {}
+        self.accumulators = {}
         self.pupilinfo_for_export = {}
 
         """ If prune_length specified, keep only data from start to start + prune_length
             of the segment
         """
         if prune_length:
-            all_data = filter(lambda x: x.timestamp <= self.start + prune_length, all_data)
-            fixation_data = filter(lambda x: x.timestamp <= self.start + prune_length, fixation_data)
+            all_data = list(filter(lambda x: x.timestamp <= self.start + prune_length, all_data))
+            fixation_data = list(filter(lambda x: x.timestamp <= self.start + prune_length, fixation_data))
             if event_data != None:
-                event_data = filter(lambda x: x.timestamp <= self.start + prune_length, event_data)
+                event_data = list(filter(lambda x: x.timestamp <= self.start + prune_length, event_data))
             if saccade_data != None:
-                saccade_data = filter(lambda x: x.timestamp <= self.start + prune_length, saccade_data)
+                saccade_data = list(filter(lambda x: x.timestamp <= self.start + prune_length, saccade_data))
                 
+        self.use_arrays = isinstance(all_data, SampleTable)
         self.completion_time = all_data[-1].timestamp - all_data[0].timestamp
         if self.completion_time == 0:
             raise Exception("Zero length segment")
@@ -128,30 +151,49 @@ class Segment():
         self.numfixations = len(fixation_data)
         self.features['numfixations'] = self.numfixations
         self.features['fixationrate'] = float(self.numfixations) / (self.length - self.length_invalid)
+        if self.numfixations > 0:
+            self.fixation_start = fixation_data[0].timestamp
+            self.fixation_end = fixation_data[-1].timestamp
+        else:
+            self.fixation_start = -1
+            self.fixation_end = -1
 
         """ calculate blink features (no rest pupil size adjustments yet)"""
-        self.calc_blink_features(all_data)
+        if feature_selection.needs('blink'):
+            self.calc_blink_features(all_data)
 
         """ calculate pupil dilation features (no rest pupil size adjustments yet)"""
-        self.calc_pupil_features(all_data, export_pupilinfo, rest_pupil_size)
+        if feature_selection.needs('pupil'):
+            self.calc_pupil_features(all_data, export_pupilinfo, rest_pupil_size)
 
         """ calculate distance from screen features"""
-        self.calc_distance_features(all_data)
+        if feature_selection.needs('distance'):
+            self.calc_distance_features(all_data)
 
         """ calculate fixations, angles and path features"""
-        self.calc_fix_ang_path_features(fixation_data)
+        if feature_selection.needs('path'):
+            self.calc_fix_ang_path_features(fixation_data)
 
         """ calculate saccades features if available """
-        self.calc_saccade_features(saccade_data)
+        if feature_selection.needs('saccade'):
+            self.calc_saccade_features(saccade_data)
 
         """ calculate event features if available """
-        self.calc_event_features(event_data)
+        if feature_selection.needs('event'):
+            self.calc_event_features(event_data)
 
         """ calculate AOIs features """
         self.has_aois = False
-        if aois:
-            self.set_aois(aois, all_data, fixation_data, event_data, rest_pupil_size, export_pupilinfo)
-            self.features['aoisequence'] = self.generate_aoi_sequence(fixation_data, aois)
+        if aois and (feature_selection.needs('aoi') or feature_selection.needs('aoisequence')):
+            # AOI membership of the fixations, from the labels of the recording if available
+            classifier = getattr(all_data, 'aoi_classifier', None)
+            fixation_membership = None
+            if classifier is not None:
+                fixation_membership = classifier.fixation_membership(fixation_data, aois)
+            if feature_selection.needs('aoi'):
+                self.set_aois(aois, all_data, fixation_data, event_data, rest_pupil_size, export_pupilinfo, fixation_membership)
+            if feature_selection.needs('aoisequence'):
+                self.features['aoisequence'] = self.generate_aoi_sequence(fixation_data, aois, fixation_membership)
 
 
     def set_indices(self,sample_st,sample_end,fix_st,fix_end,sac_st=None,sac_end=None,event_st=None,event_end=None):
@@ -198,7 +240,7 @@ class Segment():
         raise Exception ('The indices values are accessed before setting the initial value in segement:'+self.segid+'!')
 
 
-    def set_aois(self, aois, all_data, fixation_data, event_data = None, rest_pupil_size = 0, export_pupilinfo = False):
+    def set_aois(self, aois, all_data, fixation_data, event_data = None, rest_pupil_size = 0, export_pupilinfo = False, fixation_membership = None):
         """Sets the relevant "AOI"s for this Segment
 
         Args:
@@ -206,6 +248,7 @@ class Segment():
             fixation_data: The list of "Fixation"s which make up this Segment
             aois: a list of "AOI"s relevant to this Segment
             rest_pupil_size:
+            fixation_membership: if not None, the FixationMembership of fixation_data in aois
         """
 
         if len(aois) == 0:
@@ -215,7 +258,8 @@ class Segment():
         for aoi in aois:
             #print "checking:",aoi.aid
             print("Generating features for %s AOI in segment %s" % (aoi.aid, self.segid))
-            aoistat = AOI_Stat(aoi, all_data, fixation_data, self.start, self.end, self.length_invalid, aois, event_data, rest_pupil_size, export_pupilinfo)
+            aoistat = AOI_Stat(aoi, all_data, fixation_data, self.start, self.end, self.length_invalid, aois, event_data, rest_pupil_size, export_pupilinfo, fixation_membership,
+                               self.feature_selection)
             self.aoi_data[aoi.aid] = aoistat
 
             act, _ = aoi.is_active_partition(self.fixation_start, self.fixation_end)
@@ -227,6 +271,7 @@ class Segment():
             msg = "No active AOIs passed to segment:%s start:%d end:%d" %(self.segid,self.start,self.end)
             warn(msg)
 
+    @instrumentation.timed("blink_features")
     def calc_blink_features(self, all_data):
         """ Calculates blink features such as
                 blink_num:                 number of blinks on the in the segment
@@ -258,6 +303,9 @@ class Segment():
         self.features['blinktimedistancemin']   = -1
         self.features['blinktimedistancemax']   = -1
         lower_bound, upper_bould = params.blink_threshold
+        if isinstance(all_data, SampleTable):
+            self.calc_blink_features_vectorized(all_data)
+            return
         ### File operations are for testing
         #file = open('outputfolder/blinks/blinks_%s.txt' % all_data[0].participant_name, 'w
         blinks_validity_gaps = self.calc_blink_validity_gaps(all_data)
@@ -282,6 +330,8 @@ class Segment():
                     last_blink_detected = i
 
         #file.close()
+        self.accumulators['blinkduration']      = StatAccumulator.from_values(blink_durations)
+        self.accumulators['blinktimedistance']  = StatAccumulator.from_values(blink_intervals)
         if len(blink_durations) > 0:
             self.features['blinknum']               = len(blink_durations)
             self.features['blinkdurationtotal']     = sum(blink_durations)
@@ -296,7 +346,35 @@ class Segment():
             self.features['blinktimedistancemin']   = min(blink_intervals)
             self.features['blinktimedistancemax']   = max(blink_intervals)
 
+    def calc_blink_features_vectorized(self, all_data):
+        """ Calculates the blink features (see calc_blink_features) from the arrays of a SampleTable
 
+            Args:
+                all_data: The SampleTable of "Datapoint"s which make up this Segment
+        """
+        if params.EYETRACKERTYPE == "SMI":
+            blink_durations, blink_intervals = vectorized.blink_durations_intervals(all_data)
+        else:
+            blink_durations, blink_intervals = vectorized.blink_durations_intervals(all_data, params.blink_threshold)
+
+        self.accumulators['blinkduration']      = StatAccumulator.from_values(blink_durations)
+        self.accumulators['blinktimedistance']  = StatAccumulator.from_values(blink_intervals)
+        if len(blink_durations) > 0:
+            self.features['blinknum']               = len(blink_durations)
+            self.features['blinkdurationtotal']     = vectorized.array_sum(blink_durations)
+            self.features['blinkdurationmean']      = vectorized.array_mean(blink_durations)
+            self.features['blinkdurationstd']       = vectorized.array_stddev(blink_durations)
+            self.features['blinkdurationmin']       = blink_durations.min().item()
+            self.features['blinkdurationmax']       = blink_durations.max().item()
+            self.features['blinkrate']              = float(self.features['blinknum']) / (self.length - self.length_invalid)
+        if len(blink_intervals) > 0:
+            self.features['blinktimedistancemean']  = vectorized.array_mean(blink_intervals)
+            self.features['blinktimedistancestd']   = vectorized.array_stddev(blink_intervals)
+            self.features['blinktimedistancemin']   = blink_intervals.min().item()
+            self.features['blinktimedistancemax']   = blink_intervals.max().item()
+
+
+    @instrumentation.timed("pupil_features")
     def calc_pupil_features(self, all_data, export_pupilinfo, rest_pupil_size):
         """ Calculates pupil features such as
                 mean_pupil_size:            mean of pupil sizes
@@ -312,19 +390,26 @@ class Segment():
                 all_data: The list of "Datapoint"s which make up this Segment
         """
         # check if pupil sizes are available for all missing points
-        pupil_invalid_data = filter(lambda x: x.pupilsize == -1 and x.gazepointx > 0, all_data)
-        if len(pupil_invalid_data) > 0:
+        if isinstance(all_data, SampleTable):
+            num_pupil_invalid = vectorized.count_where(lambda: (all_data.pupilsize == -1) & (all_data.gazepointx > 0))
+        else:
+            num_pupil_invalid = len(list(filter(lambda x: x.pupilsize == -1 and x.gazepointx > 0, all_data)))
+        if num_pupil_invalid > 0:
             if params.DEBUG:
                 raise Exception("Pupil size is unavailable for a valid data sample. \
-                        Number of missing points: " + str(len(pupil_invalid_data)))
+                        Number of missing points: " + str(num_pupil_invalid))
             else:
-                warn("Pupil size is unavailable for a valid data sample. Number of missing points: " + str(len(pupil_invalid_data)) )
+                warn("Pupil size is unavailable for a valid data sample. Number of missing points: " + str(num_pupil_invalid) )
+
+        if isinstance(all_data, SampleTable):
+            self.calc_pupil_features_vectorized(all_data, export_pupilinfo, rest_pupil_size)
+            return
 
 		#get all pupil sizes (valid + invalid)
         #pupilsizes = map(lambda x: x.pupilsize, all_data)
         #get all datapoints where pupil size is available
-        valid_pupil_data = filter(lambda x: x.pupilsize > 0, all_data)
-        valid_pupil_velocity = filter(lambda x: x.pupilvelocity != -1, all_data)
+        valid_pupil_data = list(filter(lambda x: x.pupilsize > 0, all_data))
+        valid_pupil_velocity = list(filter(lambda x: x.pupilvelocity != -1, all_data))
 
         #number of valid pupil sizes
         self.features['meanpupilsize']       = -1
@@ -339,19 +424,22 @@ class Segment():
         self.features['minpupilvelocity']    = -1
         self.numpupilsizes                   = len(valid_pupil_data)
         self.numpupilvelocity                = len(valid_pupil_velocity)
+        self.accumulators['pupilsize']       = StatAccumulator()
+        self.accumulators['pupilvelocity']   = StatAccumulator.from_values([x.pupilvelocity for x in valid_pupil_velocity])
 
         if self.numpupilsizes > 0: #check if the current segment has pupil data available
             if params.PUPIL_ADJUSTMENT == "rpscenter":
-                adjvalidpupilsizes = map(lambda x: x.pupilsize - rest_pupil_size, valid_pupil_data)
+                adjvalidpupilsizes = list(map(lambda x: x.pupilsize - rest_pupil_size, valid_pupil_data))
             elif params.PUPIL_ADJUSTMENT == "PCPS":
-                adjvalidpupilsizes = map(lambda x: (x.pupilsize - rest_pupil_size) / (1.0 * rest_pupil_size), valid_pupil_data)
+                adjvalidpupilsizes = list(map(lambda x: (x.pupilsize - rest_pupil_size) / (1.0 * rest_pupil_size), valid_pupil_data))
             else:
-                adjvalidpupilsizes = map(lambda x: x.pupilsize, valid_pupil_data)#valid_pupil_data
+                adjvalidpupilsizes = list(map(lambda x: x.pupilsize, valid_pupil_data))#valid_pupil_data
 
-            valid_pupil_velocity = map(lambda x: x.pupilvelocity, valid_pupil_velocity)#valid_pupil_data
+            valid_pupil_velocity = list(map(lambda x: x.pupilvelocity, valid_pupil_velocity))#valid_pupil_data
 
             if export_pupilinfo:
-                self.pupilinfo_for_export = map(lambda x: [x.timestamp, x.pupilsize, rest_pupil_size], valid_pupil_data)
+                self.pupilinfo_for_export = list(map(lambda x: [x.timestamp, x.pupilsize, rest_pupil_size], valid_pupil_data))
+            self.accumulators['pupilsize']           = StatAccumulator.from_values(adjvalidpupilsizes)
             self.features['meanpupilsize']           = mean(adjvalidpupilsizes)
             self.features['stddevpupilsize']         = stddev(adjvalidpupilsizes)
             self.features['maxpupilsize']            = max(adjvalidpupilsizes)
@@ -367,6 +455,36 @@ class Segment():
         else:
             warn("No valid pupil data!!")
 
+    def calc_pupil_features_vectorized(self, all_data, export_pupilinfo, rest_pupil_size):
+        """ Calculates the pupil features (see calc_pupil_features) from the arrays of a SampleTable
+
+            Args:
+                all_data: The SampleTable of "Datapoint"s which make up this Segment
+        """
+        self.features['meanpupilsize']       = -1
+        self.features['stddevpupilsize']     = -1
+        self.features['maxpupilsize']        = -1
+        self.features['minpupilsize']        = -1
+        self.features['startpupilsize']      = -1
+        self.features['endpupilsize']        = -1
+        self.features['meanpupilvelocity']   = -1
+        self.features['stddevpupilvelocity'] = -1
+        self.features['maxpupilvelocity']    = -1
+        self.features['minpupilvelocity']    = -1
+
+        features, adjvalidpupilsizes, valid_pupil_velocity, pupilinfo = vectorized.pupil_features(
+            all_data, rest_pupil_size, params.PUPIL_ADJUSTMENT, export_pupilinfo)
+        self.numpupilsizes = len(adjvalidpupilsizes)
+        self.numpupilvelocity = len(valid_pupil_velocity)
+        self.accumulators['pupilsize'] = StatAccumulator.from_values(adjvalidpupilsizes)
+        self.accumulators['pupilvelocity'] = StatAccumulator.from_values(valid_pupil_velocity)
+        self.features.update(features)
+        if pupilinfo is not None:
+            self.pupilinfo_for_export = pupilinfo
+        if self.numpupilsizes == 0:
+            warn("No valid pupil data!!")
+
+    @instrumentation.timed("distance_features")
     def calc_distance_features(self, all_data):
         """ Calculates distance features such as
                 mean_distance:            mean of distances from the screen
@@ -380,33 +498,44 @@ class Segment():
                 all_data: The list of "Datapoint"s which make up this Segment
         """
         # check if distances are available for all missing points
-        invalid_distance_data = filter(lambda x: x.distance <= 0 and x.gazepointx >= 0, all_data)
-        if len(invalid_distance_data) > 0:
+        if isinstance(all_data, SampleTable):
+            num_distance_invalid = vectorized.count_where(lambda: (all_data.distance <= 0) & (all_data.gazepointx >= 0))
+        else:
+            num_distance_invalid = len(list(filter(lambda x: x.distance <= 0 and x.gazepointx >= 0, all_data)))
+        if num_distance_invalid > 0:
             warn("Distance from screen is unavailable for a valid data sample. \
-                        Number of missing points: " + str(len(invalid_distance_data)))
+                        Number of missing points: " + str(num_distance_invalid))
+
+        self.features['meandistance']       = -1
+        self.features['stddevdistance']     = -1
+        self.features['maxdistance']        = -1
+        self.features['mindistance']        = -1
+        self.features['startdistance']      = -1
+        self.features['enddistance']        = -1
+
+        if isinstance(all_data, SampleTable):
+            features, distances_from_screen = vectorized.distance_features(all_data)
+            self.numdistancedata = len(distances_from_screen)
+            self.accumulators['distance'] = StatAccumulator.from_values(distances_from_screen)
+            self.features.update(features)
+            return
 
         #get all datapoints where distance is available
-        valid_distance_data = filter(lambda x: x.distance > 0, all_data)
+        distances_from_screen = list(map(lambda x: x.distance, filter(lambda x: x.distance > 0, all_data)))
 
         #number of valid distance datapoints
-        self.numdistancedata = len(valid_distance_data)
+        self.numdistancedata = len(distances_from_screen)
+        self.accumulators['distance'] = StatAccumulator.from_values(distances_from_screen)
         if self.numdistancedata > 0: #check if the current segment has pupil data available
-            distances_from_screen               = map(lambda x: x.distance, valid_distance_data)
             self.features['meandistance']       = mean(distances_from_screen)
             self.features['stddevdistance']     = stddev(distances_from_screen)
             self.features['maxdistance']        = max(distances_from_screen)
             self.features['mindistance']        = min(distances_from_screen)
             self.features['startdistance']      = distances_from_screen[0]
             self.features['enddistance']        = distances_from_screen[-1]
-        else:
-            self.features['meandistance']       = -1
-            self.features['stddevdistance']     = -1
-            self.features['maxdistance']        = -1
-            self.features['mindistance']        = -1
-            self.features['startdistance']      = -1
-            self.features['enddistance']        = -1
 
 
+    @instrumentation.timed("saccade_features")
     def calc_saccade_features(self, saccade_data):
         """ Calculates saccade features such as
                 numsaccades:              number of saccades in the segment
@@ -430,18 +559,21 @@ class Segment():
             self.numsaccades = len(saccade_data)
             self.features['numsaccades'] = self.numsaccades
             self.features['sumsaccadedistance'] = sum(map(lambda x: float(x.saccadedistance), saccade_data))
-            self.features['meansaccadedistance'] = mean(map(lambda x: float(x.saccadedistance), saccade_data))
-            self.features['stddevsaccadedistance'] = stddev(map(lambda x: float(x.saccadedistance), saccade_data))
+            self.features['meansaccadedistance'] = mean(list(map(lambda x: float(x.saccadedistance), saccade_data)))
+            self.features['stddevsaccadedistance'] = stddev(list(map(lambda x: float(x.saccadedistance), saccade_data)))
             self.features['longestsaccadedistance'] = max(map(lambda x: float(x.saccadedistance), saccade_data))
             self.features['sumsaccadeduration'] = sum(map(lambda x: float(x.saccadeduration), saccade_data))
-            self.features['meansaccadeduration'] = mean(map(lambda x: float(x.saccadeduration), saccade_data))
-            self.features['stddevsaccadeduration'] = stddev(map(lambda x: float(x.saccadeduration), saccade_data))
+            self.features['meansaccadeduration'] = mean(list(map(lambda x: float(x.saccadeduration), saccade_data)))
+            self.features['stddevsaccadeduration'] = stddev(list(map(lambda x: float(x.saccadeduration), saccade_data)))
             self.features['longestsaccadeduration'] = max(map(lambda x: float(x.saccadeduration), saccade_data))
-            self.features['meansaccadespeed'] = mean(map(lambda x: float(x.saccadespeed), saccade_data))
-            self.features['stddevsaccadespeed'] = stddev(map(lambda x: float(x.saccadespeed), saccade_data))
+            self.features['meansaccadespeed'] = mean(list(map(lambda x: float(x.saccadespeed), saccade_data)))
+            self.features['stddevsaccadespeed'] = stddev(list(map(lambda x: float(x.saccadespeed), saccade_data)))
             self.features['maxsaccadespeed'] = max(map(lambda x: float(x.saccadespeed), saccade_data))
             self.features['minsaccadespeed'] = min(map(lambda x: float(x.saccadespeed), saccade_data))
             self.features['fixationsaccadetimeratio'] = float(self.features['sumfixationduration']) / self.features['sumsaccadeduration']
+            self.accumulators['saccadedistance'] = StatAccumulator.from_values([float(x.saccadedistance) for x in saccade_data])
+            self.accumulators['saccadeduration'] = StatAccumulator.from_values([float(x.saccadeduration) for x in saccade_data])
+            self.accumulators['saccadespeed'] = StatAccumulator.from_values([float(x.saccadespeed) for x in saccade_data])
         else:
             self.numsaccades = 0
             self.features['numsaccades'] = 0
@@ -458,8 +590,12 @@ class Segment():
             self.features['maxsaccadespeed'] = -1
             self.features['minsaccadespeed'] = -1
             self.features['fixationsaccadetimeratio'] = -1
+            self.accumulators['saccadedistance'] = StatAccumulator()
+            self.accumulators['saccadeduration'] = StatAccumulator()
+            self.accumulators['saccadespeed'] = StatAccumulator()
 
 
+    @instrumentation.timed("path_features")
     def calc_fix_ang_path_features(self, fixation_data):
         """ Calculates fixation, angle and path features such as
                 meanfixationduration:     mean duration of fixations in the segment
@@ -479,18 +615,17 @@ class Segment():
                 saccade_data: The list of saccade datapoints for this Segment
         """
         if self.numfixations > 0:
-            self.fixation_start = fixation_data[0].timestamp
-            self.fixation_end = fixation_data[-1].timestamp
-            self.features['meanfixationduration'] = mean(map(lambda x: float(x.fixationduration), fixation_data))
-            self.features['stddevfixationduration'] = stddev(map(lambda x: float(x.fixationduration), fixation_data))
+            self.features['meanfixationduration'] = mean(list(map(lambda x: float(x.fixationduration), fixation_data)))
+            self.features['stddevfixationduration'] = stddev(list(map(lambda x: float(x.fixationduration), fixation_data)))
             self.features['sumfixationduration'] = sum(map(lambda x: x.fixationduration, fixation_data))
             self.features['fixationrate'] = float(self.numfixations) / (self.length - self.length_invalid)
-            distances = self.calc_distances(fixation_data)
-            abs_angles = self.calc_abs_angles(fixation_data)
-            rel_angles = self.calc_rel_angles(fixation_data)
+            if self.use_arrays:
+                distances, abs_angles, rel_angles = vectorized.path_features(fixation_data)
+            else:
+                distances = self.calc_distances(fixation_data)
+                abs_angles = self.calc_abs_angles(fixation_data)
+                rel_angles = self.calc_rel_angles(fixation_data)
         else:
-            self.fixation_start = -1
-            self.fixation_end = -1
             self.features['meanfixationduration'] = -1
             self.features['stddevfixationduration'] = -1
             self.features['sumfixationduration'] = -1
@@ -499,7 +634,24 @@ class Segment():
         self.numfixdistances = len(distances)
         self.numabsangles = len(abs_angles)
         self.numrelangles = len(rel_angles)
-        if len(distances) > 0:
+        self.accumulators['fixationduration'] = StatAccumulator.from_values([x.fixationduration for x in fixation_data])
+        self.accumulators['pathdistance'] = StatAccumulator.from_values(distances)
+        self.accumulators['abspathangles'] = StatAccumulator.from_values(abs_angles)
+        self.accumulators['relpathangles'] = StatAccumulator.from_values(rel_angles)
+        if len(distances) > 0 and self.use_arrays:
+            self.features['meanpathdistance'] = vectorized.array_mean(distances)
+            self.features['sumpathdistance'] = vectorized.array_sum(distances)
+            self.features['stddevpathdistance'] = vectorized.array_stddev(distances)
+            self.features['eyemovementvelocity'] = self.features['sumpathdistance']/(self.length - self.length_invalid)
+            self.features['sumabspathangles'] = vectorized.array_sum(abs_angles)
+            self.features['abspathanglesrate'] = vectorized.array_sum(abs_angles)/(self.length - self.length_invalid)
+            self.features['meanabspathangles'] = vectorized.array_mean(abs_angles)
+            self.features['stddevabspathangles'] = vectorized.array_stddev(abs_angles)
+            self.features['sumrelpathangles'] = vectorized.array_sum(rel_angles)
+            self.features['relpathanglesrate'] = vectorized.array_sum(rel_angles)/(self.length - self.length_invalid)
+            self.features['meanrelpathangles'] = vectorized.array_mean(rel_angles)
+            self.features['stddevrelpathangles'] = vectorized.array_stddev(rel_angles)
+        elif len(distances) > 0:
             self.features['meanpathdistance'] = mean(distances)
             self.features['sumpathdistance'] = sum(distances)
             self.features['stddevpathdistance'] = stddev(distances)
@@ -527,6 +679,7 @@ class Segment():
             self.features['stddevrelpathangles'] = -1
 
 
+    @instrumentation.timed("event_features")
     def calc_event_features(self, event_data):
         """ Calculates event features such as
                 numevents:                number of events in the segment
@@ -587,6 +740,8 @@ class Segment():
         Returns:
             A float indicating the proportion of valid samples over all the samples in this Segment
         """
+        if isinstance(all_data, SampleTable):
+            return vectorized.validity_proportion(all_data)
         num_valid = float(0)
         num = 0
 
@@ -618,6 +773,9 @@ class Segment():
             return all_data[-1].timestamp - all_data[0].timestamp
         self.time_gaps = []
         self.all_invalid_gaps = []
+        if isinstance(all_data, SampleTable):
+            max_size, self.time_gaps = vectorized.largest_validity_gap(all_data, params.MAX_SEG_TIMEGAP)
+            return max_size
         max_size = 0
         dindex = 0
         datalen = len(all_data)
@@ -649,6 +807,8 @@ class Segment():
             An array for tuples (int, int) indicating beginning and end timestamps for each contiguous invalid group of rows
         """
 
+        if isinstance(all_data, SampleTable):
+            return vectorized.blink_validity_gaps(all_data)
         blinks_validity_gaps = []
         dindex = 0
         datalen = len(all_data)
@@ -709,6 +869,8 @@ class Segment():
         """
         if self.numfixations == 0:
             return 0.0
+        if isinstance(all_data, SampleTable):
+            return vectorized.validity_proportion(all_data, include_fixations=True)
         num_valid = float(0)
         num = 0
 
@@ -768,7 +930,7 @@ class Segment():
         lastx = fixdata[0].mappedfixationpointx
         lasty = fixdata[0].mappedfixationpointy
 
-        for i in xrange(1, len(fixdata)):
+        for i in range(1, len(fixdata)):
             x = fixdata[i].mappedfixationpointx
             y = fixdata[i].mappedfixationpointy
             dist = math.sqrt((x - lastx)**2 + (y - lasty)**2)
@@ -793,7 +955,7 @@ class Segment():
         lastx = fixdata[0].mappedfixationpointx
         lasty = fixdata[0].mappedfixationpointy
 
-        for i in xrange(1,len(fixdata)):
+        for i in range(1,len(fixdata)):
             x = fixdata[i].mappedfixationpointx
             y = fixdata[i].mappedfixationpointy
             (dist, theta) = geometry.vector_difference((lastx,lasty), (x, y))
@@ -820,7 +982,7 @@ class Segment():
         lastx = fixdata[0].mappedfixationpointx
         lasty = fixdata[0].mappedfixationpointy
 
-        for i in xrange(1, len(fixdata) - 1):
+        for i in range(1, len(fixdata) - 1):
             x = fixdata[i].mappedfixationpointx
             y = fixdata[i].mappedfixationpointy
             nextx = fixdata[i + 1].mappedfixationpointx
@@ -857,20 +1019,31 @@ class Segment():
             An integer determining the number of samples in the Segment
 
         """
+        if isinstance(all_data, SampleTable):
+            return vectorized.count_samples(all_data)
         num = 0
         for d in all_data:
             if d.stimuliname != '':
                 num += 1
         return num
 
-    def generate_aoi_sequence(self, fixdata, aois):
+    def generate_aoi_sequence(self, fixdata, aois, fixation_membership=None):
         """returns the sequence of AOI's where "Fixation"s occurred
         Args:
             fixdata: a list of "Fixation"s
+            aois: a list of "AOI"s
+            fixation_membership: if not None, the FixationMembership of fixdata in aois
         Returns:
             a list of AOI names that correspond to the sequence of "Fixation" locations
         """
         sequence = []
+        if fixation_membership is not None:
+            for i, j in zip(*np.nonzero(fixation_membership.table)):
+                fix = fixdata[i]
+                aoi = aois[j]
+                if aoi.is_active(fix.timestamp, fix.timestamp):
+                    sequence.append(aoi.aid)
+            return sequence
         for fix in fixdata:
             for aoi in aois:
                 if _fixation_inside_aoi(fix, aoi.polyin, aoi.polyout) and aoi.is_active(fix.timestamp, fix.timestamp) :
@@ -906,7 +1079,7 @@ class Segment():
         if featurelist == []:
             featnames = []
         elif not featurelist:       #include all features
-            featnames = self.features.keys()
+            featnames = list(self.features.keys())
         else:                       #a list of features was given
             featnames = []
             for name in featurelist:
@@ -917,15 +1090,15 @@ class Segment():
 
         featnames.sort()
 
-        featvals = map(lambda x: self.features[x], featnames)
+        featvals = list(map(lambda x: self.features[x], featnames))
 
         if self.has_aois:
-            for aid, aoi in self.aoi_data.iteritems():
+            for aid, aoi in self.aoi_data.items():
                 if aoifeaturelabels:    #an exact list of aoifeatures was given
                     anames, avals = aoi.get_features()
-                    anames = map(lambda x: '%s_%s'%(aid, x), anames)
+                    anames = list(map(lambda x: '%s_%s'%(aid, x), anames))
                     featval = zip(anames,avals)
-                    newfeatval = filter(lambda x: x[0] in aoifeaturelabels,featval)
+                    newfeatval = list(filter(lambda x: x[0] in aoifeaturelabels,featval))
                     anames = []
                     avals = []
                     for fn,fv in newfeatval:
@@ -936,7 +1109,7 @@ class Segment():
                         featvals += avals
                 else:                   #a list of features for each AIO was given
                     anames, avals = aoi.get_features(aoifeaturelist)
-                    anames = map(lambda x: '%s_%s'%(aid, x), anames)
+                    anames = list(map(lambda x: '%s_%s'%(aid, x), anames))
 
                     featnames += anames
                     featvals += avals
@@ -958,6 +1131,6 @@ class Segment():
 #        featurelist.extend(["meanpathdistance","sumpathdistance","stddevpathdistance","sumabspathangles","meanabspathangles","stddevabspathangles","sumrelpathangles","meanrelpathangles","stddevrelpathangles"])
 
         fn,fv = self.get_features()
-        for i in xrange(len(fn)):
+        for i in range(len(fn)):
             print(fn[i],':',fv[i])
         print
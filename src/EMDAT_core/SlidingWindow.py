@@ -0,0 +1,699 @@
+"""
+UBC Eye Movement Data Analysis Toolkit (EMDAT), Version 3
+
+Sliding-window segmentation: the general features of overlapping windows of fixed length that slide
+over each Scene by a fixed stride, as a time series.
+
+A window from start to end holds the same samples, "Fixation"s, "Saccade"s and "Event"s as a Segment
+from start to end (as selected by utils.get_chunk, including params.INCLUDE_HALF_FIXATIONS), and its
+features are the general features that Segment would have. They are updated incrementally as the
+window slides: the statistics of each signal are kept in a SlidingAccumulator, to which the records
+that enter the window are added and from which the records that leave it are removed, so that each
+record is added and removed once whatever the overlap between windows. The values that involve
+consecutive records (path distances and angles, blinks and the time between them, invalid gaps,
+double clicks) are precomputed once for the whole span, and only the ones that lie entirely inside a
+window are counted in it, except at the edges of the window, which are clipped as Segment clips them.
+
+Institution: The University of British Columbia.
+"""
+
+from bisect import bisect_left, bisect_right
+import math
+import params
+from EMDAT_core import geometry
+from EMDAT_core.accumulators import StatAccumulator, SlidingAccumulator
+from EMDAT_core.data_structures import SampleTable
+from EMDAT_core.OnlineSegment import adjust_pupil_size, general_features, relative_angle
+from EMDAT_core.Segment import Segment
+from EMDAT_core.utils import get_chunk
+
+
+class Window(object):
+    """
+    The general features of one window of a Scene.
+
+    Attributes:
+        segid: a string containing the id of the Window ([scene id]_w[window number])
+        scid: a string containing the id of the Scene this Window belongs to
+        start: the timestamp at which the Window starts
+        end: the timestamp at which the Window ends
+        features: a dictionary of features (see OnlineSegment.general_features)
+        is_valid: always True ("Window"s are not filtered by sample quality)
+    """
+
+    def __init__(self, scid, number, start, end, features):
+        """Inits a Window
+
+        Args:
+            scid: a string containing the id of the Scene
+
+            number: an integer, the position of the Window in its Scene (starting at 0)
+
+            start: the timestamp at which the Window starts
+
+            end: the timestamp at which the Window ends
+
+            features: a dictionary of features
+
+        Yields:
+            a Window object
+        """
+        self.segid = "%s_w%d" % (scid, number)
+        self.scid = scid
+        self.start = start
+        self.end = end
+        self.features = features
+        self.is_valid = True
+
+    def getid(self):
+        """Returns the segid for this Window"""
+        return self.segid
+
+    def get_features(self, featurelist=None):
+        """Returns feature names and their values for this Window (see Segment.get_features)
+
+        Args:
+            featurelist: if not None, a list containing the name of features to be returned.
+                If this is None all features will be returned
+
+        Returns:
+            featnames: a list of feature names sorted alphabetically
+            featvals: a corresponding list of feature values
+        """
+        if featurelist is None:
+            featnames = list(self.features.keys())
+        else:
+            featnames = []
+            for name in featurelist:
+                if name in self.features:
+                    featnames.append(name)
+                else:
+                    raise Exception('Window %s has no such feature: %s' % (self.getid(), name))
+        featnames.sort()
+        featvals = [self.features[name] for name in featnames]
+        return featnames, featvals
+
+
+def window_origin(scene_start, window_stride, window_alignment, recording_start):
+    """Returns the timestamp at which the first window of a Scene starts
+
+    Args:
+        scene_start: the timestamp at which the Scene starts
+
+        window_stride: the time (in ms) between the starts of two consecutive windows
+
+        window_alignment: "scene" if the windows start at the start of the Scene, or "recording" if
+            the windows of all scenes start at multiples of window_stride after the start of the recording
+
+        recording_start: the timestamp of the first sample of the recording
+
+    Returns:
+        a timestamp
+    """
+    if window_alignment == "scene":
+        return scene_start
+    elif window_alignment == "recording":
+        offset = scene_start - recording_start
+        return recording_start + -(-offset // window_stride) * window_stride
+    raise Exception("Unknown window alignment: " + str(window_alignment))
+
+
+
+
+def sliding_windows(scid, start, end, all_data, fixation_data, saccade_data=None, event_data=None,
+                    window_length=1000, window_stride=None, rest_pupil_size=0):
+    """Returns the "Window"s sliding over a time span of a recording
+
+    Each window holds the records that a Segment with the same start and end would hold (see utils.get_chunk).
+    Only the windows that fit in the span and whose samples span some time (the windows a Segment could be
+    built from) are returned. If params.DEBUG is True, the features of each window with at least one
+    Fixation are checked against those of the Segment built from the same records (see check_window).
+
+    Args:
+        scid: a string containing the id of the Scene
+
+        start: the timestamp at which the first window starts
+
+        end: the timestamp at which the span ends (no window ends after it)
+
+        all_data: the "Datapoint"s of the recording (a SampleTable or a list of "Datapoint"s)
+
+        fixation_data: the list of "Fixation"s of the recording
+
+        saccade_data: the list of "Saccade"s of the recording, or None
+
+        event_data: the list of "Event"s of the recording, or None
+
+        window_length: the length (in ms) of a window
+
+        window_stride: the time (in ms) between the starts of two consecutive windows
+            (by default, window_length: the windows do not overlap)
+
+        rest_pupil_size: rest pupil size for this Scene, used to adjust pupil size
+
+    Returns:
+        a list of "Window"s, in chronological order
+    """
+    if window_stride is None:
+        window_stride = window_length
+    if window_length <= 0 or window_stride <= 0:
+        raise Exception("The window length and stride must be positive (got %s and %s)" % (window_length, window_stride))
+    numwindows = (end - start - window_length) // window_stride + 1
+    if numwindows <= 0:
+        return []
+    bounds = [(start + number * window_stride, start + number * window_stride + window_length)
+              for number in range(numwindows)]
+
+    samples = _SampleStream(all_data, _chunks(all_data, bounds), rest_pupil_size)
+    fixations = _FixationStream(fixation_data, _chunks(fixation_data, bounds))
+    if saccade_data is not None:
+        saccades = _SaccadeStream(saccade_data, _chunks(saccade_data, bounds))
+    if event_data is not None:
+        events = _EventStream(event_data, _chunks(event_data, bounds))
+
+    windows = []
+    for number, (window_start, window_end) in enumerate(bounds):
+        length = samples.length(number)
+        if length <= 0:
+            continue    # no Segment can be built on these samples ("Zero length segment")
+        accumulators = {}
+        numsamples, length_invalid = samples.update(number, accumulators)
+        numfixations = fixations.update(number, accumulators)
+        if numfixations == 0:
+            length_invalid = 0  # see Segment.calc_largest_validity_gap
+        if saccade_data is not None:
+            saccades.update(number, accumulators)
+        else:
+            for signal in _SaccadeStream.SIGNALS:
+                accumulators[signal] = StatAccumulator()
+        if event_data is not None:
+            event_counts, first_events = events.update(number)
+        else:
+            event_counts = {'leftc': 0, 'rightc': 0, 'doublec': 0, 'keyp': 0}
+            first_events = {'leftc': None, 'rightc': None, 'doublec': None, 'keyp': None}
+
+        features = general_features(length, length_invalid, numsamples, accumulators, event_counts, first_events)
+        if event_data is None:
+            # as Segment.calc_event_features without event data
+            for name in ('leftclicrate', 'rightclicrate', 'doubleclicrate', 'keypressedrate'):
+                features[name] = -1
+        window = Window(scid, number, window_start, window_end, features)
+        if params.DEBUG and numfixations > 0:
+            check_window(window, window_segment(window, all_data, fixation_data, saccade_data, event_data,
+                                                rest_pupil_size))
+        windows.append(window)
+    return windows
+
+
+def window_segment(window, all_data, fixation_data, saccade_data=None, event_data=None, rest_pupil_size=0):
+    """Returns the Segment from the start to the end of a Window, with the records a Scene would give it
+
+    Args:
+        window: a Window
+
+        all_data, fixation_data, saccade_data, event_data, rest_pupil_size: see sliding_windows
+
+    Returns:
+        a Segment (without "AOI"s)
+    """
+    _, all_start, all_end = get_chunk(all_data, 0, window.start, window.end)
+    _, fix_start, fix_end = get_chunk(fixation_data, 0, window.start, window.end)
+    if saccade_data is not None:
+        _, sac_start, sac_end = get_chunk(saccade_data, 0, window.start, window.end)
+        saccade_data = saccade_data[sac_start:sac_end]
+    if event_data is not None:
+        _, event_start, event_end = get_chunk(event_data, 0, window.start, window.end)
+        event_data = event_data[event_start:event_end]
+    return Segment(window.segid, all_data[all_start:all_end], fixation_data[fix_start:fix_end],
+                   saccade_data=saccade_data, event_data=event_data, rest_pupil_size=rest_pupil_size)
+
+
+def check_window(window, segment):
+    """Raises an Exception if the features of a Window differ from those of a Segment over the same records
+
+    The Window must have the same features as the Segment. The values are compared up to a relative error
+    of 1e-9, since the statistics of the Window are not summed in the same order.
+
+    Args:
+        window: a Window
+
+        segment: a Segment (see window_segment)
+    """
+    differences = ["%s: missing" % name for name in sorted(set(segment.features) - set(window.features))]
+    differences += ["%s: not a feature of the Segment" % name for name in sorted(set(window.features) - set(segment.features))]
+    for name in sorted(set(window.features) & set(segment.features)):
+        value, expected = window.features[name], segment.features[name]
+        if value == expected:
+            continue
+        value, expected = float(value), float(expected)
+        if math.isnan(value) and math.isnan(expected):
+            continue
+        if abs(value - expected) > 1e-9 * max(1.0, abs(value), abs(expected)):
+            differences.append("%s: %r instead of %r" % (name, value, expected))
+    if differences:
+        raise Exception("Window %s differs from the Segment over the same records: %s"
+                        % (window.getid(), ", ".join(differences)))
+
+
+def scene_windows(scid, seglist, recording, window_length, window_stride=None, window_alignment="scene",
+                  rest_pupil_size=0):
+    """Returns the "Window"s of a Scene, sliding from the start of its first Segment to the end of its last one
+
+    Args:
+        scid: a string containing the id of the Scene
+
+        seglist: a list of (segid, start, end) tuples, as read from a '.seg' file
+
+        recording: the Recording the Scene belongs to
+
+        window_length, window_stride: see sliding_windows
+
+        window_alignment: "scene" or "recording" (see window_origin)
+
+        rest_pupil_size: rest pupil size for this Scene, used to adjust pupil size
+
+    Returns:
+        a list of "Window"s, in chronological order
+    """
+    scene_start = min(seg[1] for seg in seglist)
+    scene_end = max(seg[2] for seg in seglist)
+    if window_stride is None:
+        window_stride = window_length
+    start = window_origin(scene_start, window_stride, window_alignment, recording.all_data[0].timestamp)
+    windows = sliding_windows(scid, start, scene_end, recording.all_data, recording.fix_data,
+                              saccade_data=recording.sac_data, event_data=recording.event_data,
+                              window_length=window_length, window_stride=window_stride,
+                              rest_pupil_size=rest_pupil_size)
+    if params.DEBUG or params.VERBOSE == "VERBOSE":
+        print("Scene %s: %d windows" % (scid, len(windows)))
+    return windows
+
+
+def write_windows_tsv(windows, outfile, featurelist=None):
+    """Writes the features of a list of "Window"s to a tab separated file, one row per Window
+
+    Args:
+        windows: a list of "Window"s
+
+        outfile: a string containing the name of the output file
+
+        featurelist: if not None, a list containing the name of features to be written.
+            If this is None all features will be written
+    """
+    with open(outfile, 'w') as f:
+        featnames = None
+        for window in windows:
+            names, values = window.get_features(featurelist)
+            if featnames is None:
+                featnames = names
+                f.write('\t'.join(['Sc_id', 'Window_id', 'start', 'end'] + featnames) + '\n')
+            f.write('\t'.join([window.scid, window.segid, str(window.start), str(window.end)] +
+                              [str(value) for value in values]) + '\n')
+
+
+def _chunks(data, bounds):
+    """Returns, for each (start, end) time range, the range (first, last excluded) of the records of data that a
+    Segment from start to end holds (see utils.get_chunk)"""
+    chunks = []
+    ind = 0
+    for start, end in bounds:
+        _, start_ind, end_ind = get_chunk(data, ind, start, end)
+        ind = max(start_ind, 0)
+        start_ind, end_ind, _ = slice(start_ind, end_ind).indices(len(data))
+        chunks.append((start_ind, max(start_ind, end_ind)))
+    return chunks
+
+
+def _local_records(data, chunks):
+    """Returns the records of data from the first to the last record of a list of chunks (without copying the
+    stream), and the chunks as ranges in these records"""
+    used = [chunk for chunk in chunks if chunk[1] > chunk[0]]
+    if not used:
+        return data[0:0], [(0, 0)] * len(chunks)
+    base = min(first for first, _ in used)
+    top = max(last for _, last in used)
+    local_chunks = []
+    for first, last in chunks:
+        first = min(max(first - base, 0), top - base)
+        local_chunks.append((first, max(first, min(last - base, top - base))))
+    return data[base:top], local_chunks
+
+
+class _SlidingRange(object):
+    """
+    SlidingAccumulators over the values of the records in a range that moves forward.
+
+    Attributes:
+        columns: a dictionary (signal name: list of the value of each record, None for the records without a value)
+        first, last: the current range of records (last excluded)
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.accumulators = dict((signal, SlidingAccumulator()) for signal in columns)
+        self.first = self.last = 0
+
+    def move(self, first, last):
+        """Moves the range to the records first to last (excluded), and returns a dictionary with a new
+        StatAccumulator per signal holding the values of these records"""
+        last = max(first, last)
+        if first < self.first or last < self.last or first > self.last:
+            # the range does not slide forward: start again from an empty range
+            for acc in self.accumulators.values():
+                acc.clear()
+            self.first = self.last = first
+        for signal, values in self.columns.items():
+            acc = self.accumulators[signal]
+            for value in values[self.last:last]:
+                if value is not None:
+                    acc.add(value)
+            for value in values[self.first:first]:
+                if value is not None:
+                    acc.remove()
+        self.first, self.last = first, last
+        return dict((signal, acc.get()) for signal, acc in self.accumulators.items())
+
+
+class _Gaps(object):
+    """
+    The groups of consecutive flagged samples (invalid samples, or invalid samples for blinks) of a sequence of
+    samples, and the gaps they make in a window, as found by Segment.calc_largest_validity_gap and
+    Segment.calc_blink_validity_gaps: a gap starts at the first flagged sample of the window and ends at
+    the sample that follows the group, or at the last sample of the window.
+
+    Attributes:
+        timestamps: the timestamps of the samples
+        firsts: the index of the first sample of each group
+        stops: the index of the sample that follows each group (the number of samples for the last group
+            if it ends with the samples)
+    """
+
+    def __init__(self, timestamps, flags):
+        self.timestamps = timestamps
+        self.firsts = []
+        self.stops = []
+        numsamples = len(flags)
+        ind = 0
+        while ind < numsamples:
+            if flags[ind]:
+                first = ind
+                while ind < numsamples and flags[ind]:
+                    ind += 1
+                self.firsts.append(first)
+                self.stops.append(ind)
+            else:
+                ind += 1
+
+    def __len__(self):
+        return len(self.firsts)
+
+    def gap(self, group):
+        """Returns the (start, end) timestamps of a whole group"""
+        return self.timestamps[self.firsts[group]], self.timestamps[min(self.stops[group], len(self.timestamps) - 1)]
+
+    def window(self, first, last):
+        """Returns the gaps of the window made of the samples first to last (excluded)
+
+        Returns:
+            head: the (start, end) timestamps of the gap of the group that starts before the window, or None
+            inner_first, inner_last: the range (inner_last excluded) of the groups whose whole gap is in the window
+            tail: the (start, end) timestamps of the gap of the group that starts in the window but ends
+                after its last sample, or None
+        """
+        last -= 1
+        inner_first = bisect_left(self.firsts, first)
+        inner_last = max(inner_first, bisect_right(self.stops, last))
+        head = tail = None
+        if inner_first > 0 and self.stops[inner_first - 1] > first:
+            head = (self.timestamps[first], self.timestamps[min(self.stops[inner_first - 1], last)])
+        if inner_last < len(self.firsts) and self.firsts[inner_last] <= last:
+            tail = (self.timestamps[self.firsts[inner_last]], self.timestamps[last])
+        return head, inner_first, inner_last, tail
+
+
+def _is_blink(duration):
+    """Returns True if a gap of this duration is a blink (see Segment.calc_blink_features)"""
+    if params.EYETRACKERTYPE == "SMI":
+        return True
+    lower_bound, upper_bound = params.blink_threshold
+    return lower_bound <= duration <= upper_bound
+
+
+class _SampleStream(object):
+    """
+    The samples of the windows: number of samples, invalid gaps, blinks, pupil and distance from the screen.
+
+    Attributes:
+        chunks: the range of samples of each window
+        timestamps: the timestamps of the samples
+    """
+
+    def __init__(self, all_data, chunks, rest_pupil_size):
+        samples, self.chunks = _local_records(all_data, chunks)
+        names = ('timestamp', 'stimuliname', 'is_valid', 'is_valid_blink', 'pupilsize', 'pupilvelocity', 'distance')
+        if isinstance(samples, SampleTable):
+            columns = dict((name, samples.get_column(name)) for name in names)
+        else:
+            columns = dict((name, [getattr(datapoint, name) for datapoint in samples]) for name in names)
+        self.timestamps = columns['timestamp']
+
+        self.numsamples = [0]   # the number of samples with a stimuli name before each sample
+        for stimuliname in columns['stimuliname']:
+            self.numsamples.append(self.numsamples[-1] + (stimuliname != ''))
+        self.signals = _SlidingRange({
+            'pupilsize': [adjust_pupil_size(size, rest_pupil_size) if size is not None and size > 0 else None
+                          for size in columns['pupilsize']],
+            'pupilvelocity': [velocity if velocity is not None and velocity != -1 else None
+                              for velocity in columns['pupilvelocity']],
+            'distance': [distance if distance is not None and distance > 0 else None
+                         for distance in columns['distance']]})
+
+        # the invalid gaps longer than params.MAX_SEG_TIMEGAP (see Segment.get_length_invalid)
+        self.invalid_gaps = _Gaps(self.timestamps, [not valid for valid in columns['is_valid']])
+        self.length_invalid = [0]   # the total length of the long gaps before each group
+        for group in range(len(self.invalid_gaps)):
+            self.length_invalid.append(self.length_invalid[-1] + _long_gap(self.invalid_gaps.gap(group)))
+
+        # the blinks and the time between consecutive blinks (see Segment.calc_blink_features)
+        self.blink_gaps = _Gaps(self.timestamps, [not valid for valid in columns['is_valid_blink']])
+        self.blinks = []    # the groups whose whole gap is a blink
+        for group in range(len(self.blink_gaps)):
+            if self.blink_gaps.stops[group] < len(self.timestamps):
+                start, end = self.blink_gaps.gap(group)
+                if _is_blink(end - start):
+                    self.blinks.append(group)
+        gaps = [self.blink_gaps.gap(group) for group in self.blinks]
+        self.blink_durations = _SlidingRange({'blinkduration': [end - start for start, end in gaps]})
+        self.blink_intervals = _SlidingRange({'blinktimedistance': [gaps[ind + 1][0] - gaps[ind][1]
+                                                                    for ind in range(len(gaps) - 1)]})
+
+    def length(self, number):
+        """Returns the time between the first and the last sample of a window"""
+        first, last = self.chunks[number]
+        if last - first < 2:
+            return 0
+        return self.timestamps[last - 1] - self.timestamps[first]
+
+    def update(self, number, accumulators):
+        """Moves to a window and adds the accumulators of its samples to a dictionary
+
+        Args:
+            number: the number of the window
+            accumulators: a dictionary of "StatAccumulator"s
+
+        Returns:
+            the number of samples of the window with a stimuli name, and the length of its invalid gaps
+            longer than params.MAX_SEG_TIMEGAP
+        """
+        first, last = self.chunks[number]
+        accumulators.update(self.signals.move(first, last))
+
+        head, inner_first, inner_last, tail = self.invalid_gaps.window(first, last)
+        length_invalid = self.length_invalid[inner_last] - self.length_invalid[inner_first]
+        for gap in (head, tail):
+            if gap is not None:
+                length_invalid += _long_gap(gap)
+
+        head, inner_first, inner_last, tail = self.blink_gaps.window(first, last)
+        blink_first = bisect_left(self.blinks, inner_first)
+        blink_last = bisect_left(self.blinks, inner_last)
+        durations = self.blink_durations.move(blink_first, blink_last)['blinkduration']
+        intervals = self.blink_intervals.move(blink_first, blink_last - 1)['blinktimedistance']
+        if blink_last > blink_first:
+            inner = (self.blink_gaps.gap(self.blinks[blink_first]), self.blink_gaps.gap(self.blinks[blink_last - 1]))
+        else:
+            inner = None
+        if head is not None and _is_blink(head[1] - head[0]):
+            durations.add(head[1] - head[0])
+            if inner is not None:
+                intervals.add(inner[0][0] - head[1])
+        else:
+            head = None
+        if tail is not None and _is_blink(tail[1] - tail[0]):
+            durations.add(tail[1] - tail[0])
+            previous = inner[1] if inner is not None else head
+            if previous is not None:
+                intervals.add(tail[0] - previous[1])
+        accumulators['blinkduration'] = durations
+        accumulators['blinktimedistance'] = intervals
+        return self.numsamples[last] - self.numsamples[first], length_invalid
+
+
+def _long_gap(gap):
+    """Returns the length of a gap if it is longer than params.MAX_SEG_TIMEGAP, 0 otherwise"""
+    length = gap[1] - gap[0]
+    return length if length > params.MAX_SEG_TIMEGAP else 0
+
+
+class _FixationStream(object):
+    """
+    The "Fixation"s of the windows: fixation durations, and the path distances and angles between the
+    consecutive "Fixation"s of a window (see Segment.calc_fix_ang_path_features).
+
+    Attributes:
+        chunks: the range of "Fixation"s of each window
+    """
+
+    def __init__(self, fixation_data, chunks):
+        fixations, self.chunks = _local_records(fixation_data, chunks)
+        points = [(fix.mappedfixationpointx, fix.mappedfixationpointy) for fix in fixations]
+        distances = []
+        abs_angles = []
+        for ind in range(1, len(points)):
+            (lastx, lasty), (x, y) = points[ind - 1], points[ind]
+            distances.append(math.sqrt((x - lastx)**2 + (y - lasty)**2))
+            (_, theta) = geometry.vector_difference((lastx, lasty), (x, y))
+            abs_angles.append(abs(theta))
+        rel_angles = [relative_angle(points[ind - 1], points[ind], points[ind + 1]) for ind in range(1, len(points) - 1)]
+        self.fixations = _SlidingRange({'fixationduration': [fix.fixationduration for fix in fixations]})
+        self.pairs = _SlidingRange({'pathdistance': distances, 'abspathangles': abs_angles})
+        self.triples = _SlidingRange({'relpathangles': rel_angles})
+
+    def update(self, number, accumulators):
+        """Moves to a window, adds the accumulators of its "Fixation"s to a dictionary and returns their number"""
+        first, last = self.chunks[number]
+        accumulators.update(self.fixations.move(first, last))
+        accumulators.update(self.pairs.move(first, last - 1))
+        accumulators.update(self.triples.move(first, last - 2))
+        return last - first
+
+
+class _SaccadeStream(object):
+    """
+    The "Saccade"s of the windows (see Segment.calc_saccade_features).
+
+    Attributes:
+        chunks: the range of "Saccade"s of each window
+    """
+
+    SIGNALS = ('saccadedistance', 'saccadeduration', 'saccadespeed')
+
+    def __init__(self, saccade_data, chunks):
+        saccades, self.chunks = _local_records(saccade_data, chunks)
+        self.saccades = _SlidingRange(dict((signal, [float(getattr(saccade, signal)) for saccade in saccades])
+                                           for signal in self.SIGNALS))
+
+    def update(self, number, accumulators):
+        """Moves to a window and adds the accumulators of its "Saccade"s to a dictionary"""
+        first, last = self.chunks[number]
+        accumulators.update(self.saccades.move(first, last))
+
+
+class _EventStream(object):
+    """
+    The "Event"s of the windows (see utils.generate_event_lists).
+
+    A left click is the second click of a double click if the previous left click is close enough to it
+    and is not itself the second click of a double click. The left clicks are thus split into chains
+    of consecutive clicks that are close enough to the previous one: the clicks of a chain are paired
+    from its first click on, and only the last one is a single left click if the chain has an odd
+    number of clicks. A window that starts or ends in the middle of a chain sees the part of the chain
+    inside it as a shorter chain.
+
+    Attributes:
+        chunks: the range of "Event"s of each window
+    """
+
+    def __init__(self, event_data, chunks):
+        events, self.chunks = _local_records(event_data, chunks)
+        self.positions = {'rightc': [], 'keyp': []}     # the index of the events of each kind
+        self.timestamps = {'rightc': [], 'keyp': []}
+        self.clicks = []        # the index of each left click
+        self.click_times = []
+        self.click_chains = []  # the chain of each left click
+        self.chain_starts = []  # the first left click of each chain
+        previous = None
+        for ind, event in enumerate(events):
+            if event.event == "LeftMouseClick":
+                if previous is None or not ((event.timestamp - previous.timestamp) <= 700 and
+                                            (event.data1 - previous.data1) <= 10 and (event.data2 - previous.data2) <= 10):
+                    self.chain_starts.append(len(self.clicks))
+                self.clicks.append(ind)
+                self.click_times.append(event.timestamp)
+                self.click_chains.append(len(self.chain_starts) - 1)
+                previous = event
+            elif event.event in ("RightMouseClick", "KeyPress"):
+                kind = 'rightc' if event.event == "RightMouseClick" else 'keyp'
+                self.positions[kind].append(ind)
+                self.timestamps[kind].append(event.timestamp)
+        self.chain_ends = self.chain_starts[1:] + [len(self.clicks)]
+        # the number of double clicks and single left clicks in the chains before each chain
+        self.chain_counts = [(0, 0)]
+        for start, end in zip(self.chain_starts, self.chain_ends):
+            doublec, leftc = self.chain_counts[-1]
+            self.chain_counts.append((doublec + (end - start) // 2, leftc + (end - start) % 2))
+        # the first chain from each chain with a double click, and with a single left click
+        numchains = len(self.chain_starts)
+        self.next_double = [numchains] * (numchains + 1)
+        self.next_single = [numchains] * (numchains + 1)
+        for chain in range(numchains - 1, -1, -1):
+            size = self.chain_ends[chain] - self.chain_starts[chain]
+            self.next_double[chain] = chain if size >= 2 else self.next_double[chain + 1]
+            self.next_single[chain] = chain if size % 2 == 1 else self.next_single[chain + 1]
+
+    def update(self, number):
+        """Moves to a window and returns the number of events of each kind and the timestamp of the first
+        event of each kind (see OnlineSegment.general_features)"""
+        first, last = self.chunks[number]
+        counts = {'leftc': 0, 'rightc': 0, 'doublec': 0, 'keyp': 0}
+        first_events = {'leftc': None, 'rightc': None, 'doublec': None, 'keyp': None}
+        for kind in ('rightc', 'keyp'):
+            kind_first = bisect_left(self.positions[kind], first)
+            kind_last = bisect_left(self.positions[kind], last)
+            counts[kind] = kind_last - kind_first
+            if kind_last > kind_first:
+                first_events[kind] = self.timestamps[kind][kind_first]
+
+        click_first = bisect_left(self.clicks, first)
+        click_last = bisect_left(self.clicks, last)
+        if click_last > click_first:
+            first_chain = self.click_chains[click_first]
+            last_chain = self.click_chains[click_last - 1]
+            # the parts of the chains in the window: (first click, last click excluded)
+            if first_chain == last_chain:
+                parts = [(click_first, click_last)]
+            else:
+                parts = [(click_first, self.chain_ends[first_chain])]
+                if last_chain > first_chain + 1:
+                    parts.append(None)  # the whole chains between the first and the last ones
+                parts.append((self.chain_starts[last_chain], click_last))
+            for part in parts:
+                if part is None:
+                    doublec = self.chain_counts[last_chain][0] - self.chain_counts[first_chain + 1][0]
+                    leftc = self.chain_counts[last_chain][1] - self.chain_counts[first_chain + 1][1]
+                    double_chain = self.next_double[first_chain + 1]
+                    single_chain = self.next_single[first_chain + 1]
+                    first_double = self.chain_starts[double_chain] + 1 if double_chain < last_chain else None
+                    first_single = self.chain_ends[single_chain] - 1 if single_chain < last_chain else None
+                else:
+                    size = part[1] - part[0]
+                    doublec, leftc = size // 2, size % 2
+                    first_double = part[0] + 1 if doublec > 0 else None
+                    first_single = part[1] - 1 if leftc > 0 else None
+                counts['doublec'] += doublec
+                counts['leftc'] += leftc
+                if first_events['doublec'] is None and first_double is not None:
+                    first_events['doublec'] = self.click_times[first_double]
+                if first_events['leftc'] is None and first_single is not None:
+                    first_events['leftc'] = self.click_times[first_single]
+        return counts, first_events
@@ -8,98 +8,175 @@ Authors: Samad Kardan (creator), Sebastien Lalle.
 Institution: The University of British Columbia.
 """
 from EMDAT_core.Participant import Participant
+import numpy as np
 import params
 
+PROPORTION_THRESHOLDS = range(1, 102, 1)   # the thresholds (in %) explored for the proportion of valid samples
+
+
+class ValiditySweep(object):
+    """
+    The validity of all the Segments of a cohort of Participants, for many thresholds at once.
+
+    The proportions of valid samples and the largest invalid gaps of the Segments are gathered into arrays
+    once, and the number of invalid Segments of each Participant is then computed for all the thresholds
+    together, from the sorted thresholds and cumulative counts, instead of testing each Segment at each
+    threshold with calc_validity1/2/3. A Segment is invalid at a threshold exactly when the corresponding
+    calc_validity method returns False.
+
+    Attributes:
+        pids: the list of the ids of the Participants
+        numsegments: an array with the number of Segments of each Participant
+        segids: an array with the id of each Segment (of all the Participants)
+        owner: an array with the index in pids of the Participant of each Segment
+        values: a dictionary with an array of the proportion of valid samples (method 1), largest invalid gap
+            (method 2) or proportion of valid and restored samples (method 3) of each Segment, with the validity
+            method as key
+    """
+
+    def __init__(self, participant_list):
+        """Inits ValiditySweep class
+
+        Args:
+            participant_list: a list of Participants
+        """
+        self.pids = [p.pid for p in participant_list]
+        self.numsegments = np.array([len(p.segments) for p in participant_list], dtype=np.intp)
+        segments = [seg for p in participant_list for seg in p.segments]
+        self.segids = np.array([seg.segid for seg in segments], dtype=object)
+        self.owner = np.repeat(np.arange(len(participant_list)), self.numsegments)
+        self.values = {1: np.array([seg.proportion_valid for seg in segments], dtype=np.float64),
+                       2: np.array([seg.largest_data_gap for seg in segments], dtype=np.float64),
+                       3: np.array([seg.proportion_valid_fix for seg in segments], dtype=np.float64)}
+
+    def cohort_matrix(self, method, thresholds):
+        """Returns the number of invalid Segments of each Participant at each threshold
+
+        Args:
+            method: the validity method (1, 2 or 3, see params.VALIDITY_METHOD)
+            thresholds: a list of thresholds, in the unit of the method (e.g. 0.7 or 3000), in any order
+
+        Returns:
+            an integer array with one row per Participant (in the order of pids) and one column per threshold
+        """
+        if method not in self.values:
+            raise Exception("Unknown validity method: " + str(method))
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        order = np.argsort(thresholds, kind='mergesort')
+        values = self.values[method]
+
+        # the index of the first sorted threshold from which each Segment is counted
+        if method == 2:
+            # valid while largest_data_gap <= threshold: invalid for the thresholds below the gap
+            counted_until = np.searchsorted(thresholds[order], values, side='left')
+            counts = np.zeros((len(self.pids), len(thresholds) + 1), dtype=np.intp)
+            np.add.at(counts, (self.owner, counted_until), 1)
+            # a Segment is counted in all the columns before counted_until (NaN gaps are never valid)
+            invalid = self.numsegments[:, np.newaxis] - np.cumsum(counts, axis=1)[:, :-1]
+        else:
+            # valid while proportion > threshold: invalid from the first threshold >= proportion
+            counted_from = np.searchsorted(thresholds[order], values, side='left')
+            counted_from[np.isnan(values)] = 0  # NaN proportions are never valid
+            counts = np.zeros((len(self.pids), len(thresholds) + 1), dtype=np.intp)
+            np.add.at(counts, (self.owner, counted_from), 1)
+            invalid = np.cumsum(counts, axis=1)[:, :-1]
+
+        result = np.empty_like(invalid)
+        result[:, order] = invalid
+        return result
+
+    def invalid_segments(self, method, threshold):
+        """Returns the ids of the invalid Segments of each Participant at one threshold
+
+        Args:
+            method: the validity method (1, 2 or 3, see params.VALIDITY_METHOD)
+            threshold: the threshold, in the unit of the method
+
+        Returns:
+            a list with the list of the ids of the invalid Segments of each Participant (in the order of pids)
+        """
+        values = self.values[method]
+        with np.errstate(invalid='ignore'):
+            valid = values <= threshold if method == 2 else values > threshold
+        invalid = np.flatnonzero(~valid)
+        result = [[] for _ in self.pids]
+        for i in invalid.tolist():
+            result[self.owner[i]].append(self.segids[i])
+        return result
+
+    def participant_tables(self, method, thresholds, labels=None):
+        """Returns the number of invalid Segments of each Participant at each threshold, as lists
+
+        Args:
+            method: the validity method (1, 2 or 3, see params.VALIDITY_METHOD)
+            thresholds: a list of thresholds, in the unit of the method
+            labels: the label of each threshold in the tables (by default the thresholds themselves)
+
+        Returns:
+            a list of (pid, a list of (threshold label, number of invalid Segments), number of Segments),
+            one for each Participant
+        """
+        if labels is None:
+            labels = thresholds
+        matrix = self.cohort_matrix(method, thresholds)
+        return [(pid, list(zip(labels, matrix[i].tolist())), int(self.numsegments[i]))
+                for i, pid in enumerate(self.pids)]
+
+
 def explore_validation_proportion_threshold_segments(participant_list, include_restored_samples = True, prune_length = None,
                                           auto_partition_low_quality_segments = False):
     """Explores different threshold values for the proportion of valid samples method in terms of Segments for all Participants in the list
-    """
 
-    seglen = 0
-    segs = 0
-    participants = []
+    Returns:
+        a list of (pid, a list of (threshold in %, number of invalid Segments), number of Segments), one for each Participant
+    """
     for p in participant_list:
-        if params.VERBOSE != "QUIET":
-            print("Data validation for participant ", p.pid)
         if p.require_valid_segments == True:
             raise Exception("Error: explore_validation_threshold_segments should be called with a list of Participants with require_valid_segments = False")
 
-        tvalidity = []
-
-        for seg in p.segments:
-            seglen += seg.completion_time
+    method = 3 if include_restored_samples else 1  ##proportion (with restored samples from Fixations)
+    thresholds = [tresh/100.0 for tresh in PROPORTION_THRESHOLDS]
+    sweep = ValiditySweep(participant_list)
+    participants = sweep.participant_tables(method, thresholds, labels=list(PROPORTION_THRESHOLDS))
 
-        segs += len(p.segments)
-        if include_restored_samples == False:
-            for tresh in range(1,102,1):    ##proportion
-                invc = 0
-                invsegs=[]
-                for seg in p.segments:
-                    if seg.calc_validity1(tresh/100.0) == False:
-                        invc +=1
-                        invsegs.append(seg.segid)
-        else:
-            for tresh in range(1,102,1):    ##proportion with restored samples from Fixations
-                invc = 0
-                invsegs=[]
-                for seg in p.segments:
-                    if seg.calc_validity3(tresh/100.0) == False:
-                        invc +=1
-                        invsegs.append(seg.segid)
-
-                if len(invsegs)>0:
-                    if params.VERBOSE != "QUIET":
-                        print(str(invc)+ " invalid segments (out of "+str(len(p.segments))+" for participant "+ str(p.pid) +" at threshold "+str(tresh))
-                    if params.DEBUG or params.VERBOSE == "VERBOSE":
-                        print("List of invalid segments:",invsegs)
-
-                tvalidity.append((tresh, invc))
-        participants.append( (p.pid,tvalidity, len(p.segments) ) )
-        #print ( (tvalidity, len(p.segments)) )
+    for pid, tvalidity, numsegments in participants:
+        if params.VERBOSE != "QUIET":
+            print("Data validation for participant ", pid)
+        for tresh, invc in tvalidity:
+            if invc > 0 and include_restored_samples:
+                if params.VERBOSE != "QUIET":
+                    print(str(invc)+ " invalid segments (out of "+str(numsegments)+" for participant "+ str(pid) +" at threshold "+str(tresh))
+                if params.DEBUG or params.VERBOSE == "VERBOSE":
+                    print("List of invalid segments:", sweep.invalid_segments(method, tresh/100.0)[sweep.pids.index(pid)])
 
-    if params.DEBUG or params.VERBOSE == "VERBOSE":
-        print("Average seg len",seglen/float(segs))
+    _print_average_segment_length(participant_list)
     return participants
 
 def explore_validation_time_gap_threshold_segments(participant_list, time_gap_list = [100, 200, 300, 400, 500, 1000, 2000], prune_length = None,
                                           auto_partition_low_quality_segments = False):
     """Explores different threshiold values for the invalid time gaps in the Segments for all Participants in the list
-    """
 
-    seglen = 0
-    segs = 0
-    participants = []
+    Returns:
+        a list of (pid, a list of (time gap threshold, number of invalid Segments), number of Segments), one for each Participant
+    """
     for p in participant_list:
         if p.require_valid_segments == True:
             raise Exception("explore_validation_threshold_segments should be called with a list of Participants with require_valid_segments = False")
 
-        tvalidity = []
-
-        for seg in p.segments:
-            seglen += seg.completion_time
-        segs += len(p.segments)
-
+    participants = ValiditySweep(participant_list).participant_tables(2, time_gap_list)    ##time-gap
 
-        for tresh in time_gap_list:     ##time-gap
-            invc = 0
-            invsegs=[]
-            for seg in p.segments:
-                if seg.calc_validity2(tresh) == False:
-                    invc +=1
-
-            if len(invsegs)>0:
-                if params.VERBOSE != "QUIET":
-                    print(str(invc)+ " invalid segments (out of "+str(len(p.segments))+" for participant "+ str(p.pid) +" at threshold "+str(tresh))
-                if params.DEBUG or params.VERBOSE == "VERBOSE":
-                    print("List of invalid segments:",invsegs)
-
-            tvalidity.append((tresh, invc))
-        participants.append( (p.pid,tvalidity, len(p.segments) ) )
-        #print ( (tvalidity, len(p.segments)) )
+    _print_average_segment_length(participant_list)
+    return participants
 
+def _print_average_segment_length(participant_list):
     if params.DEBUG or params.VERBOSE == "VERBOSE":
-        print("average seg len",seglen/float(segs))
-    return participants
+        seglen = 0
+        segs = 0
+        for p in participant_list:
+            for seg in p.segments:
+                seglen += seg.completion_time
+            segs += len(p.segments)
+        print("Average seg len",seglen/float(segs))
 
 
 def explore_validation_proportion_threshold_participants(participant_list, include_restored_samples =True, prune_length = None,
@@ -140,7 +217,7 @@ def output_Validity_info_Participants(user_list, include_restored_samples, auto_
     pv = explore_validation_proportion_threshold_participants(participant_list=user_list, include_restored_samples = include_restored_samples, prune_length = None,
                         auto_partition_low_quality_segments = auto_partition_low_quality_segments_flag)
 
-    for rate in xrange(1,102,1): ##porportion
+    for rate in range(1,102,1): ##porportion
         usr=[]
         totalseg = 0
         inv_user = 0
@@ -173,7 +250,7 @@ def output_Validity_info_Segments(user_list, auto_partition_low_quality_segments
         if validity_method == 1|validity_method == 3:   ##porportion
             pv = explore_validation_proportion_threshold_segments(participant_list=user_list, prune_length = None,
                                auto_partition_low_quality_segments = auto_partition_low_quality_segments_flag)
-            for rate in xrange(1,102,1):
+            for rate in range(1,102,1):
                 usr=[]
                 totalseg = 0
                 inv_seg = 0
@@ -195,7 +272,7 @@ def output_Validity_info_Segments(user_list, auto_partition_low_quality_segments
         elif validity_method == 2:  ##time gap\
             pv = explore_validation_time_gap_threshold_segments(participant_list = user_list, time_gap_list = threshold_gaps_list, prune_length = None,
                                                                 auto_partition_low_quality_segments = auto_partition_low_quality_segments_flag)
-            for gap_index in xrange(len(threshold_gaps_list)):
+            for gap_index in range(len(threshold_gaps_list)):
                 usr=[]
                 totalseg = 0
                 inv_seg = 0
@@ -221,7 +298,7 @@ def output_Validity_info_Segments(user_list, auto_partition_low_quality_segments
         if validity_method == 1|validity_method == 3:   ##porportion
             pv = explore_validation_proportion_threshold_segments(participant_list=user_list, prune_length = None,
                                auto_partition_low_quality_segments = auto_partition_low_quality_segments_flag)
-            for rate in xrange(1,102,1):
+            for rate in range(1,102,1):
                 usr=[]
                 totalseg = 0
                 inv_seg = 0
@@ -242,7 +319,7 @@ def output_Validity_info_Segments(user_list, auto_partition_low_quality_segments
         elif validity_method == 2:  ##time gap\
             pv = explore_validation_time_gap_threshold_segments(participant_list = user_list, time_gap_list = threshold_gaps_list, prune_length = None,
                                                                 auto_partition_low_quality_segments = auto_partition_low_quality_segments_flag)
-            for gap_index in xrange(len(threshold_gaps_list)):
+            for gap_index in range(len(threshold_gaps_list)):
                 usr=[]
                 totalseg = 0
                 inv_seg = 0
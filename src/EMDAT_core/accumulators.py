@@ -0,0 +1,207 @@
+"""
+UBC Eye Movement Data Analysis Toolkit (EMDAT), Version 3
+
+Mergeable summary statistics of the signals of a Segment (pupil size, fixation duration, ...).
+Each Segment keeps one StatAccumulator per signal; the accumulators of any group of "Segment"s
+(a Scene, all the "Segment"s of a participant, several participants) can be combined in O(1) per
+Segment to get the statistics of the group without going back to the samples.
+
+Institution: The University of British Columbia.
+"""
+
+import math
+import numpy as np
+
+
+class StatAccumulator(object):
+    """Sufficient statistics of a sequence of values
+
+    Attributes:
+        count: the number of values
+        sum: the sum of the values (an int if all values are ints)
+        sumsq: the sum of the squares of the values
+        min, max: the smallest and largest values (None if there is no value)
+        first, last: the first and last values (None if there is no value)
+        mean: the mean of the values (0.0 if there is no value)
+        m2: the sum of the squared differences to the mean (Welford's algorithm)
+    """
+
+    def __init__(self):
+        """Inits an empty StatAccumulator
+
+        Yields:
+            a StatAccumulator object
+        """
+        self.count = 0
+        self.sum = 0
+        self.sumsq = 0.0
+        self.min = None
+        self.max = None
+        self.first = None
+        self.last = None
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    @classmethod
+    def from_values(cls, values):
+        """Returns a StatAccumulator holding the statistics of a list or NumPy array of values"""
+        acc = cls()
+        if len(values) == 0:
+            return acc
+        if isinstance(values, np.ndarray):
+            acc.count = len(values)
+            acc.sum = values.sum().item()
+            acc.mean = acc.sum / float(acc.count)
+            deviations = values - acc.mean
+            acc.m2 = (deviations * deviations).sum().item()
+            squares = values.astype(np.float64)
+            acc.sumsq = (squares * squares).sum().item()
+            acc.min = values.min().item()
+            acc.max = values.max().item()
+            acc.first = values[0].item()
+            acc.last = values[-1].item()
+        else:
+            acc.count = len(values)
+            acc.sum = sum(values)
+            acc.mean = acc.sum / float(acc.count)
+            acc.m2 = sum((value - acc.mean) ** 2 for value in values)
+            acc.sumsq = sum(float(value) ** 2 for value in values)
+            acc.min = min(values)
+            acc.max = max(values)
+            acc.first = values[0]
+            acc.last = values[-1]
+        return acc
+
+    @classmethod
+    def combine(cls, accumulators):
+        """Returns a new StatAccumulator merging a sequence of accumulators, in order"""
+        acc = cls()
+        for other in accumulators:
+            acc.merge(other)
+        return acc
+
+    def add(self, value):
+        """Adds one value (Welford's online update)"""
+        self.count += 1
+        self.sum += value
+        self.sumsq += float(value) ** 2
+        delta = value - self.mean
+        self.mean += delta / float(self.count)
+        self.m2 += delta * (value - self.mean)
+        if self.count == 1:
+            self.min = self.max = self.first = value
+        else:
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+        self.last = value
+
+    def merge(self, other):
+        """Adds the values of another accumulator, which come after the values of this one
+
+        The means and squared differences are combined with the parallel algorithm of Chan et al.
+
+        Args:
+            other: a StatAccumulator
+
+        Returns:
+            this StatAccumulator
+        """
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.__dict__.update(other.__dict__)
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / float(count)
+        self.m2 += other.m2 + delta * delta * self.count * other.count / float(count)
+        self.count = count
+        self.sum += other.sum
+        self.sumsq += other.sumsq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.last = other.last
+        return self
+
+    def variance(self):
+        """Returns the sample variance of the values, or NaN if there are less than two values"""
+        if self.count < 2:
+            return float('nan')
+        return self.m2 / float(self.count - 1)
+
+    def stddev(self):
+        """Returns the sample standard deviation of the values (as utils.stddev), or NaN if there are less than two values"""
+        if self.count < 2:
+            return float('nan')
+        return math.sqrt(max(self.m2, 0.0) / float(self.count - 1))
+
+
+class SlidingAccumulator(object):
+    """The statistics of a sliding sequence of values: values are added at the end and removed from the start
+
+    The values are kept in two stacks (the "two-stack queue" sliding aggregate): new values are added
+    to a StatAccumulator, and the oldest values are removed from a stack holding, for each of them,
+    the StatAccumulator of this value and all the values after it in the stack. When that stack is
+    empty, it is rebuilt from the values added since. Adding or removing a value and reading the
+    statistics (including min, max, first and last, which cannot be subtracted) take amortized constant
+    time, and no statistic is ever subtracted, so they do not drift as the sequence slides.
+    """
+
+    def __init__(self):
+        """Inits an empty SlidingAccumulator
+
+        Yields:
+            a SlidingAccumulator object
+        """
+        self._front = []    # the StatAccumulator of each oldest value and the values after it in _front, oldest last
+        self._back = StatAccumulator()
+        self._back_values = []
+
+    def __len__(self):
+        return len(self._front) + self._back.count
+
+    def add(self, value):
+        """Adds a value at the end of the sequence"""
+        self._back.add(value)
+        self._back_values.append(value)
+
+    def remove(self):
+        """Removes the oldest value of the sequence"""
+        if not self._front:
+            suffix = StatAccumulator()
+            for value in reversed(self._back_values):
+                acc = StatAccumulator()
+                acc.add(value)
+                suffix = acc.merge(suffix)
+                self._front.append(suffix)
+            self._back = StatAccumulator()
+            self._back_values = []
+        self._front.pop()
+
+    def clear(self):
+        """Removes all the values"""
+        self.__init__()
+
+    def get(self):
+        """Returns a new StatAccumulator with the statistics of the values in the sequence"""
+        acc = StatAccumulator()
+        if self._front:
+            acc.merge(self._front[-1])
+        return acc.merge(self._back)
+
+
+def merge_accumulators(obj_list):
+    """Merges the accumulators of a list of objects (e.g. "Segment"s or "Scene"s) signal by signal
+
+    Args:
+        obj_list: a list of objects with an accumulators attribute (a dictionary of "StatAccumulator"s),
+            in chronological order
+
+    Returns:
+        a dictionary with a new StatAccumulator for each signal
+    """
+    merged = {}
+    for obj in obj_list:
+        for signal, acc in obj.accumulators.items():
+            merged.setdefault(signal, StatAccumulator()).merge(acc)
+    return merged
@@ -7,6 +7,13 @@ Authors: Nicholas FitzGerald (creator), Oliver Schmid, Samad Kardan, Sebastien L
 Institution: The University of British Columbia.
 """
 from warnings import warn
+from bisect import bisect_left, bisect_right
+import numpy as np
+
+try:
+    _range = xrange
+except NameError:   # Python 3
+    _range = range
 
 
 class Datapoint:
@@ -47,6 +54,506 @@ class Datapoint:
     def get_string(self, sep='\t'):
         return str(self.timestamp)+sep+str(self.pupilsize)+sep+str(self.pupilvelocity)+sep+str(self.distance)+sep+str(self.is_valid)+sep+str(self.stimuliname)+sep+str(self.fixationindex)#+sep+str(self.gazepointxleft)
 
+class SampleTable(object):
+    """
+    A columnar store for the gaze samples of a recording: each attribute of a "Datapoint" is held
+    in a typed NumPy array instead of one Python object per sample.
+
+    A SampleTable behaves like a read-only list of "Datapoint"s: len(), iteration and indexing
+    return "Datapoint" objects built on the fly, and slicing returns a SampleTable sharing the
+    same arrays (no copy). Missing values (None in a "Datapoint") are stored as NaN in float
+    columns and as INT_MISSING in integer columns.
+
+    Attributes:
+        timestamp, fixationindex: int64 arrays
+        pupilsize, pupilvelocity, distance, gazepointx, gazepointy: float64 arrays
+        is_valid, is_valid_blink: boolean arrays
+        stimuliname: an array of indices in stimulinames
+        stimulinames: a list of the distinct stimuli names
+        timestamp_index: a TimestampIndex over the timestamps, or None if they are not sorted
+        aoi_mask: None, or an array with the AOI-membership bitmask of each sample set by an AOIClassifier
+        aoi_classifier: the AOIClassifier that set aoi_mask
+    """
+
+    INT_MISSING = np.iinfo(np.int64).min
+    INT_COLUMNS = ('timestamp', 'fixationindex')
+    FLOAT_COLUMNS = ('pupilsize', 'pupilvelocity', 'distance', 'gazepointx', 'gazepointy')
+    BOOL_COLUMNS = ('is_valid', 'is_valid_blink')
+    COLUMNS = INT_COLUMNS + FLOAT_COLUMNS + BOOL_COLUMNS + ('stimuliname',)
+
+    def __init__(self, columns, stimulinames, timestamp_index=False):
+        """Initializes a SampleTable from its columns
+
+        Args:
+            columns: a dictionary with a NumPy array for each name in SampleTable.COLUMNS,
+                all of the same length
+            stimulinames: the list of stimuli names indexed by the 'stimuliname' column
+            timestamp_index: the TimestampIndex of the samples. If not given, it is built from the timestamps.
+
+        Yields:
+            a SampleTable object
+        """
+        for column in self.COLUMNS:
+            setattr(self, column, columns[column])
+        self.stimulinames = stimulinames
+        if timestamp_index is False:
+            timestamp_index = TimestampIndex.from_timestamps(self.timestamp)
+        self.timestamp_index = timestamp_index
+        self.aoi_mask = None
+        self.aoi_classifier = None
+
+    @classmethod
+    def from_datapoints(cls, datapoints):
+        """Returns a SampleTable holding the given "Datapoint"s
+
+        Args:
+            datapoints: a list of "Datapoint"s
+
+        Returns:
+            a SampleTable
+        """
+        builder = SampleTableBuilder()
+        for datapoint in datapoints:
+            builder.append(datapoint.__dict__)
+        return builder.build()
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if self.timestamp_index is None:
+                timestamp_index = None
+            else:
+                timestamp_index = self.timestamp_index[index]
+            table = SampleTable(dict((column, getattr(self, column)[index]) for column in self.COLUMNS),
+                                self.stimulinames, timestamp_index)
+            if self.aoi_mask is not None:
+                table.aoi_mask = self.aoi_mask[index]
+                table.aoi_classifier = self.aoi_classifier
+            return table
+        return Datapoint(self.get_row(index))
+
+    def __iter__(self):
+        columns = [self.get_column(column) for column in self.COLUMNS]
+        for values in zip(*columns):
+            yield Datapoint(dict(zip(self.COLUMNS, values)))
+
+    def take(self, indices):
+        """Returns a SampleTable with a copy of the samples at the given indices
+
+        Args:
+            indices: an array of indices in this table, in the order of the new table
+
+        Returns:
+            a SampleTable
+        """
+        return SampleTable(dict((column, getattr(self, column)[indices]) for column in self.COLUMNS),
+                           self.stimulinames)
+
+    def get_column(self, column):
+        """Returns the values of a column as a list, with missing values set to None
+
+        Args:
+            column: the name of the column (one of SampleTable.COLUMNS)
+
+        Returns:
+            a list of Python values
+        """
+        values = getattr(self, column)
+        if column == 'stimuliname':
+            return [self.stimulinames[code] for code in values.tolist()]
+        if column in self.FLOAT_COLUMNS:
+            return [None if value != value else value for value in values.tolist()]
+        if column in self.INT_COLUMNS:
+            return [None if value == self.INT_MISSING else value for value in values.tolist()]
+        return values.tolist()
+
+    def get_row(self, index):
+        """Returns the values of one sample as a dictionary, with missing values set to None
+
+        Args:
+            index: the index of the sample in the table
+
+        Returns:
+            a dictionary (attribute name: value) as accepted by "Datapoint"
+        """
+        data = {}
+        for column in self.COLUMNS:
+            value = getattr(self, column)[index].item()
+            if column == 'stimuliname':
+                value = self.stimulinames[value]
+            elif column in self.FLOAT_COLUMNS and value != value:
+                value = None
+            elif column in self.INT_COLUMNS and value == self.INT_MISSING:
+                value = None
+            data[column] = value
+        return data
+
+
+class SampleTableBuilder:
+    """
+    A helper to fill a SampleTable one sample at a time, e.g. while reading a data file.
+    """
+
+    def __init__(self):
+        self.columns = dict((column, []) for column in SampleTable.COLUMNS)
+        self.stimulinames = []
+        self.stimuli_codes = {}
+
+    def append(self, data):
+        """Adds a sample to the table
+
+        Args:
+            data: a dictionary with the attributes of the sample, as accepted by "Datapoint"
+        """
+        for column in SampleTable.INT_COLUMNS:
+            value = data.get(column, None)
+            self.columns[column].append(SampleTable.INT_MISSING if value is None else value)
+        for column in SampleTable.FLOAT_COLUMNS:
+            value = data.get(column, None)
+            self.columns[column].append(np.nan if value is None else value)
+        for column in SampleTable.BOOL_COLUMNS:
+            self.columns[column].append(bool(data.get(column, None)))
+        stimuliname = data.get('stimuliname', None)
+        code = self.stimuli_codes.get(stimuliname)
+        if code is None:
+            code = self.stimuli_codes[stimuliname] = len(self.stimulinames)
+            self.stimulinames.append(stimuliname)
+        self.columns['stimuliname'].append(code)
+
+    def __len__(self):
+        return len(self.columns['timestamp'])
+
+    def build(self):
+        """Returns the SampleTable holding all the samples added so far"""
+        columns = {}
+        for column in SampleTable.INT_COLUMNS:
+            columns[column] = np.array(self.columns[column], dtype=np.int64)
+        for column in SampleTable.FLOAT_COLUMNS:
+            columns[column] = np.array(self.columns[column], dtype=np.float64)
+        for column in SampleTable.BOOL_COLUMNS:
+            columns[column] = np.array(self.columns[column], dtype=bool)
+        columns['stimuliname'] = np.array(self.columns['stimuliname'], dtype=np.int32)
+        return SampleTable(columns, list(self.stimulinames))
+
+class TimestampIndex(object):
+    """
+    A precomputed index over the timestamps of a stream of records ("Datapoint"s, "Fixation"s,
+    "Saccade"s or "Event"s) that answers the interval queries of utils.get_chunk by bisection
+    instead of a linear scan.
+
+    The index is only built for streams with known and non-decreasing timestamps (see from_records).
+    Slicing an index returns the index of the corresponding slice of the stream, without any copy.
+
+    Attributes:
+        timestamps: an array with the timestamps of the records
+        ends: for "Fixation"s, an array with the end time of each Fixation, None otherwise
+        halves: for "Fixation"s, an array with the middle time of each Fixation, None otherwise
+        ends_sorted: a boolean indicating whether the end times of the "Fixation"s are non-decreasing
+    """
+
+    def __init__(self, timestamps, durations=None, ends_sorted=None):
+        """Initializes a TimestampIndex
+
+        Args:
+            timestamps: a non-decreasing array of timestamps
+            durations: for "Fixation"s, an array with the duration of each Fixation, None otherwise
+            ends_sorted: if not None, whether the end times of the "Fixation"s are known to be non-decreasing
+
+        Yields:
+            a TimestampIndex object
+        """
+        self.timestamps = timestamps
+        if durations is None:
+            self.ends = None
+            self.halves = None
+            self.ends_sorted = True
+        else:
+            self.ends = timestamps + durations
+            self.halves = timestamps + durations / 2.0
+            if ends_sorted is None:
+                ends_sorted = bool(np.all(self.ends[1:] >= self.ends[:-1]))
+            self.ends_sorted = ends_sorted
+
+    @classmethod
+    def from_records(cls, records):
+        """Returns the TimestampIndex of a list of records, or None if the records cannot be indexed
+
+        Args:
+            records: a list of "Datapoint"s, "Fixation"s, "Saccade"s or "Event"s
+
+        Returns:
+            a TimestampIndex, or None if some timestamps (or Fixation durations) are missing or
+            if the timestamps are not sorted
+        """
+        timestamps = [record.timestamp for record in records]
+        if None in timestamps:
+            return None
+        timestamps = np.array(timestamps, dtype=np.int64)
+        if not np.all(timestamps[1:] >= timestamps[:-1]):
+            return None
+        if len(records) > 0 and isinstance(records[0], Fixation):
+            durations = [fix.fixationduration for fix in records]
+            if None in durations:
+                return None
+            return cls(timestamps, np.array(durations, dtype=np.int64))
+        return cls(timestamps)
+
+    @classmethod
+    def from_timestamps(cls, timestamps):
+        """Returns the TimestampIndex of an array of timestamps, or None if they cannot be indexed"""
+        if np.any(timestamps == SampleTable.INT_MISSING) or not np.all(timestamps[1:] >= timestamps[:-1]):
+            return None
+        return cls(timestamps)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError("a TimestampIndex can only be sliced")
+        sliced = TimestampIndex(self.timestamps[index])
+        if self.ends is not None:
+            sliced.ends = self.ends[index]
+            sliced.halves = self.halves[index]
+            sliced.ends_sorted = self.ends_sorted
+        return sliced
+
+    def get_chunk(self, ind, start, end, include_half_fixations=False):
+        """Returns index of first and last records that fall within a time interval (start-end)
+
+        Same as utils.get_chunk, including the handling of "Fixation"s that are only partly inside
+        the interval.
+
+        Args:
+            ind: an integer indicating the starting index for search
+            start: an integer indicating the start of interval in milliseconds
+            end: an integer indicating the end of interval in milliseconds
+            include_half_fixations: whether "Fixation"s that are mostly inside the interval are included
+                (see params.INCLUDE_HALF_FIXATIONS)
+
+        Returns:
+            curr_ind, start_ind, end_ind: see utils.get_chunk
+        """
+        datalen = len(self.timestamps)
+        if ind >= datalen:
+            return datalen, datalen, datalen
+
+        curr_ind = ind + int(np.searchsorted(self.timestamps[ind:], start, 'left'))
+        if self.ends is None: # if this is not a Fixation we do not have to worry about half fixations
+            start_ind = curr_ind
+            curr_ind = start_ind + int(np.searchsorted(self.timestamps[start_ind:], end, 'right'))
+            return curr_ind, start_ind, curr_ind
+
+        if include_half_fixations and self.halves[curr_ind - 1] > start: # if the last fixation before, is mostly in this segment
+            curr_ind -= 1
+        start_ind = curr_ind
+        if curr_ind < 0:
+            # the fixation before the first one is the last fixation of the list (negative index)
+            if self.ends[curr_ind] > end:
+                return curr_ind, start_ind, curr_ind
+            curr_ind = 0
+        curr_ind = self._first_end_after(curr_ind, end)
+
+        if curr_ind == start_ind:   # an empty chunk!
+            end_ind = curr_ind - 1
+        elif self.halves[curr_ind - 1] > end: # if the last fixation is mostly outside this segment
+            end_ind = curr_ind - 2
+        else:
+            end_ind = curr_ind - 1
+        return curr_ind, start_ind, end_ind + 1
+
+    def _first_end_after(self, ind, end):
+        """Returns the index of the first Fixation from ind that ends after end (or the length of the index)"""
+        if self.ends_sorted:
+            return ind + int(np.searchsorted(self.ends[ind:], end, 'right'))
+        after = np.flatnonzero(self.ends[ind:] > end)
+        if len(after) == 0:
+            return len(self.ends)
+        return ind + int(after[0])
+
+
+class RecordList(list):
+    """
+    A list of "Fixation"s, "Saccade"s or "Event"s that carries the TimestampIndex of its records.
+    Slices of a RecordList are "RecordingView"s of the list carrying the corresponding slice of the index.
+
+    Attributes:
+        timestamp_index: a TimestampIndex, or None if the records cannot be indexed
+    """
+
+    def __init__(self, records=(), timestamp_index=False):
+        """Initializes a RecordList
+
+        Args:
+            records: a list of records
+            timestamp_index: the TimestampIndex of the records. If not given, it is built from the records.
+
+        Yields:
+            a RecordList object
+        """
+        list.__init__(self, records)
+        if timestamp_index is False:
+            timestamp_index = TimestampIndex.from_records(self)
+        self.timestamp_index = timestamp_index
+
+    def __getitem__(self, index):
+        if isinstance(index, slice) and index.step is None:
+            start, stop, _ = index.indices(len(self))
+            return self.__getslice__(start, stop)
+        return list.__getitem__(self, index)
+
+    def __getslice__(self, start, stop):
+        # Python 2 has already added len(self) to negative indices: the remaining ones are clamped
+        start = min(max(start, 0), len(self))
+        stop = min(max(stop, 0), len(self))
+        if self.timestamp_index is None:
+            timestamp_index = None
+        else:
+            timestamp_index = self.timestamp_index[start:stop]
+        return RecordingView(self, start, stop, timestamp_index)
+
+
+class RecordingView(object):
+    """
+    A read-only view of the records start to stop (excluded) of a stream of a recording
+    (e.g. the "Fixation"s of one Segment). A RecordingView behaves like the corresponding slice
+    of the list but does not copy it: "Segment"s, sub-"Segment"s and "AOI_Stat"s built from the same
+    recording all share its record list. Slicing a RecordingView returns another view of the same list.
+    (Slices of a SampleTable are already views of the arrays of the recording.)
+
+    Attributes:
+        records: the list of records of the recording
+        start, stop: the range of the view in records
+        timestamp_index: the TimestampIndex of the records in the view, or None
+    """
+
+    def __init__(self, records, start, stop, timestamp_index=None):
+        """Initializes a RecordingView
+
+        Args:
+            records: a list of records
+            start, stop: the range of the view in records, with 0 <= start and stop <= len(records)
+            timestamp_index: the TimestampIndex of the records in the view, or None
+
+        Yields:
+            a RecordingView object
+        """
+        self.records = records
+        self.start = start
+        self.stop = max(start, stop)
+        self.timestamp_index = timestamp_index
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step is not None:
+                return list(self)[index]
+            start, stop, _ = index.indices(len(self))
+            if self.timestamp_index is None:
+                timestamp_index = None
+            else:
+                timestamp_index = self.timestamp_index[start:stop]
+            return RecordingView(self.records, self.start + start, self.start + stop, timestamp_index)
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("RecordingView index out of range")
+        return self.records[self.start + index]
+
+    def __iter__(self):
+        records = self.records
+        for index in _range(self.start, self.stop):
+            yield records[index]
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class IntervalIndex(object):
+    """
+    A static index of a list of closed time intervals (start, end) (e.g. the activity intervals of a dynamic AOI,
+    see AOI.index_activity), answering the queries about the intervals around a time or overlapping a time range
+    in logarithmic time (plus the number of intervals returned) instead of scanning the list.
+
+    The intervals are sorted by start, with the running maximum of their ends (for the intervals starting before
+    a time), the running minimum of their ends from the last one (for the intervals starting after a time), and
+    a binary tree of the maximum end of each range of sorted intervals (to find the intervals overlapping a time
+    range without visiting the others).
+
+    Attributes:
+        intervals: the list of the (start, end) intervals, in the given order
+        positions: the position in intervals of each interval, sorted by start (and position)
+        starts: the starts of the intervals, sorted
+    """
+
+    def __init__(self, intervals):
+        """Initializes an IntervalIndex
+
+        Args:
+            intervals: a list of (start, end) intervals, in any order and possibly overlapping
+
+        Yields:
+            an IntervalIndex object
+        """
+        self.intervals = list(intervals)
+        self.positions = sorted(range(len(self.intervals)), key=lambda i: self.intervals[i][0])
+        self.starts = [self.intervals[i][0] for i in self.positions]
+        ends = [self.intervals[i][1] for i in self.positions]
+
+        self._max_end = []
+        max_end = float('-inf')
+        for end in ends:
+            max_end = max(max_end, end)
+            self._max_end.append(max_end)
+        self._min_end_after = [float('inf')] * (len(ends) + 1)
+        for i in range(len(ends) - 1, -1, -1):
+            self._min_end_after[i] = min(self._min_end_after[i + 1], ends[i])
+
+        self._size = 1
+        while self._size < len(ends):
+            self._size *= 2
+        self._tree = [float('-inf')] * (2 * self._size)
+        self._tree[self._size:self._size + len(ends)] = ends
+        for node in range(self._size - 1, 0, -1):
+            self._tree[node] = max(self._tree[2 * node], self._tree[2 * node + 1])
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def max_end_starting_before(self, time, inclusive=True):
+        """Returns the largest end of the intervals starting before time (or at time if inclusive),
+        or -infinity if there is none"""
+        k = bisect_right(self.starts, time) if inclusive else bisect_left(self.starts, time)
+        return self._max_end[k - 1] if k > 0 else float('-inf')
+
+    def min_end_starting_after(self, time):
+        """Returns the smallest end of the intervals starting strictly after time, or +infinity if there is none"""
+        return self._min_end_after[bisect_right(self.starts, time)]
+
+    def overlapping(self, start, end):
+        """Returns the positions in intervals of the intervals overlapping the closed time range [start, end]
+        (i.e. the intervals (s, e) with s <= end and e >= start), in increasing order"""
+        k = bisect_right(self.starts, end)
+        found = []
+        stack = [(1, 0, self._size)]
+        while stack:
+            node, lo, hi = stack.pop()
+            if lo >= k or self._tree[node] < start:
+                continue
+            if node >= self._size:
+                found.append(self.positions[lo])
+                continue
+            mid = (lo + hi) // 2
+            stack.append((2 * node + 1, mid, hi))
+            stack.append((2 * node, lo, mid))
+        found.sort()
+        return found
+
+
 class Fixation:
     """
     A class that holds the information for one Fixation
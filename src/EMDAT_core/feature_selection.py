@@ -0,0 +1,195 @@
+"""
+UBC Eye Movement Data Analysis Toolkit (EMDAT), Version 3
+
+Feature-dependency map: which calculators of the "Segment"s, "Scene"s and "AOI_Stat"s, and which data
+of the Recording, each feature depends on.
+
+The features of a Segment are computed in groups, one per calculator (e.g. all the pupil features by
+Segment.calc_pupil_features), and the features of a Scene are merged from those of its "Segment"s group by
+group. A FeatureSelection built from the lists of features to export (as given to get_features or
+write_features_tsv) tells which groups are needed, so that the calculators, the streams of the Recording
+(saccades, events) and the columns of the samples (pupil sizes, distances) that no requested feature
+depends on are skipped. The features of the skipped groups are absent from the "Segment"s and "Scene"s
+(and keep their default values in the "AOI_Stat"s).
+
+The features that are not in any group (e.g. 'length', 'numsamples', 'numfixations') are always computed,
+and a feature that is not in the map (e.g. a feature added by a subclass) selects all the groups.
+
+Institution: The University of British Columbia.
+"""
+
+# the features of each group of features of the "Segment"s and "Scene"s
+FEATURE_GROUPS = {
+    'path': ['fixationrate', 'meanfixationduration', 'stddevfixationduration', 'sumfixationduration',
+             'meanpathdistance', 'sumpathdistance', 'stddevpathdistance', 'eyemovementvelocity',
+             'sumabspathangles', 'abspathanglesrate', 'meanabspathangles', 'stddevabspathangles',
+             'sumrelpathangles', 'relpathanglesrate', 'meanrelpathangles', 'stddevrelpathangles'],
+    'blink': ['blinknum', 'blinkdurationtotal', 'blinkdurationmean', 'blinkdurationstd', 'blinkdurationmin',
+              'blinkdurationmax', 'blinkrate', 'blinktimedistancemean', 'blinktimedistancestd',
+              'blinktimedistancemin', 'blinktimedistancemax'],
+    'pupil': ['meanpupilsize', 'stddevpupilsize', 'maxpupilsize', 'minpupilsize', 'startpupilsize', 'endpupilsize',
+              'meanpupilvelocity', 'stddevpupilvelocity', 'maxpupilvelocity', 'minpupilvelocity'],
+    'distance': ['meandistance', 'stddevdistance', 'maxdistance', 'mindistance', 'startdistance', 'enddistance'],
+    'saccade': ['numsaccades', 'sumsaccadedistance', 'meansaccadedistance', 'stddevsaccadedistance',
+                'longestsaccadedistance', 'sumsaccadeduration', 'meansaccadeduration', 'stddevsaccadeduration',
+                'longestsaccadeduration', 'meansaccadespeed', 'stddevsaccadespeed', 'maxsaccadespeed',
+                'minsaccadespeed', 'fixationsaccadetimeratio'],
+    'event': ['numevents', 'numleftclic', 'numrightclic', 'numdoubleclic', 'numkeypressed', 'leftclicrate',
+              'rightclicrate', 'doubleclicrate', 'keypressedrate', 'timetofirstleftclic', 'timetofirstrightclic',
+              'timetofirstdoubleclic', 'timetofirstkeypressed'],
+    'aoisequence': ['aoisequence'],
+}
+
+# the features of the "Segment"s and "Scene"s computed whatever the selection
+CORE_FEATURES = ['numsegments', 'completion_time', 'length', 'length_invalid', 'numsamples', 'numfixations']
+
+# the groups whose calculators use the features of other groups
+GROUP_DEPENDENCIES = {
+    'saccade': ['path'],    # fixationsaccadetimeratio uses sumfixationduration
+}
+
+# the features of each group of features of the "AOI_Stat"s ('numtransfrom' and 'proptransfrom' stand for
+# the transition features to all the "AOI"s, as in AOI_Stat.get_features)
+AOI_FEATURE_GROUPS = {
+    'pupil': FEATURE_GROUPS['pupil'],
+    'distance': FEATURE_GROUPS['distance'],
+    'event': ['numevents', 'numleftclic', 'numrightclic', 'numdoubleclic', 'leftclicrate', 'rightclicrate',
+              'doubleclicrate', 'timetofirstleftclic', 'timetofirstrightclic', 'timetofirstdoubleclic',
+              'timetolastleftclic', 'timetolastrightclic', 'timetolastdoubleclic'],
+    'transition': ['numtransfrom', 'proptransfrom'],
+}
+
+# the features of the "AOI_Stat"s computed whatever the selection (if any AOI feature is selected)
+AOI_CORE_FEATURES = ['numfixations', 'longestfixation', 'meanfixationduration', 'stddevfixationduration',
+                     'timetofirstfixation', 'timetolastfixation', 'proportionnum', 'proportiontime',
+                     'fixationrate', 'totaltimespent']
+
+# the groups of features ("Segment" groups, and AOI groups prefixed with 'aoi_') that use each kind of
+# data of the Recording
+DATA_DEPENDENCIES = {
+    'pupil': ['pupil', 'aoi_pupil'],            # the pupil sizes and velocities of the samples
+    'distance': ['distance', 'aoi_distance'],   # the distances of the samples from the screen
+    'saccades': ['saccade'],                    # the saccade stream
+    'events': ['event', 'aoi_event'],           # the event stream
+}
+
+
+class FeatureSelection(object):
+    """
+    The groups of features needed to compute a list of features (see FEATURE_GROUPS and AOI_FEATURE_GROUPS).
+
+    The lists are given as to Segment.get_features: None selects all the features, and an empty list none.
+
+    Attributes:
+        groups: the set of the groups of features of the "Segment"s and "Scene"s that are needed, with 'aoi'
+            if any AOI feature is needed
+        aoi_groups: the set of the groups of features of the "AOI_Stat"s that are needed
+    """
+
+    def __init__(self, featurelist=None, aoifeaturelist=None, aoifeaturelabels=None):
+        """Inits FeatureSelection class
+
+        Args:
+            featurelist: if not None, a list containing the name of the features of the "Segment"s and "Scene"s
+
+            aoifeaturelist: if not None, a list of features of each of the "AOI"s (e.g. 'fixationrate')
+
+            aoifeaturelabels: if not None, a list of AOI features of the form [AOI name]_[feature name]
+                (e.g. 'graph_fixationrate'). As in Segment.get_features, aoifeaturelist is not used if
+                aoifeaturelabels is given.
+        """
+        if featurelist is None:
+            self.groups = set(FEATURE_GROUPS)
+        else:
+            self.groups = set()
+            for name in featurelist:
+                self.groups.update(_groups_of(name, FEATURE_GROUPS, CORE_FEATURES))
+        for group in list(self.groups):
+            self.groups.update(GROUP_DEPENDENCIES.get(group, []))
+
+        if aoifeaturelabels:
+            aoifeatures, match = aoifeaturelabels, _label_matches
+        else:
+            aoifeatures, match = aoifeaturelist, _aoi_feature_matches
+        if aoifeatures is None:
+            self.aoi_groups = set(AOI_FEATURE_GROUPS)
+        else:
+            self.aoi_groups = set()
+            for name in aoifeatures:
+                self.aoi_groups.update(_groups_of(name, AOI_FEATURE_GROUPS, AOI_CORE_FEATURES, match))
+        if aoifeatures is None or len(aoifeatures) > 0:
+            self.groups.add('aoi')
+
+    def needs(self, group):
+        """Returns True if the features of a group of the "Segment"s and "Scene"s are needed
+
+        Args:
+            group: a key of FEATURE_GROUPS, or 'aoi' for the "AOI_Stat"s
+        """
+        return group in self.groups
+
+    def needs_aoi(self, group):
+        """Returns True if the features of a group of the "AOI_Stat"s are needed
+
+        Args:
+            group: a key of AOI_FEATURE_GROUPS
+        """
+        return 'aoi' in self.groups and group in self.aoi_groups
+
+    def needs_data(self, data):
+        """Returns True if a kind of data of the Recording is used by the needed features
+
+        Args:
+            data: a key of DATA_DEPENDENCIES (e.g. 'pupil' or 'events')
+        """
+        for group in DATA_DEPENDENCIES[data]:
+            if group.startswith('aoi_'):
+                if self.needs_aoi(group[len('aoi_'):]):
+                    return True
+            elif self.needs(group):
+                return True
+        return False
+
+    def key(self):
+        """Returns the needed groups, as a value with a stable repr() (see Recording.cache_key_data)"""
+        return tuple(sorted(self.groups)), tuple(sorted(self.aoi_groups))
+
+
+
+def _groups_of(name, groups, core, match=None):
+    """Returns the groups needed to compute a feature: its group, no group for the core features, and
+    all the groups for a feature that is not in the map
+
+    Args:
+        name: the name of the feature
+        groups: a dictionary with the list of the features of each group
+        core: the list of the features computed whatever the selection
+        match: if not None, a function telling whether name is a given feature (by default, name == feature)
+    """
+    if match is None:
+        match = lambda name, feature: name == feature
+    for feature in core:
+        if match(name, feature):
+            return []
+    found = [group for group, features in groups.items() if any(match(name, feature) for feature in features)]
+    if found:
+        return found
+    return list(groups)
+
+
+def _aoi_feature_matches(name, feature):
+    """Returns True if a name of aoifeaturelist is a feature of an AOI ('numtransfrom' and 'proptransfrom'
+    also match the transition features to one AOI, e.g. 'numtransfrom_graph')"""
+    if feature in ('numtransfrom', 'proptransfrom'):
+        return name == feature or name.startswith(feature + '_')
+    return name == feature
+
+
+def _label_matches(label, feature):
+    """Returns True if an AOI feature label (of the form [AOI name]_[feature name]) is a feature of an AOI"""
+    if feature in ('numtransfrom', 'proptransfrom'):
+        return ('_' + feature + '_') in label
+    return label.endswith('_' + feature)
+
+
+ALL_FEATURES = FeatureSelection()   # the selection of all the features (used when none is given)
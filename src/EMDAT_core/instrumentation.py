@@ -0,0 +1,323 @@
+"""
+UBC Eye Movement Data Analysis Toolkit (EMDAT), Version 3
+
+Opt-in instrumentation of the pipeline: the wall and CPU time spent in each stage (parsing, Segment
+construction, the feature groups of a Segment, AOI statistics, Scene merging, export) and the number of
+calls of the hot helpers (point_inside_polygon, get_chunk), for each participant and for the whole run.
+
+Instrumentation is enabled by setting params.INSTRUMENTATION to True, or the environment variable
+EMDAT_INSTRUMENTATION to 1. The report is then written as JSON when the program exits, to
+params.INSTRUMENTATION_REPORT (or to the file named by the environment variable EMDAT_INSTRUMENTATION_REPORT),
+or on demand with write_report(). When instrumentation is disabled, a stage costs one test and the helpers
+are not wrapped at all: the call counters are only installed if instrumentation is enabled when EMDAT is
+imported.
+
+Stages are nested (e.g. the blink features are computed while a Segment is built, and Segments are built
+while a Scene is): the time of a stage includes the time of the stages run inside it, and its "self" time
+does not.
+
+Institution: The University of British Columbia.
+"""
+
+import atexit
+import functools
+import json
+import os
+import time
+from collections import OrderedDict
+
+import params
+
+REPORT_FORMAT = 1
+
+_ENV_ENABLED = os.environ.get('EMDAT_INSTRUMENTATION', '') not in ('', '0')
+_cpu_time = getattr(time, 'process_time', None) or time.clock  # time.clock is the CPU time on Python 2
+
+
+def is_enabled():
+    """Returns True if instrumentation is enabled (see params.INSTRUMENTATION)"""
+    return _ENV_ENABLED or getattr(params, 'INSTRUMENTATION', False)
+
+
+class StageStats(object):
+    """
+    The time spent in one stage
+
+    Attributes:
+        calls: the number of times the stage was run
+        wall_time, cpu_time: the wall and CPU time (in seconds) spent in the stage
+        self_wall_time, self_cpu_time: the same, minus the time spent in the stages run inside it
+    """
+
+    FIELDS = ('calls', 'wall_time', 'cpu_time', 'self_wall_time', 'self_cpu_time')
+
+    def __init__(self):
+        self.calls = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.self_wall_time = 0.0
+        self.self_cpu_time = 0.0
+
+    def add(self, other):
+        """Adds the time of another StageStats to this one"""
+        for field in StageStats.FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+    def to_dict(self):
+        return dict((field, getattr(self, field)) for field in StageStats.FIELDS)
+
+    @classmethod
+    def from_dict(cls, values):
+        stats = cls()
+        for field in StageStats.FIELDS:
+            setattr(stats, field, values[field])
+        return stats
+
+
+class Report(object):
+    """
+    The stage times and call counters of a participant or of a run
+
+    Attributes:
+        stages: a dictionary of "StageStats" with the stage names as keys
+        counters: a dictionary of call counts with the helper names as keys
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+
+    def add_stage(self, name, wall_time, cpu_time, self_wall_time, self_cpu_time):
+        """Records one run of a stage"""
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        stats.calls += 1
+        stats.wall_time += wall_time
+        stats.cpu_time += cpu_time
+        stats.self_wall_time += self_wall_time
+        stats.self_cpu_time += self_cpu_time
+
+    def count(self, name, calls=1):
+        """Adds calls to the counter of a helper"""
+        self.counters[name] = self.counters.get(name, 0) + calls
+
+    def merge(self, other):
+        """Adds the stage times and call counters of another Report to this one"""
+        for name, stats in other.stages.items():
+            if name not in self.stages:
+                self.stages[name] = StageStats()
+            self.stages[name].add(stats)
+        for name, calls in other.counters.items():
+            self.count(name, calls)
+
+    def to_dict(self):
+        return {'stages': dict((name, stats.to_dict()) for name, stats in self.stages.items()),
+                'counters': dict(self.counters)}
+
+    @classmethod
+    def from_dict(cls, values):
+        report = cls()
+        for name, stats in values['stages'].items():
+            report.stages[name] = StageStats.from_dict(stats)
+        report.counters.update(values['counters'])
+        return report
+
+
+_run = Report()
+_participants = OrderedDict()
+_current = None     # the Report of the participant being processed, if any
+_stack = []         # one [name, wall start, cpu start, wall time of children, cpu time of children] per open stage
+
+
+class _Stage(object):
+    """A context manager timing one run of a stage (see stage())"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        _stack.append([self.name, time.time(), _cpu_time(), 0.0, 0.0])
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        name, wall_start, cpu_start, children_wall, children_cpu = _stack.pop()
+        wall_time = time.time() - wall_start
+        cpu_time = _cpu_time() - cpu_start
+        if _stack:
+            _stack[-1][3] += wall_time
+            _stack[-1][4] += cpu_time
+        self_wall_time = wall_time - children_wall
+        self_cpu_time = cpu_time - children_cpu
+        _run.add_stage(name, wall_time, cpu_time, self_wall_time, self_cpu_time)
+        if _current is not None:
+            _current.add_stage(name, wall_time, cpu_time, self_wall_time, self_cpu_time)
+        return False
+
+
+class _NoStage(object):
+    """The context manager returned by stage() when instrumentation is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name):
+    """Returns a context manager that times the code it runs as one run of a stage
+
+    Args:
+        name: the name of the stage, e.g. 'parse'
+    """
+    if is_enabled():
+        return _Stage(name)
+    return _NO_STAGE
+
+
+def timed(name):
+    """A decorator timing every call of a function (or method) as one run of a stage
+
+    Args:
+        name: the name of the stage
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return func(*args, **kwargs)
+            with _Stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, calls=1):
+    """Adds calls to the counter of a helper (does nothing if instrumentation is disabled)"""
+    if not is_enabled():
+        return
+    _run.count(name, calls)
+    if _current is not None:
+        _current.count(name, calls)
+
+
+def counted(name):
+    """A decorator counting the calls of a helper
+
+    The function is returned unchanged when instrumentation is disabled at import time, so that
+    the helper costs nothing more in normal runs.
+
+    Args:
+        name: the name of the counter
+    """
+    def decorate(func):
+        if not is_enabled():
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            _run.count(name)
+            if _current is not None:
+                _current.count(name)
+            return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def begin_participant(pid):
+    """Starts attributing the stages and the calls to a participant, until end_participant() is called
+
+    Args:
+        pid: the participant id
+    """
+    global _current
+    if not is_enabled():
+        return
+    del _stack[:]  # stages left open by a participant that failed
+    _current = Report()
+    _participants[pid] = _current
+    _Stage('participant').__enter__()
+
+
+def end_participant():
+    """Stops attributing the stages and the calls to the current participant"""
+    global _current
+    if _current is None:
+        return
+    if _stack:
+        _Stage('participant').__exit__(None, None, None)
+    _current = None
+
+
+def participant_report(pid):
+    """Returns the report of a participant as a dictionary, or None if nothing was recorded for it
+
+    This is used to send the report of a participant from a worker process to the parent process
+    (see add_participant_report).
+    """
+    report = _participants.get(pid)
+    return report.to_dict() if report is not None else None
+
+
+def add_participant_report(pid, values):
+    """Adds the report of a participant processed in another process to this run
+
+    Args:
+        pid: the participant id
+
+        values: a dictionary returned by participant_report, or None
+    """
+    if values is None or not is_enabled():
+        return
+    report = Report.from_dict(values)
+    if pid in _participants:
+        _participants[pid].merge(report)
+    else:
+        _participants[pid] = report
+    _run.merge(report)
+
+
+def report():
+    """Returns the report of the run as a dictionary
+
+    The report holds the stage times and call counters of the whole run ('run') and of each participant
+    ('participants', a list of dictionaries with the participant id as 'pid'), in the order of processing.
+    """
+    participants = []
+    for pid, participant in _participants.items():
+        values = participant.to_dict()
+        values['pid'] = pid
+        participants.append(values)
+    return {'format': REPORT_FORMAT, 'run': _run.to_dict(), 'participants': participants}
+
+
+def write_report(outfile=None):
+    """Writes the report of the run as JSON
+
+    Args:
+        outfile: the name of the output file; by default, the file named by the environment variable
+            EMDAT_INSTRUMENTATION_REPORT, or else params.INSTRUMENTATION_REPORT
+    """
+    if outfile is None:
+        outfile = os.environ.get('EMDAT_INSTRUMENTATION_REPORT') or params.INSTRUMENTATION_REPORT
+    with open(outfile, 'w') as f:
+        json.dump(report(), f, indent=1, sort_keys=True)
+
+
+def reset():
+    """Forgets everything recorded so far"""
+    global _run, _current
+    _run = Report()
+    _participants.clear()
+    _current = None
+    del _stack[:]
+
+
+def _write_report_at_exit():
+    if is_enabled() and (_run.stages or _run.counters):
+        write_report()
+
+atexit.register(_write_report_at_exit)
@@ -0,0 +1,243 @@
+"""
+UBC Eye Movement Data Analysis Toolkit (EMDAT), Version 3
+
+On-disk cache of parsed recordings. Reading the files exported by an eye tracker does not depend
+on the feature parameters (validity thresholds, AOIs, ...), so the data streams of a Recording
+(samples, fixations, saccades and events) are stored once in a NumPy '.npz' file and loaded from
+there in later runs. A cache file is identified by the content of the input files, the reader
+class and version, and the parameters the reader depends on (see Recording.cache_key_data).
+
+Institution: The University of British Columbia.
+"""
+
+import hashlib
+import numbers
+import os
+import numpy as np
+from EMDAT_core.data_structures import Datapoint, Fixation, Saccade, Event, SampleTable
+
+FORMAT_VERSION = 1
+
+# the type of each value of a cached attribute
+_ABSENT, _NONE, _BOOL, _INT, _FLOAT, _STR = range(6)
+
+
+class _MissingAttribute:
+    """Marks an attribute that a record does not have (e.g. 'data1' for most "Event"s)"""
+    pass
+
+
+class _EmptyRecord:
+    """Helper to create records without calling their constructor (see _new_record)"""
+    pass
+
+
+def cache_path(cache_dir, recording, all_file, fixation_file, saccade_file=None, event_file=None):
+    """Returns the name of the cache file of a recording
+
+    Args:
+        cache_dir: the directory of the cache files
+
+        recording: the Recording reading the files
+
+        all_file, fixation_file, saccade_file, event_file: the input files of the recording
+            (saccade_file and event_file can be None)
+
+    Returns:
+        a string containing the name of the '.npz' file
+    """
+    key = recording_digest(recording.cache_key_data(), (all_file, fixation_file, saccade_file, event_file))
+    return os.path.join(cache_dir, key + '.npz')
+
+
+def recording_digest(key_data, files):
+    """Returns the SHA-1 digest (in hexadecimal) identifying a recording: its reader settings and the
+    content of its input files
+
+    Args:
+        key_data: a list of values with a stable repr(), as returned by Recording.cache_key_data
+
+        files: the input files of the recording (possibly None)
+    """
+    key = hashlib.sha1()
+    key.update(repr((FORMAT_VERSION, key_data)).encode('utf-8'))
+    digests = {}
+    for path in files:
+        if path is None:
+            key.update(b'None')
+            continue
+        if path not in digests:
+            digests[path] = file_digest(path)
+        key.update(digests[path].encode('ascii'))
+    return key.hexdigest()
+
+
+def file_digest(path, block_size=1 << 20):
+    """Returns the SHA-1 digest (in hexadecimal) of the content of a file"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        block = f.read(block_size)
+        while block:
+            digest.update(block)
+            block = f.read(block_size)
+    return digest.hexdigest()
+
+
+def save_recording(path, all_data, fix_data, sac_data=None, event_data=None):
+    """Writes the data streams of a recording to a cache file
+
+    The file is written under a temporary name and then renamed, so that a cache file is
+    never seen half-written.
+
+    Args:
+        path: the name of the '.npz' cache file
+
+        all_data: a SampleTable or a list of "Datapoint"s
+
+        fix_data: a list of "Fixation"s
+
+        sac_data: a list of "Saccade"s, or None
+
+        event_data: a list of "Event"s, or None
+
+    Raises:
+        TypeError: if a record holds a value that cannot be stored in the cache
+    """
+    arrays = {}
+    if isinstance(all_data, SampleTable):
+        for column in SampleTable.COLUMNS:
+            arrays['samples.' + column] = getattr(all_data, column)
+        _encode_values(arrays, 'samples.stimulinames', all_data.stimulinames)
+    else:
+        _encode_records(arrays, 'datapoints', all_data)
+    _encode_records(arrays, 'fixations', fix_data)
+    if sac_data is not None:
+        _encode_records(arrays, 'saccades', sac_data)
+    if event_data is not None:
+        _encode_records(arrays, 'events', event_data)
+
+    temp_path = '%s.%d.tmp.npz' % (path[:-len('.npz')], os.getpid())
+    try:
+        np.savez(temp_path, **arrays)
+    except:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(temp_path, path)
+
+
+def load_recording(path):
+    """Reads the data streams of a recording from a cache file written by save_recording
+
+    Args:
+        path: the name of the '.npz' cache file
+
+    Returns:
+        the SampleTable (or list of "Datapoint"s), the list of "Fixation"s, the list of "Saccade"s
+        (or None) and the list of "Event"s (or None), as returned by Recording.read_data
+    """
+    with np.load(path, allow_pickle=False) as cached:
+        arrays = dict((name, cached[name]) for name in cached.files)
+    if 'datapoints.count' in arrays:
+        all_data = _decode_records(arrays, 'datapoints', Datapoint)
+    else:
+        columns = dict((column, arrays['samples.' + column]) for column in SampleTable.COLUMNS)
+        all_data = SampleTable(columns, _decode_values(arrays, 'samples.stimulinames'))
+    fix_data = _decode_records(arrays, 'fixations', Fixation)
+    sac_data = _decode_records(arrays, 'saccades', Saccade) if 'saccades.count' in arrays else None
+    event_data = _decode_records(arrays, 'events', Event) if 'events.count' in arrays else None
+    return all_data, fix_data, sac_data, event_data
+
+
+def _encode_records(arrays, prefix, records):
+    """Stores the attributes of a list of records, one set of arrays per attribute"""
+    names = sorted(set(name for record in records for name in record.__dict__))
+    arrays[prefix + '.count'] = np.array(len(records))
+    _encode_values(arrays, prefix + '.names', names)
+    for name in names:
+        _encode_values(arrays, prefix + '.' + name,
+                       [record.__dict__.get(name, _MissingAttribute) for record in records])
+
+
+def _decode_records(arrays, prefix, record_class):
+    """Rebuilds the list of records stored by _encode_records"""
+    count = int(arrays[prefix + '.count'])
+    records = [{} for _ in range(count)]
+    for name in _decode_values(arrays, prefix + '.names'):
+        for attributes, value in zip(records, _decode_values(arrays, prefix + '.' + name)):
+            if value is not _MissingAttribute:
+                attributes[name] = value
+    return [_new_record(record_class, attributes) for attributes in records]
+
+
+def _new_record(record_class, attributes):
+    """Returns a record of the given class with the given attributes, without calling its constructor
+    (which would apply the media offset a second time)"""
+    record = _EmptyRecord()
+    record.__class__ = record_class
+    record.__dict__.update(attributes)
+    return record
+
+
+def _encode_values(arrays, prefix, values):
+    """Stores a list of Python values (None, bool, int, float or str) with their exact types
+
+    The type of each value is kept in the prefix+'.kinds' array and the values themselves in
+    typed arrays (prefix+'.ints', '.floats' and '.strs') that are only written when needed.
+    """
+    count = len(values)
+    kinds = np.empty(count, dtype=np.int8)
+    ints = np.zeros(count, dtype=np.int64)
+    floats = np.zeros(count, dtype=np.float64)
+    strs = [''] * count
+    for i, value in enumerate(values):
+        if value is _MissingAttribute:
+            kinds[i] = _ABSENT
+        elif value is None:
+            kinds[i] = _NONE
+        elif isinstance(value, bool):
+            kinds[i] = _BOOL
+            ints[i] = value
+        elif isinstance(value, numbers.Integral):
+            kinds[i] = _INT
+            ints[i] = value
+        elif isinstance(value, float):
+            kinds[i] = _FLOAT
+            floats[i] = value
+        elif isinstance(value, str):
+            kinds[i] = _STR
+            strs[i] = value
+        else:
+            raise TypeError("Value %r of type %s cannot be cached." % (value, type(value).__name__))
+    arrays[prefix + '.kinds'] = kinds
+    if np.any((kinds == _INT) | (kinds == _BOOL)):
+        arrays[prefix + '.ints'] = ints
+    if np.any(kinds == _FLOAT):
+        arrays[prefix + '.floats'] = floats
+    if np.any(kinds == _STR):
+        arrays[prefix + '.strs'] = np.array(strs)
+
+
+def _decode_values(arrays, prefix):
+    """Rebuilds the list of values stored by _encode_values"""
+    kinds = arrays[prefix + '.kinds'].tolist()
+    ints = arrays[prefix + '.ints'].tolist() if prefix + '.ints' in arrays else None
+    floats = arrays[prefix + '.floats'].tolist() if prefix + '.floats' in arrays else None
+    strs = arrays[prefix + '.strs'].tolist() if prefix + '.strs' in arrays else None
+    values = []
+    for i, kind in enumerate(kinds):
+        if kind == _ABSENT:
+            values.append(_MissingAttribute)
+        elif kind == _NONE:
+            values.append(None)
+        elif kind == _BOOL:
+            values.append(bool(ints[i]))
+        elif kind == _INT:
+            values.append(ints[i])
+        elif kind == _FLOAT:
+            values.append(floats[i])
+        else:
+            values.append(strs[i])
+    return values
@@ -0,0 +1,141 @@
+"""
+UBC Eye Movement Data Analysis Toolkit (EMDAT), Version 3
+
+On-disk cache of computed "Segment"s. The features of a Segment only depend on the data of the recording
+between its start and end, on its "AOI"s and on a few parameters, so each Segment a Scene computes (with its
+features, its AOI_Stat objects and the accumulators the Scene merges) is stored in its own pickle file and
+loaded from there in later runs. When the '.seg' file is edited only the new or changed "Segment"s are
+computed again, and the Scenes are merged from a mix of cached and new "Segment"s (unless the rows are
+filtered while reading, see params.READ_SEGMENTS_ONLY: the time ranges of the filter are part of the key).
+
+A cache file is identified by the recording (the content of its input files and the reader settings, see
+Recording.cache_key_data), the time range of the Segment, the "AOI"s, the arguments of the Segment
+and the parameters listed in SEGMENT_PARAMS.
+
+Institution: The University of British Columbia.
+"""
+
+import hashlib
+import os
+import sys
+from warnings import warn
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+import params
+
+FORMAT_VERSION = 1
+
+# the names of the parameters in params that the features of a Segment depend on
+SEGMENT_PARAMS = ('VALIDITY_METHOD', 'VALID_PROP_THRESH', 'VALID_TIME_THRESH', 'MAX_SEG_TIMEGAP',
+                  'PUPIL_ADJUSTMENT', 'blink_threshold', 'EYETRACKERTYPE', 'INCLUDE_HALF_FIXATIONS')
+
+
+class SegmentCache(object):
+    """
+    The cache of the "Segment"s of one recording.
+
+    Attributes:
+        cache_dir: the directory of the cache files
+        data_key: a string identifying the data of the recording (see Recording.cache_key_data)
+        hits: the number of "Segment"s loaded from the cache
+        misses: the number of "Segment"s not found in the cache
+    """
+
+    def __init__(self, cache_dir, data_key):
+        """Inits SegmentCache class
+
+        Args:
+            cache_dir: the directory of the cache files
+            data_key: a string identifying the data of the recording
+        """
+        self.cache_dir = cache_dir
+        self.data_key = data_key
+        self.hits = 0
+        self.misses = 0
+
+    def settings_key(self, aoilist, prune_length, rest_pupil_size, export_pupilinfo, feature_selection,
+                     saccades, events):
+        """Returns the part of the key of the cached "Segment"s shared by all the "Segment"s of a Scene
+
+        Args:
+            aoilist: a list of "AOI"s, or None
+            prune_length, rest_pupil_size, export_pupilinfo, feature_selection: the arguments of the "Segment"s
+            saccades: a boolean, True if the "Segment"s have saccade data
+            events: a boolean, True if the "Segment"s have event data
+
+        Returns:
+            a string
+        """
+        aois = [(aoi.aid, aoi.polyin, aoi.polyout, aoi.timeseq) for aoi in aoilist] if aoilist else []
+        settings = (FORMAT_VERSION, sys.version_info[0], self.data_key, aois, prune_length, rest_pupil_size,
+                    bool(export_pupilinfo), feature_selection.key(), bool(saccades), bool(events),
+                    [(name, getattr(params, name, None)) for name in SEGMENT_PARAMS])
+        return hashlib.sha1(repr(settings).encode('utf-8')).hexdigest()
+
+    def path(self, settings, start, end):
+        """Returns the name of the cache file of the Segment between start and end"""
+        key = hashlib.sha1((settings + repr((start, end))).encode('utf-8'))
+        return os.path.join(self.cache_dir, key.hexdigest() + '.pkl')
+
+    def load(self, settings, start, end, segid, aoilist=None, feature_selection=None):
+        """Returns the cached Segment between start and end, or None if there is none
+
+        Args:
+            settings: the key returned by settings_key
+            start, end: the time range of the Segment (as used to select its data)
+            segid: the id of the Segment (the cached Segment may come from a Segment with another id)
+            aoilist: if not None, the list of "AOI"s given to the Segment, shared by the AOI_Stat objects
+                of the cached Segment
+            feature_selection: if not None, the FeatureSelection of the Segment
+
+        Returns:
+            a Segment, or None
+        """
+        path = self.path(settings, start, end)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            with open(path, 'rb') as f:
+                segment = pickle.load(f)
+        except Exception as e:
+            warn("Cannot read the cached segment '" + path + "' (" + str(e) + "), computing it again.")
+            self.misses += 1
+            return None
+        segment.segid = segid
+        if feature_selection is not None:
+            segment.feature_selection = feature_selection
+        if aoilist:
+            aois = dict((aoi.aid, aoi) for aoi in aoilist)
+            for aid, aoi_stat in segment.aoi_data.items():
+                aoi_stat.aoi = aois.get(aid, aoi_stat.aoi)
+        self.hits += 1
+        return segment
+
+    def save(self, settings, start, end, segment):
+        """Writes a Segment to the cache (a failure to write it only issues a warning)
+
+        The file is written under a temporary name and then renamed, so that a cache file is
+        never seen half-written.
+
+        Args:
+            settings: the key returned by settings_key
+            start, end: the time range of the Segment (as used to select its data)
+            segment: the Segment
+        """
+        path = self.path(settings, start, end)
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            with open(temp_path, 'wb') as f:
+                pickle.dump(segment, f, pickle.HIGHEST_PROTOCOL)
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(temp_path, path)
+        except Exception as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            warn("Cannot write the cached segment '" + path + "': " + str(e))
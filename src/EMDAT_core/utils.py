@@ -9,10 +9,13 @@ Institution: The University of British Columbia.
 """
 
 from EMDAT_core.data_structures import Fixation
+from EMDAT_core import instrumentation
 import params
 import math
+import numpy as np
 
 
+@instrumentation.counted("point_inside_polygon")
 def point_inside_polygon(x,y,poly):
     """Determines if a point is inside a given polygon or not
 
@@ -45,6 +48,53 @@ def point_inside_polygon(x,y,poly):
 
     return inside
 
+def points_inside_polygon(x, y, poly):
+    """Determines which points of a batch are inside a given polygon
+
+        Vectorized version of point_inside_polygon: the same "Ray Casting Method" is applied to
+        arrays of coordinates, with the same arithmetic (so integer coordinates use the division
+        of the running Python version, like point_inside_polygon does). Only the points within the
+        bounding box of the polygon are tested, since the ray cast is always False outside of it.
+        Missing (NaN) coordinates are never inside.
+
+    Args:
+        x: a NumPy array with the x coordinates of the points
+        y: a NumPy array with the y coordinates of the points
+        poly: is a list of (x,y) pairs defining the polgon
+
+    Returns:
+        a boolean NumPy array, True for the points inside the polygon
+    """
+    inside = np.zeros(len(x), dtype=bool)
+    n = len(poly)
+    if n == 0 or len(x) == 0:
+        return inside
+
+    xs = [p[0] for p in poly]
+    ys = [p[1] for p in poly]
+    with np.errstate(invalid='ignore'):
+        candidates = np.flatnonzero((x >= min(xs)) & (x <= max(xs)) & (y > min(ys)) & (y <= max(ys)))
+    if len(candidates) == 0:
+        return inside
+    cx = x[candidates]
+    cy = y[candidates]
+    cinside = np.zeros(len(candidates), dtype=bool)
+
+    p1x,p1y = poly[0]
+    for i in range(n+1):
+        p2x,p2y = poly[i % n]
+        if p1y != p2y: #horizontal edges are never crossed
+            crossing = (cy > min(p1y,p2y)) & (cy <= max(p1y,p2y)) & (cx <= max(p1x,p2x))
+            if p1x != p2x:
+                xinters = (cy-p1y)*(p2x-p1x)/(p2y-p1y)+p1x
+                crossing &= cx <= xinters
+            cinside ^= crossing
+        p1x,p1y = p2x,p2y
+
+    inside[candidates] = cinside
+    return inside
+
+@instrumentation.counted("get_chunk")
 def get_chunk(data, ind, start, end):
     """Returns index of first and last records in data that fall within a time interval (start-end)
     Args:
@@ -62,7 +112,14 @@ def get_chunk(data, ind, start, end):
             the given time interval
         end_ind: an integer indicating the index of last record in the list that falls within
             the given time interval
+
+    If data carries a TimestampIndex (see data_structures.SampleTable and data_structures.RecordList),
+    the interval is found by bisection instead of a linear scan.
     """
+    timestamp_index = getattr(data, 'timestamp_index', None)
+    if timestamp_index is not None:
+        return timestamp_index.get_chunk(ind, start, end, params.INCLUDE_HALF_FIXATIONS)
+
     datalen = len(data)
     curr_ind = ind
     if curr_ind < datalen:
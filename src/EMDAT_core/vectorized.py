@@ -0,0 +1,269 @@
+"""
+UBC Eye Movement Data Analysis Toolkit (EMDAT), Version 3
+
+Vectorized (NumPy) versions of the per-sample computations of "Segment". They are used instead of
+the loops over "Datapoint"s when the samples of a Segment are held in a SampleTable, and return
+the same values (as Python numbers) as the original calculations.
+
+Institution: The University of British Columbia.
+"""
+
+import math
+import numpy as np
+
+
+def array_sum(values):
+    """Returns the sum of an array as a Python number (0 if the array is empty)"""
+    if len(values) == 0:
+        return 0
+    return values.sum().item()
+
+
+def array_mean(values):
+    """Returns the average of an array, with the same conventions as utils.mean"""
+    if len(values) == 0:
+        return 0
+    return values.sum().item() / float(len(values))
+
+
+def array_stddev(values):
+    """Returns the standard deviation of an array, with the same conventions as utils.stddev"""
+    if len(values) < 2:
+        return float('nan')
+    m = array_mean(values)
+    return math.sqrt(((values - m) ** 2).sum().item() / float(len(values) - 1))
+
+
+def stimuli_mask(table):
+    """Returns a boolean array selecting the samples with a stimuli name, or None if all of them have one
+
+    Args:
+        table: a SampleTable
+    """
+    if '' not in table.stimulinames:
+        return None
+    return table.stimuliname != table.stimulinames.index('')
+
+
+def count_samples(table):
+    """Returns the number of samples with a stimuli name (see Segment.calc_num_samples)"""
+    mask = stimuli_mask(table)
+    if mask is None:
+        return len(table)
+    return int(np.count_nonzero(mask))
+
+
+def validity_proportion(table, include_fixations=False):
+    """Returns the proportion of valid samples (see Segment.calc_validity_proportion)
+
+    Args:
+        table: a SampleTable
+        include_fixations: if True, invalid samples that are part of a Fixation are considered as valid
+            (see Segment.calc_validity_fixation)
+    """
+    valid = table.is_valid
+    if include_fixations:
+        valid = valid | (table.fixationindex != table.INT_MISSING)
+    mask = stimuli_mask(table)
+    if mask is None:
+        num = len(table)
+        num_valid = np.count_nonzero(valid)
+    else:
+        num = np.count_nonzero(mask)
+        num_valid = np.count_nonzero(valid & mask)
+    if num == 0:
+        return 0.0
+    return float(num_valid) / num
+
+
+def invalid_gaps(timestamp, valid):
+    """Returns the contiguous groups of invalid samples, as scanned by Segment.calc_largest_validity_gap
+
+    Each gap starts at the timestamp of its first invalid sample and ends at the timestamp of the
+    next valid sample (or of the last sample if the data ends with invalid samples).
+
+    Args:
+        timestamp: an array with the timestamps of the samples
+        valid: a boolean array with the validity of the samples
+
+    Returns:
+        an array with the start timestamps and an array with the end timestamps of the gaps
+    """
+    invalid = ~valid
+    if not invalid.any():
+        empty = timestamp[:0]
+        return empty, empty
+    previous_valid = np.empty(len(invalid), dtype=bool)
+    previous_valid[0] = True
+    previous_valid[1:] = valid[:-1]
+    first = np.flatnonzero(invalid & previous_valid)
+    next_valid = np.empty(len(invalid), dtype=bool)
+    next_valid[-1] = True
+    next_valid[:-1] = valid[1:]
+    last = np.flatnonzero(invalid & next_valid)
+    end = np.minimum(last + 1, len(timestamp) - 1)
+    return timestamp[first], timestamp[end]
+
+
+def largest_validity_gap(table, max_seg_timegap):
+    """Returns the length of the largest invalid gap and the list of gaps longer than max_seg_timegap
+
+    Args:
+        table: a SampleTable
+        max_seg_timegap: the length (in ms) above which gaps are listed
+    """
+    starts, ends = invalid_gaps(table.timestamp, table.is_valid)
+    lengths = ends - starts
+    if len(lengths) == 0:
+        return 0, []
+    long_gaps = lengths > max_seg_timegap
+    time_gaps = list(zip(starts[long_gaps].tolist(), ends[long_gaps].tolist()))
+    return max(0, lengths.max().item()), time_gaps
+
+
+def blink_validity_gaps(table):
+    """Returns the blink validity gaps as a list of (start, end) tuples (see Segment.calc_blink_validity_gaps)"""
+    starts, ends = invalid_gaps(table.timestamp, table.is_valid_blink)
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def blink_durations_intervals(table, bounds=None):
+    """Returns the durations of the blinks and the time between consecutive blinks
+
+    Args:
+        table: a SampleTable
+        bounds: if not None, a (min, max) tuple: only the gaps whose length is within the bounds are blinks
+
+    Returns:
+        an array with the blink durations and an array with the intervals between consecutive blinks
+    """
+    starts, ends = invalid_gaps(table.timestamp, table.is_valid_blink)
+    if bounds is not None:
+        lengths = ends - starts
+        blinks = (lengths <= bounds[1]) & (lengths >= bounds[0])
+        starts = starts[blinks]
+        ends = ends[blinks]
+    return ends - starts, starts[1:] - ends[:-1]
+
+
+def count_where(condition):
+    """Returns the number of samples for which a condition on the columns of a SampleTable is True
+
+    Args:
+        condition: a function that takes no argument and returns a boolean array. It is called with
+            NumPy warnings about missing (NaN) values disabled.
+    """
+    with np.errstate(invalid='ignore'):
+        return int(np.count_nonzero(condition()))
+
+
+def select_where(values, condition):
+    """Returns the values for which a condition is True (see count_where)"""
+    with np.errstate(invalid='ignore'):
+        return values[condition()]
+
+
+def pupil_features(table, rest_pupil_size, adjustment, export_pupilinfo=False):
+    """Returns the pupil features of the samples of a SampleTable (see Segment.calc_pupil_features)
+
+    Args:
+        table: a SampleTable
+        rest_pupil_size: the rest pupil size used for the adjustment
+        adjustment: the pupil size adjustment (see params.PUPIL_ADJUSTMENT)
+        export_pupilinfo: True to return the (timestamp, pupil size, rest pupil size) of the valid samples
+
+    Returns:
+        a dictionary with the pupil features (empty if no sample has a valid pupil size), an array with
+        the valid (adjusted) pupil sizes, an array with the valid pupil velocities, and the pupil info
+        for export (None if export_pupilinfo is False or no sample has a valid pupil size)
+    """
+    valid_pupil = select_where(np.arange(len(table)), lambda: table.pupilsize > 0)
+    valid_pupil_velocity = select_where(table.pupilvelocity, lambda: table.pupilvelocity != -1)
+    features = {}
+    adjvalidpupilsizes = table.pupilsize[:0]
+    pupilinfo = None
+
+    if len(valid_pupil) > 0:
+        validpupilsizes = table.pupilsize[valid_pupil]
+        if adjustment == "rpscenter":
+            adjvalidpupilsizes = validpupilsizes - rest_pupil_size
+        elif adjustment == "PCPS":
+            if rest_pupil_size == 0:
+                raise ZeroDivisionError("float division by zero")
+            adjvalidpupilsizes = (validpupilsizes - rest_pupil_size) / (1.0 * rest_pupil_size)
+        else:
+            adjvalidpupilsizes = validpupilsizes
+
+        if export_pupilinfo:
+            pupilinfo = [[timestamp, pupilsize, rest_pupil_size] for timestamp, pupilsize
+                         in zip(table.timestamp[valid_pupil].tolist(), validpupilsizes.tolist())]
+        features['meanpupilsize'] = array_mean(adjvalidpupilsizes)
+        features['stddevpupilsize'] = array_stddev(adjvalidpupilsizes)
+        features['maxpupilsize'] = adjvalidpupilsizes.max().item()
+        features['minpupilsize'] = adjvalidpupilsizes.min().item()
+        features['startpupilsize'] = adjvalidpupilsizes[0].item()
+        features['endpupilsize'] = adjvalidpupilsizes[-1].item()
+
+        if len(valid_pupil_velocity) > 0:
+            features['meanpupilvelocity'] = array_mean(valid_pupil_velocity)
+            features['stddevpupilvelocity'] = array_stddev(valid_pupil_velocity)
+            features['maxpupilvelocity'] = valid_pupil_velocity.max().item()
+            features['minpupilvelocity'] = valid_pupil_velocity.min().item()
+
+    return features, adjvalidpupilsizes, valid_pupil_velocity, pupilinfo
+
+
+def distance_features(table):
+    """Returns the distance from the screen features of the samples of a SampleTable (see Segment.calc_distance_features)
+
+    Args:
+        table: a SampleTable
+
+    Returns:
+        a dictionary with the distance features (empty if no sample has a valid distance) and an
+        array with the valid distances
+    """
+    distances_from_screen = select_where(table.distance, lambda: table.distance > 0)
+    features = {}
+    if len(distances_from_screen) > 0:
+        features['meandistance'] = array_mean(distances_from_screen)
+        features['stddevdistance'] = array_stddev(distances_from_screen)
+        features['maxdistance'] = distances_from_screen.max().item()
+        features['mindistance'] = distances_from_screen.min().item()
+        features['startdistance'] = distances_from_screen[0].item()
+        features['enddistance'] = distances_from_screen[-1].item()
+    return features, distances_from_screen
+
+
+def path_features(fixation_data):
+    """Returns the path distances, absolute angles and relative angles of a sequence of "Fixation"s
+
+    See Segment.calc_distances, Segment.calc_abs_angles and Segment.calc_rel_angles
+
+    Args:
+        fixation_data: a list of "Fixation"s
+
+    Returns:
+        three arrays: distances, absolute angles and relative angles (in radians)
+    """
+    x = np.array([fix.mappedfixationpointx for fix in fixation_data])
+    y = np.array([fix.mappedfixationpointy for fix in fixation_data])
+    dx = x[1:] - x[:-1]
+    dy = y[1:] - y[:-1]
+    distances = np.sqrt(dx ** 2 + dy ** 2)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        theta = np.arctan(np.abs(dy) / np.abs(dx).astype(float))
+        abs_angles = np.where(dx > 0, theta, math.pi - theta)
+        abs_angles = np.where(dx == 0, math.pi / 2, abs_angles)
+        abs_angles = np.where(dy == 0, 0.0, abs_angles)
+
+        v1x, v1y = -dx[:-1], -dy[:-1]
+        v2x, v2y = dx[1:], dy[1:]
+        v1_dot = np.sqrt(v1x * v1x + v1y * v1y)
+        v2_dot = np.sqrt(v2x * v2x + v2y * v2y)
+        dotproduct = (v1x / v1_dot) * (v2x / v2_dot) + (v1y / v1_dot) * (v2y / v2_dot)
+        rel_angles = np.arccos(np.clip(dotproduct, -1.0, 1.0))
+        rel_angles = np.where((v1_dot == 0) | (v2_dot == 0), 0.0, rel_angles)
+
+    return distances.astype(float), abs_angles.astype(float), rel_angles.astype(float)
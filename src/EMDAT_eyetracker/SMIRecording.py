@@ -9,126 +9,146 @@ Institution: The University of British Columbia.
 """
 
 from EMDAT_core.Recording import Recording
-from EMDAT_core.data_structures import Datapoint, Fixation, Saccade, Event
+from EMDAT_core.data_structures import SampleTable, Fixation, Saccade, Event
+from EMDAT_eyetracker.columns import read_columns, row_filter, to_list, encode_strings
 import EMDAT_core.utils
-import csv
+import numpy as np
 import params
 
 
 class SMIRecording(Recording):
+
+    READER_PARAMS = ('RAW_HEADER_LINE', 'EVENTS_FIRST_DATA_LINE', 'FIXATION_HEADER_LINE', 'SACCADE_HEADER_LINE',
+                     'USER_EVENT_HEADER_LINE', 'MONOCULAR_EYE')
+    TIMESTAMPS_PER_MS = 1000  # BeGaze timestamps are in microseconds
+
     def read_all_data(self, all_file):
-        all_data = []
+        names = ["Time", "L Event Info", "R Event Info", "L POR X [px]", "L POR Y [px]", "R POR X [px]", "R POR Y [px]"]
+        if self.reads_data('pupil'):
+            names += ["L Pupil Diameter [mm]", "R Pupil Diameter [mm]"]
+        if self.reads_data('distance'):
+            names += ["L EPOS Z", "R EPOS Z"]
         with open(all_file, 'r') as f:
-            for i in xrange(params.RAW_HEADER_LINE):
+            for i in range(params.RAW_HEADER_LINE):
                 if i is (params.RAW_HEADER_LINE - 1):  # read the row of the table header for fixations
                     data_header = next(f).strip().split(',')
                 else:
                     next(f)
 
-            reader = csv.DictReader(f, fieldnames=data_header)
-            last_pupil_left = -1
-            last_pupil_right = -1
-            last_time = -1
+            table = read_columns(f, names, delimiter=',', fieldnames=data_header,
+                                 where=row_filter(self.read_filter, "Time", self.TIMESTAMPS_PER_MS,
+                                                  samples=lambda t: t.equals("L Event Info", "Fixation"),
+                                                  sample_columns=["L Event Info"]))
 
-            for row in reader:
-                if row["L Event Info"] != "Fixation":  # ignore data points other than fixations (gaze points)
-                    continue
-                pupil_left = EMDAT_core.utils.cast_float(row["L Pupil Diameter [mm]"])
-                pupil_right = EMDAT_core.utils.cast_float(row["R Pupil Diameter [mm]"])
-                distance_left = EMDAT_core.utils.cast_float(row["L EPOS Z"], -1)
-                distance_right = EMDAT_core.utils.cast_float(row["R EPOS Z"], -1)
-                timestamp = EMDAT_core.utils.cast_int(row["Time"])
-                data = {"timestamp": timestamp,
-                        "pupilsize": EMDAT_core.Recording.get_pupil_size(pupil_left, pupil_right),
-                        "pupilvelocity": EMDAT_core.Recording.get_pupil_velocity(last_pupil_left, last_pupil_right, pupil_left, pupil_right, (timestamp-last_time) ),
-                        "distance": EMDAT_core.Recording.get_distance(distance_left, distance_right),
-                        "is_valid": (EMDAT_core.utils.cast_float(row["L POR X [px]"], -1) > 0 and EMDAT_core.utils.cast_float(row["L POR Y [px]"], -1) > 0 )
-                                              or (EMDAT_core.utils.cast_float(row["R POR X [px]"], -1) > 0 and EMDAT_core.utils.cast_float(row["R POR Y [px]"], -1) > 0),
-                        "stimuliname": "Screen",  # temporarily set to the same stimuli
-                        "is_valid_blink": not ("Blink" in row['L Event Info'] or "Blink" in row['R Event Info']),
-                        "fixationindex": EMDAT_core.utils.cast_int(row["Time"]),
-                        "gazepointxleft": EMDAT_core.utils.cast_float(row["L POR X [px]"]),
-                        "gazepointxlright": EMDAT_core.utils.cast_float(row["R POR X [px]"])}
-                all_data.append(Datapoint(data))
-                last_pupil_left = pupil_left
-                last_pupil_right = pupil_right
-                last_time = timestamp
-
-        return all_data
+        table = table.take(table.equals("L Event Info", "Fixation"))  # ignore data points other than fixations (gaze points)
+        timestamps = table.ints("Time")
+        if self.reads_data('pupil'):
+            pupil_left = table.floats("L Pupil Diameter [mm]")
+            pupil_right = table.floats("R Pupil Diameter [mm]")
+            pupil_sizes = EMDAT_core.Recording.get_pupil_sizes(pupil_left, pupil_right)
+            pupil_velocities = EMDAT_core.Recording.get_pupil_velocities(pupil_left, pupil_right, timestamps)
+        else:
+            pupil_sizes = EMDAT_core.Recording.get_missing_values(len(timestamps))
+            pupil_velocities = EMDAT_core.Recording.get_missing_values(len(timestamps))
+        if self.reads_data('distance'):
+            distances = EMDAT_core.Recording.get_distances(table.floats("L EPOS Z", -1), table.floats("R EPOS Z", -1))
+        else:
+            distances = EMDAT_core.Recording.get_missing_values(len(timestamps))
+        columns = {"timestamp": timestamps,
+                   "pupilsize": pupil_sizes,
+                   "pupilvelocity": pupil_velocities,
+                   "distance": distances,
+                   "is_valid": ((table.floats("L POR X [px]", -1) > 0) & (table.floats("L POR Y [px]", -1) > 0))
+                               | ((table.floats("R POR X [px]", -1) > 0) & (table.floats("R POR Y [px]", -1) > 0)),
+                   "is_valid_blink": ~(table.contains("L Event Info", "Blink") | table.contains("R Event Info", "Blink")),
+                   "fixationindex": timestamps}
+        for column in ("gazepointx", "gazepointy"):
+            columns[column] = np.full(len(timestamps), np.nan)
+        columns["stimuliname"], stimulinames = encode_strings(["Screen"] * len(timestamps))  # temporarily set to the same stimuli
+        return SampleTable(columns, stimulinames)
 
     def read_fixation_data(self, fixation_file):
         all_fixation = []
         with open(fixation_file, 'r') as f:
-            for i in xrange(params.EVENTS_FIRST_DATA_LINE - 1):
+            for i in range(params.EVENTS_FIRST_DATA_LINE - 1):
                 if i is (params.FIXATION_HEADER_LINE - 1):  # read the row of the table header for fixations
                     fixation_headers = next(f).strip().split(',')
                 else:
                     next(f)
-            reader = csv.DictReader(f, fieldnames=fixation_headers)
-            for row in reader:
-                if not row["Event Type"].startswith("Fixation "+params.MONOCULAR_EYE):
-                    continue
-                data = {"fixationindex": EMDAT_core.utils.cast_int(row["Number"]),
-                        "timestamp": EMDAT_core.utils.cast_int(row["Start"]),
-                        "fixationduration": EMDAT_core.utils.cast_int(row["Duration"]),
-                        "fixationpointx": EMDAT_core.utils.cast_float(row["Location X"]),
-                        "fixationpointy": EMDAT_core.utils.cast_float(row["Location Y"])}
-                all_fixation.append(Fixation(data, self.media_offset))
+            table = read_columns(f, ["Event Type", "Number", "Start", "Duration", "Location X", "Location Y"],
+                                 delimiter=',', fieldnames=fixation_headers,
+                                 where=row_filter(self.read_filter, "Start", self.TIMESTAMPS_PER_MS))
+        table = table.take(table.startswith("Event Type", "Fixation "+params.MONOCULAR_EYE))
+        for index, timestamp, duration, x, y in zip(to_list(table.ints("Number")), to_list(table.ints("Start")),
+                                                    to_list(table.ints("Duration")), to_list(table.floats("Location X")),
+                                                    to_list(table.floats("Location Y"))):
+            data = {"fixationindex": index,
+                    "timestamp": timestamp,
+                    "fixationduration": duration,
+                    "fixationpointx": x,
+                    "fixationpointy": y}
+            all_fixation.append(Fixation(data, self.media_offset))
 
         return all_fixation
 
     def read_saccade_data(self, saccade_file):
         all_saccades = []
         with open(saccade_file, 'r') as f:
-            for i in xrange(params.EVENTS_FIRST_DATA_LINE - 1):
+            for i in range(params.EVENTS_FIRST_DATA_LINE - 1):
                 if i is (params.SACCADE_HEADER_LINE - 1):  # read the row of the table header for saccades
                     saccade_headers = next(f).strip().split(',')
                 else:
                     next(f)
-            reader = csv.DictReader(f, fieldnames=saccade_headers)
-            for row in reader:
-                if not row["Event Type"].startswith("Saccade "+params.MONOCULAR_EYE):
-                    continue
-                data = {"saccadeindex": EMDAT_core.utils.cast_int(row["Number"]),
-                        "timestamp": EMDAT_core.utils.cast_int(row["Start"]),
-                        "saccadeduration": EMDAT_core.utils.cast_int(row["Duration"]),
-                        "saccadestartpointx": EMDAT_core.utils.cast_float(row["Start Loc.X"]),
-                        "saccadestartpointy": EMDAT_core.utils.cast_float(row["Start Loc.Y"]),
-                        "saccadeendpointx": EMDAT_core.utils.cast_float(row["End Loc.X"]),
-                        "saccadeendpointy": EMDAT_core.utils.cast_float(row["End Loc.Y"]),
-                        "saccadedistance": EMDAT_core.utils.cast_float(row["Average Speed"])*EMDAT_core.utils.cast_float(row["Duration"]),
-                        "saccadespeed": EMDAT_core.utils.cast_float(row["Average Speed"]),
-                        "saccadeacceleration": EMDAT_core.utils.cast_float(row["Average Accel."])
-                        }
-                all_saccades.append(Saccade(data, self.media_offset))
+            table = read_columns(f, ["Event Type", "Number", "Start", "Duration", "Start Loc.X", "Start Loc.Y",
+                                     "End Loc.X", "End Loc.Y", "Average Speed", "Average Accel."],
+                                 delimiter=',', fieldnames=saccade_headers,
+                                 where=row_filter(self.read_filter, "Start", self.TIMESTAMPS_PER_MS))
+        table = table.take(table.startswith("Event Type", "Saccade "+params.MONOCULAR_EYE))
+        for index, timestamp, duration, duration_float, start_x, start_y, end_x, end_y, speed, accel in zip(
+                to_list(table.ints("Number")), to_list(table.ints("Start")), to_list(table.ints("Duration")),
+                to_list(table.floats("Duration")), to_list(table.floats("Start Loc.X")), to_list(table.floats("Start Loc.Y")),
+                to_list(table.floats("End Loc.X")), to_list(table.floats("End Loc.Y")),
+                to_list(table.floats("Average Speed")), to_list(table.floats("Average Accel."))):
+            data = {"saccadeindex": index,
+                    "timestamp": timestamp,
+                    "saccadeduration": duration,
+                    "saccadestartpointx": start_x,
+                    "saccadestartpointy": start_y,
+                    "saccadeendpointx": end_x,
+                    "saccadeendpointy": end_y,
+                    "saccadedistance": speed*duration_float,
+                    "saccadespeed": speed,
+                    "saccadeacceleration": accel
+                    }
+            all_saccades.append(Saccade(data, self.media_offset))
 
         return all_saccades
 
     def read_event_data(self, event_file):
         all_event = []
         with open(event_file, 'r') as f:
-            for i in xrange(params.EVENTS_FIRST_DATA_LINE - 1):
+            for i in range(params.EVENTS_FIRST_DATA_LINE - 1):
                 if i is (params.USER_EVENT_HEADER_LINE - 1):  # read the row of the table header for user events
                     event_headers = next(f).strip().split(',')
                 else:
                     next(f)
-            reader = csv.DictReader(f, fieldnames=event_headers)
-            for row in reader:
-                if row["Event Type"] != "UserEvent":
-                    continue
-                data = {"timestamp": EMDAT_core.utils.cast_int(row["Start"]),
-                        "description": row["Description"]}
-                descriptions = row["Description"].split(" ")
-                event_type = descriptions[2]
-                if event_type == "UE-mouseclick":
-                    if descriptions[3] == "left":
-                        data.update({"event": "LeftMouseClick"})
-                    else:
-                        data.update({"event": "RightMouseClick"})
-                    data.update({"x_coord": EMDAT_core.utils.cast_int(descriptions[4].split("=")[1]),
-                                 "y_coord": EMDAT_core.utils.cast_int(descriptions[5].split("=")[1])})
-                elif event_type == "UE-keypress":
-                    data.update({"event": "KeyPress", "key_name": descriptions[3]})
-                all_event.append(Event(data, self.media_offset))
+            table = read_columns(f, ["Event Type", "Start", "Description"], delimiter=',', fieldnames=event_headers,
+                                 where=row_filter(self.read_filter, "Start", self.TIMESTAMPS_PER_MS))
+        table = table.take(table.equals("Event Type", "UserEvent"))
+        for timestamp, description in zip(to_list(table.ints("Start")), table["Description"]):
+            data = {"timestamp": timestamp,
+                    "description": description}
+            descriptions = description.split(" ")
+            event_type = descriptions[2]
+            if event_type == "UE-mouseclick":
+                if descriptions[3] == "left":
+                    data.update({"event": "LeftMouseClick"})
+                else:
+                    data.update({"event": "RightMouseClick"})
+                data.update({"x_coord": EMDAT_core.utils.cast_int(descriptions[4].split("=")[1]),
+                             "y_coord": EMDAT_core.utils.cast_int(descriptions[5].split("=")[1])})
+            elif event_type == "UE-keypress":
+                data.update({"event": "KeyPress", "key_name": descriptions[3]})
+            all_event.append(Event(data, self.media_offset))
 
         return all_event
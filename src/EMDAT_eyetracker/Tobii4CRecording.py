@@ -9,58 +9,55 @@ Institution: The University of British Columbia.
 """
 
 from EMDAT_core.Recording import Recording
-from EMDAT_core.data_structures import Datapoint, Fixation, Saccade, Event
+from EMDAT_core.data_structures import SampleTable, Fixation, Saccade, Event
+from EMDAT_eyetracker.columns import read_columns, to_floats, to_list
 import EMDAT_core.utils
-import csv
+from warnings import warn
 import params
 import numpy as np
 
 
 class Tobii4CRecording(Recording):
     def read_all_data(self, all_file):
-        """Returns a list of "Datapoint"s read from an data file.
+        """Returns the "Datapoint"s read from an data file.
 
         Args:
             all_file:A string containing the name of the data file output by the Tobii software.
 
         Returns:
-            a list of "Datapoint"s
+            a SampleTable holding the "Datapoint"s
         """
-        all_data = []
+        names = ["system_time_stamp", "left_gaze_origin_validity", "right_gaze_origin_validity",
+                 "left_gaze_point_on_display_area", "right_gaze_point_on_display_area"]
+        if self.reads_data('pupil'):
+            names += ["left_pupil_diameter", "right_pupil_diameter"]
         with open(all_file, 'r') as f:
-            reader = csv.DictReader(f, delimiter=";")
-            last_pupil_left = -1
-            last_pupil_right = -1
-            last_time = -1
-            currentfix = 0
-            for row in reader:
-                if not row["left_gaze_origin_validity"] or not row["right_gaze_origin_validity"]: #ignore data point with no validity information
-                    continue
-                right_gaze = list(map(lambda point: EMDAT_core.utils.cast_float(point, -1),
-                                      row["right_gaze_point_on_display_area"].strip("()").split(",")))
-                left_gaze = list(map(lambda point: EMDAT_core.utils.cast_float(point, -1),
-                                     row["left_gaze_point_on_display_area"].strip("()").split(",")))
-                gaze_point_x = EMDAT_core.utils.cast_float((left_gaze[0] + right_gaze[0])/2, -1)
-                gaze_point_y = EMDAT_core.utils.cast_float((left_gaze[1] + right_gaze[1])/2, -1)
-                pupil_left = EMDAT_core.utils.cast_float(row["left_pupil_diameter"], -1)
-                pupil_right = EMDAT_core.utils.cast_float(row["right_pupil_diameter"], -1)
-                timestamp = EMDAT_core.utils.cast_int(EMDAT_core.utils.cast_float(row["system_time_stamp"]))
-                data = {"timestamp": timestamp,
-                        "pupilsize": EMDAT_core.Recording.get_pupil_size(pupil_left, pupil_right),
-                        "pupilvelocity": EMDAT_core.Recording.get_pupil_velocity(last_pupil_left, last_pupil_right, pupil_left, pupil_right, (timestamp-last_time) ),
-                        "distance": -1,
-                        "is_valid": EMDAT_core.utils.cast_int(row["right_gaze_origin_validity"]) == 1 or EMDAT_core.utils.cast_int(row["left_gaze_origin_validity"]) == 1,
-                        "is_valid_blink": EMDAT_core.utils.cast_int(row["right_gaze_origin_validity"]) == 1 and EMDAT_core.utils.cast_int(row["left_gaze_origin_validity"]) == 1,
-                        "fixationindex": currentfix,
-                        "gazepointx": gaze_point_x,
-                        "gazepointy": gaze_point_y}
-                all_data.append(Datapoint(data))
-                last_pupil_left = pupil_left
-                last_pupil_right = pupil_right
-                last_time = timestamp
-                currentfix += 1
-
-        return all_data
+            table = read_columns(f, names, delimiter=";")
+
+        table = table.take(table.present("left_gaze_origin_validity") & table.present("right_gaze_origin_validity")) #ignore data point with no validity information
+        timestamps = _truncate(table.floats("system_time_stamp"))
+        validity_left = table.ints("left_gaze_origin_validity") == 1
+        validity_right = table.ints("right_gaze_origin_validity") == 1
+        gaze_x, gaze_y = _mean_gaze_points(table["left_gaze_point_on_display_area"], table["right_gaze_point_on_display_area"])
+        if self.reads_data('pupil'):
+            pupil_left = table.floats("left_pupil_diameter", -1)
+            pupil_right = table.floats("right_pupil_diameter", -1)
+            pupil_sizes = EMDAT_core.Recording.get_pupil_sizes(pupil_left, pupil_right)
+            pupil_velocities = EMDAT_core.Recording.get_pupil_velocities(pupil_left, pupil_right, timestamps)
+        else:
+            pupil_sizes = EMDAT_core.Recording.get_missing_values(len(timestamps))
+            pupil_velocities = EMDAT_core.Recording.get_missing_values(len(timestamps))
+        columns = {"timestamp": timestamps,
+                   "pupilsize": pupil_sizes,
+                   "pupilvelocity": pupil_velocities,
+                   "distance": np.full(len(timestamps), -1.0),
+                   "is_valid": validity_right | validity_left,
+                   "is_valid_blink": validity_right & validity_left,
+                   "fixationindex": np.arange(len(timestamps), dtype=np.int64),
+                   "gazepointx": gaze_x,
+                   "gazepointy": gaze_y,
+                   "stimuliname": np.zeros(len(timestamps), dtype=np.int32)}
+        return SampleTable(columns, [None])
 
     def read_fixation_data(self, fixation_file):
         """Returns a list of "Fixation"s read from the data file file.
@@ -74,88 +71,143 @@ class Tobii4CRecording(Recording):
 
         all_fixation = []
         with open(fixation_file, 'r') as f:
-            currentfix = 0
-            reader = csv.DictReader(f, delimiter=',')
-            for row in reader:
-                if row["label"] != "fixation": #if not a fixation or the current fixation
-                    continue
-                data = {"fixationindex": currentfix,
-                        "timestamp": EMDAT_core.utils.cast_int(EMDAT_core.utils.cast_float(row["start"])),
-                        "fixationduration": EMDAT_core.utils.cast_int(EMDAT_core.utils.cast_float(row["duration"])),
-                        "fixationpointx": EMDAT_core.utils.cast_float(row["x"]),
-                        "fixationpointy": EMDAT_core.utils.cast_float(row["y"])}
-                all_fixation.append(Fixation(data, self.media_offset))
-                currentfix += 1
+            table = read_columns(f, ["label", "start", "duration", "x", "y"], delimiter=',')
+        table = table.take(table.equals("label", "fixation")) #if not a fixation or the current fixation
+        for currentfix, (timestamp, duration, x, y) in enumerate(zip(to_list(_truncate(table.floats("start"))),
+                                                                    to_list(_truncate(table.floats("duration"))),
+                                                                    to_list(table.floats("x")), to_list(table.floats("y")))):
+            data = {"fixationindex": currentfix,
+                    "timestamp": timestamp,
+                    "fixationduration": duration,
+                    "fixationpointx": x,
+                    "fixationpointy": y}
+            all_fixation.append(Fixation(data, self.media_offset))
 
         return all_fixation
 
     def read_saccade_data(self, saccade_file, all_file):
         """Returns a list of "Saccade"s read from the data file file.
 
+        The 4C does not export the gaze points of saccades: they are rebuilt from the samples of the
+        raw data file whose timestamps fall within the interval of each saccade. The raw file is
+        parsed once into arrays (see read_gaze_arrays), and all the saccade intervals are joined
+        against them at once with np.searchsorted.
+
         Args:
             saccade_file: A string containing the name of the data file output by the Tobii software.
+            all_file: A string containing the name of the raw data file with the gaze samples.
 
         Returns:
             a list of "Saccade"s
         """
+        with open(saccade_file, 'r') as f:
+            table = read_columns(f, ["label", "start", "end", "duration"], delimiter=',')
+        table = table.take(table.equals("label", "saccade"))
+        if not len(table):
+            return []
+
+        timestamps, gaze_x, gaze_y, valid = read_gaze_arrays(all_file)
+        starts = table.floats("start")
+        ends = table.floats("end")
+        durations = to_list(_truncate(table.floats("duration")))
+        # samples first[k] to last[k] - 1 are the samples of saccade k
+        first = np.searchsorted(timestamps, starts, side='left')
+        last = np.searchsorted(timestamps, ends, side='right')
+        numsamples = last - first
+
+        # distance between consecutive samples; the steps from or to a sample without gaze point are ignored
+        steps = np.hypot(np.diff(gaze_x), np.diff(gaze_y))
+        steps = np.append(np.where(np.isnan(steps), 0.0, steps), 0.0)
+        bounds = np.empty(2 * len(table), dtype=np.intp)
+        bounds[0::2] = first
+        bounds[1::2] = np.maximum(last - 1, first)
+        bounds = np.minimum(bounds, len(steps) - 1)
+        distances = np.where(numsamples > 1, np.add.reduceat(steps, bounds)[0::2], 0.0)
+
+        valid_counts = np.concatenate(([0], np.cumsum(valid)))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            valid_rates = (valid_counts[last] - valid_counts[first]) / numsamples.astype(np.float64)
 
         all_saccade = []
-        with open(all_file, 'r') as all_data:
-            all_reader = list(csv.DictReader(all_data, delimiter=';'))
-
-            with open(saccade_file, 'r') as f:
-                reader = list(csv.DictReader(f, delimiter=','))
-                current_index = 0
-
-                for row in reader:
-                    if row["label"] == "saccade":
-                        start = EMDAT_core.utils.cast_float(row["start"])
-                        end = EMDAT_core.utils.cast_float(row["end"])
-                        # search for start
-                        saccade_vect = []
-                        is_valid_sample = 0
-
-                        # iterate through all_reader with loop
-                        i = np.searchsorted(list(map(lambda all_data_row: EMDAT_core.utils.cast_float(all_data_row["system_time_stamp"]), all_reader)), start)
-                        i_start = i
-                        while EMDAT_core.utils.cast_float(all_reader[i]["system_time_stamp"]) <= end:
-                            right_gaze = list(map(lambda point: EMDAT_core.utils.cast_float(point, -1),
-                                                  all_reader[i]["right_gaze_point_on_display_area"].strip("()").split(",")))
-                            left_gaze = list(map(lambda point: EMDAT_core.utils.cast_float(point, -1),
-                                                 all_reader[i]["left_gaze_point_on_display_area"].strip("()").split(",")))
-                            gaze_point_x = EMDAT_core.utils.cast_float((left_gaze[0] + right_gaze[0])/2, -1)
-                            gaze_point_y = EMDAT_core.utils.cast_float((left_gaze[1] + right_gaze[1])/2, -1)
-                            saccade_vect.append([EMDAT_core.utils.cast_float(all_reader[i]["system_time_stamp"]),
-                                                 gaze_point_x, gaze_point_y])
-
-                            if EMDAT_core.utils.cast_int(all_reader[i]["right_gaze_origin_validity"]) == 1 or \
-                                    EMDAT_core.utils.cast_int(all_reader[i]["left_gaze_origin_validity"]) == 1:
-                                is_valid_sample += 1
-                            i += 1
-
-                        rate_valid_sample = is_valid_sample/(i - i_start)
-                        saccade_duration = EMDAT_core.utils.cast_int(EMDAT_core.utils.cast_float(row["duration"]))
-                        dist = EMDAT_core.Recording.get_saccade_distance(saccade_vect)
-                        accel = -1#Recording.get_saccade_acceleration(saccade_vect)
-                        speed = float(dist) / EMDAT_core.utils.cast_int(saccade_duration)
-                        data = {"saccadeindex": EMDAT_core.utils.cast_int(current_index),
-                                "timestamp": start,
-                                "saccadeduration": EMDAT_core.utils.cast_int(saccade_duration),
-                                "saccadestartpointx": saccade_vect[0][1],
-                                "saccadestartpointy": saccade_vect[0][2],
-                                "saccadeendpointx": saccade_vect[-1][1],
-                                "saccadeendpointy": saccade_vect[-1][2],
-                                "saccadedistance": dist,
-                                "saccadespeed": speed,
-                                "saccadeacceleration": accel,
-                                "saccadequality": rate_valid_sample
-                                }
-                        all_saccade.append(Saccade(data, self.media_offset))
-                        current_index += 1
+        for k, start in enumerate(table["start"]):
+            if numsamples[k] == 0:
+                warn("No sample in the saccade starting at " + start + ", ignored.")
+                continue
+            saccade_duration = durations[k]
+            dist = float(distances[k])
+            accel = -1#Recording.get_saccade_acceleration(saccade_vect)
+            speed = float(dist) / saccade_duration
+            data = {"saccadeindex": len(all_saccade),
+                    "timestamp": float(starts[k]),
+                    "saccadeduration": saccade_duration,
+                    "saccadestartpointx": float(gaze_x[first[k]]),
+                    "saccadestartpointy": float(gaze_y[first[k]]),
+                    "saccadeendpointx": float(gaze_x[last[k] - 1]),
+                    "saccadeendpointy": float(gaze_y[last[k] - 1]),
+                    "saccadedistance": dist,
+                    "saccadespeed": speed,
+                    "saccadeacceleration": accel,
+                    "saccadequality": float(valid_rates[k])
+                    }
+            all_saccade.append(Saccade(data, self.media_offset))
 
         return all_saccade
 
 
+def read_gaze_arrays(all_file):
+    """Returns the timestamps, gaze points and validity of all the rows of a 4C raw data file, as arrays
+
+    The gaze point of a sample is the mean of the gaze points of the eyes that have one (as
+    Recording.get_pupil_size), or NaN if neither eye has one.
+
+    Args:
+        all_file: A string containing the name of the raw data file output by the Tobii software.
+
+    Returns:
+        timestamps: a float array of the system timestamps (in the order of the file, which is chronological)
+        gaze_x, gaze_y: float arrays of the coordinates of the gaze points on the display area
+        valid: a boolean array, True if the gaze origin of at least one eye is valid
+    """
+    with open(all_file, 'r') as f:
+        table = read_columns(f, ["system_time_stamp", "left_gaze_point_on_display_area", "right_gaze_point_on_display_area",
+                                 "left_gaze_origin_validity", "right_gaze_origin_validity"], delimiter=';')
+    gaze_x, gaze_y = _mean_gaze_points(table["left_gaze_point_on_display_area"], table["right_gaze_point_on_display_area"])
+    valid = (np.char.strip(table.strings("right_gaze_origin_validity")) == "1") | \
+            (np.char.strip(table.strings("left_gaze_origin_validity")) == "1")
+    return table.floats("system_time_stamp"), gaze_x, gaze_y, valid
+
+
+def _mean_gaze_points(left_values, right_values):
+    """Returns the coordinates of the mean of the gaze points of both eyes (see read_gaze_arrays)"""
+    left = _gaze_points(left_values)
+    right = _gaze_points(right_values)
+    both = np.isfinite(left) & np.isfinite(right)
+    gaze = np.where(both, (left + right) / 2.0, np.where(np.isfinite(left), left, right))
+    return gaze[:, 0], gaze[:, 1]
+
+
+def _gaze_points(values):
+    """Returns the (x, y) coordinates of gaze points written as "(x, y)" as an array of shape (n, 2),
+    NaN if missing or invalid"""
+    if len(values) == 0:
+        return np.empty((0, 2))
+    parts = np.char.partition(np.char.strip(np.array(values), "()"), ",")
+    x = to_floats(np.char.strip(parts[:, 0]), -1)
+    y = to_floats(np.char.strip(parts[:, 2]), -1)
+    invalid = (parts[:, 1] == "") | (np.char.find(parts[:, 2], ",") >= 0)  # not two coordinates
+    x[invalid] = np.nan
+    y[invalid] = np.nan
+    return np.column_stack((x, y))
+
+
+def _truncate(values):
+    """Returns float values truncated to int64, as cast_int(cast_float(value)), with SampleTable.INT_MISSING for NaN"""
+    result = np.full(len(values), SampleTable.INT_MISSING, dtype=np.int64)
+    present = ~np.isnan(values)
+    result[present] = values[present].astype(np.int64)
+    return result
+
+
 # for testing purposes:
 if __name__ == "__main__":
 
@@ -9,54 +9,65 @@ Institution: The University of British Columbia.
 """
 
 from EMDAT_core.Recording import *
-from EMDAT_core.data_structures import Datapoint, Fixation, Saccade, Event
+from EMDAT_core.data_structures import SampleTable, Fixation, Saccade, Event
 from EMDAT_core.utils import *
-import csv
+from EMDAT_eyetracker.columns import read_columns, row_filter, to_list, encode_strings
 import params
 
 
 class TobiiV2Recording(Recording):
+
+    READER_PARAMS = ('ALLDATAHEADERLINES', 'NUMBEROFEXTRAHEADERLINES', 'FIXATIONHEADERLINES', 'EVENTSHEADERLINES')
+
     def read_all_data(self, all_file):
-        """Returns a list of "Datapoint"s read from an "All-Data" file.
+        """Returns the "Datapoint"s read from an "All-Data" file.
 
         Args:
             all_file:A string containing the name of the 'All-Data.tsv' file output by the Tobii software.
 
         Returns:
-            a list of "Datapoint"s
+            a SampleTable holding the "Datapoint"s
         """
-        all_data = []
+        names = ["Number", "Timestamp", "ValidityLeft", "ValidityRight", "StimuliName", "FixationIndex"]
+        if self.reads_data('pupil'):
+            names += ["PupilLeft", "PupilRight"]
+        if self.reads_data('distance'):
+            names += ["DistanceLeft", "DistanceRight"]
         with open(all_file, 'r') as f:
-            for _ in xrange(params.ALLDATAHEADERLINES + params.NUMBEROFEXTRAHEADERLINES - 1):
+            for _ in range(params.ALLDATAHEADERLINES + params.NUMBEROFEXTRAHEADERLINES - 1):
                 next(f)
-            reader = csv.DictReader(f, delimiter="\t")
-            last_pupil_left = -1
-            last_pupil_right = -1
-            last_time = -1
-
-            for row in reader:
-                if not row["Number"]:  # ignore invalid data point
-                    continue
-                pupil_left = cast_float(row["PupilLeft"], -1)
-                pupil_right = cast_float(row["PupilRight"], -1)
-                distance_left = cast_float(row["DistanceLeft"], -1)
-                distance_right = cast_float(row["DistanceRight"], -1)
-                timestamp = cast_int(row["Timestamp"])
-                data = {"timestamp": timestamp,
-                        "pupilsize": get_pupil_size(pupil_left, pupil_right),
-                        "pupilvelocity": get_pupil_velocity(last_pupil_left, last_pupil_right, pupil_left, pupil_right, (timestamp-last_time) ),
-                        "distance": get_distance(distance_left, distance_right),
-                        "is_valid": cast_int(row["ValidityRight"]) < 2 or cast_int(row["ValidityLeft"]) < 2,
-                        "is_valid_blink": cast_int(row["ValidityRight"]) < 2 and cast_int(row["ValidityLeft"]) < 2,
-                        "stimuliname": row["StimuliName"],
-                        "fixationindex": cast_int(row["FixationIndex"]),
-                        "gazepointxleft": cast_float(row["GazePointXLeft"])}
-                all_data.append(Datapoint(data))
-                last_pupil_left = pupil_left
-                last_pupil_right = pupil_right
-                last_time = timestamp
-
-        return all_data
+            table = read_columns(f, names, delimiter="\t",
+                                 where=row_filter(self.read_filter, "Timestamp", self.TIMESTAMPS_PER_MS,
+                                                  samples=lambda t: t.present("Number"), sample_columns=["Number"],
+                                                  stimulus_column="StimuliName"))
+
+        table = table.take(table.present("Number"))  # ignore invalid data point
+        timestamps = table.ints("Timestamp")
+        validity_left = table.ints("ValidityLeft") < 2  # a missing validity counts as valid, as None < 2 did
+        validity_right = table.ints("ValidityRight") < 2
+        if self.reads_data('pupil'):
+            pupil_left = table.floats("PupilLeft", -1)
+            pupil_right = table.floats("PupilRight", -1)
+            pupil_sizes = get_pupil_sizes(pupil_left, pupil_right)
+            pupil_velocities = get_pupil_velocities(pupil_left, pupil_right, timestamps)
+        else:
+            pupil_sizes = get_missing_values(len(timestamps))
+            pupil_velocities = get_missing_values(len(timestamps))
+        if self.reads_data('distance'):
+            distances = get_distances(table.floats("DistanceLeft", -1), table.floats("DistanceRight", -1))
+        else:
+            distances = get_missing_values(len(timestamps))
+        columns = {"timestamp": timestamps,
+                   "pupilsize": pupil_sizes,
+                   "pupilvelocity": pupil_velocities,
+                   "distance": distances,
+                   "is_valid": validity_right | validity_left,
+                   "is_valid_blink": validity_right & validity_left,
+                   "fixationindex": table.ints("FixationIndex")}
+        for column in ("gazepointx", "gazepointy"):
+            columns[column] = np.full(len(timestamps), np.nan)
+        columns["stimuliname"], stimulinames = encode_strings(table["StimuliName"])
+        return SampleTable(columns, stimulinames)
 
     def read_fixation_data(self, fixation_file):
         """Returns a list of "Fixation"s read from an "Fixation-Data" file.
@@ -70,16 +81,21 @@ class TobiiV2Recording(Recording):
 
         all_fixation = []
         with open(fixation_file, 'r') as f:
-            for _ in xrange(params.FIXATIONHEADERLINES - 1):
+            for _ in range(params.FIXATIONHEADERLINES - 1):
                 next(f)
-            reader = csv.DictReader(f, delimiter='\t')
-            for row in reader:
-                data = {"fixationindex": cast_int(row["FixationIndex"]),
-                        "timestamp": cast_int(row["Timestamp"]),
-                        "fixationduration": cast_int(row["FixationDuration"]),
-                        "fixationpointx": cast_int(row["MappedFixationPointX"]),
-                        "fixationpointy": cast_int(row["MappedFixationPointY"])}
-                all_fixation.append(Fixation(data, self.media_offset))
+            table = read_columns(f, ["FixationIndex", "Timestamp", "FixationDuration",
+                                     "MappedFixationPointX", "MappedFixationPointY"], delimiter='\t',
+                                 where=row_filter(self.read_filter, "Timestamp", self.TIMESTAMPS_PER_MS))
+        for index, timestamp, duration, x, y in zip(to_list(table.ints("FixationIndex")), to_list(table.ints("Timestamp")),
+                                                    to_list(table.ints("FixationDuration")),
+                                                    to_list(table.ints("MappedFixationPointX")),
+                                                    to_list(table.ints("MappedFixationPointY"))):
+            data = {"fixationindex": index,
+                    "timestamp": timestamp,
+                    "fixationduration": duration,
+                    "fixationpointx": x,
+                    "fixationpointy": y}
+            all_fixation.append(Fixation(data, self.media_offset))
 
         return all_fixation
 
@@ -95,20 +111,23 @@ class TobiiV2Recording(Recording):
 
         all_event = []
         with open(event_file, 'r') as f:
-            for _ in xrange(params.EVENTSHEADERLINES - 1):
+            for _ in range(params.EVENTSHEADERLINES - 1):
                 next(f)
-            reader = csv.DictReader(f, delimiter='\t')
-            for row in reader:
-                data = {"timestamp": cast_int(row["Timestamp"]),
-                        "event": row["Event"],
-                        "event_key": cast_int(row["EventKey"])}
-                if data["event"] == "LeftMouseClick" or data["event"] == "RightMouseClick":
-                    data.update({"x_coord": cast_int(row["Data1"]), "y_coord": cast_int(row["Data2"])})
-                elif data["event"] == "KeyPress":
-                    data.update({"key_code": cast_int(row["Data1"]), "key_name": row["Descriptor"]})
-                elif data["event"] == "LogData":
-                    data.update({"description": row["Data1"]})
-                all_event.append(Event(data, self.media_offset))
+            table = read_columns(f, ["Timestamp", "Event", "EventKey", "Data1", "Data2", "Descriptor"], delimiter='\t',
+                                 where=row_filter(self.read_filter, "Timestamp", self.TIMESTAMPS_PER_MS))
+        for timestamp, event, event_key, data1, data1_int, data2_int, descriptor in zip(
+                to_list(table.ints("Timestamp")), table["Event"], to_list(table.ints("EventKey")), table["Data1"],
+                to_list(table.ints("Data1")), to_list(table.ints("Data2")), table["Descriptor"]):
+            data = {"timestamp": timestamp,
+                    "event": event,
+                    "event_key": event_key}
+            if data["event"] == "LeftMouseClick" or data["event"] == "RightMouseClick":
+                data.update({"x_coord": data1_int, "y_coord": data2_int})
+            elif data["event"] == "KeyPress":
+                data.update({"key_code": data1_int, "key_name": descriptor})
+            elif data["event"] == "LogData":
+                data.update({"description": data1})
+            all_event.append(Event(data, self.media_offset))
 
         return all_event
 
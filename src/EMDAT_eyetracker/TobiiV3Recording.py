@@ -4,64 +4,110 @@ Created on 2015-08-15
 
 Class to read Tobii data (exported with Tobii Studio V3 and higher). See sample data in the "sampledata" folder.
 
+Tobii Studio V3 exports all the data (gaze samples, fixations, saccades and events) in one single file.
+Only the columns needed by each data stream are read (see EMDAT_eyetracker/columns.py), and when the
+same file is given for all the data streams, the file is read only once.
+
 Authors: Mike Wu (creator), Sebastien Lalle.
 Institution: The University of British Columbia.
 """
 
 from EMDAT_core.Recording import Recording
-from EMDAT_core.data_structures import Datapoint, Fixation, Saccade, Event
+from EMDAT_core.data_structures import SampleTable, Fixation, Saccade, Event
+from EMDAT_eyetracker.columns import read_columns, row_filter, to_list, encode_strings
 import EMDAT_core.utils
-import csv
+import numpy as np
 import params
 
+DATAPOINT_COLUMNS = ('RecordingTimestamp', 'ValidityLeft', 'ValidityRight', 'PupilLeft', 'PupilRight',
+                     'DistanceLeft', 'DistanceRight', 'FixationIndex', 'GazePointX (MCSpx)', 'GazePointY (MCSpx)')
+SKIPPABLE_COLUMNS = {'pupil': ('PupilLeft', 'PupilRight'), 'distance': ('DistanceLeft', 'DistanceRight')}
+FIXATION_COLUMNS = ('RecordingTimestamp', 'ValidityLeft', 'ValidityRight', 'GazeEventType', 'GazeEventDuration',
+                    'FixationIndex', 'FixationPointX (MCSpx)', 'FixationPointY (MCSpx)')
+SACCADE_COLUMNS = ('RecordingTimestamp', 'EyeTrackerTimestamp', 'ValidityLeft', 'ValidityRight', 'GazeEventType',
+                   'SaccadeIndex', 'GazePointX (ADCSpx)', 'GazePointY (ADCSpx)',
+                   'FixationPointX (MCSpx)', 'FixationPointY (MCSpx)')
+EVENT_COLUMNS = ('RecordingTimestamp', 'MouseEventIndex', 'MouseEvent', 'MouseEventX (MCSpx)', 'MouseEventY (MCSpx)',
+                 'KeyPressEventIndex', 'KeyPressEvent')
+
 
 class TobiiV3Recording(Recording):
+
+    MEDIA_NAME = 'Screen Recordings (1)'  # MediaName of the rows holding the recording data
+    READER_PARAMS = ('VALID_SAMPLES_PROP_SACCADE',)
+
+    def cache_key_data(self):
+        """Returns the reader-specific part of the key of the cached recordings, including the MediaName filter"""
+        return Recording.cache_key_data(self) + [('MEDIA_NAME', self.MEDIA_NAME)]
+
+    def read_data(self, all_file, fixation_file, saccade_file=None, event_file=None):
+        """Reads all the data streams of the recording. If all the streams come from the same
+        export file, the file is read only once.
+
+        Args:
+            all_file: A string containing the name of the data file output by the Tobii software.
+            fixation_file: A string containing the name of the fixation file output by the Tobii software.
+            saccade_file: If not None, a string containing the name of the saccade file.
+            event_file: If not None, a string containing the name of the event file.
+
+        Returns:
+            a SampleTable of "Datapoint"s, a list of "Fixation"s, a list of "Saccade"s (or None)
+            and a list of "Event"s (or None)
+        """
+        files = [path for path in (fixation_file, saccade_file, event_file) if path is not None]
+        if any(path != all_file for path in files):
+            return Recording.read_data(self, all_file, fixation_file, saccade_file, event_file)
+
+        names = self.datapoint_columns()
+        for columns, data_file in ((FIXATION_COLUMNS, fixation_file), (SACCADE_COLUMNS, saccade_file),
+                                   (EVENT_COLUMNS, event_file)):
+            if data_file is not None:
+                names.extend(name for name in columns if name not in names)
+        table = self.read_table(all_file, names)
+
+        return [read_datapoints(table, self.reads_data('pupil'), self.reads_data('distance')),
+                read_fixations(table, self.media_offset),
+                read_saccades(table, self.media_offset) if saccade_file is not None else None,
+                read_events(table, self.media_offset) if event_file is not None else None]
+
+    def read_table(self, data_file, names):
+        """Reads some columns of the rows of an exported data file that belong to the screen recording
+        (and to the time ranges of the read filter, if any).
+
+        The MediaName (and RecordingTimestamp) of each row is read first, and the other columns are only
+        read for the rows that are kept.
+
+        Args:
+            data_file: A string containing the name of the data file output by the Tobii software.
+            names: the names of the columns to read
+
+        Returns:
+            a ColumnTable with the columns in names and 'MediaName'
+        """
+        where = row_filter(self.read_filter, 'RecordingTimestamp', self.TIMESTAMPS_PER_MS,
+                           samples=lambda t: t.present('ValidityLeft') & t.present('ValidityRight'),
+                           sample_columns=['ValidityLeft', 'ValidityRight'],
+                           stimulus_column='MediaName', stimulus=self.MEDIA_NAME)  # ignore non-recording data point
+        with open(data_file, 'r') as f:
+            return read_columns(f, list(names) + ['MediaName'], delimiter='\t', where=where)
+
     def read_all_data(self, all_file):
-        """Returns a list of "Datapoint"s read from an data file.
+        """Returns the "Datapoint"s read from an data file.
 
         Args:
             all_file:A string containing the name of the data file output by the Tobii software.
 
         Returns:
-            a list of "Datapoint"s
+            a SampleTable holding the "Datapoint"s
         """
-        all_data = []
-        with open(all_file, 'r') as f:
-            reader = csv.DictReader(f, delimiter="\t")
-            last_pupil_left = -1
-            last_pupil_right = -1
-            last_time = -1
-
-            for row in reader:
-#                if row["MediaName"] != 'ScreenRec':
-                if row["MediaName"] != 'Screen Recordings (1)':  # ignore non-recording data point
-                    continue
-                if not row["ValidityLeft"] or not row["ValidityRight"]: #ignore data point with no validity information
-                    continue
-                gaze_point_x = EMDAT_core.utils.cast_float(row["GazePointX (MCSpx)"], -1)
-                gaze_point_y = EMDAT_core.utils.cast_float(row["GazePointY (MCSpx)"], -1)
-                pupil_left = EMDAT_core.utils.cast_float(row["PupilLeft"], -1)
-                pupil_right = EMDAT_core.utils.cast_float(row["PupilRight"], -1)
-                distance_left = EMDAT_core.utils.cast_float(row["DistanceLeft"], -1)
-                distance_right = EMDAT_core.utils.cast_float(row["DistanceRight"], -1)
-                timestamp = EMDAT_core.utils.cast_int(row["RecordingTimestamp"])
-                data = {'participant_name': row["ParticipantName"],
-                        "timestamp": timestamp,
-                        "pupilsize": EMDAT_core.Recording.get_pupil_size(pupil_left, pupil_right),
-                        "pupilvelocity": EMDAT_core.Recording.get_pupil_velocity(last_pupil_left, last_pupil_right, pupil_left, pupil_right, (timestamp-last_time) ),
-                        "distance": EMDAT_core.Recording.get_distance(distance_left, distance_right),
-                        "is_valid": EMDAT_core.utils.cast_int(row["ValidityRight"]) < 2 or EMDAT_core.utils.cast_int(row["ValidityLeft"]) < 2,
-                        "is_valid_blink": EMDAT_core.utils.cast_int(row["ValidityRight"]) < 2 and EMDAT_core.utils.cast_int(row["ValidityLeft"]) < 2,
-                        "stimuliname": row["MediaName"],
-                        "fixationindex": EMDAT_core.utils.cast_int(row["FixationIndex"]),
-                        "gazepointx": gaze_point_x,
-                        "gazepointy": gaze_point_y}
-                all_data.append(Datapoint(data))
-                last_pupil_left = pupil_left
-                last_pupil_right = pupil_right
-                last_time = timestamp
-
-        return all_data
+        return read_datapoints(self.read_table(all_file, self.datapoint_columns()),
+                               self.reads_data('pupil'), self.reads_data('distance'))
+
+    def datapoint_columns(self):
+        """Returns the list of the columns read for the "Datapoint"s, without the pupil and distance columns
+        if they are not needed (see Recording.reads_data)"""
+        skipped = [name for data, columns in SKIPPABLE_COLUMNS.items() if not self.reads_data(data) for name in columns]
+        return [name for name in DATAPOINT_COLUMNS if name not in skipped]
 
     def read_fixation_data(self, fixation_file):
         """Returns a list of "Fixation"s read from the data file file.
@@ -72,28 +118,7 @@ class TobiiV3Recording(Recording):
         Returns:
             a list of "Fixation"s
         """
-
-        all_fixation = []
-        with open(fixation_file, 'r') as f:
-            currentfix = 0
-            reader = csv.DictReader(f, delimiter='\t')
-            for row in reader:
-#                if row["MediaName"] != 'ScreenRec':
-                if row["MediaName"] != 'Screen Recordings (1)':  # ignore non-recording data point
-                    continue
-                if not row["ValidityLeft"] or not row["ValidityRight"] or not row["FixationPointX (MCSpx)"] or not row["FixationPointY (MCSpx)"]: #ignore data point with no information
-                    continue
-                if row["GazeEventType"] != "Fixation" or currentfix == row["FixationIndex"]: #if not a fixation or the current fixation
-                    continue
-                data = {"fixationindex": EMDAT_core.utils.cast_int(row["FixationIndex"]),
-                        "timestamp": EMDAT_core.utils.cast_int(row["RecordingTimestamp"]),
-                        "fixationduration": EMDAT_core.utils.cast_int(row["GazeEventDuration"]),
-                        "fixationpointx": EMDAT_core.utils.cast_int(row["FixationPointX (MCSpx)"]),
-                        "fixationpointy": EMDAT_core.utils.cast_int(row["FixationPointY (MCSpx)"])}
-                all_fixation.append(Fixation(data, self.media_offset))
-                currentfix = row["FixationIndex"]
-
-        return all_fixation
+        return read_fixations(self.read_table(fixation_file, FIXATION_COLUMNS), self.media_offset)
 
     def read_saccade_data(self, saccade_file):
         """Returns a list of "Saccade"s read from the data file file.
@@ -104,108 +129,7 @@ class TobiiV3Recording(Recording):
         Returns:
             a list of "Saccade"s
         """
-
-        all_saccade = []
-        with open(saccade_file, 'r') as f:
-            reader = csv.DictReader(f, delimiter='\t')
-            in_saccade = False
-            in_fixation = False
-            last_gaze_coord = (0, 0, 0) #timestamp X Y
-            saccade_vect = []
-            saccade_duration = 0
-            current_index = 0
-
-            nb_invalid_temp = 0
-            nb_valid_sample = 0
-            nb_sample = 0
-            last_valid = False
-
-            for row in reader:
-#                if row["MediaName"] != 'ScreenRec' or not row["EyeTrackerTimestamp"]:
-                if row["MediaName"] != 'Screen Recordings (1)' or not row["EyeTrackerTimestamp"]:  # ignore non-recording data point
-                    continue
-
-                if in_fixation:
-                    if row["GazeEventType"] == "Fixation":
-                        nb_invalid_temp = 0
-                    elif row["GazeEventType"] == "Saccade": #new saccade
-                        in_fixation = False
-                        in_saccade = True
-                        current_index = row["SaccadeIndex"]
-                        saccade_vect = [last_gaze_coord]
-                        nb_valid_sample = 0
-
-                        #add current sample
-                        if (EMDAT_core.utils.cast_int(row["ValidityLeft"])<2 or EMDAT_core.utils.cast_int(row["ValidityRight"])<2) and row["GazePointX (ADCSpx)"] and row["GazePointY (ADCSpx)"]: #ignore data point with no valid data
-                            saccade_vect.append( [EMDAT_core.utils.cast_int(row["RecordingTimestamp"]), EMDAT_core.utils.cast_int(row["GazePointX (ADCSpx)"]), EMDAT_core.utils.cast_int(row["GazePointY (ADCSpx)"])] )
-                            nb_valid_sample += 1
-
-                        if last_valid:
-                            nb_valid_sample += 1
-
-                        nb_sample = 2 + nb_invalid_temp #current gaze sample + last gaze sample of the previous fixation + eventually all unclasified gaze samples in between
-                        nb_invalid_temp = 0
-                    else: #unclassified gaze samples
-                        nb_invalid_temp += 1
-
-                elif in_saccade:
-                    if row["GazeEventType"] == "Fixation":
-                        in_fixation = True
-                        in_saccade = False
-
-                        #end of last saccade
-                        if (EMDAT_core.utils.cast_int(row["ValidityLeft"])<2 or EMDAT_core.utils.cast_int(row["ValidityRight"])<2) and row["GazePointX (ADCSpx)"] and row["GazePointY (ADCSpx)"]: #valid last datapoint
-                            saccade_vect.append( [EMDAT_core.utils.cast_int(row["RecordingTimestamp"]), EMDAT_core.utils.cast_int(row["GazePointX (ADCSpx)"]), EMDAT_core.utils.cast_int(row["GazePointY (ADCSpx)"])] )
-                            nb_valid_sample += 1
-                        elif (row["FixationPointX (MCSpx)"] and row["FixationPointY (MCSpx)"]): #if gaze sample not valid, try to use fixation data instead
-                            saccade_vect.append( [EMDAT_core.utils.cast_int(row["RecordingTimestamp"]), EMDAT_core.utils.cast_int(row["FixationPointX (MCSpx)"]), EMDAT_core.utils.cast_int(row["FixationPointY (MCSpx)"])] )
-                            nb_valid_sample += 1
-                        nb_sample += 1
-
-                        rate_valid_sample = float(nb_valid_sample) / nb_sample
-                        if rate_valid_sample >= params.VALID_SAMPLES_PROP_SACCADE: #if saccade quality is above the threshold
-                            saccade_duration = EMDAT_core.utils.cast_int(row["RecordingTimestamp"]) - saccade_vect[0][0]
-                            dist = EMDAT_core.Recording.get_saccade_distance(saccade_vect)
-                            accel = -1#Recording.get_saccade_acceleration(saccade_vect)
-                            speed = float(dist) / EMDAT_core.utils.cast_int(saccade_duration)
-                            data = {"saccadeindex": EMDAT_core.utils.cast_int(current_index),
-                                    "timestamp": saccade_vect[0][0],
-                                    "saccadeduration": EMDAT_core.utils.cast_int(saccade_duration),
-                                    "saccadestartpointx": saccade_vect[0][1],
-                                    "saccadestartpointy": saccade_vect[0][2],
-                                    "saccadeendpointx": saccade_vect[-1][1],
-                                    "saccadeendpointy": saccade_vect[-1][2],
-                                    "saccadedistance": dist,
-                                    "saccadespeed": speed,
-                                    "saccadeacceleration": accel,
-									"saccadequality": rate_valid_sample
-                                    }
-                            all_saccade.append(Saccade(data, self.media_offset))
-                            nb_valid_sample = 0
-                            nb_sample = 0
-
-                    elif row["GazeEventType"] == "Saccade":
-                        if (EMDAT_core.utils.cast_int(row["ValidityLeft"])<2 or EMDAT_core.utils.cast_int(row["ValidityRight"])<2) and row["GazePointX (ADCSpx)"] and row["GazePointY (ADCSpx)"]: #ignore data point with no valid data
-                            saccade_vect.append( [EMDAT_core.utils.cast_int(row["RecordingTimestamp"]), EMDAT_core.utils.cast_int(row["GazePointX (ADCSpx)"]), EMDAT_core.utils.cast_int(row["GazePointY (ADCSpx)"])] )
-                            nb_valid_sample += 1
-                        nb_sample += 1
-                    else: #unclassified gaze samples
-                        nb_sample += 1
-                    nb_invalid_temp = 0
-
-                else: #wait for the first fixation
-                    if row["GazeEventType"] == "Fixation":
-                        in_fixation = True
-
-                if row["GazePointX (ADCSpx)"] and row["GazePointY (ADCSpx)"]:
-                    last_gaze_coord = (EMDAT_core.utils.cast_int(row["RecordingTimestamp"]), EMDAT_core.utils.cast_int(row["GazePointX (ADCSpx)"]), EMDAT_core.utils.cast_int(row["GazePointY (ADCSpx)"]))
-                    last_valid = (EMDAT_core.utils.cast_int(row["ValidityLeft"])<2 or EMDAT_core.utils.cast_int(row["ValidityRight"])<2)
-                elif row["GazeEventType"] == "Fixation" and row["FixationPointX (MCSpx)"] and row["FixationPointY (MCSpx)"]: #if last sample not valid, at least check if valid data about the fixation
-                    last_gaze_coord = (EMDAT_core.utils.cast_int(row["RecordingTimestamp"]), EMDAT_core.utils.cast_int(row["FixationPointX (MCSpx)"]), EMDAT_core.utils.cast_int(row["FixationPointY (MCSpx)"]))
-                    last_valid = True
-
-        return all_saccade
-
+        return read_saccades(self.read_table(saccade_file, SACCADE_COLUMNS), self.media_offset)
 
     def read_event_data(self, event_file):
         """Returns a list of "Event"s read from an data file.
@@ -216,26 +140,222 @@ class TobiiV3Recording(Recording):
         Returns:
             a list of "Event"s
         """
+        return read_events(self.read_table(event_file, EVENT_COLUMNS), self.media_offset)
+
+
+def read_datapoints(table, pupil=True, distance=True):
+    """Builds the SampleTable of "Datapoint"s from the rows of a Tobii export
+
+    Args:
+        table: a ColumnTable with the columns in DATAPOINT_COLUMNS and 'MediaName'
+        pupil: False if the pupil columns are not read (the pupil sizes and velocities are set to -1)
+        distance: False if the distance columns are not read (the distances are set to -1)
+
+    Returns:
+        a SampleTable holding the "Datapoint"s
+    """
+    rows = np.flatnonzero(table.present("ValidityLeft") & table.present("ValidityRight"))  # ignore data point with no validity information
+    timestamps = table.ints("RecordingTimestamp")[rows]
+    validity_left = table.ints("ValidityLeft")[rows] < 2  # a missing validity counts as valid, as None < 2 did
+    validity_right = table.ints("ValidityRight")[rows] < 2
+    if pupil:
+        pupil_left = table.floats("PupilLeft", -1)[rows]
+        pupil_right = table.floats("PupilRight", -1)[rows]
+        pupil_sizes = EMDAT_core.Recording.get_pupil_sizes(pupil_left, pupil_right)
+        pupil_velocities = EMDAT_core.Recording.get_pupil_velocities(pupil_left, pupil_right, timestamps)
+    else:
+        pupil_sizes = EMDAT_core.Recording.get_missing_values(len(rows))
+        pupil_velocities = EMDAT_core.Recording.get_missing_values(len(rows))
+    if distance:
+        distances = EMDAT_core.Recording.get_distances(table.floats("DistanceLeft", -1)[rows], table.floats("DistanceRight", -1)[rows])
+    else:
+        distances = EMDAT_core.Recording.get_missing_values(len(rows))
+    columns = {"timestamp": timestamps,
+               "pupilsize": pupil_sizes,
+               "pupilvelocity": pupil_velocities,
+               "distance": distances,
+               "is_valid": validity_right | validity_left,
+               "is_valid_blink": validity_right & validity_left,
+               "fixationindex": table.ints("FixationIndex")[rows],
+               "gazepointx": table.floats("GazePointX (MCSpx)", -1)[rows],
+               "gazepointy": table.floats("GazePointY (MCSpx)", -1)[rows]}
+    columns["stimuliname"], stimulinames = encode_strings(table.strings("MediaName")[rows].tolist())
+    return SampleTable(columns, stimulinames)
+
+
+def read_fixations(table, media_offset):
+    """Builds the list of "Fixation"s from the rows of a Tobii export
+
+    Args:
+        table: a ColumnTable with the columns in FIXATION_COLUMNS
+        media_offset: the media offset of the recording
+
+    Returns:
+        a list of "Fixation"s
+    """
+    rows = np.flatnonzero(table.present("ValidityLeft") & table.present("ValidityRight") &
+                          table.present("FixationPointX (MCSpx)") & table.present("FixationPointY (MCSpx)") &  # ignore data point with no information
+                          table.equals("GazeEventType", "Fixation"))
+    indices = table.strings("FixationIndex")[rows]
+    rows = rows[np.concatenate(([True], indices[1:] != indices[:-1]))[:len(rows)]]  # first row of each fixation
+    fixations = []
+    for index, timestamp, duration, x, y in zip(to_list(table.ints("FixationIndex")[rows]), to_list(table.ints("RecordingTimestamp")[rows]),
+                                                to_list(table.ints("GazeEventDuration")[rows]),
+                                                to_list(table.ints("FixationPointX (MCSpx)")[rows]),
+                                                to_list(table.ints("FixationPointY (MCSpx)")[rows])):
+        data = {"fixationindex": index,
+                "timestamp": timestamp,
+                "fixationduration": duration,
+                "fixationpointx": x,
+                "fixationpointy": y}
+        fixations.append(Fixation(data, media_offset))
+    return fixations
+
+
+def read_saccades(table, media_offset):
+    """Rebuilds the list of "Saccade"s from the gaze samples of a Tobii export
+
+    Args:
+        table: a ColumnTable with the columns in SACCADE_COLUMNS
+        media_offset: the media offset of the recording
+
+    Returns:
+        a list of "Saccade"s
+    """
+    rows = np.flatnonzero(table.present("EyeTrackerTimestamp"))  # ignore non-recording data point
+    event_types = table.strings("GazeEventType")[rows].tolist()
+    saccade_indices = to_list(table.ints("SaccadeIndex")[rows])
+    timestamps = to_list(table.ints("RecordingTimestamp")[rows])
+    valid = ((table.ints("ValidityLeft")[rows] < 2) | (table.ints("ValidityRight")[rows] < 2)).tolist()
+    has_gaze = (table.present("GazePointX (ADCSpx)") & table.present("GazePointY (ADCSpx)"))[rows].tolist()
+    gaze_x = to_list(table.ints("GazePointX (ADCSpx)")[rows])
+    gaze_y = to_list(table.ints("GazePointY (ADCSpx)")[rows])
+    has_fixation_point = (table.present("FixationPointX (MCSpx)") & table.present("FixationPointY (MCSpx)"))[rows].tolist()
+    fixation_x = to_list(table.ints("FixationPointX (MCSpx)")[rows])
+    fixation_y = to_list(table.ints("FixationPointY (MCSpx)")[rows])
+
+    saccades = []
+    in_saccade = False
+    in_fixation = False
+    last_gaze_coord = (0, 0, 0) #timestamp X Y
+    saccade_vect = []
+    current_index = 0
+    nb_invalid_temp = 0
+    nb_valid_sample = 0
+    nb_sample = 0
+    last_valid = False
+
+    for i, event_type in enumerate(event_types):
+        if in_fixation:
+            if event_type == "Fixation":
+                nb_invalid_temp = 0
+            elif event_type == "Saccade": #new saccade
+                in_fixation = False
+                in_saccade = True
+                current_index = saccade_indices[i]
+                saccade_vect = [last_gaze_coord]
+                nb_valid_sample = 0
+
+                #add current sample
+                if valid[i] and has_gaze[i]: #ignore data point with no valid data
+                    saccade_vect.append([timestamps[i], gaze_x[i], gaze_y[i]])
+                    nb_valid_sample += 1
+
+                if last_valid:
+                    nb_valid_sample += 1
+
+                nb_sample = 2 + nb_invalid_temp #current gaze sample + last gaze sample of the previous fixation + eventually all unclasified gaze samples in between
+                nb_invalid_temp = 0
+            else: #unclassified gaze samples
+                nb_invalid_temp += 1
+
+        elif in_saccade:
+            if event_type == "Fixation":
+                in_fixation = True
+                in_saccade = False
+
+                #end of last saccade
+                if valid[i] and has_gaze[i]: #valid last datapoint
+                    saccade_vect.append([timestamps[i], gaze_x[i], gaze_y[i]])
+                    nb_valid_sample += 1
+                elif has_fixation_point[i]: #if gaze sample not valid, try to use fixation data instead
+                    saccade_vect.append([timestamps[i], fixation_x[i], fixation_y[i]])
+                    nb_valid_sample += 1
+                nb_sample += 1
+
+                rate_valid_sample = float(nb_valid_sample) / nb_sample
+                if rate_valid_sample >= params.VALID_SAMPLES_PROP_SACCADE: #if saccade quality is above the threshold
+                    saccade_duration = timestamps[i] - saccade_vect[0][0]
+                    dist = EMDAT_core.Recording.get_saccade_distance(saccade_vect)
+                    accel = -1#Recording.get_saccade_acceleration(saccade_vect)
+                    speed = float(dist) / saccade_duration
+                    data = {"saccadeindex": current_index,
+                            "timestamp": saccade_vect[0][0],
+                            "saccadeduration": saccade_duration,
+                            "saccadestartpointx": saccade_vect[0][1],
+                            "saccadestartpointy": saccade_vect[0][2],
+                            "saccadeendpointx": saccade_vect[-1][1],
+                            "saccadeendpointy": saccade_vect[-1][2],
+                            "saccadedistance": dist,
+                            "saccadespeed": speed,
+                            "saccadeacceleration": accel,
+                            "saccadequality": rate_valid_sample
+                            }
+                    saccades.append(Saccade(data, media_offset))
+                    nb_valid_sample = 0
+                    nb_sample = 0
+
+            elif event_type == "Saccade":
+                if valid[i] and has_gaze[i]: #ignore data point with no valid data
+                    saccade_vect.append([timestamps[i], gaze_x[i], gaze_y[i]])
+                    nb_valid_sample += 1
+                nb_sample += 1
+            else: #unclassified gaze samples
+                nb_sample += 1
+            nb_invalid_temp = 0
 
-        all_event = []
-        with open(event_file, 'r') as f:
-            reader = csv.DictReader(f, delimiter='\t')
-            for row in reader:
-#                if row["MediaName"] != 'ScreenRec':
-                if row["MediaName"] != 'Screen Recordings (1)':  # ignore non-recording data point
-                    continue
-                if row["MouseEventIndex"] : #mouse event
-                    data = {"timestamp": EMDAT_core.utils.cast_int(row["RecordingTimestamp"]),
-                        "event": row["MouseEvent"]+"MouseClick",
-                        "x_coord": EMDAT_core.utils.cast_int(row["MouseEventX (MCSpx)"]),
-                        "y_coord": EMDAT_core.utils.cast_int(row["MouseEventY (MCSpx)"])
-                        }
-                    all_event.append(Event(data, self.media_offset))
-                elif row["KeyPressEventIndex"] : #keyboard event
-                    data = {"timestamp": EMDAT_core.utils.cast_int(row["RecordingTimestamp"]),
-                        "event": "KeyPress",
-                        "key_name": row["KeyPressEvent"]
-                        }
-                    all_event.append(Event(data, self.media_offset))
-
-        return all_event
+        else: #wait for the first fixation
+            if event_type == "Fixation":
+                in_fixation = True
+
+        if has_gaze[i]:
+            last_gaze_coord = (timestamps[i], gaze_x[i], gaze_y[i])
+            last_valid = valid[i]
+        elif event_type == "Fixation" and has_fixation_point[i]: #if last sample not valid, at least check if valid data about the fixation
+            last_gaze_coord = (timestamps[i], fixation_x[i], fixation_y[i])
+            last_valid = True
+
+    return saccades
+
+
+def read_events(table, media_offset):
+    """Builds the list of "Event"s from the rows of a Tobii export
+
+    Args:
+        table: a ColumnTable with the columns in EVENT_COLUMNS
+        media_offset: the media offset of the recording
+
+    Returns:
+        a list of "Event"s
+    """
+    mouse = table.present("MouseEventIndex")
+    rows = np.flatnonzero(mouse | table.present("KeyPressEventIndex"))
+    events = []
+    for is_mouse, timestamp, mouse_event, x, y, key_name in zip(mouse[rows].tolist(), to_list(table.ints("RecordingTimestamp")[rows]),
+                                                                  table.strings("MouseEvent")[rows].tolist(),
+                                                                  to_list(table.ints("MouseEventX (MCSpx)")[rows]),
+                                                                  to_list(table.ints("MouseEventY (MCSpx)")[rows]),
+                                                                  table.strings("KeyPressEvent")[rows].tolist()):
+        if is_mouse: #mouse event
+            data = {"timestamp": timestamp,
+                "event": mouse_event+"MouseClick",
+                "x_coord": x,
+                "y_coord": y
+                }
+        else: #keyboard event
+            data = {"timestamp": timestamp,
+                "event": "KeyPress",
+                "key_name": key_name
+                }
+        events.append(Event(data, media_offset))
+    return events
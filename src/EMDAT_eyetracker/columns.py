@@ -0,0 +1,425 @@
+"""
+UBC Eye Movement Data Analysis Toolkit (EMDAT), Version 3
+
+Column-projected reader of delimited exports, shared by the eye tracker readers.
+
+The exports of the eye trackers have dozens of columns, of which a reader needs a few. Instead of
+building a dictionary of every column for every row (as csv.DictReader does) and converting each
+field with cast_int/cast_float, the indices of the needed columns are resolved once from the header,
+each line is only split up to the last needed column, and the values of each column are converted
+at once into a typed NumPy array:
+    floats: float64 arrays, with NaN where EMDAT_core.utils.cast_float would return None
+        (empty or non-numeric fields, and the invalid value if one is given)
+    ints: int64 arrays, with SampleTable.INT_MISSING where EMDAT_core.utils.cast_int would return None
+
+Fields are split on the delimiter, except on the (rare) lines holding a quote, which are parsed
+with the csv module. Blank lines are skipped and short lines are padded with empty fields.
+
+Rows can be rejected after reading only one or two of their columns (e.g. the stimulus name and the
+timestamp, see row_filter), before the other columns are read.
+
+Institution: The University of British Columbia.
+"""
+
+import csv
+from operator import itemgetter
+import numpy as np
+from EMDAT_core.data_structures import SampleTable
+import EMDAT_core.utils
+
+
+class ColumnTable(object):
+    """
+    The values of some columns of a delimited export, as read by read_columns
+
+    The typed arrays returned by strings, floats and ints are computed once per column and shared by
+    all the callers, which must not modify them (index them to get a copy).
+
+    Attributes:
+        columns: a dictionary with the list of the (string) values of each column, in the order of the file
+    """
+
+    def __init__(self, columns):
+        """Inits ColumnTable class
+
+        Args:
+            columns: a dictionary with a list of string values for each column, all of the same length
+        """
+        self.columns = columns
+        self._strings = {}
+        self._converted = {}
+
+    def __len__(self):
+        for values in self.columns.values():
+            return len(values)
+        return 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def take(self, rows, names=None):
+        """Returns a ColumnTable with the given rows only
+
+        Args:
+            rows: a boolean array with one value per row, or an array of row indices
+
+            names: if not None, the columns to keep (by default, all of them)
+
+        Returns:
+            a ColumnTable
+        """
+        if names is None:
+            names = list(self.columns.keys())
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            if rows.all():
+                return ColumnTable(dict((name, self.columns[name]) for name in names))
+            rows = np.flatnonzero(rows)
+        rows = rows.tolist()
+        return ColumnTable(dict((name, [self.columns[name][i] for i in rows]) for name in names))
+
+    def strings(self, name):
+        """Returns the values of a column as a NumPy array of strings"""
+        strings = self._strings.get(name)
+        if strings is None:
+            strings = self._strings[name] = _string_array(self.columns[name])
+        return strings
+
+    def present(self, name):
+        """Returns a boolean array, True where the field of a column is not empty"""
+        return self.strings(name) != ''
+
+    def equals(self, name, value):
+        """Returns a boolean array, True where the field of a column is the given string"""
+        return self.strings(name) == value
+
+    def startswith(self, name, prefix):
+        """Returns a boolean array, True where the field of a column starts with the given string"""
+        return np.char.startswith(self.strings(name), prefix)
+
+    def contains(self, name, substring):
+        """Returns a boolean array, True where the field of a column contains the given string"""
+        return np.char.find(self.strings(name), substring) >= 0
+
+    def floats(self, name, invalid_value=None):
+        """Returns the values of a column as a float64 array (see to_floats)"""
+        return self._convert(to_floats, name, invalid_value)
+
+    def ints(self, name, invalid_value=None):
+        """Returns the values of a column as an int64 array (see to_ints)"""
+        return self._convert(to_ints, name, invalid_value)
+
+    def _convert(self, convert, name, invalid_value):
+        key = (convert, name, invalid_value)
+        values = self._converted.get(key)
+        if values is None:
+            values = self._converted[key] = convert(self.strings(name), invalid_value)
+        return values
+
+
+def read_columns(f, names, delimiter='\t', fieldnames=None, where=None):
+    """Reads some columns of the rest of an open delimited file
+
+    Args:
+        f: a file object, positioned at the header line (or at the first row if fieldnames is given)
+
+        names: the names of the columns to read
+
+        delimiter: the delimiter of the fields
+
+        fieldnames: if not None, the list of the column names of the file, which then has no header line
+
+        where: if not None, a RowFilter (as returned by row_filter) selecting the rows to read: the columns
+            it selects the rows from are read first, and the other columns are only read for the rows kept
+
+    Returns:
+        a ColumnTable with the columns in names
+    """
+    if fieldnames is None:
+        header = next(f, '')
+        fieldnames = _split_line(header.rstrip('\r\n'), delimiter, None)
+    source = getattr(f, 'name', 'the file')
+    lines = (line.rstrip('\r\n') for line in f)
+    if where is not None:
+        lines = where.select_lines(lines, fieldnames, delimiter, source)
+    return _read_lines(lines, fieldnames, names, delimiter, source)
+
+
+def row_filter(read_filter, time_column, timestamps_per_ms=1, samples=None, sample_columns=(), stimulus_column=None,
+               stimulus=None):
+    """Returns the 'where' argument of read_columns that keeps the rows accepted by a ReadFilter
+
+    Args:
+        read_filter: None, or a ReadFilter (see EMDAT_core/Recording.py)
+
+        time_column: the column with the timestamp of the rows
+
+        timestamps_per_ms: the number of units of the timestamps in a millisecond
+
+        samples: None, or a function returning a boolean array, True for the rows of the gaze samples,
+            from a ColumnTable with the columns in sample_columns
+
+        sample_columns: the columns used by samples
+
+        stimulus_column: None, or the column with the stimulus name of the rows
+
+        stimulus: the stimulus name of the rows to keep if the read filter does not give one (None to keep
+            all the stimuli)
+
+    Returns:
+        a RowFilter, or None if no row is filtered
+    """
+    if read_filter is not None and read_filter.stimulus is not None:
+        stimulus = read_filter.stimulus
+    if stimulus_column is None:
+        stimulus = None
+    by_time = read_filter is not None and read_filter.time_ranges is not None
+    if stimulus is None and not by_time:
+        return None
+
+    filter_names = [stimulus_column] if stimulus is not None else []
+    if by_time:
+        filter_names.extend(name for name in [time_column] + list(sample_columns) if name not in filter_names)
+    return RowFilter(filter_names, read_filter if by_time else None, time_column, timestamps_per_ms, samples,
+                     stimulus_column, stimulus)
+
+
+class RowFilter(object):
+    """
+    The rows of a delimited export that read_columns keeps (see row_filter)
+
+    The lines are selected by chunks of CHUNK_LINES lines, and only the lines kept are held until the other
+    columns are read, so that the rejected lines (e.g. the rows of other stimuli) are never all in memory.
+    The last gaze sample of the chunks read, if rejected, is held until a later chunk tells whether it is
+    the sample before the first sample of a time range of the read filter (see ReadFilter.time_mask).
+
+    Attributes:
+        names: the columns the rows are selected from
+        read_filter: None, or the ReadFilter whose time ranges select the rows
+        time_column, timestamps_per_ms, samples, stimulus_column: as in row_filter
+        stimulus: None, or the stimulus name of the rows to keep
+    """
+
+    CHUNK_LINES = 10000  # number of lines selected at once
+
+    def __init__(self, names, read_filter, time_column, timestamps_per_ms, samples, stimulus_column, stimulus):
+        """Inits RowFilter class
+
+        Args:
+            names, read_filter, time_column, timestamps_per_ms, samples, stimulus_column, stimulus: as in the
+                attributes
+        """
+        self.names = names
+        self.read_filter = read_filter
+        self.time_column = time_column
+        self.timestamps_per_ms = timestamps_per_ms
+        self.samples = samples
+        self.stimulus_column = stimulus_column
+        self.stimulus = stimulus
+
+    def select_lines(self, lines, fieldnames, delimiter, source):
+        """Returns the list of the lines to keep
+
+        Args:
+            lines: the lines of the file (without the line ends), in the order of the file
+
+            fieldnames: the list of the column names of the file
+
+            delimiter: the delimiter of the fields
+
+            source: the name of the file, for the error messages
+
+        Returns:
+            a list of lines
+        """
+        kept = []
+        state = (None, True)
+        chunk = []
+        for line in lines:
+            if not line:  # a blank line, skipped as csv.DictReader does
+                continue
+            chunk.append(line)
+            if len(chunk) == self.CHUNK_LINES:
+                state = self._select_chunk(chunk, fieldnames, delimiter, source, kept, state)
+                chunk = []
+        if chunk:
+            self._select_chunk(chunk, fieldnames, delimiter, source, kept, state)
+        return kept
+
+    def _select_chunk(self, chunk, fieldnames, delimiter, source, kept, state):
+        """Appends the lines of a chunk to keep to kept
+
+        Args:
+            chunk: a list of non-blank lines
+
+            fieldnames, delimiter, source: as in select_lines
+
+            kept: the list of the lines kept from the previous chunks
+
+            state: a pair (held, first) where held is None or a tuple (line, timestamp, index in kept) with the
+                last gaze sample of the previous chunks if it was rejected, and first is True if no gaze sample
+                was read yet
+
+        Returns:
+            the state after this chunk
+        """
+        table = _read_lines(chunk, fieldnames, self.names, delimiter, source)
+        keep = np.ones(len(table), dtype=bool)
+        if self.stimulus is not None:
+            keep &= table.equals(self.stimulus_column, self.stimulus)
+        if self.read_filter is None:
+            kept.extend(chunk[i] for i in np.flatnonzero(keep).tolist())
+            return state
+
+        held, first = state
+        timestamps = table.ints(self.time_column)
+        samples = keep & self.samples(table) if self.samples is not None else np.zeros(len(table), dtype=bool)
+        if held is None:
+            keep &= self.read_filter.time_mask(timestamps, samples, self.timestamps_per_ms, keep_first=first)
+        else:  # the held sample is given as the sample before the rows of the chunk
+            mask = self.read_filter.time_mask(np.concatenate([[held[1]], timestamps]),
+                                              np.concatenate([[True], samples]), self.timestamps_per_ms,
+                                              keep_first=False)
+            if mask[0]:
+                kept.insert(held[2], held[0])
+                held = None
+            keep &= mask[1:]
+
+        sample_rows = np.flatnonzero(samples & (timestamps != SampleTable.INT_MISSING))
+        if len(sample_rows):
+            first = False
+            last = sample_rows[-1]
+            if keep[last]:
+                held = None
+            else:
+                held = (chunk[last], timestamps[last], len(kept) + int(np.count_nonzero(keep[:last])))
+        kept.extend(chunk[i] for i in np.flatnonzero(keep).tolist())
+        return held, first
+
+
+def to_floats(values, invalid_value=None):
+    """Converts strings to a float64 array, as EMDAT_core.utils.cast_float does one at a time
+
+    Args:
+        values: a list (or an array) of strings
+
+        invalid_value: if not None, the value that is considered missing (e.g. -1)
+
+    Returns:
+        a float64 array, with NaN for the missing and non-numeric values
+    """
+    strings = _string_array(values)
+    result = np.full(len(strings), np.nan)
+    present = strings != ''
+    try:
+        result[present] = strings[present].astype(np.float64)
+    except ValueError:
+        try:  # decimal commas
+            result[present] = np.char.replace(strings[present], ',', '.').astype(np.float64)
+        except ValueError:
+            converted = [EMDAT_core.utils.cast_float(value) for value in strings[present].tolist()]
+            result[present] = [np.nan if value is None else value for value in converted]
+    if invalid_value is not None:
+        result[result == invalid_value] = np.nan
+    return result
+
+
+def to_ints(values, invalid_value=None):
+    """Converts strings to an int64 array, as EMDAT_core.utils.cast_int does one at a time
+
+    Args:
+        values: a list (or an array) of strings
+
+        invalid_value: if not None, the value that is considered missing
+
+    Returns:
+        an int64 array, with SampleTable.INT_MISSING for the missing and non-integer values
+    """
+    strings = _string_array(values)
+    result = np.full(len(strings), SampleTable.INT_MISSING, dtype=np.int64)
+    present = strings != ''
+    try:
+        result[present] = strings[present].astype(np.int64)
+    except (ValueError, OverflowError):
+        converted = [EMDAT_core.utils.cast_int(value) for value in strings[present].tolist()]
+        result[present] = [SampleTable.INT_MISSING if value is None else value for value in converted]
+    if invalid_value is not None:
+        result[result == invalid_value] = SampleTable.INT_MISSING
+    return result
+
+
+def to_list(values):
+    """Returns the values of a float or int array as a list, with None for the missing values"""
+    if values.dtype == np.float64:
+        return [None if value != value else value for value in values.tolist()]
+    return [None if value == SampleTable.INT_MISSING else value for value in values.tolist()]
+
+
+def encode_strings(values):
+    """Returns the codes of a list of strings, as stored in SampleTable.stimuliname
+
+    Args:
+        values: a list of strings
+
+    Returns:
+        an int32 array with the index of each string in the list of distinct strings, and that list
+        (in the order of first appearance)
+    """
+    names = []
+    codes = {}
+    result = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(names)
+            names.append(value)
+        result[i] = code
+    return result, names
+
+
+def _string_array(values):
+    if isinstance(values, np.ndarray):
+        return values
+    if len(values) == 0:
+        return np.array([], dtype=str)
+    return np.array(values)
+
+
+def _read_lines(lines, fieldnames, names, delimiter, source):
+    """Returns a ColumnTable with some columns of the given lines (see read_columns)"""
+    indices = []
+    for name in names:
+        if name not in fieldnames:
+            raise Exception("Column '%s' not found in the header of %s" % (name, source))
+        indices.append(fieldnames.index(name))
+    if not indices:
+        return ColumnTable({})
+    maxsplit = max(indices) + 1  # the fields after the last needed one are not split
+    numfields = maxsplit + 1
+    getter = itemgetter(*indices)
+
+    rows = []
+    for line in lines:
+        if not line:  # a blank line, skipped as csv.DictReader does
+            continue
+        fields = _split_line(line, delimiter, maxsplit)
+        if len(fields) < numfields:
+            fields += [''] * (numfields - len(fields))
+        rows.append(getter(fields))
+
+    if len(indices) == 1:
+        return ColumnTable({names[0]: list(rows)})
+    if not rows:
+        return ColumnTable(dict((name, []) for name in names))
+    return ColumnTable(dict(zip(names, [list(values) for values in zip(*rows)])))
+
+
+def _split_line(line, delimiter, maxsplit):
+    if '"' in line:
+        fields = next(csv.reader([line], delimiter=delimiter))
+        if maxsplit is not None and len(fields) > maxsplit + 1:
+            fields = fields[:maxsplit + 1]
+        return fields
+    if maxsplit is None:
+        return line.split(delimiter)
+    return line.split(delimiter, maxsplit)
@@ -0,0 +1,439 @@
+"""
+UBC Eye Movement Data Analysis Toolkit (EMDAT), Version 3
+
+Benchmark suite: times the BasicParticipant pipeline and its stages on synthetic workloads, and compares
+the results of two runs.
+
+A workload is a group of synthetic participants (see synthetic_data.py) defined by its number of
+participants, sampling rate, number of "AOI"s and recording duration. The standard workloads are the
+combinations of 1 to 200 participants, 60/120/300 Hz and 0/8/21 "AOI"s. For each workload, the
+following stages are timed:
+    read: parsing the exports into a Recording
+    segments: building the "Segment"s of every Scene (without "AOI"s)
+    aoi_stat: building the AOI_Stat of every AOI in every Segment
+    scenes: merging the "Segment"s into "Scene"s (and into the whole-recording Scene)
+    write: write_features_tsv for all the participants
+    pipeline: read_participants_Basic followed by write_features_tsv (end to end)
+
+Each stage runs in a fresh process, which first prepares the input of the stage (untimed) and then runs
+the stage itself (timed). The wall time, the throughput (samples of the workload per second) and the
+peak resident memory of that process are reported as JSON, one record per workload and stage.
+
+Usage:
+    python benchmark.py run results.json --participants 1,10 --rates 60,120,300 --aois 0,8,21 --duration 300
+    python benchmark.py compare baseline.json results.json --threshold 0.1
+
+Institution: The University of British Columbia.
+"""
+from __future__ import print_function
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+import warnings
+
+import numpy as np
+
+import params
+import synthetic_data
+
+STAGES = ("read", "segments", "aoi_stat", "scenes", "write", "pipeline")
+
+STANDARD_PARTICIPANTS = (1, 10, 50, 200)
+STANDARD_RATES = (60, 120, 300)
+STANDARD_AOIS = (0, 8, 21)
+
+BENCHMARK_FORMAT = 1
+
+
+def standard_workloads(participants=STANDARD_PARTICIPANTS, rates=STANDARD_RATES, aois=STANDARD_AOIS,
+                       duration=300, tracker="TobiiV3", seed=0):
+    """Returns the workloads made of all the combinations of the given sizes
+
+    Args:
+        participants: a list of numbers of participants
+
+        rates: a list of sampling rates (in Hz)
+
+        aois: a list of numbers of "AOI"s
+
+        duration: the length of each recording (in seconds)
+
+        tracker: the export format of the workloads ("TobiiV3", "TobiiV2" or "SMI")
+
+        seed: the seed of the synthetic data
+
+    Returns:
+        a list of workload dictionaries, smallest first
+    """
+    return [{'tracker': tracker, 'participants': numparticipants, 'rate': rate, 'aois': numaois,
+             'duration': duration, 'seed': seed}
+            for numparticipants in participants for rate in rates for numaois in aois]
+
+
+def workload_id(workload):
+    """Returns a string identifying a workload, e.g. 'TobiiV3_p10_r120_a8_d300_s0'"""
+    return "%(tracker)s_p%(participants)d_r%(rate)d_a%(aois)d_d%(duration)d_s%(seed)d" % workload
+
+
+def prepare_workload(workdir, workload):
+    """Writes the synthetic data of a workload, unless a previous run already wrote it
+
+    Args:
+        workdir: the directory where the data of all workloads is kept
+
+        workload: a workload dictionary (see standard_workloads)
+
+    Returns:
+        a dictionary with the directory of the data ('datadir'), and the participant ids, file names and
+        number of samples returned by synthetic_data.generate_dataset
+    """
+    datadir = os.path.join(workdir, workload_id(workload))
+    infofile = os.path.join(datadir, "workload.json")
+    if os.path.exists(infofile):
+        with open(infofile) as f:
+            info = json.load(f)
+        if info.get('workload') == workload:
+            return info
+    info = synthetic_data.generate_dataset(datadir, tracker=workload['tracker'],
+                                           participants=workload['participants'],
+                                           duration=workload['duration'], sampling_rate=workload['rate'],
+                                           aoi_count=workload['aois'], seed=workload['seed'])
+    info['datadir'] = datadir
+    info['workload'] = workload
+    with open(infofile, 'w') as f:
+        json.dump(info, f, indent=1, sort_keys=True)
+    return info
+
+
+def run_benchmarks(workloads, workdir, stages=STAGES, repeat=1, verbose=True):
+    """Times the stages of the pipeline on a list of workloads
+
+    Args:
+        workloads: a list of workload dictionaries (see standard_workloads)
+
+        workdir: the directory where the data of the workloads is written
+
+        stages: a list of stage names, from STAGES
+
+        repeat: the number of times each stage is timed; the fastest run is reported
+
+        verbose: if True, print the results as they come
+
+    Returns:
+        a dictionary with the description of the machine ('environment') and a list of result records
+        ('results'), ready to be written as JSON
+    """
+    results = []
+    for workload in workloads:
+        info = prepare_workload(workdir, workload)
+        for stage in stages:
+            if stage == "aoi_stat" and workload['aois'] == 0:
+                continue
+            runs = [_run_in_process(stage, info, workdir) for _ in range(repeat)]
+            wall_times = [run['wall_time'] for run in runs]
+            wall_time = min(wall_times)
+            record = {'workload': workload_id(workload),
+                      'tracker': workload['tracker'],
+                      'participants': workload['participants'],
+                      'rate': workload['rate'],
+                      'aois': workload['aois'],
+                      'duration': workload['duration'],
+                      'stage': stage,
+                      'samples': info['numsamples'],
+                      'wall_time': wall_time,
+                      'wall_times': wall_times,
+                      'samples_per_sec': info['numsamples'] / wall_time if wall_time > 0 else None,
+                      'peak_rss_mb': max(run['peak_rss_mb'] for run in runs)}
+            results.append(record)
+            if verbose:
+                print("%-32s %-9s %9.3f s %12.0f samples/s %9.1f MB" %
+                      (record['workload'], stage, wall_time, record['samples_per_sec'] or 0, record['peak_rss_mb']))
+    return {'format': BENCHMARK_FORMAT, 'environment': environment(), 'results': results}
+
+
+def environment():
+    """Returns a description of the machine and of the software running the benchmarks"""
+    return {'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': multiprocessing.cpu_count(),
+            'time': time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def compare_results(baseline, current, threshold=0.1):
+    """Compares the results of two runs, matching their records by workload and stage
+
+    Args:
+        baseline: the dictionary of results of the reference run (see run_benchmarks)
+
+        current: the dictionary of results of the new run
+
+        threshold: the relative slow-down (or memory increase) above which a stage is reported as a regression
+
+    Returns:
+        a list of (workload, stage, baseline record, current record, time ratio, memory ratio, is_regression)
+        tuples, for the records present in both runs
+    """
+    reference = dict(((record['workload'], record['stage']), record) for record in baseline['results'])
+    comparison = []
+    for record in current['results']:
+        key = (record['workload'], record['stage'])
+        if key not in reference:
+            continue
+        base = reference[key]
+        time_ratio = record['wall_time'] / base['wall_time'] if base['wall_time'] > 0 else float('inf')
+        memory_ratio = record['peak_rss_mb'] / base['peak_rss_mb'] if base['peak_rss_mb'] > 0 else float('inf')
+        is_regression = time_ratio > 1 + threshold or memory_ratio > 1 + threshold
+        comparison.append((key[0], key[1], base, record, time_ratio, memory_ratio, is_regression))
+    return comparison
+
+
+def print_comparison(comparison):
+    """Prints the output of compare_results as a table"""
+    print("%-32s %-9s %10s %10s %7s %10s %10s %7s" %
+          ("workload", "stage", "base (s)", "new (s)", "time", "base (MB)", "new (MB)", "memory"))
+    for workload, stage, base, record, time_ratio, memory_ratio, is_regression in comparison:
+        print("%-32s %-9s %10.3f %10.3f %6.2fx %10.1f %10.1f %6.2fx%s" %
+              (workload, stage, base['wall_time'], record['wall_time'], time_ratio,
+               base['peak_rss_mb'], record['peak_rss_mb'], memory_ratio, "  REGRESSION" if is_regression else ""))
+
+
+def peak_rss_mb():
+    """Returns the peak resident memory of the current process (in MB)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":  # bytes on macOS, kilobytes elsewhere
+        return peak / (1024.0 * 1024.0)
+    return peak / 1024.0
+
+
+class StageTimer(object):
+    """
+    Accumulates the wall time spent in the timed sections of a stage (used as a context manager, once
+    per participant, so that the untimed preparation of the input can be interleaved with the stage)
+    """
+
+    def __init__(self):
+        self.wall_time = 0.0
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wall_time += time.time() - self.started
+        return False
+
+
+def _run_in_process(stage, info, workdir):
+    """Runs one stage in a fresh process, and returns its wall time and peak memory"""
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_stage_process, args=(queue, stage, info, workdir))
+    process.start()
+    result = queue.get()
+    process.join()
+    if 'error' in result:
+        raise Exception("Stage %s failed on %s: %s" % (stage, info['datadir'], result['error']))
+    return result
+
+
+def _stage_process(queue, stage, info, workdir):
+    """The body of the process running one stage: EMDAT output is silenced and the results are sent back"""
+    try:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        sys.stdout.flush()
+        os.dup2(devnull, 1)
+        warnings.simplefilter("ignore")
+        params.EYETRACKERTYPE = info['workload']['tracker']
+        params.VERBOSE = "QUIET"
+        params.DEBUG = False
+        params.RECORDING_CACHE_DIR = None
+        params.SEGMENT_CACHE_DIR = None
+        params.CANARY_OUTPUT_LOG = os.path.join(workdir, "benchmark_log.txt")
+        timer = StageTimer()
+        STAGE_FUNCTIONS[stage](info, timer)
+        queue.put({'wall_time': timer.wall_time, 'peak_rss_mb': peak_rss_mb()})
+    except Exception as e:
+        queue.put({'error': "%s: %s" % (type(e).__name__, e)})
+
+
+def _read_recording(tracker, paths):
+    """Returns the Recording of a participant, read as BasicParticipant reads it"""
+    from EMDAT_eyetracker.TobiiV2Recording import TobiiV2Recording
+    from EMDAT_eyetracker.TobiiV3Recording import TobiiV3Recording
+    from EMDAT_eyetracker.SMIRecording import SMIRecording
+    if tracker == "TobiiV2":
+        return TobiiV2Recording(paths['all'], paths['fix'], event_file=paths['event'],
+                                media_offset=params.MEDIA_OFFSET)
+    elif tracker == "TobiiV3":
+        return TobiiV3Recording(paths['all'], paths['fix'], saccade_file=paths['sac'],
+                                event_file=paths['event'], media_offset=params.MEDIA_OFFSET)
+    elif tracker == "SMI":
+        return SMIRecording(paths['all'], paths['fix'], saccade_file=paths['sac'], event_file=paths['event'],
+                            media_offset=params.MEDIA_OFFSET)
+    raise Exception("Unknown eye tracker type: " + str(tracker))
+
+
+def _participants(info):
+    """Yields the pid, file names and rest pupil sizes of each participant of a workload"""
+    from EMDAT_core.Recording import read_rest_pupil_sizes
+    rpsdata = read_rest_pupil_sizes(info['rpsfile'])
+    for pid in info['pids']:
+        yield pid, synthetic_data.participant_paths(info['datadir'], info['workload']['tracker'], pid), rpsdata[pid]
+
+
+def _segments(rec, scenelist, rpsdata, aois=None):
+    """Yields the scid, chunk indices and Segment of every segment of a Recording, as Scene builds them"""
+    from EMDAT_core.Segment import Segment
+    from EMDAT_core.utils import get_chunk
+    for scid, seglist in scenelist.items():
+        for segid, start, end in seglist:
+            _, all_start, all_end = get_chunk(rec.all_data, 0, start, end)
+            _, fix_start, fix_end = get_chunk(rec.fix_data, 0, start, end)
+            if fix_end - fix_start <= 0:
+                continue
+            saccades = events = None
+            if rec.sac_data is not None:
+                _, sac_start, sac_end = get_chunk(rec.sac_data, 0, start, end)
+                saccades = rec.sac_data[sac_start:sac_end]
+            if rec.event_data is not None:
+                _, event_start, event_end = get_chunk(rec.event_data, 0, start, end)
+                events = rec.event_data[event_start:event_end]
+            seg = Segment(segid, rec.all_data[all_start:all_end], rec.fix_data[fix_start:fix_end],
+                          saccade_data=saccades, event_data=events, aois=aois,
+                          rest_pupil_size=rpsdata.get(scid, 0), export_pupilinfo=True)
+            yield scid, (all_start, all_end, fix_start, fix_end), events, seg
+
+
+def _stage_read(info, timer):
+    tracker = info['workload']['tracker']
+    for pid, paths, rpsdata in _participants(info):
+        with timer:
+            _read_recording(tracker, paths)
+
+
+def _stage_segments(info, timer):
+    from EMDAT_core.Recording import read_segs
+    tracker = info['workload']['tracker']
+    for pid, paths, rpsdata in _participants(info):
+        rec = _read_recording(tracker, paths)
+        scenelist = read_segs(paths['seg'])
+        with timer:
+            for _ in _segments(rec, scenelist, rpsdata):
+                pass
+
+
+def _stage_aoi_stat(info, timer):
+    from EMDAT_core.AOI import AOI_Stat, AOIClassifier
+    from EMDAT_core.Recording import read_aois, read_segs
+    tracker = info['workload']['tracker']
+    aois = read_aois(info['aoifile'])
+    for pid, paths, rpsdata in _participants(info):
+        rec = _read_recording(tracker, paths)
+        AOIClassifier(aois).label(rec.all_data, rec.fix_data)
+        inputs = []
+        for scid, (all_start, all_end, fix_start, fix_end), events, seg in \
+                _segments(rec, read_segs(paths['seg']), rpsdata):
+            all_data = rec.all_data[all_start:all_end]
+            fixation_data = rec.fix_data[fix_start:fix_end]
+            classifier = getattr(all_data, 'aoi_classifier', None)
+            membership = classifier.fixation_membership(fixation_data, aois) if classifier is not None else None
+            inputs.append((all_data, fixation_data, events, seg, rpsdata.get(scid, 0), membership))
+        with timer:
+            for all_data, fixation_data, events, seg, rest_pupil_size, membership in inputs:
+                for aoi in aois:
+                    AOI_Stat(aoi, all_data, fixation_data, seg.start, seg.end, seg.length_invalid, aois, events,
+                             rest_pupil_size, True, membership)
+
+
+def _stage_scenes(info, timer):
+    from EMDAT_core.Recording import read_aois, read_segs
+    from EMDAT_core.Scene import Scene
+    tracker = info['workload']['tracker']
+    aois = read_aois(info['aoifile'])
+    for pid, paths, rpsdata in _participants(info):
+        rec = _read_recording(tracker, paths)
+        segments, scenes = rec.process_rec(scenelist=read_segs(paths['seg']), aoilist=aois, rpsdata=rpsdata,
+                                           export_pupilinfo=True)
+        with timer:
+            for scene in scenes:
+                Scene(scene.scid, [], rec.all_data, rec.fix_data, saccade_data=rec.sac_data,
+                      event_data=rec.event_data, Segments=scene.segments, aoilist=aois,
+                      rest_pupil_size=rpsdata.get(scene.scid, 0), export_pupilinfo=True)
+            Scene(str(pid) + '_allsc', [], rec.all_data, rec.fix_data, saccade_data=rec.sac_data,
+                  event_data=rec.event_data, Segments=sorted(segments, key=lambda x: x.start), aoilist=aois,
+                  export_pupilinfo=True)
+
+
+def _read_participants(info):
+    from BasicParticipant import read_participants_Basic
+    return read_participants_Basic(info['datadir'], info['pids'], info['pids'], aoifile=info['aoifile'],
+                                   rpsfile=info['rpsfile'])
+
+
+def _stage_write(info, timer):
+    from EMDAT_core.Participant import write_features_tsv
+    participants = _read_participants(info)
+    with timer:
+        write_features_tsv(participants, os.path.join(info['datadir'], "features.tsv"))
+
+
+def _stage_pipeline(info, timer):
+    from EMDAT_core.Participant import write_features_tsv
+    with timer:
+        participants = _read_participants(info)
+        write_features_tsv(participants, os.path.join(info['datadir'], "features.tsv"))
+
+
+STAGE_FUNCTIONS = {"read": _stage_read, "segments": _stage_segments, "aoi_stat": _stage_aoi_stat,
+                   "scenes": _stage_scenes, "write": _stage_write, "pipeline": _stage_pipeline}
+
+
+def _int_list(text):
+    return [int(value) for value in text.split(',')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times the EMDAT pipeline on synthetic workloads.")
+    commands = parser.add_subparsers(dest="command")
+    run = commands.add_parser("run", help="run the benchmarks and write their results as JSON")
+    run.add_argument("outfile")
+    run.add_argument("--participants", type=_int_list, default=list(STANDARD_PARTICIPANTS))
+    run.add_argument("--rates", type=_int_list, default=list(STANDARD_RATES), help="sampling rates (Hz)")
+    run.add_argument("--aois", type=_int_list, default=list(STANDARD_AOIS))
+    run.add_argument("--duration", type=int, default=300, help="length of each recording (s)")
+    run.add_argument("--tracker", choices=("TobiiV3", "TobiiV2", "SMI"), default="TobiiV3")
+    run.add_argument("--stages", type=lambda text: text.split(','), default=list(STAGES))
+    run.add_argument("--repeat", type=int, default=1)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--workdir", default="./outputfolder/benchmark")
+    compare = commands.add_parser("compare", help="compare the results of two runs")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=0.1,
+                         help="relative slow-down (or memory increase) reported as a regression")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        for stage in args.stages:
+            if stage not in STAGES:
+                parser.error("unknown stage: %s (choose from %s)" % (stage, ', '.join(STAGES)))
+        workloads = standard_workloads(args.participants, args.rates, args.aois, args.duration, args.tracker,
+                                       args.seed)
+        results = run_benchmarks(workloads, args.workdir, args.stages, args.repeat)
+        with open(args.outfile, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        comparison = compare_results(baseline, current, args.threshold)
+        print_comparison(comparison)
+        if any(row[-1] for row in comparison):
+            sys.exit(1)
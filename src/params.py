@@ -200,4 +200,39 @@ DEBUG = False
 #VERBOSE = "NORMAL"		#prints essential information
 VERBOSE = "VERBOSE"	#prints information useful for debugging
 
+# ####################### Recording cache ##############################################################
+
+#Directory where the parsed eye tracking data of each recording is cached (as a NumPy '.npz' file), so that
+#the exported files are not parsed again in later runs. Cache files are keyed by the content of the exported
+#files and the reader settings, and can be deleted at any time.
+#RECORDING_CACHE_DIR = './outputfolder/recording_cache'
+RECORDING_CACHE_DIR = None
+
+#Directory where each computed Segment (its features, AOI statistics and the statistics the Scenes are merged from) is
+#cached (as a pickle file), so that only the new or changed Segments of the '.seg' file are computed in later runs.
+#Cache files are keyed by the data of the recording, the time range of the Segment, the AOIs and the parameters the
+#features depend on (see EMDAT_core/segment_cache.py), and can be deleted at any time. With READ_SEGMENTS_ONLY the time
+#ranges of all the Segments are part of the key, so editing the '.seg' file computes every Segment again.
+#SEGMENT_CACHE_DIR = './outputfolder/segment_cache'
+SEGMENT_CACHE_DIR = None
+
+# ####################### Reading only the segments ##############################################################
+
+#Reject the rows of the exported files that are far from every Segment of the '.seg' file (e.g. calibration or breaks
+#between tasks) while reading them, after reading only their timestamp (see ReadFilter in EMDAT_core/Recording.py).
+#The time ranges of the Segments are widened by READ_FILTER_MARGIN (ms) on each side, to keep the samples and
+#fixations around the start and end of each Segment that the features depend on. The last sample before each Segment is
+#kept whatever its distance, as the pupil velocity of the first sample of the Segment depends on it.
+READ_SEGMENTS_ONLY = True
+READ_FILTER_MARGIN = 10000
+
+# ####################### Instrumentation ##############################################################
+
+#Record the wall and CPU time of each stage of the pipeline and the number of calls of the hot helpers,
+#per participant and for the whole run (see EMDAT_core/instrumentation.py). Can also be enabled by setting
+#the environment variable EMDAT_INSTRUMENTATION to 1. The report is written to INSTRUMENTATION_REPORT at exit.
+#INSTRUMENTATION = True
+INSTRUMENTATION = False
+INSTRUMENTATION_REPORT = './outputfolder/instrumentation_report.json'
+
 CANARY_OUTPUT_LOG = '/Users/obarral/Documents/CANARY/Data/PRE-LOCKDOWN-ALL-DATA/EMDAT/EMDAT_processing_log.txt'
@@ -0,0 +1,625 @@
+"""
+UBC Eye Movement Data Analysis Toolkit (EMDAT), Version 3
+
+Generator of synthetic eye tracking exports, to test and profile EMDAT at scale without participant data.
+
+For each participant, a gaze session is simulated (fixations and saccades between random points of the
+screen, blinks, invalid gaps, losses of one eye, pupil size and distance drifts, mouse clicks and key
+presses) and written in the export format of an eye tracker: TobiiV3 (one 'Data_Export.tsv' file),
+TobiiV2 ('All-Data.tsv', 'Fixation-Data.tsv' and 'Event-Data.tsv'), SMI ('Samples.txt' and 'Events.txt')
+or Tobii4C (raw and fixation '.csv' files). The matching '.seg', '.aoi' and rest pupil size files are
+written as well.
+
+The output only depends on the arguments: the same seed always gives the same files, on any machine.
+Files are written row by row, so that multi-GB workloads can be generated in constant memory.
+
+Usage:
+    python synthetic_data.py outdir --tracker TobiiV3 --participants 10 --duration 600 --rate 120 --aois 8
+
+Institution: The University of British Columbia.
+"""
+from __future__ import print_function
+import argparse
+import math
+import os
+import random
+
+import params
+
+TRACKERS = ("TobiiV3", "TobiiV2", "SMI", "Tobii4C")
+
+SCREEN_WIDTH = 1280
+SCREEN_HEIGHT = 1024
+
+
+def generate_dataset(outdir, tracker="TobiiV3", participants=1, duration=600, sampling_rate=120,
+                     scenes=2, segments_per_scene=3, aoi_count=8, blinks_per_minute=15.0,
+                     invalid_gaps_per_minute=1.0, invalid_gap_duration=(500, 3000), eye_loss_rate=0.03,
+                     clicks_per_minute=6.0, keypresses_per_minute=4.0, seed=0, layout="basic"):
+    """Writes the exports of a group of synthetic participants, with their '.seg', '.aoi' and rest pupil size files
+
+    Args:
+        outdir: the directory where the files are written (created if needed)
+
+        tracker: the export format, one of TRACKERS
+
+        participants: the number of participants (their ids are 1 to participants)
+
+        duration: the length of each recording (in seconds)
+
+        sampling_rate: the sampling rate of the eye tracker (in Hz)
+
+        scenes, segments_per_scene: each recording is cut into consecutive "Scene"s of consecutive "Segment"s
+            of equal length
+
+        aoi_count: the number of (rectangular) "AOI"s, in a grid covering the screen
+
+        blinks_per_minute: the average number of blinks per minute
+
+        invalid_gaps_per_minute: the average number of gaps of invalid samples per minute
+            (losses of both eyes longer than a blink)
+
+        invalid_gap_duration: the range (in ms) of the duration of the invalid gaps
+
+        eye_loss_rate: the proportion of samples (during fixations and saccades) where one eye is lost
+
+        clicks_per_minute: the average number of mouse clicks per minute (one in ten is a double click)
+
+        keypresses_per_minute: the average number of key presses per minute
+
+        seed: the seed of the random generator
+
+        layout: "basic" to name the files as BasicParticipant.read_participants_Basic expects them, or
+            "pool" as BasicParticipant_multiprocessing.participant_files does (only for TobiiV3)
+
+    Returns:
+        a dictionary with the list of participant ids ('pids'), the names of the shared '.aoi' and rest
+        pupil size files ('aoifile' and 'rpsfile'), and the number of samples written ('numsamples')
+    """
+    if tracker not in TRACKERS:
+        raise Exception("Unknown eye tracker type: " + str(tracker))
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+
+    aois = aoi_grid(aoi_count)
+    aoifile = os.path.join(outdir, "synthetic.aoi")
+    write_aoi_file(aoifile, aois)
+    scene_names = ["scene%d" % (i + 1) for i in range(scenes)]
+
+    pids = list(range(1, participants + 1))
+    rest_pupil_sizes = {}
+    numsamples = 0
+    for pid in pids:
+        rng = random.Random(seed * 1000003 + pid)
+        session = SyntheticSession(rng, duration * 1000, sampling_rate, blinks_per_minute,
+                                   invalid_gaps_per_minute, invalid_gap_duration, eye_loss_rate,
+                                   clicks_per_minute, keypresses_per_minute)
+        paths = participant_paths(outdir, tracker, pid, layout)
+        for path in paths.values():
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+        WRITERS[tracker](session, paths, pid)
+        time_unit = 1000 if tracker in ("SMI", "Tobii4C") else 1  # SMI and 4C timestamps are in microseconds
+        write_seg_file(paths['seg'], scene_names, segments_per_scene, session.duration, time_unit, session.time_origin)
+        if 'aoi' in paths:
+            write_aoi_file(paths['aoi'], aois)
+        rest_pupil_sizes[pid] = [session.rest_pupil_size + (rng.random() - 0.5) * 0.1 for _ in scene_names]
+        numsamples += session.numsamples
+
+    rpsfile = os.path.join(outdir, "all_rest_pupil_sizes.tsv")
+    with open(rpsfile, 'w') as f:
+        f.write('\t'.join(["pid"] + scene_names) + '\n')
+        for pid in pids:
+            f.write('\t'.join([str(pid)] + ["%.3f" % rps for rps in rest_pupil_sizes[pid]]) + '\n')
+
+    return {'pids': pids, 'aoifile': aoifile, 'rpsfile': rpsfile, 'numsamples': numsamples}
+
+
+def participant_paths(outdir, tracker, pid, layout="basic"):
+    """Returns the names of the files of a participant
+
+    Args:
+        outdir: the directory of the dataset
+
+        tracker: the export format, one of TRACKERS
+
+        pid: the participant id
+
+        layout: "basic" or "pool" (see generate_dataset)
+
+    Returns:
+        a dictionary with the names of the files ('all', 'fix', 'sac', 'event', 'seg' and, for the TobiiV3 basic
+        layout, 'aoi'); several keys give the same file when the tracker exports the streams together
+    """
+    if tracker == "TobiiV3" and layout == "basic":
+        base = "%s_%s" % (params.BASE_TOBII_NAME, pid)
+        export = os.path.join(outdir, "Preprocessing", "Eye_Raw", base + ".tsv")
+        return {'all': export, 'fix': export, 'sac': export, 'event': export,
+                'seg': os.path.join(outdir, "Preprocessing", "Segments", base + ".seg"),
+                'aoi': os.path.join(outdir, "Preprocessing", "AOIs", base + ".aoi")}
+    elif tracker == "TobiiV3":
+        export = os.path.join(outdir, "P%s_Data_Export.tsv" % pid)
+        return {'all': export, 'fix': export, 'sac': export, 'event': export,
+                'seg': os.path.join(outdir, "TobiiV3_sample_%s.seg" % pid)}
+    elif tracker == "TobiiV2":
+        return {'all': os.path.join(outdir, "P%s-All-Data.tsv" % pid),
+                'fix': os.path.join(outdir, "P%s-Fixation-Data.tsv" % pid),
+                'event': os.path.join(outdir, "P%s-Event-Data.tsv" % pid),
+                'seg': os.path.join(outdir, "P%s.seg" % pid)}
+    elif tracker == "SMI":
+        events = os.path.join(outdir, "SMI_Sample_%s_Events.txt" % pid)
+        return {'all': os.path.join(outdir, "SMI_Sample_%s_Samples.txt" % pid),
+                'fix': events, 'sac': events, 'event': events,
+                'seg': os.path.join(outdir, "SMI_Sample_%s.seg" % pid)}
+    elif tracker == "Tobii4C":
+        return {'all': os.path.join(outdir, "P%s.csv" % pid),
+                'fix': os.path.join(outdir, "P%s_fixation.csv" % pid),
+                'seg': os.path.join(outdir, "P%s.seg" % pid)}
+    raise Exception("Unknown eye tracker type: " + str(tracker))
+
+
+class SyntheticSession(object):
+    """
+    A simulated gaze session. The samples are generated on demand by samples(), which also fills the lists
+    of fixations, saccades and blinks; the user events are drawn when the session is created.
+
+    Attributes:
+        duration: the length of the session (in ms)
+        period: the time between two samples (in ms)
+        time_origin: the timestamp (in ms) of the start of the session
+        rest_pupil_size: the rest pupil size of the participant (in mm)
+        fixations: a list of (index, start, duration, x, y), filled by samples()
+        saccades: a list of (index, start, duration, start x, start y, end x, end y), filled by samples()
+        blinks: a list of (start, duration), filled by samples()
+        events: a list of (timestamp, kind, x, y, key) with kind in "LeftMouseClick", "RightMouseClick" and "KeyPress"
+        numsamples: the number of samples generated so far
+    """
+
+    def __init__(self, rng, duration, sampling_rate, blinks_per_minute, invalid_gaps_per_minute,
+                 invalid_gap_duration, eye_loss_rate, clicks_per_minute, keypresses_per_minute):
+        self.rng = rng
+        self.duration = duration
+        self.period = 1000.0 / sampling_rate
+        self.time_origin = uniform_int(rng, 0, 5000)
+        self.rest_pupil_size = 2.8 + rng.random()
+        self.blinks_per_minute = blinks_per_minute
+        self.invalid_gaps_per_minute = invalid_gaps_per_minute
+        self.invalid_gap_duration = invalid_gap_duration
+        self.eye_loss_rate = eye_loss_rate
+        self.fixations = []
+        self.saccades = []
+        self.blinks = []
+        self.numsamples = 0
+        self.events = self._draw_events(clicks_per_minute, keypresses_per_minute)
+
+    def _draw_events(self, clicks_per_minute, keypresses_per_minute):
+        """Returns the user events of the session, in chronological order"""
+        events = []
+        for kind, per_minute in (("click", clicks_per_minute), ("KeyPress", keypresses_per_minute)):
+            if per_minute <= 0:
+                continue
+            t = 0.0
+            while True:
+                t += -math.log(1.0 - self.rng.random()) * 60000.0 / per_minute
+                if t >= self.duration:
+                    break
+                timestamp = self.time_origin + int(t)
+                x, y = uniform_int(self.rng, 0, SCREEN_WIDTH - 1), uniform_int(self.rng, 0, SCREEN_HEIGHT - 1)
+                if kind == "KeyPress":
+                    events.append((timestamp, kind, x, y, "abcdefghijklmnopqrstuvwxyz"[uniform_int(self.rng, 0, 25)]))
+                elif self.rng.random() < 0.1:  # double click
+                    events.append((timestamp, "LeftMouseClick", x, y, ""))
+                    events.append((timestamp + uniform_int(self.rng, 100, 300), "LeftMouseClick", x, y, ""))
+                else:
+                    events.append((timestamp, "LeftMouseClick" if self.rng.random() < 0.85 else "RightMouseClick", x, y, ""))
+        events.sort()
+        return events
+
+    def samples(self):
+        """Yields the samples of the session, in chronological order
+
+        Each sample is a tuple (timestamp, gaze x, gaze y, left valid, right valid, left pupil, right pupil,
+        left distance, right distance, event type, event index, event duration, fixation x, fixation y), where
+        timestamp is in ms, event type is "Fixation", "Saccade", "Blink" or "Gap" (an invalid gap), event index
+        is the index of the fixation or saccade (0 otherwise), fixation x and y are the fixation point (None
+        outside of fixations) and the pupils, distances and gaze point are None for the eyes (or sample) without data.
+        """
+        rng = self.rng
+        end = self.time_origin + self.duration
+        sample_number = 0
+        fixation_index = 0
+        saccade_index = 0
+        x, y = SCREEN_WIDTH / 2.0, SCREEN_HEIGHT / 2.0
+        pupil_drift = 0.0
+        distance = 550.0 + rng.random() * 100.0
+        start = float(self.time_origin)
+        phase = "Fixation"
+        while start < end:
+            if phase == "Fixation":
+                fixation_index += 1
+                event_duration = uniform_int(rng, 100, 600)
+                target = (x, y)
+            elif phase == "Saccade":
+                saccade_index += 1
+                event_duration = uniform_int(rng, 20, 80)
+                target = (uniform_int(rng, 20, SCREEN_WIDTH - 21), uniform_int(rng, 20, SCREEN_HEIGHT - 21))
+            elif phase == "Blink":
+                event_duration = uniform_int(rng, 100, 300)
+            else:
+                event_duration = uniform_int(rng, *self.invalid_gap_duration)
+            event_end = min(start + event_duration, end)
+            event_duration = int(event_end - start)
+            event_index = fixation_index if phase == "Fixation" else saccade_index if phase == "Saccade" else 0
+
+            first = None
+            last = None
+            start_point = (x, y)
+            while True:
+                timestamp = int(round(self.time_origin + sample_number * self.period))
+                if timestamp >= event_end:
+                    break
+                sample_number += 1
+                if first is None:
+                    first = timestamp
+                last = timestamp
+                pupil_drift = min(0.8, max(-0.8, pupil_drift + (rng.random() - 0.5) * 0.02))
+                distance = min(700.0, max(450.0, distance + (rng.random() - 0.5) * 2.0))
+                self.numsamples += 1
+                if phase in ("Blink", "Gap"):
+                    yield (timestamp, None, None, False, False, None, None, None, None, phase, 0, event_duration, None, None)
+                    continue
+                if phase == "Saccade":
+                    progress = (timestamp - start + self.period) / float(event_duration)
+                    progress = min(progress, 1.0)
+                    gaze_x = start_point[0] + (target[0] - start_point[0]) * progress
+                    gaze_y = start_point[1] + (target[1] - start_point[1]) * progress
+                else:
+                    gaze_x = x + (rng.random() - 0.5) * 20.0
+                    gaze_y = y + (rng.random() - 0.5) * 20.0
+                left_valid = right_valid = True
+                if rng.random() < self.eye_loss_rate:
+                    if rng.random() < 0.5:
+                        left_valid = False
+                    else:
+                        right_valid = False
+                pupil = self.rest_pupil_size + pupil_drift
+                yield (timestamp, int(gaze_x), int(gaze_y), left_valid, right_valid,
+                       pupil + (rng.random() - 0.5) * 0.05 if left_valid else None,
+                       pupil + (rng.random() - 0.5) * 0.05 if right_valid else None,
+                       distance if left_valid else None, distance + 5.0 if right_valid else None,
+                       phase, event_index, event_duration,
+                       int(x) if phase == "Fixation" else None, int(y) if phase == "Fixation" else None)
+
+            if first is not None:
+                if phase == "Fixation":
+                    self.fixations.append((fixation_index, first, event_duration, int(x), int(y)))
+                elif phase == "Saccade":
+                    self.saccades.append((saccade_index, first, event_duration,
+                                          int(start_point[0]), int(start_point[1]), int(target[0]), int(target[1])))
+                elif phase == "Blink":
+                    self.blinks.append((first, last - first + int(round(self.period))))
+            start = event_end
+
+            if phase == "Fixation":
+                phase = "Saccade"
+            elif phase == "Saccade":
+                x, y = target
+                elapsed = event_duration + 350.0  # average length of a fixation and a saccade
+                if rng.random() < self.invalid_gaps_per_minute * elapsed / 60000.0:
+                    phase = "Gap"
+                elif rng.random() < self.blinks_per_minute * elapsed / 60000.0:
+                    phase = "Blink"
+                else:
+                    phase = "Fixation"
+            else:
+                phase = "Fixation"
+
+
+def write_tobiiv3(session, paths, pid):
+    """Writes a TobiiV3 'Data_Export.tsv' file (samples, fixations, saccades and events in one file)"""
+    columns = ["ParticipantName", "RecordingTimestamp", "EyeTrackerTimestamp", "MediaName", "ValidityLeft",
+               "ValidityRight", "GazePointX (MCSpx)", "GazePointY (MCSpx)", "GazePointX (ADCSpx)", "GazePointY (ADCSpx)",
+               "PupilLeft", "PupilRight", "DistanceLeft", "DistanceRight", "FixationIndex", "SaccadeIndex",
+               "GazeEventType", "GazeEventDuration", "FixationPointX (MCSpx)", "FixationPointY (MCSpx)",
+               "MouseEventIndex", "MouseEvent", "MouseEventX (MCSpx)", "MouseEventY (MCSpx)",
+               "KeyPressEventIndex", "KeyPressEvent"]
+    media = "Screen Recordings (1)"
+    name = "P%s" % pid
+    events = session.events
+    next_event = 0
+    indices = {"mouse": 0, "key": 0}
+
+    def event_row(event):
+        timestamp, kind, x, y, key = event
+        row = [name, str(timestamp), "", media] + [""] * (len(columns) - 4)
+        if kind == "KeyPress":
+            indices["key"] += 1
+            row[24:26] = [str(indices["key"]), key]
+        else:
+            indices["mouse"] += 1
+            row[20:24] = [str(indices["mouse"]), "Left" if kind == "LeftMouseClick" else "Right", str(x), str(y)]
+        return '\t'.join(row) + '\n'
+
+    with open(paths['all'], 'w') as f:
+        f.write('\t'.join(columns) + '\n')
+        for sample in session.samples():
+            (timestamp, gaze_x, gaze_y, left_valid, right_valid, pupil_left, pupil_right,
+             distance_left, distance_right, event_type, event_index, event_duration, fixation_x, fixation_y) = sample
+            while next_event < len(events) and events[next_event][0] <= timestamp:
+                f.write(event_row(events[next_event]))
+                next_event += 1
+            if event_type in ("Fixation", "Saccade"):
+                gaze_event = event_type
+            else:
+                gaze_event = "Unclassified"
+            gaze = ("" if gaze_x is None else str(gaze_x), "" if gaze_y is None else str(gaze_y))
+            row = [name, str(timestamp), str(timestamp * 1000), media, "0" if left_valid else "4", "0" if right_valid else "4",
+                   gaze[0], gaze[1], gaze[0], gaze[1], decimal_comma(pupil_left, "%.2f"), decimal_comma(pupil_right, "%.2f"),
+                   decimal_comma(distance_left, "%.1f"), decimal_comma(distance_right, "%.1f"),
+                   str(event_index) if event_type == "Fixation" else "", str(event_index) if event_type == "Saccade" else "",
+                   gaze_event, str(event_duration),
+                   str(fixation_x) if fixation_x is not None else "", str(fixation_y) if fixation_y is not None else "",
+                   "", "", "", "", "", ""]
+            f.write('\t'.join(row) + '\n')
+        for event in events[next_event:]:
+            f.write(event_row(event))
+
+
+def write_tobiiv2(session, paths, pid):
+    """Writes the TobiiV2 'All-Data.tsv', 'Fixation-Data.tsv' and 'Event-Data.tsv' files"""
+    columns = ["Timestamp", "DateTimeStamp", "DateTimeStampStartOffset", "Number", "GazePointXLeft", "GazePointYLeft",
+               "CamXLeft", "CamYLeft", "DistanceLeft", "PupilLeft", "ValidityLeft", "GazePointXRight", "GazePointYRight",
+               "CamXRight", "CamYRight", "DistanceRight", "PupilRight", "ValidityRight", "FixationIndex", "GazePointX",
+               "GazePointY", "Event", "EventKey", "Data1", "Data2", "Descriptor", "StimuliName", "StimuliID",
+               "MediaWidth", "MediaHeight", "MediaPosX", "MediaPosY", "MappedFixationPointX", "MappedFixationPointY",
+               "FixationDuration", "AoiIds", "AoiNames", "WebGroupImage", "MappedGazeDataPointX", "MappedGazeDataPointY",
+               "MicroSecondTimestamp", "AbsoluteMicroSecondTimestamp"]
+    with open(paths['all'], 'w') as f:
+        f.write(tobii_preamble(params.ALLDATAHEADERLINES + params.NUMBEROFEXTRAHEADERLINES - 1, pid))
+        f.write('\t'.join(columns) + '\n')
+        number = 0
+        for sample in session.samples():
+            (timestamp, gaze_x, gaze_y, left_valid, right_valid, pupil_left, pupil_right,
+             distance_left, distance_right, event_type, event_index, event_duration, fixation_x, fixation_y) = sample
+            number += 1
+            row = [""] * len(columns)
+            row[0] = str(timestamp)
+            row[3] = str(number)
+            row[4] = str(gaze_x) if left_valid else "-1"
+            row[5] = str(gaze_y) if left_valid else "-1"
+            row[8] = "%.2f" % distance_left if distance_left is not None else "-1"
+            row[9] = "%.2f" % pupil_left if pupil_left is not None else "-1"
+            row[10] = "0" if left_valid else "4"
+            row[11] = str(gaze_x) if right_valid else "-1"
+            row[12] = str(gaze_y) if right_valid else "-1"
+            row[15] = "%.2f" % distance_right if distance_right is not None else "-1"
+            row[16] = "%.2f" % pupil_right if pupil_right is not None else "-1"
+            row[17] = "0" if right_valid else "4"
+            row[18] = str(event_index) if event_type == "Fixation" else ""
+            row[19] = str(gaze_x) if gaze_x is not None else "-1"
+            row[20] = str(gaze_y) if gaze_y is not None else "-1"
+            row[26] = "ScreenRec"
+            row[40] = str(timestamp * 1000)
+            f.write('\t'.join(row) + '\n')
+
+    with open(paths['fix'], 'w') as f:
+        f.write(tobii_preamble(params.FIXATIONHEADERLINES - 1, pid))
+        f.write('\t'.join(["FixationIndex", "Timestamp", "FixationDuration", "MappedFixationPointX", "MappedFixationPointY"]) + '\n')
+        for index, start, duration, x, y in session.fixations:
+            f.write('\t'.join([str(index), str(start), str(duration), str(x), str(y)]) + '\n')
+
+    with open(paths['event'], 'w') as f:
+        f.write(tobii_preamble(params.EVENTSHEADERLINES - 1, pid))
+        f.write('\t'.join(["Timestamp", "Event", "EventKey", "Data1", "Data2", "Descriptor"]) + '\n')
+        f.write('\t'.join([str(session.time_origin), "ScreenRecStarted", "8192", "0", "0", ""]) + '\n')
+        for timestamp, kind, x, y, key in session.events:
+            if kind == "KeyPress":
+                f.write('\t'.join([str(timestamp), kind, "3", str(ord(key)), "0", key]) + '\n')
+            else:
+                f.write('\t'.join([str(timestamp), kind, "1" if kind == "LeftMouseClick" else "2", str(x), str(y), ""]) + '\n')
+
+
+def write_smi(session, paths, pid):
+    """Writes the SMI (BeGaze) 'Samples.txt' and 'Events.txt' files, with timestamps in microseconds"""
+    columns = ["Time", "Type", "Trial", "L POR X [px]", "L POR Y [px]", "R POR X [px]", "R POR Y [px]",
+               "L Pupil Diameter [mm]", "R Pupil Diameter [mm]", "L EPOS Z", "R EPOS Z", "L Event Info", "R Event Info"]
+    with open(paths['all'], 'w') as f:
+        for _ in range(params.RAW_HEADER_LINE - 1):
+            f.write('## [BeGaze]\n')
+        f.write(','.join(columns) + '\n')
+        for sample in session.samples():
+            (timestamp, gaze_x, gaze_y, left_valid, right_valid, pupil_left, pupil_right,
+             distance_left, distance_right, event_type, event_index, event_duration, fixation_x, fixation_y) = sample
+            info = "-" if event_type == "Gap" else event_type
+            row = [str(timestamp * 1000), "SMP", "1",
+                   "%d.00" % gaze_x if left_valid else "0.00", "%d.00" % gaze_y if left_valid else "0.00",
+                   "%d.00" % gaze_x if right_valid else "0.00", "%d.00" % gaze_y if right_valid else "0.00",
+                   "%.2f" % pupil_left if pupil_left is not None else "0.00",
+                   "%.2f" % pupil_right if pupil_right is not None else "0.00",
+                   "%.2f" % distance_left if distance_left is not None else "0.00",
+                   "%.2f" % distance_right if distance_right is not None else "0.00",
+                   info, info]
+            f.write(','.join(row) + '\n')
+
+    header_lines = {params.FIXATION_HEADER_LINE: "Event Type,Trial,Number,Start,End,Duration,Location X,Location Y,"
+                                                 "Dispersion X,Dispersion Y,AOI hit,Image,Plane,Avg. Pupil Size X,Avg. Pupil Size Y",
+                    params.SACCADE_HEADER_LINE: "Event Type,Trial,Number,Start,End,Duration,Start Loc.X,Start Loc.Y,"
+                                                "End Loc.X,End Loc.Y,Amplitude,Peak Speed,Peak Speed At,Average Speed,"
+                                                "Peak Accel.,Peak Decel.,Average Accel.",
+                    params.USER_EVENT_HEADER_LINE: "Event Type,Trial,Number,Start,Description"}
+    records = []
+    for index, start, duration, x, y in session.fixations:
+        for eye in ("L", "R"):
+            records.append((start, "Fixation %s,1,%d,%d,%d,%d,%d.00,%d.00,20,20,-,-,-1,16.00,16.00" %
+                            (eye, index, start * 1000, (start + duration) * 1000, duration * 1000, x, y)))
+    for index, start, duration, start_x, start_y, end_x, end_y in session.saccades:
+        speed = math.sqrt((end_x - start_x) ** 2 + (end_y - start_y) ** 2) / (duration * 1000.0)
+        for eye in ("L", "R"):
+            records.append((start, "Saccade %s,1,%d,%d,%d,%d,%d.00,%d.00,%d.00,%d.00,1.00,%.4f,0.50,%.4f,1000.00,-1000.00,500.00" %
+                            (eye, index, start * 1000, (start + duration) * 1000, duration * 1000,
+                             start_x, start_y, end_x, end_y, 2 * speed, speed)))
+    for number, (start, duration) in enumerate(session.blinks):
+        for eye in ("L", "R"):
+            records.append((start, "Blink %s,1,%d,%d,%d,%d" % (eye, number + 1, start * 1000, (start + duration) * 1000, duration * 1000)))
+    for number, (timestamp, kind, x, y, key) in enumerate(session.events):
+        if kind == "KeyPress":
+            description = "# Message: UE-keypress %s" % key
+        else:
+            description = "# Message: UE-mouseclick %s x=%d y=%d" % ("left" if kind == "LeftMouseClick" else "right", x, y)
+        records.append((timestamp, "UserEvent,1,%d,%d,%s" % (number + 1, timestamp * 1000, description)))
+    records.sort(key=lambda record: record[0])
+
+    with open(paths['event'], 'w') as f:
+        preamble = ["[BeGaze]", "Converted from:\tsynthetic", "Date:\t01.01.2020 00:00:00", "Version:\tBeGaze 3.5.90",
+                    "Sample Rate:\t%d" % int(round(1000.0 / session.period)), "Subject:\tP%s" % pid,
+                    "Description:\tsynthetic", "Stimulus:\tscreen"]
+        for line in range(1, params.EVENTS_FIRST_DATA_LINE):
+            if line in header_lines:
+                f.write(header_lines[line] + '\n')
+            elif line - 1 in header_lines:
+                f.write('\n')
+            elif line <= len(preamble):
+                f.write(preamble[line - 1] + '\n')
+            else:
+                f.write('\n')
+        for _, record in records:
+            f.write(record + '\n')
+
+
+def write_tobii4c(session, paths, pid):
+    """Writes the Tobii 4C raw '.csv' file (gaze points normalized to the display area, timestamps in
+    microseconds) and the '_fixation.csv' file of fixations and saccades"""
+    columns = ["right_pupil_validity", "right_gaze_point_on_display_area", "left_gaze_origin_validity",
+               "system_time_stamp", "right_gaze_origin_in_user_coordinate_system",
+               "left_gaze_point_in_user_coordinate_system", "left_gaze_origin_in_user_coordinate_system",
+               "left_pupil_validity", "right_pupil_diameter", "left_gaze_origin_in_trackbox_coordinate_system",
+               "right_gaze_point_in_user_coordinate_system", "left_pupil_diameter", "right_gaze_origin_validity",
+               "left_gaze_point_validity", "right_gaze_point_validity", "left_gaze_point_on_display_area",
+               "right_gaze_origin_in_trackbox_coordinate_system", "device_time_stamp"]
+    unused = "(0.0, 0.0, 0.0)"
+    with open(paths['all'], 'w') as f:
+        f.write(';'.join(columns) + '\n')
+        for sample in session.samples():
+            (timestamp, gaze_x, gaze_y, left_valid, right_valid, pupil_left, pupil_right,
+             distance_left, distance_right, event_type, event_index, event_duration, fixation_x, fixation_y) = sample
+            if gaze_x is None:
+                left_point = right_point = "(nan, nan)"
+            else:
+                point = "(%.6f, %.6f)" % (gaze_x / float(SCREEN_WIDTH), gaze_y / float(SCREEN_HEIGHT))
+                left_point = point if left_valid else "(nan, nan)"
+                right_point = point if right_valid else "(nan, nan)"
+            row = ["1" if right_valid else "0", right_point, "1" if left_valid else "0", "%d" % (timestamp * 1000),
+                   unused, unused, unused, "1" if left_valid else "0",
+                   "%.5f" % pupil_right if pupil_right is not None else "nan", unused, unused,
+                   "%.5f" % pupil_left if pupil_left is not None else "nan", "1" if right_valid else "0",
+                   "1" if left_valid else "0", "1" if right_valid else "0", left_point, unused, "%d" % (timestamp * 1000)]
+            f.write(';'.join(row) + '\n')
+
+    records = []
+    for index, start, duration, x, y in session.fixations:
+        records.append((start, "fixation,%.4f,%.4f,%d.0,%d.0,%d.0" % (100.0 * x / SCREEN_WIDTH, 100.0 * y / SCREEN_HEIGHT,
+                                                                   start * 1000, (start + duration) * 1000, duration)))
+    for index, start, duration, start_x, start_y, end_x, end_y in session.saccades:
+        records.append((start, "saccade,%.4f,%.4f,%d.0,%d.0,%d.0" % (100.0 * end_x / SCREEN_WIDTH, 100.0 * end_y / SCREEN_HEIGHT,
+                                                                  start * 1000, (start + duration) * 1000, duration)))
+    records.sort(key=lambda record: record[0])
+    with open(paths['fix'], 'w') as f:
+        f.write("label,x,y,start,end,duration\n")
+        for _, record in records:
+            f.write(record + '\n')
+
+
+WRITERS = {"TobiiV3": write_tobiiv3, "TobiiV2": write_tobiiv2, "SMI": write_smi, "Tobii4C": write_tobii4c}
+
+
+def aoi_grid(aoi_count):
+    """Returns the (name, polygon) of aoi_count rectangular "AOI"s in a grid covering the screen"""
+    if aoi_count <= 0:
+        return []
+    columns = int(math.ceil(math.sqrt(aoi_count)))
+    rows = int(math.ceil(aoi_count / float(columns)))
+    width = SCREEN_WIDTH // columns
+    height = SCREEN_HEIGHT // rows
+    aois = []
+    for i in range(aoi_count):
+        left = (i % columns) * width
+        top = (i // columns) * height
+        aois.append(("AOI%d" % (i + 1), [(left, top), (left + width - 1, top), (left + width - 1, top + height - 1),
+                                          (left, top + height - 1)]))
+    return aois
+
+
+def write_aoi_file(path, aois):
+    """Writes a '.aoi' file (see Recording.read_aois) with static "AOI"s"""
+    with open(path, 'w') as f:
+        for name, polygon in aois:
+            f.write('\t'.join([name] + ["%d,%d" % point for point in polygon]) + '\n')
+
+
+def write_seg_file(path, scene_names, segments_per_scene, duration, time_unit=1, time_origin=0):
+    """Writes a '.seg' file (see Recording.read_segs) cutting a recording into consecutive scenes and segments
+
+    Args:
+        path: the name of the '.seg' file
+
+        scene_names: the ids of the scenes
+
+        segments_per_scene: the number of segments of each scene
+
+        duration: the length of the recording (in ms)
+
+        time_unit: the number of time units of the recording in a ms (1000 for timestamps in microseconds)
+
+        time_origin: the timestamp (in ms) of the start of the recording
+    """
+    numsegments = len(scene_names) * segments_per_scene
+    with open(path, 'w') as f:
+        for i in range(numsegments):
+            start = (time_origin + duration * i // numsegments) * time_unit
+            end = (time_origin + duration * (i + 1) // numsegments) * time_unit - 1
+            f.write('\t'.join([scene_names[i // segments_per_scene], "seg%d" % (i + 1), str(start), str(end)]) + '\n')
+
+
+def tobii_preamble(numlines, pid):
+    """Returns the lines of metadata written by Tobii Studio V1-V2 before the table header"""
+    lines = ["Data properties:", "", "Recording name:\t Rec %s" % pid, "Recording date:\t 01/01/2020",
+             "Recording time:\t 0:00:00 AM", "Recording resolution:\t %d x %d" % (SCREEN_WIDTH, SCREEN_HEIGHT), "",
+             "Participant:\t P%s" % pid]
+    lines = (lines + [""] * numlines)[:numlines]
+    return ''.join(line + '\n' for line in lines)
+
+
+def decimal_comma(value, fmt):
+    """Formats a number with a decimal comma, as Tobii Studio V3 does with a Swedish locale ("" for None)"""
+    if value is None:
+        return ""
+    return (fmt % value).replace(".", ",")
+
+
+def uniform_int(rng, low, high):
+    """Returns a random integer in [low, high], drawn the same way by Python 2 and 3"""
+    return low + int(rng.random() * (high - low + 1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Writes synthetic eye tracking exports for scale testing.")
+    parser.add_argument("outdir")
+    parser.add_argument("--tracker", choices=TRACKERS, default="TobiiV3")
+    parser.add_argument("--participants", type=int, default=1)
+    parser.add_argument("--duration", type=int, default=600, help="length of each recording (s)")
+    parser.add_argument("--rate", type=int, default=120, help="sampling rate (Hz)")
+    parser.add_argument("--scenes", type=int, default=2)
+    parser.add_argument("--segments-per-scene", type=int, default=3)
+    parser.add_argument("--aois", type=int, default=8)
+    parser.add_argument("--blinks-per-minute", type=float, default=15.0)
+    parser.add_argument("--gaps-per-minute", type=float, default=1.0)
+    parser.add_argument("--eye-loss-rate", type=float, default=0.03)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--layout", choices=("basic", "pool"), default="basic")
+    args = parser.parse_args()
+    info = generate_dataset(args.outdir, tracker=args.tracker, participants=args.participants, duration=args.duration,
+                            sampling_rate=args.rate, scenes=args.scenes, segments_per_scene=args.segments_per_scene,
+                            aoi_count=args.aois, blinks_per_minute=args.blinks_per_minute,
+                            invalid_gaps_per_minute=args.gaps_per_minute, eye_loss_rate=args.eye_loss_rate,
+                            seed=args.seed, layout=args.layout)
+    print("Wrote %d samples of %d participants to %s" % (info['numsamples'], len(info['pids']), args.outdir))
@@ -8,6 +8,7 @@ Sample code to run EMDAT for a given experiment (multiprocessing version).
 Institution: The University of British Columbia.
 """
 
+from __future__ import print_function
 from multiprocessing import freeze_support, cpu_count
 from BasicParticipant_multiprocessing import *
 from EMDAT_core.Participant import export_features_all, write_features_tsv
@@ -26,18 +27,28 @@ if __name__ == '__main__':
     #
     #alogoffset =[ 3,  2, 2]    # the time sifference between the eye tracker logs and the external log
 
-    ###### Read participants
+    ###### Compute features (one participant per task, largest recording first)
     nbprocess = cpu_count()
-    ps = read_participants_Basic_multiprocessing(nbprocess, user_list = ul,pids = uids, log_time_offsets = alogoffset, datadir=params.EYELOGDATAFOLDER, 
-                               prune_length = None, 
+    aoi_feat_names = list(params.aoigeneralfeat)
+    print("Exporting features:\n--General:", params.featurelist, "\n--AOI:", aoi_feat_names, "\n--Sequences:", params.aoisequencefeat)
+    (featnames, rows), (seqnames, seqrows) = read_participants_features_pool(nbprocess, user_list = ul, pids = uids, log_time_offsets = alogoffset,
+                               datadir=params.EYELOGDATAFOLDER,
+                               featurelists = [params.featurelist, params.aoisequencefeat], aoifeaturelist = aoi_feat_names,
+                               id_prefix = False, require_valid = True,
+                               prune_length = None,
                                aoifile = "./sampledata/general.aoi",
     #                           aoifile = "./sampledata/Dynamic_1.aoi",
                                require_valid_segs = False, auto_partition_low_quality_segments = True,
                                rpsfile = "./sampledata/all_rest_pupil_sizes.tsv")
-    print
+    print()
     ######
 
     if params.DEBUG or params.VERBOSE == "VERBOSE":
+        ps = read_participants_pool(nbprocess, user_list = ul,pids = uids, log_time_offsets = alogoffset, datadir=params.EYELOGDATAFOLDER,
+                               prune_length = None,
+                               aoifile = "./sampledata/general.aoi",
+                               require_valid_segs = False, auto_partition_low_quality_segments = True,
+                               rpsfile = "./sampledata/all_rest_pupil_sizes.tsv")
         #explore_validation_threshold_segments(ps, auto_partition_low_quality_segments = False)
         output_Validity_info_Segments(ps, auto_partition_low_quality_segments_flag = False, validity_method = 3)
         output_percent_discarded(ps,'./outputfolder/disc_multiprocessing.csv')
@@ -46,15 +57,12 @@ if __name__ == '__main__':
 
 
     ##### WRITE features to file
-    print
-    aoi_feat_names = (map(lambda x:x, params.aoigeneralfeat))
-    print "Exporting features:\n--General:", params.featurelist, "\n--AOI:", aoi_feat_names, "\n--Sequences:", params.aoisequencefeat
-    write_features_tsv(ps, './outputfolder/sample_features_multiprocessing.tsv',featurelist = params.featurelist, aoifeaturelist=aoi_feat_names, id_prefix = False)
+    write_feature_rows_tsv(featnames, rows, './outputfolder/sample_features_multiprocessing.tsv')
 
     ##### WRITE AOI sequences to file
-    write_features_tsv(ps, './outputfolder/sample_sequences_multiprocessing.tsv',featurelist = params.aoisequencefeat, aoifeaturelist=aoi_feat_names, id_prefix = False)
+    write_feature_rows_tsv(seqnames, seqrows, './outputfolder/sample_sequences_multiprocessing.tsv')
 
     #### Export pupil dilations for each scene to a separate file
-    #print "--pupil dilation trends" 
+    #print("--pupil dilation trends")
     #plot_pupil_dilation_all(ps, './outputfolder/pupilsizes/', "problem1")
     #plot_pupil_dilation_all(ps, './outputfolder/pupilsizes/', "problem2")